@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Metric, DashboardWidget, Report, SystemHealth
+from .models import Metric, MetricSnapshot, AnalyticsCounter, DashboardWidget, Report, SystemHealth
 
 
 @admin.register(Metric)
@@ -11,6 +11,22 @@ class MetricAdmin(admin.ModelAdmin):
     ordering = ['-calculated_at']
 
 
+@admin.register(MetricSnapshot)
+class MetricSnapshotAdmin(admin.ModelAdmin):
+    list_display = ['section', 'period_days', 'projet', 'computed_at', 'checked_at', 'duration_ms']
+    list_filter = ['section', 'period_days']
+    readonly_fields = ['fingerprint', 'computed_at', 'checked_at', 'duration_ms']
+    ordering = ['period_days', 'section']
+
+
+@admin.register(AnalyticsCounter)
+class AnalyticsCounterAdmin(admin.ModelAdmin):
+    list_display = ['counter', 'value', 'scope', 'count', 'updated_at']
+    list_filter = ['counter']
+    search_fields = ['counter', 'value']
+    ordering = ['counter', 'scope', 'value']
+
+
 @admin.register(DashboardWidget)
 class DashboardWidgetAdmin(admin.ModelAdmin):
     list_display = ['name', 'widget_type', 'is_active', 'is_public', 'created_by', 'created_at']
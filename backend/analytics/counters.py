@@ -0,0 +1,287 @@
+"""
+Compteurs incrémentaux pour les métriques de comptage des analytiques.
+
+Les répartitions simples (projets par statut / propriétaire, tâches par statut /
+priorité, documents par type...) sont maintenues dans la table AnalyticsCounter
+par les signaux post_save / post_delete : la lecture d'un KPI devient une simple
+lecture de ligne au lieu d'un GROUP BY sur la table source.
+
+Les mises à jour effectuées hors signaux (QuerySet.update, SQL brut) ne sont pas
+vues par les compteurs : la commande reconcile_analytics_counters les reconstruit
+périodiquement depuis les tables sources et signale les écarts constatés.
+
+La construction initiale est faite par la migration 0005_build_analytics_counters
+(ou par la commande) : tant que la sentinelle n'existe pas, les lectures sont
+calculées depuis les tables sources, sans rien écrire pendant la requête.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F
+from django.utils import timezone
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .models import AnalyticsCounter
+from projects.models import Projet, Tache
+from documents.models import DocumentProjet, CommentaireDocumentProjet
+
+logger = logging.getLogger(__name__)
+
+
+# Noms des compteurs
+PROJETS_TOTAL = 'projets.total'
+PROJETS_STATUT = 'projets.statut'
+PROJETS_PROPRIETAIRE = 'projets.proprietaire'
+TACHES_TOTAL = 'taches.total'
+TACHES_STATUT = 'taches.statut'
+TACHES_PRIORITE = 'taches.priorite'
+DOCUMENTS_TOTAL = 'documents.total'
+DOCUMENTS_TYPE = 'documents.type'
+COMMENTAIRES_TOTAL = 'commentaires.total'
+
+# Ligne sentinelle écrite par la réconciliation : tant qu'elle n'existe pas,
+# les compteurs n'ont jamais été initialisés depuis les tables sources
+SENTINELLE = '_reconcilie'
+
+# Champs suivis par modèle pour détecter les transitions (pre_save)
+CHAMPS_SUIVIS = {
+    Projet: ('statut', 'proprietaire_id'),
+    Tache: ('statut', 'priorite', 'projet_id'),
+    DocumentProjet: ('type_document',),
+    CommentaireDocumentProjet: (),
+}
+
+# Clé d'un compteur : (compteur, valeur, portée)
+CleCompteur = Tuple[str, str, int]
+
+
+def cles_pour(model, etat: Optional[Dict]) -> List[CleCompteur]:
+    """Compteurs auxquels contribue une ligne dans l'état donné"""
+    if etat is None:
+        return []
+    if model is Projet:
+        return [
+            (PROJETS_TOTAL, '', 0),
+            (PROJETS_STATUT, etat['statut'] or '', 0),
+            (PROJETS_PROPRIETAIRE, str(etat['proprietaire_id'] or ''), 0),
+        ]
+    if model is Tache:
+        cles = []
+        # Compteurs globaux et compteurs du projet de la tâche
+        for scope in (0, etat['projet_id']):
+            cles.extend([
+                (TACHES_TOTAL, '', scope),
+                (TACHES_STATUT, etat['statut'] or '', scope),
+                (TACHES_PRIORITE, etat['priorite'] or '', scope),
+            ])
+        return cles
+    if model is DocumentProjet:
+        return [
+            (DOCUMENTS_TOTAL, '', 0),
+            (DOCUMENTS_TYPE, etat['type_document'] or '', 0),
+        ]
+    if model is CommentaireDocumentProjet:
+        return [(COMMENTAIRES_TOTAL, '', 0)]
+    return []
+
+
+def etat_de(model, instance) -> Dict:
+    """Valeurs courantes des champs suivis d'une instance"""
+    return {champ: getattr(instance, champ) for champ in CHAMPS_SUIVIS[model]}
+
+
+class AnalyticsCounterService:
+    """Service de mise à jour, de lecture et de réconciliation des compteurs"""
+
+    # Mis en cache au niveau du processus une fois la sentinelle observée
+    _initialise = False
+
+    # ------------------------------------------------------------------
+    # Écriture (signaux)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def enregistrer_transition(cls, model, ancien_etat: Optional[Dict], nouvel_etat: Optional[Dict]):
+        """
+        Calcule les deltas entre deux états d'une ligne et les applique après le
+        commit de la transaction courante (rien n'est compté en cas de rollback).
+        """
+        cls.enregistrer_transitions(model, [(ancien_etat, nouvel_etat)])
+
+    @classmethod
+    def enregistrer_transitions(cls, model, transitions: List[Tuple[Optional[Dict], Optional[Dict]]]):
+        """
+        Variante groupée pour les opérations en masse (bulk_create / bulk_update ne
+        déclenchent pas les signaux) : un seul UPDATE par compteur touché.
+        """
+        deltas = Counter()
+        for ancien_etat, nouvel_etat in transitions:
+            deltas.update(cles_pour(model, nouvel_etat))
+            deltas.subtract(Counter(cles_pour(model, ancien_etat)))
+        deltas = {cle: delta for cle, delta in deltas.items() if delta}
+        if deltas:
+            transaction.on_commit(lambda: cls.appliquer_deltas(deltas))
+
+    @classmethod
+    def appliquer_deltas(cls, deltas: Dict[CleCompteur, int]):
+        """Applique des deltas atomiquement (F-expressions) sur les compteurs"""
+        for (counter, value, scope), delta in deltas.items():
+            try:
+                cls._incrementer(counter, value, scope, delta)
+            except Exception as e:
+                # Un compteur faux est corrigé par la réconciliation : ne pas bloquer l'écriture
+                logger.error(f"Erreur lors de la mise à jour du compteur {counter}[{value}] (portée {scope}): {e}")
+
+    @staticmethod
+    def _incrementer(counter: str, value: str, scope: int, delta: int):
+        maintenant = timezone.now()
+        compteurs = AnalyticsCounter.objects.filter(counter=counter, value=value, scope=scope)
+        if compteurs.update(count=F('count') + delta, updated_at=maintenant):
+            return
+        try:
+            with transaction.atomic():
+                AnalyticsCounter.objects.create(
+                    counter=counter, value=value, scope=scope, count=delta, updated_at=maintenant
+                )
+        except IntegrityError:
+            # Créé entre-temps par une autre requête
+            compteurs.update(count=F('count') + delta, updated_at=maintenant)
+
+    @staticmethod
+    def supprimer_portee(scope: int):
+        """Supprime les compteurs propres à un projet supprimé"""
+        transaction.on_commit(lambda: AnalyticsCounter.objects.filter(scope=scope).delete())
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def get_counters(cls, scope: int = 0) -> Dict[str, Dict[str, int]]:
+        """
+        Retourne tous les compteurs d'une portée : {compteur: {valeur: nombre}}.
+        Une seule requête sur la table des compteurs ; calculés depuis les tables
+        sources tant que les compteurs n'ont jamais été construits.
+        """
+        compteurs = defaultdict(dict)
+        if not cls.est_initialise():
+            for (counter, value, portee), count in cls.compute_expected().items():
+                if portee == scope:
+                    compteurs[counter][value] = count
+            return compteurs
+        for counter, value, count in AnalyticsCounter.objects.filter(scope=scope).exclude(
+            counter=SENTINELLE
+        ).values_list('counter', 'value', 'count'):
+            compteurs[counter][value] = count
+        return compteurs
+
+    @staticmethod
+    def total(compteurs: Dict[str, Dict[str, int]], counter: str) -> int:
+        """Valeur d'un compteur sans répartition (total)"""
+        return compteurs.get(counter, {}).get('', 0)
+
+    @staticmethod
+    def repartition(compteurs: Dict[str, Dict[str, int]], counter: str) -> List[Tuple[str, int]]:
+        """Répartition non nulle d'un compteur, triée par valeur"""
+        return sorted(
+            (value, count) for value, count in compteurs.get(counter, {}).items() if count > 0
+        )
+
+    @classmethod
+    def est_initialise(cls) -> bool:
+        """
+        Compteurs construits au moins une fois (sentinelle présente). Sans sentinelle,
+        aucune reconstruction n'est lancée pendant une requête : la migration ou la
+        commande reconcile_analytics_counters s'en charge.
+        """
+        if cls._initialise:
+            return True
+        if AnalyticsCounter.objects.filter(counter=SENTINELLE).exists():
+            cls._initialise = True
+        else:
+            logger.warning(
+                "Compteurs d'analytiques non initialisés : lecture depuis les tables sources "
+                "(lancer reconcile_analytics_counters)"
+            )
+        return cls._initialise
+
+    # ------------------------------------------------------------------
+    # Réconciliation
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def compute_expected(modeles: Optional[Dict] = None) -> Dict[CleCompteur, int]:
+        """
+        Recalcule tous les compteurs depuis les tables sources. `modeles` remplace
+        les classes Projet, Tache, DocumentProjet et CommentaireDocumentProjet
+        (modèles historiques d'une migration).
+        """
+        modeles = modeles or {}
+        Projet_ = modeles.get('Projet', Projet)
+        Tache_ = modeles.get('Tache', Tache)
+        DocumentProjet_ = modeles.get('DocumentProjet', DocumentProjet)
+        CommentaireDocumentProjet_ = modeles.get('CommentaireDocumentProjet', CommentaireDocumentProjet)
+        attendus = Counter()
+
+        attendus[(PROJETS_TOTAL, '', 0)] += 0
+        for ligne in Projet_.objects.values('statut').annotate(count=Count('id')).order_by():
+            attendus[(PROJETS_TOTAL, '', 0)] += ligne['count']
+            attendus[(PROJETS_STATUT, ligne['statut'] or '', 0)] += ligne['count']
+        for ligne in Projet_.objects.values('proprietaire_id').annotate(count=Count('id')).order_by():
+            attendus[(PROJETS_PROPRIETAIRE, str(ligne['proprietaire_id'] or ''), 0)] += ligne['count']
+
+        attendus[(TACHES_TOTAL, '', 0)] += 0
+        for ligne in Tache_.objects.values('projet_id', 'statut', 'priorite').annotate(count=Count('id')).order_by():
+            for scope in (0, ligne['projet_id']):
+                attendus[(TACHES_TOTAL, '', scope)] += ligne['count']
+                attendus[(TACHES_STATUT, ligne['statut'] or '', scope)] += ligne['count']
+                attendus[(TACHES_PRIORITE, ligne['priorite'] or '', scope)] += ligne['count']
+
+        attendus[(DOCUMENTS_TOTAL, '', 0)] += 0
+        for ligne in DocumentProjet_.objects.values('type_document').annotate(count=Count('id')).order_by():
+            attendus[(DOCUMENTS_TOTAL, '', 0)] += ligne['count']
+            attendus[(DOCUMENTS_TYPE, ligne['type_document'] or '', 0)] += ligne['count']
+
+        attendus[(COMMENTAIRES_TOTAL, '', 0)] = CommentaireDocumentProjet_.objects.count()
+
+        return dict(attendus)
+
+    @classmethod
+    def reconcile(cls, apply: bool = True) -> List[Dict]:
+        """
+        Compare les compteurs stockés aux valeurs recalculées et retourne les écarts.
+        Si apply=True, les compteurs sont entièrement reconstruits.
+        """
+        with transaction.atomic():
+            attendus = cls.compute_expected()
+            stockes = {
+                (c.counter, c.value, c.scope): c.count
+                for c in AnalyticsCounter.objects.exclude(counter=SENTINELLE)
+            }
+
+            ecarts = []
+            for cle in sorted(set(attendus) | set(stockes), key=lambda cle: (cle[0], cle[2], cle[1])):
+                attendu = attendus.get(cle, 0)
+                stocke = stockes.get(cle, 0)
+                if attendu != stocke:
+                    counter, value, scope = cle
+                    ecarts.append({
+                        'counter': counter,
+                        'value': value,
+                        'scope': scope,
+                        'stocke': stocke,
+                        'attendu': attendu,
+                    })
+
+            if apply:
+                maintenant = timezone.now()
+                AnalyticsCounter.objects.all().delete()
+                AnalyticsCounter.objects.bulk_create([
+                    AnalyticsCounter(counter=counter, value=value, scope=scope, count=count, updated_at=maintenant)
+                    for (counter, value, scope), count in attendus.items()
+                    if count or value == ''
+                ] + [AnalyticsCounter(counter=SENTINELLE, updated_at=maintenant)])
+
+        if ecarts:
+            logger.warning(f"Réconciliation des compteurs d'analytiques: {len(ecarts)} écart(s) détecté(s)")
+        return ecarts
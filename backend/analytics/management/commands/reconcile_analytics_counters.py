@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from analytics.counters import AnalyticsCounterService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Reconstruit les compteurs incrémentaux des analytiques depuis les tables sources et signale les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les écarts sans reconstruire les compteurs.'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        try:
+            ecarts = AnalyticsCounterService.reconcile(apply=not dry_run)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Erreur lors de la réconciliation des compteurs: {str(e)}'))
+            logger.error(f"Erreur lors de la réconciliation des compteurs: {e}", exc_info=True)
+            return
+
+        for ecart in ecarts:
+            scope = f"projet {ecart['scope']}" if ecart['scope'] else "global"
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ⚠️  {ecart['counter']}[{ecart['value']}] ({scope}): "
+                    f"stocké={ecart['stocke']} attendu={ecart['attendu']}"
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n📊 Résumé:'))
+        self.stdout.write(f'   - Écarts détectés: {len(ecarts)}')
+        if dry_run:
+            self.stdout.write(self.style.WARNING('   - Mode simulation: aucun compteur modifié'))
+        else:
+            self.stdout.write('   - Compteurs reconstruits depuis les tables sources')
@@ -0,0 +1,72 @@
+from django.core.management.base import BaseCommand
+from analytics.snapshots import MetricSnapshotService, ALL_SECTIONS, PROJECT_SECTIONS
+from projects.models import Projet
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Rafraîchit les snapshots matérialisés des métriques (seules les sections dont les sources ont changé sont recalculées)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--period-days',
+            type=int,
+            nargs='+',
+            default=[30],
+            help='Périodes (en jours) à rafraîchir. Par défaut: 30.'
+        )
+        parser.add_argument(
+            '--projects',
+            action='store_true',
+            help='Rafraîchir aussi les snapshots par projet (projets non terminés).'
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Recalculer toutes les sections même si leurs sources sont inchangées.'
+        )
+
+    def handle(self, *args, **options):
+        service = MetricSnapshotService()
+        stats = {'recalculee': 0, 'inchangee': 0}
+
+        project_ids = [None]
+        if options['projects']:
+            project_ids += list(
+                Projet.objects.exclude(statut='termine').values_list('id', flat=True)
+            )
+
+        for period_days in options['period_days']:
+            for project_id in project_ids:
+                sections = PROJECT_SECTIONS if project_id else ALL_SECTIONS
+                try:
+                    resultats = service.refresh(
+                        period_days,
+                        project_id=project_id,
+                        sections=sections,
+                        force=options['force']
+                    )
+                except Exception as e:
+                    self.stdout.write(
+                        self.style.ERROR(f'  ❌ Erreur pour la période {period_days}j (projet={project_id}): {str(e)}')
+                    )
+                    logger.error(f"Erreur lors du rafraîchissement des snapshots ({period_days}j, projet={project_id}): {e}", exc_info=True)
+                    continue
+
+                for resultat in resultats.values():
+                    stats[resultat] += 1
+
+                if project_id is None:
+                    recalculees = [section for section, resultat in resultats.items() if resultat == 'recalculee']
+                    self.stdout.write(
+                        self.style.SUCCESS(
+                            f'  ✅ {period_days}j global: {len(recalculees)} section(s) recalculée(s) '
+                            f'{", ".join(recalculees) if recalculees else ""}'
+                        )
+                    )
+
+        self.stdout.write(self.style.SUCCESS('\n📊 Résumé:'))
+        self.stdout.write(f'   - Sections recalculées: {stats["recalculee"]}')
+        self.stdout.write(f'   - Sections inchangées: {stats["inchangee"]}')
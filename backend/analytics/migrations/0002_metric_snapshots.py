@@ -0,0 +1,47 @@
+# Generated by Django 5.2.5 on 2026-10-17 16:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0001_initial'),
+        ('projects', '0014_add_en_cours_status_to_projet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MetricSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('section', models.CharField(choices=[('projects', 'Projets'), ('users', 'Utilisateurs'), ('documents', 'Documents'), ('tasks', 'Tâches'), ('performance', 'Performance'), ('system', 'Système'), ('delays', 'Retards et alertes'), ('teams', 'Équipes')], max_length=20, verbose_name='Section')),
+                ('period_days', models.PositiveIntegerField(verbose_name='Période (jours)')),
+                ('fingerprint', models.CharField(max_length=64, verbose_name='Empreinte des sources')),
+                ('computed_at', models.DateTimeField(verbose_name='Calculé le')),
+                ('checked_at', models.DateTimeField(verbose_name='Vérifié le')),
+                ('duration_ms', models.FloatField(default=0.0, verbose_name='Durée du calcul (ms)')),
+                ('projet', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='metric_snapshots', to='projects.projet', verbose_name='Projet')),
+            ],
+            options={
+                'verbose_name': 'Snapshot de métriques',
+                'verbose_name_plural': 'Snapshots de métriques',
+                'db_table': 'analytics_metric_snapshots',
+                'ordering': ['section'],
+            },
+        ),
+        migrations.AddField(
+            model_name='metric',
+            name='snapshot',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='metrics', to='analytics.metricsnapshot', verbose_name='Snapshot'),
+        ),
+        migrations.AddIndex(
+            model_name='metricsnapshot',
+            index=models.Index(fields=['period_days', 'projet'], name='analytics_m_period__57ef5e_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='metricsnapshot',
+            unique_together={('section', 'period_days', 'projet')},
+        ),
+    ]
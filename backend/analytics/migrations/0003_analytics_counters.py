@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0002_metric_snapshots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalyticsCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('counter', models.CharField(max_length=50, verbose_name='Compteur')),
+                ('value', models.CharField(blank=True, default='', max_length=100, verbose_name='Valeur')),
+                ('scope', models.BigIntegerField(default=0, verbose_name='Portée (projet)')),
+                ('count', models.IntegerField(default=0, verbose_name='Nombre')),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Mis à jour le')),
+            ],
+            options={
+                'verbose_name': "Compteur d'analytiques",
+                'verbose_name_plural': "Compteurs d'analytiques",
+                'db_table': 'analytics_counters',
+                'ordering': ['counter', 'scope', 'value'],
+                'indexes': [models.Index(fields=['counter', 'scope'], name='analytics_c_counter_5c0ef0_idx')],
+                'unique_together': {('counter', 'value', 'scope')},
+            },
+        ),
+    ]
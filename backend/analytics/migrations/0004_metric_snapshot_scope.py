@@ -0,0 +1,56 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:12
+
+from django.db import migrations, models
+
+
+def remplir_scope(apps, schema_editor):
+    """Portée des snapshots existants ; les doublons globaux (projet NULL) sont supprimés"""
+    MetricSnapshot = apps.get_model('analytics', 'MetricSnapshot')
+    Metric = apps.get_model('analytics', 'Metric')
+
+    MetricSnapshot.objects.filter(projet__isnull=False).update(scope=models.F('projet_id'))
+
+    conserves = set()
+    doublons = []
+    for snapshot in MetricSnapshot.objects.order_by('-computed_at', '-id'):
+        cle = (snapshot.section, snapshot.period_days, snapshot.scope)
+        if cle in conserves:
+            doublons.append(snapshot.id)
+        else:
+            conserves.add(cle)
+    if doublons:
+        # Les métriques des doublons rejoignent l'historique (snapshot=None)
+        Metric.objects.filter(snapshot_id__in=doublons).update(snapshot=None)
+        MetricSnapshot.objects.filter(id__in=doublons).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0003_analytics_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='metricsnapshot',
+            name='scope',
+            field=models.BigIntegerField(default=0, verbose_name='Portée (projet)'),
+        ),
+        migrations.RunPython(remplir_scope, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='metricsnapshot',
+            unique_together=set(),
+        ),
+        migrations.RemoveIndex(
+            model_name='metricsnapshot',
+            name='analytics_m_period__57ef5e_idx',
+        ),
+        migrations.AddIndex(
+            model_name='metricsnapshot',
+            index=models.Index(fields=['period_days', 'scope'], name='analytics_m_period__f21509_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='metricsnapshot',
+            constraint=models.UniqueConstraint(fields=('section', 'period_days', 'scope'), name='analytics_snapshot_unique_scope'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:40
+
+from django.db import migrations
+from django.utils import timezone
+
+
+def construire_compteurs(apps, schema_editor):
+    """
+    Construction initiale des compteurs depuis les tables sources (avant la mise en
+    service) : les requêtes ne reconstruisent jamais les compteurs elles-mêmes
+    """
+    from analytics.counters import AnalyticsCounterService, SENTINELLE
+
+    AnalyticsCounter = apps.get_model('analytics', 'AnalyticsCounter')
+    if AnalyticsCounter.objects.filter(counter=SENTINELLE).exists():
+        return
+
+    attendus = AnalyticsCounterService.compute_expected({
+        'Projet': apps.get_model('projects', 'Projet'),
+        'Tache': apps.get_model('projects', 'Tache'),
+        'DocumentProjet': apps.get_model('documents', 'DocumentProjet'),
+        'CommentaireDocumentProjet': apps.get_model('documents', 'CommentaireDocumentProjet'),
+    })
+    maintenant = timezone.now()
+    AnalyticsCounter.objects.all().delete()
+    AnalyticsCounter.objects.bulk_create([
+        AnalyticsCounter(counter=counter, value=value, scope=scope, count=count, updated_at=maintenant)
+        for (counter, value, scope), count in attendus.items()
+        if count or value == ''
+    ] + [AnalyticsCounter(counter=SENTINELLE, updated_at=maintenant)])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analytics', '0004_metric_snapshot_scope'),
+        ('projects', '0017_email_digest_entries'),
+        ('documents', '0008_remove_etape_model'),
+    ]
+
+    operations = [
+        migrations.RunPython(construire_compteurs, migrations.RunPython.noop),
+    ]
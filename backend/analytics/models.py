@@ -26,6 +26,95 @@ class MetricCategory(models.TextChoices):
     SYSTEM = 'system', 'Système'
 
 
+class SnapshotSection(models.TextChoices):
+    """Sections de calcul matérialisées dans les snapshots de métriques"""
+    PROJECTS = 'projects', 'Projets'
+    USERS = 'users', 'Utilisateurs'
+    DOCUMENTS = 'documents', 'Documents'
+    TASKS = 'tasks', 'Tâches'
+    PERFORMANCE = 'performance', 'Performance'
+    SYSTEM = 'system', 'Système'
+    DELAYS = 'delays', 'Retards et alertes'
+    TEAMS = 'teams', 'Équipes'
+
+
+class MetricSnapshot(models.Model):
+    """
+    Snapshot matérialisé d'une section de métriques pour une période et un projet.
+    Les métriques associées sont stockées dans la table Metric (champ snapshot).
+    """
+    
+    section = models.CharField(
+        max_length=20,
+        choices=SnapshotSection.choices,
+        verbose_name="Section"
+    )
+    period_days = models.PositiveIntegerField(verbose_name="Période (jours)")
+    projet = models.ForeignKey(
+        'projects.Projet',
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='metric_snapshots',
+        verbose_name="Projet"
+    )
+    # 0 = snapshot global, sinon identifiant du projet (non nul : couvert par la contrainte d'unicité)
+    scope = models.BigIntegerField(default=0, verbose_name="Portée (projet)")
+    
+    # Empreinte des tables sources au moment du calcul
+    fingerprint = models.CharField(max_length=64, verbose_name="Empreinte des sources")
+    computed_at = models.DateTimeField(verbose_name="Calculé le")
+    checked_at = models.DateTimeField(verbose_name="Vérifié le")
+    duration_ms = models.FloatField(default=0.0, verbose_name="Durée du calcul (ms)")
+    
+    class Meta:
+        db_table = "analytics_metric_snapshots"
+        verbose_name = "Snapshot de métriques"
+        verbose_name_plural = "Snapshots de métriques"
+        ordering = ['section']
+        constraints = [
+            models.UniqueConstraint(
+                fields=['section', 'period_days', 'scope'],
+                name='analytics_snapshot_unique_scope'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['period_days', 'scope']),
+        ]
+    
+    def __str__(self):
+        scope = f"projet {self.projet_id}" if self.projet_id else "global"
+        return f"{self.get_section_display()} - {self.period_days}j ({scope})"
+
+
+class AnalyticsCounter(models.Model):
+    """
+    Compteur incrémental maintenu par les signaux (statuts, priorités, types...).
+    Permet de lire les KPI de comptage sans requête GROUP BY sur les tables sources.
+    """
+
+    counter = models.CharField(max_length=50, verbose_name="Compteur")
+    value = models.CharField(max_length=100, blank=True, default='', verbose_name="Valeur")
+    # 0 = compteur global, sinon identifiant du projet
+    scope = models.BigIntegerField(default=0, verbose_name="Portée (projet)")
+    count = models.IntegerField(default=0, verbose_name="Nombre")
+    updated_at = models.DateTimeField(default=timezone.now, verbose_name="Mis à jour le")
+
+    class Meta:
+        db_table = "analytics_counters"
+        verbose_name = "Compteur d'analytiques"
+        verbose_name_plural = "Compteurs d'analytiques"
+        ordering = ['counter', 'scope', 'value']
+        unique_together = ['counter', 'value', 'scope']
+        indexes = [
+            models.Index(fields=['counter', 'scope']),
+        ]
+
+    def __str__(self):
+        scope = f"projet {self.scope}" if self.scope else "global"
+        return f"{self.counter}[{self.value}] = {self.count} ({scope})"
+
+
 class Metric(models.Model):
     """Modèle pour stocker les métriques calculées"""
     
@@ -54,6 +143,16 @@ class Metric(models.Model):
     # Données additionnelles (JSON)
     metadata = models.JSONField(default=dict, blank=True, verbose_name="Métadonnées")
     
+    # Snapshot courant auquel appartient la métrique (None = historique)
+    snapshot = models.ForeignKey(
+        MetricSnapshot,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='metrics',
+        verbose_name="Snapshot"
+    )
+    
     class Meta:
         db_table = "analytics_metrics"
         verbose_name = "Métrique"
@@ -9,9 +9,11 @@ from typing import Dict, List, Any, Optional
 import logging
 
 from .models import Metric, MetricCategory, MetricType, SystemHealth
+from . import counters
+from .counters import AnalyticsCounterService
 from projects.models import Projet, Tache, PhaseProjet, ProjetPhaseEtat
 from accounts.models import User, Service, Role
-from documents.models import DocumentProjet, HistoriqueDocumentProjet, CommentaireDocumentProjet
+from documents.models import DocumentProjet, HistoriqueDocumentProjet
 from notifications.models import Notification
 
 logger = logging.getLogger(__name__)
@@ -65,8 +67,14 @@ class AnalyticsService:
         if project_id:
             projects_queryset = projects_queryset.filter(id=project_id)
         
+        # Compteurs incrémentaux (vue globale uniquement)
+        compteurs = None if project_id else AnalyticsCounterService.get_counters()
+        
         # Nombre total de projets
-        total_projects = projects_queryset.count()
+        if compteurs is not None:
+            total_projects = AnalyticsCounterService.total(compteurs, counters.PROJETS_TOTAL)
+        else:
+            total_projects = projects_queryset.count()
         metrics.append(Metric(
             name="Total des projets",
             description="Nombre total de projets dans le système" + (f" (projet {project_id})" if project_id else ""),
@@ -97,7 +105,13 @@ class AnalyticsService:
         ))
         
         # Projets par statut
-        project_status = projects_queryset.values('statut').annotate(count=Count('id'))
+        if compteurs is not None:
+            project_status = [
+                {'statut': statut, 'count': count}
+                for statut, count in AnalyticsCounterService.repartition(compteurs, counters.PROJETS_STATUT)
+            ]
+        else:
+            project_status = projects_queryset.values('statut').annotate(count=Count('id'))
         for status in project_status:
             metrics.append(Metric(
                 name=f"Projets {status['statut']}",
@@ -112,7 +126,17 @@ class AnalyticsService:
             ))
         
         # Projets par propriétaire
-        projects_by_owner = projects_queryset.values('proprietaire__username').annotate(count=Count('id'))
+        if compteurs is not None:
+            owners = AnalyticsCounterService.repartition(compteurs, counters.PROJETS_PROPRIETAIRE)
+            usernames = dict(User.objects.filter(
+                id__in=[owner_id for owner_id, count in owners if owner_id]
+            ).values_list('id', 'username'))
+            projects_by_owner = [
+                {'proprietaire__username': usernames.get(int(owner_id)) if owner_id else None, 'count': count}
+                for owner_id, count in owners
+            ]
+        else:
+            projects_by_owner = projects_queryset.values('proprietaire__username').annotate(count=Count('id'))
         for owner in projects_by_owner:
             if owner['proprietaire__username']:
                 metrics.append(Metric(
@@ -236,8 +260,10 @@ class AnalyticsService:
         """Calcule les métriques liées aux documents"""
         metrics = []
         
+        compteurs = AnalyticsCounterService.get_counters()
+        
         # Nombre total de documents
-        total_documents = DocumentProjet.objects.count()
+        total_documents = AnalyticsCounterService.total(compteurs, counters.DOCUMENTS_TOTAL)
         metrics.append(Metric(
             name="Total des documents",
             description="Nombre total de documents dans le système",
@@ -266,7 +292,10 @@ class AnalyticsService:
         ))
         
         # Documents par type
-        documents_by_type = DocumentProjet.objects.values('type_document').annotate(count=Count('id'))
+        documents_by_type = [
+            {'type_document': type_document, 'count': count}
+            for type_document, count in AnalyticsCounterService.repartition(compteurs, counters.DOCUMENTS_TYPE)
+        ]
         for doc_type in documents_by_type:
             if doc_type['type_document']:
                 metrics.append(Metric(
@@ -282,7 +311,7 @@ class AnalyticsService:
                 ))
         
         # Commentaires sur documents
-        total_comments = CommentaireDocumentProjet.objects.count()
+        total_comments = AnalyticsCounterService.total(compteurs, counters.COMMENTAIRES_TOTAL)
         metrics.append(Metric(
             name="Commentaires sur documents",
             description="Nombre total de commentaires sur les documents",
@@ -305,8 +334,11 @@ class AnalyticsService:
         if project_id:
             tasks_queryset = tasks_queryset.filter(projet_id=project_id)
         
+        # Compteurs incrémentaux (globaux ou du projet)
+        compteurs = AnalyticsCounterService.get_counters(scope=project_id or 0)
+        
         # Nombre total de tâches
-        total_tasks = tasks_queryset.count()
+        total_tasks = AnalyticsCounterService.total(compteurs, counters.TACHES_TOTAL)
         metrics.append(Metric(
             name="Total des tâches",
             description="Nombre total de tâches dans le système" + (f" (projet {project_id})" if project_id else ""),
@@ -337,7 +369,10 @@ class AnalyticsService:
         ))
         
         # Tâches par statut
-        task_status = tasks_queryset.values('statut').annotate(count=Count('id'))
+        task_status = [
+            {'statut': statut, 'count': count}
+            for statut, count in AnalyticsCounterService.repartition(compteurs, counters.TACHES_STATUT)
+        ]
         for status in task_status:
             metrics.append(Metric(
                 name=f"Tâches {status['statut']}",
@@ -352,7 +387,10 @@ class AnalyticsService:
             ))
         
         # Tâches par priorité
-        task_priority = tasks_queryset.values('priorite').annotate(count=Count('id'))
+        task_priority = [
+            {'priorite': priorite, 'count': count}
+            for priorite, count in AnalyticsCounterService.repartition(compteurs, counters.TACHES_PRIORITE)
+        ]
         for priority in task_priority:
             if priority['priorite']:
                 metrics.append(Metric(
@@ -373,9 +411,11 @@ class AnalyticsService:
         """Calcule les métriques de performance"""
         metrics = []
         
+        compteurs = AnalyticsCounterService.get_counters()
+        
         # Taux de completion des projets
-        total_projects = Projet.objects.count()
-        completed_projects = Projet.objects.filter(statut='termine').count()
+        total_projects = AnalyticsCounterService.total(compteurs, counters.PROJETS_TOTAL)
+        completed_projects = compteurs.get(counters.PROJETS_STATUT, {}).get('termine', 0)
         
         if total_projects > 0:
             completion_rate = (completed_projects / total_projects) * 100
@@ -391,8 +431,8 @@ class AnalyticsService:
             ))
         
         # Taux de completion des tâches
-        total_tasks = Tache.objects.count()
-        completed_tasks = Tache.objects.filter(statut='termine').count()
+        total_tasks = AnalyticsCounterService.total(compteurs, counters.TACHES_TOTAL)
+        completed_tasks = compteurs.get(counters.TACHES_STATUT, {}).get('termine', 0)
         
         if total_tasks > 0:
             task_completion_rate = (completed_tasks / total_tasks) * 100
@@ -470,7 +510,7 @@ class AnalyticsService:
     def get_project_dashboard_data(self, project_id: int) -> Dict[str, Any]:
         """Récupère toutes les données détaillées pour un projet spécifique"""
         try:
-            project = Projet.objects.get(id=project_id)
+            project = Projet.objects.select_related('proprietaire').get(id=project_id)
         except Projet.DoesNotExist:
             logger.warning(f'Projet avec ID {project_id} non trouvé')
             return {}
@@ -498,32 +538,37 @@ class AnalyticsService:
             'objectif': project.objectif,
         }
         
+        # Phases du projet avec le décompte des tâches par statut (une seule requête ;
+        # noms distincts des compteurs stockés taches_total / taches_terminees / taches_en_attente)
+        phases_etat = list(
+            project.phases_etat.select_related('phase').annotate(
+                nb_taches=Count('taches'),
+                nb_taches_terminees=Count('taches', filter=Q(taches__statut='termine')),
+                nb_taches_en_cours=Count('taches', filter=Q(taches__statut='en_cours')),
+                nb_taches_en_attente=Count('taches', filter=Q(taches__statut='en_attente')),
+            )
+        )
+        
         # Progression globale du projet (par phases)
-        phases_etat = project.phases_etat.all()
-        total_phases = phases_etat.count()
-        phases_terminees = phases_etat.filter(terminee=True).count()
-        phases_en_cours = phases_etat.filter(
-            date_debut__isnull=False,
-            terminee=False,
-            ignoree=False
-        ).count()
-        phases_en_attente = phases_etat.filter(
-            date_debut__isnull=True,
-            terminee=False,
-            ignoree=False
-        ).count()
+        total_phases = len(phases_etat)
+        phases_terminees = sum(1 for phase_etat in phases_etat if phase_etat.terminee)
+        phases_en_cours = sum(
+            1 for phase_etat in phases_etat
+            if phase_etat.date_debut and not phase_etat.terminee and not phase_etat.ignoree
+        )
+        phases_en_attente = sum(
+            1 for phase_etat in phases_etat
+            if not phase_etat.date_debut and not phase_etat.terminee and not phase_etat.ignoree
+        )
         
         progression_globale = (phases_terminees / total_phases * 100) if total_phases > 0 else 0
         
-        # Détails des phases
+        # Détails des phases et statistiques des tâches par phase
         phases_detail = []
+        taches_par_phase = {}
         for phase_etat in phases_etat:
-            # Compter les tâches de cette phase
-            taches = phase_etat.taches.all()
-            total_taches = taches.count()
-            taches_terminees = taches.filter(statut='termine').count()
-            taches_en_cours = taches.filter(statut='en_cours').count()
-            taches_en_attente = taches.filter(statut='en_attente').count()
+            total_taches = phase_etat.nb_taches
+            taches_terminees = phase_etat.nb_taches_terminees
             
             progression_phase = (taches_terminees / total_taches * 100) if total_taches > 0 else 0
             
@@ -539,44 +584,47 @@ class AnalyticsService:
                 'progression': round(progression_phase, 1),
                 'total_taches': total_taches,
                 'taches_terminees': taches_terminees,
-                'taches_en_cours': taches_en_cours,
-                'taches_en_attente': taches_en_attente,
+                'taches_en_cours': phase_etat.nb_taches_en_cours,
+                'taches_en_attente': phase_etat.nb_taches_en_attente,
             })
+            
+            taches_par_phase[phase_etat.id] = {
+                'phase_nom': phase_etat.phase.nom if phase_etat.phase else None,
+                'total': total_taches,
+                'terminees': taches_terminees,
+                'en_cours': phase_etat.nb_taches_en_cours,
+            }
         
-        # Tâches du projet
-        taches = project.taches.all().prefetch_related('assigne_a')
-        taches_par_statut = taches.values('statut').annotate(count=Count('id'))
-        taches_par_priorite = taches.values('priorite').annotate(count=Count('id'))
+        # Tâches du projet : une requête + un prefetch des assignés,
+        # toutes les répartitions sont ensuite calculées en mémoire
+        taches = list(
+            project.taches.select_related('tache_dependante').prefetch_related('assigne_a').order_by('id')
+        )
         
-        taches_statut_data = {item['statut']: item['count'] for item in taches_par_statut}
-        taches_priorite_data = {item['priorite']: item['count'] for item in taches_par_priorite}
+        taches_statut_data = {}
+        taches_priorite_data = {}
+        taches_par_membre = {}
+        responsables = {}
+        for tache in taches:
+            taches_statut_data[tache.statut] = taches_statut_data.get(tache.statut, 0) + 1
+            taches_priorite_data[tache.priorite] = taches_priorite_data.get(tache.priorite, 0) + 1
+            
+            # Premier assigné (par id) comme responsable principal pour la compatibilité
+            assignes = sorted(tache.assigne_a.all(), key=lambda utilisateur: utilisateur.id)
+            responsables[tache.id] = self._serialize_responsable(assignes[0]) if assignes else None
+            for utilisateur in assignes:
+                taches_par_membre.setdefault(utilisateur.id, []).append(tache)
+        
+        # Informations du projet
+        projet_info = {
+            'id': project.id,
+            'code': project.code,
+            'nom': project.nom,
+        }
         
         # Liste complète des tâches avec détails
         taches_list = []
         for tache in taches:
-            # Récupérer les responsables de la tâche (assigne_a est maintenant ManyToMany)
-            # Prendre le premier assigné comme responsable principal pour la compatibilité
-            responsable_info = None
-            assignes = tache.assigne_a.all()
-            if assignes.exists():
-                premier_assigne = assignes.first()
-                responsable_info = {
-                    'id': premier_assigne.id,
-                    'nom_complet': f"{premier_assigne.prenom} {premier_assigne.nom}",
-                    'prenom': premier_assigne.prenom,
-                    'nom': premier_assigne.nom,
-                    'username': premier_assigne.username,
-                    'email': premier_assigne.email,
-                    'photo_url': premier_assigne.photo_url,
-                }
-            
-            # Informations du projet
-            projet_info = {
-                'id': project.id,
-                'code': project.code,
-                'nom': project.nom,
-            }
-            
             # Informations de la tâche dépendante si elle existe
             tache_dependante_info = None
             if tache.tache_dependante:
@@ -598,76 +646,48 @@ class AnalyticsService:
                 'nbr_jour_estimation': tache.nbr_jour_estimation,
                 'progression': tache.progression,
                 'description': tache.description,
-                'responsable': responsable_info,
+                'responsable': responsables[tache.id],
                 'projet': projet_info,
                 'tache_dependante': tache_dependante_info,
                 'cree_le': tache.cree_le.isoformat() if tache.cree_le else None,
                 'mise_a_jour_le': tache.mise_a_jour_le.isoformat() if tache.mise_a_jour_le else None,
             })
         
-        # Membres de l'équipe
-        membres = project.membres.all().select_related('utilisateur', 'service')
-        membres_par_service = membres.values('service__nom', 'service__id').annotate(
-            count=Count('id')
-        )
+        # Membres de l'équipe (une requête), regroupés par service en mémoire
+        membres = list(project.membres.select_related('utilisateur', 'service').order_by('id'))
         
-        equipe_data = []
+        equipe_par_service = {}
         membres_details = []
         
-        for service in membres_par_service:
-            if service['service__nom']:
-                # Récupérer les membres de ce service pour ce projet
-                membres_du_service = membres.filter(service_id=service['service__id'])
-                membres_list = []
-                
-                for membre in membres_du_service:
-                    membres_list.append({
-                        'id': membre.utilisateur.id,
-                        'nom_complet': f"{membre.utilisateur.prenom} {membre.utilisateur.nom}",
-                        'prenom': membre.utilisateur.prenom,
-                        'nom': membre.utilisateur.nom,
-                        'username': membre.utilisateur.username,
-                        'email': membre.utilisateur.email,
-                        'role_projet': membre.role_projet,
-                        'photo_url': membre.utilisateur.photo_url,
-                    })
-                
-                equipe_data.append({
-                    'service': service['service__nom'],
-                    'service_id': service['service__id'],
-                    'count': service['count'],
-                    'membres': membres_list  # Ajout de la liste des membres
-                })
-        
-        # Liste complète de tous les membres (pour affichage détaillé)
         for membre in membres:
-            # Récupérer les tâches assignées à ce membre pour ce projet
-            taches_membre = Tache.objects.filter(
-                projet=project,
-                assigne_a=membre.utilisateur
-            ).prefetch_related('assigne_a')
+            utilisateur = membre.utilisateur
+            membre_info = {
+                'id': utilisateur.id,
+                'nom_complet': f"{utilisateur.prenom} {utilisateur.nom}",
+                'prenom': utilisateur.prenom,
+                'nom': utilisateur.nom,
+                'username': utilisateur.username,
+                'email': utilisateur.email,
+                'role_projet': membre.role_projet,
+                'photo_url': utilisateur.photo_url,
+            }
             
-            taches_par_statut_membre = taches_membre.values('statut').annotate(count=Count('id'))
-            taches_statut_membre = {item['statut']: item['count'] for item in taches_par_statut_membre}
+            if membre.service and membre.service.nom:
+                service_data = equipe_par_service.setdefault(membre.service.id, {
+                    'service': membre.service.nom,
+                    'service_id': membre.service.id,
+                    'count': 0,
+                    'membres': [],
+                })
+                service_data['count'] += 1
+                service_data['membres'].append(membre_info)
             
+            # Tâches assignées à ce membre pour ce projet
+            taches_membre = taches_par_membre.get(utilisateur.id, [])
+            taches_statut_membre = {}
             taches_list_membre = []
             for tache in taches_membre:
-                # Récupérer les responsables de la tâche (assigne_a est maintenant ManyToMany)
-                # Prendre le premier assigné comme responsable principal pour la compatibilité
-                responsable_info = None
-                assignes = tache.assigne_a.all()
-                if assignes.exists():
-                    premier_assigne = assignes.first()
-                    responsable_info = {
-                        'id': premier_assigne.id,
-                        'nom_complet': f"{premier_assigne.prenom} {premier_assigne.nom}",
-                        'prenom': premier_assigne.prenom,
-                        'nom': premier_assigne.nom,
-                        'username': premier_assigne.username,
-                        'email': premier_assigne.email,
-                        'photo_url': premier_assigne.photo_url,
-                    }
-                
+                taches_statut_membre[tache.statut] = taches_statut_membre.get(tache.statut, 0) + 1
                 taches_list_membre.append({
                     'id': tache.id,
                     'titre': tache.titre,
@@ -678,37 +698,21 @@ class AnalyticsService:
                     'phase': tache.phase,
                     'debut': tache.debut.isoformat() if tache.debut else None,
                     'fin': tache.fin.isoformat() if tache.fin else None,
-                    'responsable': responsable_info,  # Ajout du responsable
+                    'responsable': responsables[tache.id],
                 })
             
             membres_details.append({
-                'id': membre.utilisateur.id,
-                'nom_complet': f"{membre.utilisateur.prenom} {membre.utilisateur.nom}",
-                'prenom': membre.utilisateur.prenom,
-                'nom': membre.utilisateur.nom,
-                'username': membre.utilisateur.username,
-                'email': membre.utilisateur.email,
-                'role_projet': membre.role_projet,
+                **membre_info,
                 'service': membre.service.nom if membre.service else None,
                 'service_id': membre.service.id if membre.service else None,
-                'photo_url': membre.utilisateur.photo_url,
                 'taches': {
-                    'total': taches_membre.count(),
+                    'total': len(taches_membre),
                     'par_statut': taches_statut_membre,
                     'liste': taches_list_membre,
                 },
             })
         
-        # Statistiques des tâches par phase (remplace les étapes)
-        taches_par_phase = {}
-        for phase_etat in phases_etat:
-            taches_phase = Tache.objects.filter(phase_etat=phase_etat)
-            taches_par_phase[phase_etat.id] = {
-                'phase_nom': phase_etat.phase.nom if phase_etat.phase else None,
-                'total': taches_phase.count(),
-                'terminees': taches_phase.filter(statut='termine').count(),
-                'en_cours': taches_phase.filter(statut='en_cours').count(),
-            }
+        equipe_data = list(equipe_par_service.values())
         
         return {
             'project': project_info,
@@ -721,7 +725,7 @@ class AnalyticsService:
             },
             'phases': phases_detail,
             'taches': {
-                'total': taches.count(),
+                'total': len(taches),
                 'terminees': taches_statut_data.get('termine', 0),
                 'en_cours': taches_statut_data.get('en_cours', 0),
                 'en_attente': taches_statut_data.get('en_attente', 0),
@@ -732,39 +736,39 @@ class AnalyticsService:
                 'liste': taches_list,  # Liste complète des tâches
             },
             'equipe': {
-                'total_membres': membres.count(),
+                'total_membres': len(membres),
                 'par_service': equipe_data,
                 'membres': membres_details if membres_details else [],  # Liste complète de tous les membres avec leurs détails
             },
             'taches_par_phase': taches_par_phase
         }
     
+    @staticmethod
+    def _serialize_responsable(utilisateur) -> Dict[str, Any]:
+        """Informations d'un responsable de tâche pour le tableau de bord projet"""
+        return {
+            'id': utilisateur.id,
+            'nom_complet': f"{utilisateur.prenom} {utilisateur.nom}",
+            'prenom': utilisateur.prenom,
+            'nom': utilisateur.nom,
+            'username': utilisateur.username,
+            'email': utilisateur.email,
+            'photo_url': utilisateur.photo_url,
+        }
+    
     def get_dashboard_data(self, period_days: int = 30, project_id: Optional[int] = None) -> Dict[str, Any]:
         """Récupère les données pour le tableau de bord - Version ultra-rapide"""
         period_start = self.now - timedelta(days=period_days)
         period_end = self.now
         
-        # Si un project_id est fourni, calculer directement les métriques pour ce projet
-        if project_id:
-            metrics = self._calculate_essential_metrics(period_days, project_id)
-        else:
-            # Vérifier si des métriques récentes existent (moins de 10 minutes)
-            recent_metrics = Metric.objects.filter(
-                period_start__gte=period_start,
-                period_end__lte=period_end,
-                calculated_at__gte=self.now - timedelta(minutes=10)
-            ).order_by('-calculated_at')
-            
-            if recent_metrics.exists():
-                # Utiliser les métriques existantes (ultra-rapide)
-                metrics = recent_metrics
-            else:
-                # Calculer seulement les métriques essentielles (plus rapide)
-                metrics = self._calculate_essential_metrics(period_days)
-                
-                # Sauvegarder les métriques
-                for metric in metrics:
-                    metric.save()
+        # Servir les métriques essentielles depuis les snapshots matérialisés
+        # (recalculés uniquement si les tables sources ont changé)
+        from .snapshots import MetricSnapshotService, ESSENTIAL_SECTIONS
+        metrics = MetricSnapshotService().get_metrics(
+            period_days,
+            project_id=project_id,
+            sections=ESSENTIAL_SECTIONS
+        )
         
         # Organiser les données par catégorie
         dashboard_data = {
@@ -793,31 +797,6 @@ class AnalyticsService:
         
         return dashboard_data
     
-    def _calculate_essential_metrics(self, period_days: int = 30, project_id: Optional[int] = None) -> List[Metric]:
-        """Calcule seulement les métriques essentielles pour le tableau de bord"""
-        period_start = self.now - timedelta(days=period_days)
-        period_end = self.now
-        
-        metrics = []
-        
-        # Métriques des projets (essentielles) - filtrées par projet si spécifié
-        metrics.extend(self._calculate_project_metrics(period_start, period_end, project_id))
-        
-        # Métriques des utilisateurs (essentielles) - pas de filtre projet
-        if not project_id:
-            metrics.extend(self._calculate_user_metrics(period_start, period_end))
-        
-        # Métriques des tâches (essentielles) - filtrées par projet si spécifié
-        metrics.extend(self._calculate_task_metrics(period_start, period_end, project_id))
-        
-        # Métriques des équipes (essentielles) - filtrées par projet si spécifié
-        if project_id:
-            metrics.extend(self._calculate_team_metrics_for_project(period_start, period_end, project_id))
-        else:
-            metrics.extend(self._calculate_team_metrics(period_start, period_end))
-        
-        return metrics
-    
     def get_trend_data(self, metric_name: str, period_days: int = 30, group_by: str = 'day') -> List[Dict[str, Any]]:
         """Récupère les données de tendance pour une métrique"""
         period_start = self.now - timedelta(days=period_days)
@@ -0,0 +1,83 @@
+from django.db.models.signals import post_init, post_save, post_delete, pre_save
+from django.dispatch import receiver
+
+from .counters import AnalyticsCounterService, CHAMPS_SUIVIS, etat_de
+from projects.models import Projet, Tache
+from projects.services import operation_en_masse_en_cours
+from documents.models import DocumentProjet, CommentaireDocumentProjet
+
+
+# ============================================================================
+# COMPTEURS INCRÉMENTAUX DES ANALYTIQUES
+# ============================================================================
+
+@receiver(post_init, sender=Projet)
+@receiver(post_init, sender=Tache)
+@receiver(post_init, sender=DocumentProjet)
+def capture_loaded_counter_state(sender, instance, **kwargs):
+    """
+    Mémorise les champs comptés tels que chargés (from_db) : base de la transition
+    au prochain save, sans relire la ligne. None si l'un d'eux est différé (.only()).
+    """
+    champs = CHAMPS_SUIVIS[sender]
+    if instance.pk is None or instance.get_deferred_fields().intersection(champs):
+        instance._analytics_etat_charge = None
+    else:
+        instance._analytics_etat_charge = etat_de(sender, instance)
+
+
+@receiver(pre_save, sender=Projet)
+@receiver(pre_save, sender=Tache)
+@receiver(pre_save, sender=DocumentProjet)
+def capture_previous_counter_state(sender, instance, **kwargs):
+    """
+    État précédent des champs comptés pour calculer la transition (changement de
+    statut, de priorité, de projet...) au post_save
+    """
+    instance._analytics_etat_precedent = None
+    if sender is Tache and operation_en_masse_en_cours():
+        # Les opérations en masse enregistrent elles-mêmes leurs transitions
+        return
+    if instance.pk:
+        if not instance._state.adding:
+            # Instance chargée depuis la base ou déjà enregistrée
+            instance._analytics_etat_precedent = getattr(instance, '_analytics_etat_charge', None)
+        if instance._analytics_etat_precedent is None:
+            # Champs différés au chargement ou instance construite avec sa clé : relire la ligne
+            instance._analytics_etat_precedent = sender.objects.filter(pk=instance.pk).values(
+                *CHAMPS_SUIVIS[sender]
+            ).first()
+
+
+@receiver(post_save, sender=Projet)
+@receiver(post_save, sender=Tache)
+@receiver(post_save, sender=DocumentProjet)
+@receiver(post_save, sender=CommentaireDocumentProjet)
+def update_counters_on_save(sender, instance, created, **kwargs):
+    """
+    Met à jour les compteurs lors d'une création ou d'une transition
+    """
+    if not created and sender is CommentaireDocumentProjet:
+        # Modification d'un commentaire : rien à compter
+        return
+    nouvel_etat = etat_de(sender, instance)
+    ancien_etat = None if created else getattr(instance, '_analytics_etat_precedent', None)
+    if sender is not CommentaireDocumentProjet:
+        # Base de la transition d'un prochain save de la même instance
+        instance._analytics_etat_charge = nouvel_etat
+    if sender is Tache and operation_en_masse_en_cours():
+        return
+    AnalyticsCounterService.enregistrer_transition(sender, ancien_etat, nouvel_etat)
+
+
+@receiver(post_delete, sender=Projet)
+@receiver(post_delete, sender=Tache)
+@receiver(post_delete, sender=DocumentProjet)
+@receiver(post_delete, sender=CommentaireDocumentProjet)
+def update_counters_on_delete(sender, instance, **kwargs):
+    """
+    Décrémente les compteurs lors d'une suppression
+    """
+    AnalyticsCounterService.enregistrer_transition(sender, etat_de(sender, instance), None)
+    if sender is Projet:
+        AnalyticsCounterService.supprimer_portee(instance.pk)
@@ -0,0 +1,306 @@
+"""
+Moteur de snapshots matérialisés pour les métriques d'analytiques.
+
+Les métriques sont calculées par section (projets, tâches, utilisateurs...) et
+stockées dans la table Metric, rattachées à un MetricSnapshot par
+(section, période, projet). Les tableaux de bord lisent le dernier snapshot ;
+une section n'est recalculée que si l'empreinte de ses tables sources a changé
+ou si le snapshot a dépassé sa durée de vie maximale.
+
+Les métriques remplacées sont conservées comme historique (tendances, voir
+AnalyticsService.get_trend_data) à raison d'un jeu par snapshot et par jour :
+le dernier calcul de chaque journée. L'historique plus ancien que
+ANALYTICS_METRIC_HISTORY_DAYS est supprimé lors des recalculs.
+"""
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+from datetime import timedelta
+from typing import Dict, List, Optional
+import hashlib
+import logging
+import time
+
+from .models import Metric, MetricSnapshot, SnapshotSection
+from .services import AnalyticsService
+from projects.models import Projet, Tache, MembreProjet
+from accounts.models import User, Service
+from documents.models import DocumentProjet, CommentaireDocumentProjet
+from notifications.models import Notification
+
+logger = logging.getLogger(__name__)
+
+
+# Durée pendant laquelle un snapshot est servi sans vérifier les sources
+SNAPSHOT_MAX_AGE = timedelta(seconds=getattr(settings, 'ANALYTICS_SNAPSHOT_MAX_AGE', 600))
+
+# Durée au-delà de laquelle un snapshot est recalculé même sans changement
+# (les métriques "nouveaux sur la période" ou "en retard" dépendent de l'heure)
+SNAPSHOT_TTL = timedelta(seconds=getattr(settings, 'ANALYTICS_SNAPSHOT_TTL', 3600))
+
+# Périodes (en jours) matérialisées : celles proposées par le tableau de bord.
+# Toute autre période est refusée (chaque période crée ses propres snapshots).
+SNAPSHOT_PERIODS = tuple(getattr(settings, 'ANALYTICS_SNAPSHOT_PERIODS', (7, 30, 90, 365)))
+
+# Durée de conservation de l'historique des métriques remplacées
+METRIC_HISTORY = timedelta(days=getattr(settings, 'ANALYTICS_METRIC_HISTORY_DAYS', 365))
+
+# Sections servies par AnalyticsService.calculate_all_metrics (vue overview)
+ALL_SECTIONS = [
+    SnapshotSection.PROJECTS,
+    SnapshotSection.USERS,
+    SnapshotSection.DOCUMENTS,
+    SnapshotSection.TASKS,
+    SnapshotSection.PERFORMANCE,
+    SnapshotSection.SYSTEM,
+    SnapshotSection.DELAYS,
+    SnapshotSection.TEAMS,
+]
+
+# Sections servies par AnalyticsService.get_dashboard_data (vues dashboard et kpis)
+ESSENTIAL_SECTIONS = [
+    SnapshotSection.PROJECTS,
+    SnapshotSection.USERS,
+    SnapshotSection.TASKS,
+    SnapshotSection.TEAMS,
+]
+
+# Sections qui acceptent un filtre par projet
+PROJECT_SECTIONS = [
+    SnapshotSection.PROJECTS,
+    SnapshotSection.TASKS,
+    SnapshotSection.TEAMS,
+]
+
+
+class MetricSnapshotService:
+    """Service de calcul et de lecture des snapshots de métriques"""
+
+    def __init__(self):
+        self.analytics = AnalyticsService()
+        self.now = self.analytics.now
+
+    # ------------------------------------------------------------------
+    # Lecture
+    # ------------------------------------------------------------------
+
+    def get_metrics(self, period_days: int = 30, project_id: Optional[int] = None,
+                    sections: Optional[List[str]] = None) -> List[Metric]:
+        """
+        Retourne les métriques du dernier snapshot pour la période et le projet.
+        Les sections absentes ou trop anciennes sont rafraîchies au passage.
+        """
+        self._check_period(period_days)
+        sections = self._resolve_sections(sections, project_id)
+        snapshots = {
+            snapshot.section: snapshot
+            for snapshot in MetricSnapshot.objects.filter(
+                section__in=sections,
+                period_days=period_days,
+                scope=project_id or 0
+            )
+        }
+
+        a_rafraichir = [
+            section for section in sections
+            if section not in snapshots or snapshots[section].checked_at < self.now - SNAPSHOT_MAX_AGE
+        ]
+        if a_rafraichir:
+            self.refresh(period_days, project_id=project_id, sections=a_rafraichir)
+
+        metrics = Metric.objects.filter(
+            snapshot__section__in=sections,
+            snapshot__period_days=period_days,
+            snapshot__scope=project_id or 0
+        ).select_related('snapshot')
+
+        ordre = {section: index for index, section in enumerate(sections)}
+        return sorted(metrics, key=lambda metric: (ordre[metric.snapshot.section], metric.id))
+
+    # ------------------------------------------------------------------
+    # Calcul
+    # ------------------------------------------------------------------
+
+    def refresh(self, period_days: int = 30, project_id: Optional[int] = None,
+                sections: Optional[List[str]] = None, force: bool = False) -> Dict[str, str]:
+        """
+        Rafraîchit les snapshots d'une période. Une section n'est recalculée que si
+        l'empreinte de ses sources a changé, si son TTL est dépassé ou si force=True.
+        Retourne le résultat par section ('recalculee' ou 'inchangee').
+        """
+        self._check_period(period_days)
+        sections = self._resolve_sections(sections, project_id)
+        period_start = self.now - timedelta(days=period_days)
+        period_end = self.now
+        resultats = {}
+
+        for section in sections:
+            fingerprint = self.compute_fingerprint(section, project_id)
+            snapshot = MetricSnapshot.objects.filter(
+                section=section,
+                period_days=period_days,
+                scope=project_id or 0
+            ).first()
+
+            if (
+                snapshot
+                and not force
+                and snapshot.fingerprint == fingerprint
+                and snapshot.computed_at >= self.now - SNAPSHOT_TTL
+            ):
+                # Sources inchangées : on prolonge simplement la validité du snapshot
+                MetricSnapshot.objects.filter(pk=snapshot.pk).update(checked_at=self.now)
+                resultats[section] = 'inchangee'
+                continue
+
+            debut = time.monotonic()
+            metrics = self._calculate_section(section, period_start, period_end, project_id)
+            duree_ms = (time.monotonic() - debut) * 1000
+
+            with transaction.atomic():
+                # Ligne unique par (section, période, portée), verrouillée jusqu'au remplacement
+                # des métriques : deux calculs simultanés ne créent pas de doublon
+                snapshot, cree = MetricSnapshot.objects.select_for_update().get_or_create(
+                    section=section,
+                    period_days=period_days,
+                    scope=project_id or 0,
+                    defaults={
+                        'projet_id': project_id,
+                        'fingerprint': fingerprint,
+                        'computed_at': self.now,
+                        'checked_at': self.now,
+                    }
+                )
+                calcul_precedent = snapshot.computed_at
+                snapshot.fingerprint = fingerprint
+                snapshot.computed_at = self.now
+                snapshot.checked_at = self.now
+                snapshot.duration_ms = duree_ms
+                snapshot.save()
+
+                self._remplacer_metriques(snapshot, None if cree else calcul_precedent)
+                for metric in metrics:
+                    metric.snapshot = snapshot
+                Metric.objects.bulk_create(metrics)
+
+            resultats[section] = 'recalculee'
+            logger.info(
+                f"Snapshot {section} ({period_days}j, projet={project_id}) recalculé: "
+                f"{len(metrics)} métriques en {duree_ms:.0f} ms"
+            )
+
+        return resultats
+
+    def _remplacer_metriques(self, snapshot: MetricSnapshot, calcul_precedent) -> None:
+        """
+        Détache les métriques du snapshot : celles d'un jour précédent rejoignent
+        l'historique (dernier calcul de leur journée), celles du jour sont supprimées.
+        L'historique de ces métriques au-delà de METRIC_HISTORY est purgé.
+        """
+        anciennes = Metric.objects.filter(snapshot=snapshot)
+        noms = list(anciennes.values_list('name', flat=True).distinct())
+        if not noms:
+            return
+        if calcul_precedent and timezone.localdate(calcul_precedent) < timezone.localdate(self.now):
+            anciennes.update(snapshot=None)
+        else:
+            anciennes.delete()
+        Metric.objects.filter(
+            snapshot__isnull=True, name__in=noms, calculated_at__lt=self.now - METRIC_HISTORY
+        ).delete()
+
+    def _calculate_section(self, section, period_start, period_end, project_id=None) -> List[Metric]:
+        """Délègue le calcul d'une section à AnalyticsService"""
+        analytics = self.analytics
+        if section == SnapshotSection.PROJECTS:
+            return analytics._calculate_project_metrics(period_start, period_end, project_id)
+        if section == SnapshotSection.USERS:
+            return analytics._calculate_user_metrics(period_start, period_end)
+        if section == SnapshotSection.DOCUMENTS:
+            return analytics._calculate_document_metrics(period_start, period_end)
+        if section == SnapshotSection.TASKS:
+            return analytics._calculate_task_metrics(period_start, period_end, project_id)
+        if section == SnapshotSection.PERFORMANCE:
+            return analytics._calculate_performance_metrics(period_start, period_end)
+        if section == SnapshotSection.SYSTEM:
+            return analytics._calculate_system_metrics(period_start, period_end)
+        if section == SnapshotSection.DELAYS:
+            return analytics._calculate_delay_metrics(period_start, period_end)
+        if section == SnapshotSection.TEAMS:
+            if project_id:
+                return analytics._calculate_team_metrics_for_project(period_start, period_end, project_id)
+            return analytics._calculate_team_metrics(period_start, period_end)
+        raise ValueError(f"Section de snapshot inconnue: {section}")
+
+    # ------------------------------------------------------------------
+    # Empreintes des sources
+    # ------------------------------------------------------------------
+
+    def compute_fingerprint(self, section: str, project_id: Optional[int] = None) -> str:
+        """
+        Calcule une empreinte des tables sources d'une section.
+        Une requête agrégée (COUNT + MAX) par table source.
+        """
+        valeurs = [
+            self._aggregate_source(queryset, champs)
+            for queryset, champs in self._get_sources(section, project_id)
+        ]
+        return hashlib.sha256(repr(valeurs).encode('utf-8')).hexdigest()
+
+    def _get_sources(self, section, project_id=None):
+        """Tables sources (queryset, champs à surveiller) de chaque section"""
+        projets = Projet.objects.all()
+        taches = Tache.objects.all()
+        membres = MembreProjet.objects.all()
+        if project_id:
+            projets = projets.filter(id=project_id)
+            taches = taches.filter(projet_id=project_id)
+            membres = membres.filter(projet_id=project_id)
+
+        projets_source = (projets, ['mis_a_jour_le'])
+        taches_source = (taches, ['mise_a_jour_le'])
+        users_source = (User.objects.all(), ['mis_a_jour_le', 'last_login'])
+        documents_source = (DocumentProjet.objects.all(), ['id', 'date_modification_fichier'])
+
+        sources = {
+            SnapshotSection.PROJECTS: [projets_source, users_source],
+            SnapshotSection.USERS: [users_source, (Service.objects.all(), ['id'])],
+            SnapshotSection.DOCUMENTS: [
+                documents_source,
+                (CommentaireDocumentProjet.objects.all(), ['id']),
+            ],
+            SnapshotSection.TASKS: [taches_source],
+            SnapshotSection.PERFORMANCE: [projets_source, taches_source],
+            SnapshotSection.SYSTEM: [(Notification.objects.all(), ['id'])],
+            SnapshotSection.DELAYS: [projets_source, taches_source, documents_source],
+            SnapshotSection.TEAMS: [
+                (membres, ['id']) if project_id else users_source,
+                projets_source,
+                (Service.objects.all(), ['id']),
+            ],
+        }
+        return sources[section]
+
+    @staticmethod
+    def _aggregate_source(queryset, champs):
+        """COUNT + MAX des champs surveillés en une seule requête"""
+        aggregations = {'total': Count('pk')}
+        for champ in champs:
+            aggregations[f'max_{champ}'] = Max(champ)
+        valeurs = queryset.aggregate(**aggregations)
+        return tuple(str(valeurs[cle]) for cle in sorted(valeurs))
+
+    @staticmethod
+    def _check_period(period_days):
+        if period_days not in SNAPSHOT_PERIODS:
+            raise ValueError(f"Période non matérialisée: {period_days} (périodes: {SNAPSHOT_PERIODS})")
+
+    @staticmethod
+    def _resolve_sections(sections, project_id):
+        """Sections par défaut et restriction aux sections filtrables par projet"""
+        if sections is None:
+            sections = ALL_SECTIONS
+        if project_id:
+            sections = [section for section in sections if section in PROJECT_SECTIONS]
+        return list(sections)
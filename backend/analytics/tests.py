@@ -0,0 +1,242 @@
+from datetime import timedelta
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .counters import AnalyticsCounterService, SENTINELLE, TACHES_STATUT, TACHES_TOTAL
+from .models import AnalyticsCounter, Metric, MetricSnapshot, SnapshotSection
+from .services import AnalyticsService
+from .snapshots import MetricSnapshotService
+from projects.models import Projet, Tache, MembreProjet
+
+User = get_user_model()
+
+
+class ProjectDashboardQueryCountTest(TestCase):
+    """Le tableau de bord projet doit émettre un nombre constant de requêtes"""
+
+    # Projet + phases annotées + tâches + prefetch des assignés + membres
+    EXPECTED_QUERIES = 5
+
+    def setUp(self):
+        self.proprietaire = User.objects.create_user(
+            username='chef', email='chef@example.com', password='x', prenom='Chef', nom='Projet'
+        )
+        self.projet = Projet.objects.create(
+            code='PRJ-001', nom='Projet test', description='Description', objectif='Objectif',
+            type='marketing', proprietaire=self.proprietaire
+        )
+        self.user_index = 0
+
+    def _ajouter(self, nb_membres, taches_par_phase):
+        membres = []
+        for _ in range(nb_membres):
+            self.user_index += 1
+            utilisateur = User.objects.create_user(
+                username=f'membre{self.user_index}', email=f'membre{self.user_index}@example.com',
+                password='x', prenom='Membre', nom=str(self.user_index)
+            )
+            membres.append(utilisateur)
+        # bulk_create : le signal post_save de MembreProjet (notifications) n'est pas concerné ici
+        MembreProjet.objects.bulk_create([
+            MembreProjet(projet=self.projet, utilisateur=utilisateur, role_projet='membre')
+            for utilisateur in membres
+        ])
+
+        statuts = ['en_attente', 'en_cours', 'termine']
+        for phase_etat in self.projet.phases_etat.all():
+            for index in range(taches_par_phase):
+                tache = Tache.objects.create(
+                    projet=self.projet, phase_etat=phase_etat,
+                    titre=f'Tâche {phase_etat.id}-{index}', statut=statuts[index % len(statuts)]
+                )
+                tache.assigne_a.set(membres[:2])
+
+    def test_query_count_independent_of_phase_and_task_count(self):
+        self._ajouter(nb_membres=2, taches_par_phase=1)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            petit = AnalyticsService().get_project_dashboard_data(self.projet.id)
+
+        self._ajouter(nb_membres=5, taches_par_phase=6)
+        with self.assertNumQueries(self.EXPECTED_QUERIES):
+            grand = AnalyticsService().get_project_dashboard_data(self.projet.id)
+
+        nb_phases = self.projet.phases_etat.count()
+        self.assertEqual(petit['taches']['total'], nb_phases)
+        self.assertEqual(grand['taches']['total'], nb_phases * 7)
+        self.assertEqual(grand['equipe']['total_membres'], 7)
+        self.assertEqual(
+            sum(phase['total_taches'] for phase in grand['phases']),
+            grand['taches']['total']
+        )
+        self.assertEqual(
+            grand['taches']['terminees'],
+            Tache.objects.filter(projet=self.projet, statut='termine').count()
+        )
+
+
+@override_settings(ROOT_URLCONF='analytics.urls')
+class MetricSnapshotScopeTest(TestCase):
+    """Un seul snapshot par (section, période, portée), périodes limitées aux périodes matérialisées"""
+
+    def setUp(self):
+        self.utilisateur = User.objects.create_user(
+            username='analyste', email='analyste@example.com', password='x', prenom='A', nom='B'
+        )
+
+    def test_snapshot_global_unique(self):
+        maintenant = timezone.now()
+        MetricSnapshot.objects.create(
+            section=SnapshotSection.TASKS, period_days=30, fingerprint='a',
+            computed_at=maintenant, checked_at=maintenant
+        )
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            MetricSnapshot.objects.create(
+                section=SnapshotSection.TASKS, period_days=30, fingerprint='b',
+                computed_at=maintenant, checked_at=maintenant
+            )
+
+    def test_snapshot_cree_pendant_le_calcul_reutilise(self):
+        service = MetricSnapshotService()
+        calculer = service._calculate_section
+
+        def calcul_concurrent(*args, **kwargs):
+            # Un autre worker crée le snapshot global entre la lecture et l'enregistrement
+            maintenant = timezone.now()
+            MetricSnapshot.objects.create(
+                section=SnapshotSection.TASKS, period_days=30, fingerprint='autre',
+                computed_at=maintenant, checked_at=maintenant
+            )
+            return calculer(*args, **kwargs)
+
+        with mock.patch.object(service, '_calculate_section', side_effect=calcul_concurrent):
+            service.refresh(30, sections=[SnapshotSection.TASKS])
+
+        snapshots = MetricSnapshot.objects.filter(section=SnapshotSection.TASKS, period_days=30)
+        self.assertEqual(snapshots.count(), 1)
+        metriques = service.get_metrics(30, sections=[SnapshotSection.TASKS])
+        noms = [metric.name for metric in metriques]
+        self.assertTrue(noms)
+        self.assertEqual(len(noms), len(set(noms)))
+
+    def test_periode_hors_liste_refusee(self):
+        with self.assertRaises(ValueError):
+            MetricSnapshotService().get_metrics(12345)
+
+        client = APIClient()
+        client.force_authenticate(self.utilisateur)
+        for periode in ('12345', 'abc'):
+            reponse = client.get(reverse('analytics-overview'), {'period_days': periode})
+            self.assertEqual(reponse.status_code, 400)
+        self.assertFalse(MetricSnapshot.objects.exists())
+
+
+class MetricHistoryTest(TestCase):
+    """Historique borné des métriques remplacées par un recalcul"""
+
+    def setUp(self):
+        self.service = MetricSnapshotService()
+        self.service.refresh(30, sections=[SnapshotSection.TASKS])
+        self.snapshot = MetricSnapshot.objects.get(section=SnapshotSection.TASKS, period_days=30)
+        self.nb = Metric.objects.filter(snapshot=self.snapshot).count()
+        self.assertTrue(self.nb)
+
+    def _recalculer(self):
+        MetricSnapshotService().refresh(30, sections=[SnapshotSection.TASKS], force=True)
+
+    def test_recalcul_du_jour_remplace_les_metriques(self):
+        self._recalculer()
+        self._recalculer()
+        self.assertEqual(Metric.objects.count(), self.nb)
+        self.assertFalse(Metric.objects.filter(snapshot__isnull=True).exists())
+
+    def test_un_jeu_historique_par_jour(self):
+        hier = timezone.now() - timedelta(days=1)
+        MetricSnapshot.objects.filter(pk=self.snapshot.pk).update(computed_at=hier)
+        self._recalculer()
+        self._recalculer()
+        self.assertEqual(Metric.objects.filter(snapshot__isnull=True).count(), self.nb)
+        self.assertEqual(Metric.objects.filter(snapshot=self.snapshot).count(), self.nb)
+
+    def test_historique_ancien_purge(self):
+        ancienne = Metric.objects.filter(snapshot=self.snapshot).first()
+        ancienne.pk = None
+        ancienne.snapshot = None
+        ancienne.save()
+        Metric.objects.filter(pk=ancienne.pk).update(calculated_at=timezone.now() - timedelta(days=400))
+        self._recalculer()
+        self.assertFalse(Metric.objects.filter(pk=ancienne.pk).exists())
+
+    def test_liste_des_metriques_sans_historique(self):
+        hier = timezone.now() - timedelta(days=1)
+        MetricSnapshot.objects.filter(pk=self.snapshot.pk).update(computed_at=hier)
+        self._recalculer()
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='x', prenom='L', nom='M'
+        ))
+        reponse = client.get(reverse('metric-list'))
+        self.assertEqual(reponse.status_code, 200)
+        donnees = reponse.data['results'] if isinstance(reponse.data, dict) else reponse.data
+        self.assertEqual(len(donnees), self.nb)
+
+
+class AnalyticsCounterInitialisationTest(TestCase):
+    """Compteurs jamais reconstruits pendant une requête, transitions sans relecture de la ligne"""
+
+    def setUp(self):
+        AnalyticsCounterService._initialise = False
+        self.addCleanup(setattr, AnalyticsCounterService, '_initialise', False)
+        proprietaire = User.objects.create_user(
+            username='chef', email='chef@example.com', password='x', prenom='Chef', nom='Projet'
+        )
+        self.projet = Projet.objects.create(
+            code='PRJ-CPT', nom='Projet compteurs', description='Description', objectif='Objectif',
+            type='marketing', proprietaire=proprietaire
+        )
+        self.tache = Tache.objects.create(projet=self.projet, titre='Tâche', statut='en_attente')
+
+    def test_sans_sentinelle_lecture_depuis_les_sources(self):
+        AnalyticsCounter.objects.all().delete()
+
+        compteurs = AnalyticsCounterService.get_counters(scope=self.projet.id)
+
+        self.assertEqual(compteurs[TACHES_TOTAL][''], 1)
+        self.assertEqual(compteurs[TACHES_STATUT]['en_attente'], 1)
+        self.assertFalse(AnalyticsCounter.objects.exists())
+        self.assertFalse(AnalyticsCounterService._initialise)
+
+    def test_transition_sans_relecture_de_la_ligne(self):
+        AnalyticsCounterService.reconcile()
+        self.assertTrue(AnalyticsCounter.objects.filter(counter=SENTINELLE).exists())
+
+        tache = Tache.objects.get(pk=self.tache.pk)
+        tache.statut = 'termine'
+        with self.captureOnCommitCallbacks(execute=True), CaptureQueriesContext(connection) as requetes:
+            tache.save()
+        relectures = [
+            requete['sql'] for requete in requetes.captured_queries
+            if requete['sql'].startswith('SELECT') and '"taches"."priorite"' in requete['sql']
+        ]
+        # Seule la lecture de l'ancien statut par Tache.save() ; aucune par le signal pre_save
+        self.assertEqual(len(relectures), 1, relectures)
+
+        # Second save de la même instance : la transition part du dernier état enregistré
+        tache.statut = 'en_cours'
+        with self.captureOnCommitCallbacks(execute=True):
+            tache.save()
+
+        compteurs = AnalyticsCounterService.get_counters(scope=self.projet.id)
+        self.assertEqual(compteurs[TACHES_TOTAL][''], 1)
+        self.assertEqual(compteurs[TACHES_STATUT].get('en_attente', 0), 0)
+        self.assertEqual(compteurs[TACHES_STATUT].get('termine', 0), 0)
+        self.assertEqual(compteurs[TACHES_STATUT]['en_cours'], 1)
+        self.assertEqual(AnalyticsCounterService.reconcile(apply=False), [])
@@ -16,10 +16,28 @@ from .serializers import (
     SystemHealthSerializer, AnalyticsDataSerializer
 )
 from .services import AnalyticsService
+from .snapshots import MetricSnapshotService, SNAPSHOT_PERIODS
 
 logger = logging.getLogger(__name__)
 
 
+def get_snapshot_period(params):
+    """
+    Période demandée (period_days, 30 par défaut) parmi les périodes matérialisées ;
+    retourne (période, None) ou (None, réponse 400)
+    """
+    try:
+        period_days = int(params.get('period_days', 30))
+    except (TypeError, ValueError):
+        period_days = None
+    if period_days not in SNAPSHOT_PERIODS:
+        return None, Response(
+            {'error': f"period_days doit être l'une des valeurs {list(SNAPSHOT_PERIODS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    return period_days, None
+
+
 class MetricViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet pour les métriques"""
     
@@ -28,7 +46,8 @@ class MetricViewSet(viewsets.ReadOnlyModelViewSet):
     
     def get_queryset(self):
         """Filtrer les métriques selon les permissions"""
-        queryset = Metric.objects.all()
+        # Métriques des snapshots courants (l'historique sert aux tendances)
+        queryset = Metric.objects.filter(snapshot__isnull=False)
         
         # Filtrer par catégorie si spécifié
         category = self.request.query_params.get('category')
@@ -71,7 +90,9 @@ class MetricViewSet(viewsets.ReadOnlyModelViewSet):
     @action(detail=False, methods=['get'])
     def dashboard(self, request):
         """Récupère les données pour le tableau de bord"""
-        period_days = int(request.query_params.get('period_days', 30))
+        period_days, erreur = get_snapshot_period(request.query_params)
+        if erreur:
+            return erreur
         project_id = request.query_params.get('project_id')
         
         # Convertir project_id en int si fourni
@@ -377,12 +398,12 @@ class AnalyticsViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def overview(self, request):
         """Récupère un aperçu général des analytiques"""
-        period_days = int(request.query_params.get('period_days', 30))
-        
-        analytics_service = AnalyticsService()
+        period_days, erreur = get_snapshot_period(request.query_params)
+        if erreur:
+            return erreur
         
-        # Calculer les métriques principales
-        metrics = analytics_service.calculate_all_metrics(period_days)
+        # Lire les métriques depuis le dernier snapshot matérialisé
+        metrics = MetricSnapshotService().get_metrics(period_days)
         
         # Organiser les données par catégorie
         overview_data = {
@@ -421,7 +442,9 @@ class AnalyticsViewSet(viewsets.ViewSet):
     @action(detail=False, methods=['get'])
     def kpis(self, request):
         """Récupère les KPIs principaux"""
-        period_days = int(request.query_params.get('period_days', 30))
+        period_days, erreur = get_snapshot_period(request.query_params)
+        if erreur:
+            return erreur
         
         analytics_service = AnalyticsService()
         dashboard_data = analytics_service.get_dashboard_data(period_days)
@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class ChatbotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chatbot'
+
+    def ready(self):
+        # Invalidation de l'instantané des connaissances (chatbot/connaissances.py)
+        import chatbot.signals
@@ -0,0 +1,218 @@
+"""
+Instantané en mémoire des données lues par le chatbot (connaissances).
+
+Les réponses sur les projets, les tâches par utilisateur et par équipe, les
+budgets et les risques ne relisent plus les tables à chaque question : elles
+sont formatées à partir d'un instantané construit une fois puis partagé par les
+requêtes du processus.
+
+- Version : compteur partagé dans le cache Django, incrémenté après le commit
+  par les signaux des projets, tâches, assignations et membres de projet
+  (chatbot/signals.py). Chaque processus reconstruit son instantané dès que la
+  version change.
+- Rafraîchissement périodique : un instantané plus ancien que TTL secondes est
+  reconstruit même sans signal (opérations en masse, risques calculés par
+  rapport à la date du jour, comptes utilisateurs modifiés).
+- Sections paresseuses : projets, budgets, tâches et équipes sont chargés à leur
+  première lecture dans une version, une seule fois même si plusieurs requêtes
+  les demandent en même temps.
+"""
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import transaction
+import logging
+import re
+import threading
+import time
+
+from projects.models import Projet, Tache, MembreProjet
+
+logger = logging.getLogger(__name__)
+
+CLE_VERSION = 'chatbot:connaissances:version'
+
+_NOMBRES = re.compile(r'[\d,.\s]+')
+_NON_NUMERIQUE = re.compile(r'[^\d.,]')
+
+
+def get_config():
+    return {
+        'TTL': 300,         # Secondes avant reconstruction sans signal ; 0 : uniquement sur signal
+        **getattr(django_settings, 'CHATBOT_CONNAISSANCES', {}),
+    }
+
+
+def lire_budget(budget):
+    """Premier nombre d'un budget saisi librement ("15 000 €" -> 15000.0), None s'il n'y en a pas"""
+    nombres = _NOMBRES.findall(str(budget or ''))
+    if not nombres:
+        return None
+    chiffres = _NON_NUMERIQUE.sub('', nombres[0]).replace(',', '.')
+    try:
+        return float(chiffres) if chiffres else None
+    except ValueError:
+        return None
+
+
+def section(construire):
+    """Propriété calculée une fois par version de l'instantané"""
+    def lire(connaissances):
+        return connaissances.memoriser(construire.__name__, lambda: construire(connaissances))
+    return property(lire, doc=construire.__doc__)
+
+
+class Connaissances:
+    """Données d'une version de l'instantané ; chaque section est calculée à sa première lecture"""
+
+    def __init__(self, version):
+        self.version = version
+        self.construit_le = time.monotonic()
+        self._verrou = threading.RLock()     # Une section peut en lire une autre
+        self._sections = {}
+
+    def memoriser(self, nom, construire):
+        """Section dérivée calculée une fois par version (ex. risques évalués par la vue)"""
+        if nom not in self._sections:
+            with self._verrou:
+                if nom not in self._sections:
+                    self._sections[nom] = construire()
+        return self._sections[nom]
+
+    # ===== PROJETS ET BUDGETS =====
+
+    @section
+    def projets(self):
+        return list(Projet.objects.select_related('proprietaire').order_by('id'))
+
+    @section
+    def projets_recents(self):
+        return sorted(self.projets, key=lambda projet: projet.cree_le, reverse=True)
+
+    @section
+    def projets_actifs(self):
+        return [projet for projet in self.projets if projet.statut == 'en_cours']
+
+    @section
+    def budgets(self):
+        """(projet, montant ou None) des projets dont le budget est renseigné"""
+        return [(projet, lire_budget(projet.budget)) for projet in self.projets if projet.budget]
+
+    @section
+    def budgets_par_nom(self):
+        return sorted(self.budgets, key=lambda budget: budget[0].nom.lower())
+
+    @section
+    def projets_sans_budget(self):
+        return [projet for projet in self.projets if not projet.budget]
+
+    # ===== TÂCHES ET ÉQUIPES =====
+
+    @section
+    def taches(self):
+        return list(Tache.objects.select_related('projet').prefetch_related('assigne_a').order_by('id'))
+
+    @section
+    def taches_par_utilisateur(self):
+        """{utilisateur: [tâches]} dans l'ordre de première assignation"""
+        par_utilisateur = {}
+        for tache in self.taches:
+            for utilisateur in tache.assigne_a.all():
+                par_utilisateur.setdefault(utilisateur, []).append(tache)
+        return par_utilisateur
+
+    @section
+    def taches_non_assignees(self):
+        return [tache for tache in self.taches if not tache.assigne_a.all()]
+
+    @section
+    def equipes(self):
+        """
+        Équipes formelles : (projet, [(membre, [tâches du membre dans le projet])],
+        [tâches non assignées du projet]) pour chaque projet ayant des membres
+        """
+        membres_par_projet = {}
+        for membre in MembreProjet.objects.select_related('utilisateur', 'service').order_by('id'):
+            membres_par_projet.setdefault(membre.projet_id, []).append(membre)
+
+        taches_par_membre = {}
+        non_assignees_par_projet = {}
+        for tache in self.taches:
+            assignes = tache.assigne_a.all()
+            for utilisateur in assignes:
+                taches_par_membre.setdefault((tache.projet_id, utilisateur.pk), []).append(tache)
+            if not assignes:
+                non_assignees_par_projet.setdefault(tache.projet_id, []).append(tache)
+
+        return [
+            (
+                projet,
+                [
+                    (membre, taches_par_membre.get((projet.pk, membre.utilisateur_id), []))
+                    for membre in membres_par_projet[projet.pk]
+                ],
+                non_assignees_par_projet.get(projet.pk, []),
+            )
+            for projet in self.projets
+            if projet.pk in membres_par_projet
+        ]
+
+
+class InstantaneConnaissances:
+    """Instantané du processus, reconstruit quand la version partagée change ou qu'il expire"""
+
+    _courant = None
+    _verrou = threading.Lock()
+
+    @staticmethod
+    def _version():
+        version = cache.get(CLE_VERSION)
+        if version is None:
+            # Valeur initiale distincte de toute version précédemment évincée
+            cache.add(CLE_VERSION, time.time_ns(), None)
+            version = cache.get(CLE_VERSION)
+        return version
+
+    @classmethod
+    def obtenir(cls):
+        """Connaissances de la version courante"""
+        try:
+            version = cls._version()
+        except Exception as e:
+            logger.error(f"Version de l'instantané du chatbot illisible : {e}")
+            version = None
+
+        courant = cls._courant
+        if courant is not None and courant.version == version and not cls._expire(courant):
+            return courant
+
+        with cls._verrou:
+            if cls._courant is courant:
+                cls._courant = Connaissances(version)
+                logger.info(f"[Connaissances] Nouvel instantané (version {version})")
+            return cls._courant
+
+    @staticmethod
+    def _expire(connaissances):
+        ttl = get_config()['TTL']
+        return bool(ttl) and time.monotonic() - connaissances.construit_le > ttl
+
+    @classmethod
+    def invalider(cls):
+        """Change la version après le commit : chaque processus reconstruira son instantané"""
+        transaction.on_commit(cls._incrementer)
+
+    @staticmethod
+    def _incrementer():
+        try:
+            cache.incr(CLE_VERSION)
+        except ValueError:
+            # Version absente : la prochaine lecture en crée une nouvelle
+            pass
+        except Exception as e:
+            logger.error(f"Erreur lors de l'invalidation de l'instantané du chatbot : {e}")
+
+    @classmethod
+    def reinitialiser(cls):
+        """Oublie l'instantané du processus (tests)"""
+        with cls._verrou:
+            cls._courant = None
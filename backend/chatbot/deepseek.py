@@ -0,0 +1,358 @@
+"""
+Client de l'API DeepSeek utilisé par ChatbotView.
+
+- Cache des réponses : clé = question normalisée + empreinte des données
+  fournies au modèle (+ modèle et consigne système), durée CACHE_TTL. La même
+  question posée par plusieurs utilisateurs sur les mêmes données ne déclenche
+  qu'un appel.
+- Appel unique (single-flight) : des requêtes identiques simultanées dans un
+  processus attendent le résultat du premier appel au lieu d'en lancer chacune.
+- Session HTTP partagée (requests.Session) : connexions conservées (keep-alive)
+  et réutilisées entre les requêtes.
+- Disjoncteur : après SEUIL_ECHECS échecs consécutifs, DeepSeek n'est plus
+  appelé pendant DELAI_REOUVERTURE secondes (réponse de repli immédiate), puis
+  un seul appel d'essai décide de la réouverture.
+- Réponse diffusée (ClientDeepSeek.diffuser, vue ChatbotStreamView) : appel
+  asynchrone en streaming avec un client httpx partagé par la boucle ASGI ; les
+  morceaux sont transmis dès leur réception, la réponse complète est mise en
+  cache comme celle de completer(). Sans httpx, la réponse est obtenue par
+  completer() dans un thread et transmise en un seul morceau.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings as django_settings
+from django.core.cache import cache
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    import httpx
+except ImportError:
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        'URL': 'https://api.deepseek.com/v1/chat/completions',
+        'API_KEY': os.getenv('DEEPSEEK_API_KEY'),
+        'MODELE': 'deepseek-chat',
+        'TEMPERATURE': 0.7,
+        'TIMEOUT_CONNEXION': 5,         # Secondes
+        'TIMEOUT_LECTURE': 30,          # Secondes
+        'POOL': 10,                     # Connexions conservées par processus
+        'CACHE_TTL': 300,               # Secondes ; 0 désactive le cache
+        'SEUIL_ECHECS': 5,              # Échecs consécutifs avant ouverture du disjoncteur
+        'DELAI_REOUVERTURE': 30,        # Secondes avant un appel d'essai
+        **getattr(django_settings, 'CHATBOT_DEEPSEEK', {}),
+    }
+
+
+class DeepSeekErreur(Exception):
+    """Échec d'un appel à DeepSeek (la vue utilise alors sa réponse de repli)"""
+
+
+class DeepSeekIndisponible(DeepSeekErreur):
+    """Disjoncteur ouvert : DeepSeek n'est pas appelé"""
+
+
+def normaliser(texte):
+    """Texte comparé pour le cache : casse, espaces et ponctuation finale ignorés"""
+    return re.sub(r'\s+', ' ', (texte or '').lower()).strip().rstrip(' ?!.')
+
+
+def empreinte(*parties):
+    hachage = hashlib.sha256()
+    for partie in parties:
+        hachage.update(str(partie).encode('utf-8'))
+        hachage.update(b'\x00')
+    return hachage.hexdigest()
+
+
+class Disjoncteur:
+    """Disjoncteur du processus : fermé, ouvert (appels refusés) puis semi-ouvert (un essai)"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.echecs = 0
+        self.ouvert_jusqu_a = 0
+        self._essai_en_cours = False
+
+    def autoriser(self, config):
+        with self._verrou:
+            if self.echecs < config['SEUIL_ECHECS']:
+                return True
+            if time.monotonic() < self.ouvert_jusqu_a or self._essai_en_cours:
+                return False
+            # Semi-ouvert : un seul appel d'essai
+            self._essai_en_cours = True
+            return True
+
+    def succes(self):
+        with self._verrou:
+            self.echecs = 0
+            self._essai_en_cours = False
+
+    def abandonner(self):
+        """Appel interrompu sans résultat (client parti) : l'essai semi-ouvert est libéré"""
+        with self._verrou:
+            self._essai_en_cours = False
+
+    def echec(self, config):
+        with self._verrou:
+            self.echecs += 1
+            self._essai_en_cours = False
+            if self.echecs >= config['SEUIL_ECHECS']:
+                self.ouvert_jusqu_a = time.monotonic() + config['DELAI_REOUVERTURE']
+                logger.warning(
+                    f"[DeepSeek] Disjoncteur ouvert pour {config['DELAI_REOUVERTURE']}s "
+                    f"après {self.echecs} échec(s) consécutif(s)"
+                )
+
+    @property
+    def ouvert(self):
+        return self.echecs > 0 and time.monotonic() < self.ouvert_jusqu_a
+
+
+class _Appel:
+    """Appel en cours partagé par les requêtes identiques (single-flight)"""
+
+    def __init__(self):
+        self.termine = threading.Event()
+        self.resultat = None
+        self.erreur = None
+
+
+class ClientDeepSeek:
+    """Client partagé du processus (session, cache, appels en cours, disjoncteur)"""
+
+    _session = None
+    _client_async = None    # (boucle, httpx.AsyncClient) de la boucle ASGI
+    _verrou = threading.Lock()
+    _appels = {}            # clé de cache -> _Appel en cours
+    disjoncteur = Disjoncteur()
+
+    @classmethod
+    def session(cls):
+        if cls._session is None:
+            with cls._verrou:
+                if cls._session is None:
+                    pool = get_config()['POOL']
+                    session = requests.Session()
+                    adaptateur = HTTPAdapter(pool_connections=pool, pool_maxsize=pool)
+                    session.mount('https://', adaptateur)
+                    session.mount('http://', adaptateur)
+                    cls._session = session
+        return cls._session
+
+    @classmethod
+    def client_async(cls):
+        """Client httpx de la boucle courante (connexions conservées entre les requêtes)"""
+        boucle = asyncio.get_running_loop()
+        if cls._client_async is None or cls._client_async[0] is not boucle:
+            pool = get_config()['POOL']
+            limites = httpx.Limits(max_connections=pool, max_keepalive_connections=pool)
+            cls._client_async = (boucle, httpx.AsyncClient(limits=limites))
+        return cls._client_async[1]
+
+    @staticmethod
+    def _cle(config, consigne, prompt, question, donnees):
+        if question is not None:
+            cle = empreinte(config['MODELE'], consigne, normaliser(question), donnees or '')
+        else:
+            cle = empreinte(config['MODELE'], consigne, normaliser(prompt))
+        return f"chatbot:deepseek:{cle}"
+
+    @classmethod
+    def completer(cls, consigne, prompt, question=None, donnees=None):
+        """
+        Réponse du modèle à `prompt` (consigne système `consigne`). Avec `question`
+        et `donnees`, le cache est indexé par la question normalisée et l'empreinte
+        des données ; sinon par le prompt normalisé.
+        """
+        config = get_config()
+        cle = cls._cle(config, consigne, prompt, question, donnees)
+
+        if config['CACHE_TTL']:
+            reponse = cache.get(cle)
+            if reponse is not None:
+                logger.info("[DeepSeek] Réponse servie depuis le cache")
+                return reponse
+
+        with cls._verrou:
+            appel = cls._appels.get(cle)
+            meneur = appel is None
+            if meneur:
+                appel = cls._appels[cle] = _Appel()
+
+        if not meneur:
+            # Requête identique en cours dans ce processus : attendre son résultat
+            if not appel.termine.wait(config['TIMEOUT_CONNEXION'] + config['TIMEOUT_LECTURE']):
+                raise DeepSeekErreur("Timeout en attendant une requête DeepSeek identique")
+            if appel.erreur is not None:
+                raise appel.erreur
+            return appel.resultat
+
+        try:
+            appel.resultat = cls._appeler(consigne, prompt, config)
+            if config['CACHE_TTL']:
+                cache.set(cle, appel.resultat, config['CACHE_TTL'])
+            return appel.resultat
+        except DeepSeekErreur as e:
+            appel.erreur = e
+            raise
+        finally:
+            with cls._verrou:
+                cls._appels.pop(cle, None)
+            appel.termine.set()
+
+    @classmethod
+    def _appeler(cls, consigne, prompt, config):
+        if not config['API_KEY']:
+            raise DeepSeekErreur(
+                "Clé API DeepSeek manquante. Veuillez configurer DEEPSEEK_API_KEY dans vos variables d'environnement."
+            )
+        if not cls.disjoncteur.autoriser(config):
+            raise DeepSeekIndisponible("DeepSeek temporairement désactivé après des échecs répétés")
+
+        try:
+            logger.info(f"[DeepSeek] Envoi de la requête: {prompt[:100]}...")
+            reponse = cls.session().post(
+                config['URL'],
+                headers={
+                    "Authorization": f"Bearer {config['API_KEY']}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": config['MODELE'],
+                    "messages": [
+                        {"role": "system", "content": consigne},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": config['TEMPERATURE']
+                },
+                timeout=(config['TIMEOUT_CONNEXION'], config['TIMEOUT_LECTURE'])
+            )
+            reponse.raise_for_status()
+            contenu = reponse.json()["choices"][0]["message"]["content"]
+        except requests.exceptions.Timeout:
+            cls.disjoncteur.echec(config)
+            logger.warning(f"[DeepSeek] Timeout ({config['TIMEOUT_LECTURE']}s) - utilisation du fallback")
+            raise DeepSeekErreur("Timeout de connexion à DeepSeek")
+        except requests.exceptions.ConnectionError as e:
+            cls.disjoncteur.echec(config)
+            logger.warning(f"[DeepSeek] Erreur de connexion - utilisation du fallback: {e}")
+            raise DeepSeekErreur("Erreur de connexion à DeepSeek")
+        except requests.exceptions.RequestException as e:
+            cls.disjoncteur.echec(config)
+            logger.error(f"[DeepSeek] Erreur de requête: {e}")
+            raise DeepSeekErreur(f"Erreur de requête DeepSeek: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            cls.disjoncteur.echec(config)
+            logger.error(f"[DeepSeek] Réponse inattendue: {e}")
+            raise DeepSeekErreur(f"Réponse DeepSeek invalide: {e}")
+
+        cls.disjoncteur.succes()
+        logger.info("[DeepSeek] Réponse reçue avec succès")
+        return contenu
+
+    @classmethod
+    async def diffuser(cls, consigne, prompt, question=None, donnees=None):
+        """
+        Morceaux de la réponse du modèle, transmis dès leur réception (même cache et
+        même disjoncteur que completer()). Lève DeepSeekErreur en cas d'échec.
+        """
+        config = get_config()
+        cle = cls._cle(config, consigne, prompt, question, donnees)
+
+        if config['CACHE_TTL']:
+            reponse = await cache.aget(cle)
+            if reponse is not None:
+                logger.info("[DeepSeek] Réponse servie depuis le cache")
+                yield reponse
+                return
+
+        if httpx is None:
+            # Pas de client asynchrone : réponse complète obtenue dans un thread
+            yield await sync_to_async(cls.completer, thread_sensitive=False)(consigne, prompt, question, donnees)
+            return
+
+        if not config['API_KEY']:
+            raise DeepSeekErreur(
+                "Clé API DeepSeek manquante. Veuillez configurer DEEPSEEK_API_KEY dans vos variables d'environnement."
+            )
+        if not cls.disjoncteur.autoriser(config):
+            raise DeepSeekIndisponible("DeepSeek temporairement désactivé après des échecs répétés")
+
+        morceaux = []
+        try:
+            logger.info(f"[DeepSeek] Envoi de la requête (streaming): {prompt[:100]}...")
+            async with cls.client_async().stream(
+                'POST',
+                config['URL'],
+                headers={
+                    "Authorization": f"Bearer {config['API_KEY']}",
+                    "Content-Type": "application/json"
+                },
+                json={
+                    "model": config['MODELE'],
+                    "messages": [
+                        {"role": "system", "content": consigne},
+                        {"role": "user", "content": prompt}
+                    ],
+                    "temperature": config['TEMPERATURE'],
+                    "stream": True
+                },
+                timeout=httpx.Timeout(config['TIMEOUT_LECTURE'], connect=config['TIMEOUT_CONNEXION'])
+            ) as reponse:
+                reponse.raise_for_status()
+                # Événements SSE : "data: {...}" par morceau, "data: [DONE]" à la fin
+                async for ligne in reponse.aiter_lines():
+                    if not ligne.startswith('data:'):
+                        continue
+                    contenu = ligne[len('data:'):].strip()
+                    if contenu == '[DONE]':
+                        break
+                    morceau = json.loads(contenu)["choices"][0].get("delta", {}).get("content")
+                    if morceau:
+                        morceaux.append(morceau)
+                        yield morceau
+        except httpx.TimeoutException:
+            cls.disjoncteur.echec(config)
+            logger.warning(f"[DeepSeek] Timeout ({config['TIMEOUT_LECTURE']}s) - utilisation du fallback")
+            raise DeepSeekErreur("Timeout de connexion à DeepSeek")
+        except httpx.HTTPError as e:
+            cls.disjoncteur.echec(config)
+            logger.error(f"[DeepSeek] Erreur de requête: {e}")
+            raise DeepSeekErreur(f"Erreur de requête DeepSeek: {e}")
+        except (KeyError, IndexError, ValueError) as e:
+            cls.disjoncteur.echec(config)
+            logger.error(f"[DeepSeek] Réponse inattendue: {e}")
+            raise DeepSeekErreur(f"Réponse DeepSeek invalide: {e}")
+        except BaseException:
+            # Diffusion interrompue (GeneratorExit, CancelledError à la déconnexion du client)
+            cls.disjoncteur.abandonner()
+            raise
+
+        cls.disjoncteur.succes()
+        logger.info("[DeepSeek] Réponse diffusée avec succès")
+        if config['CACHE_TTL'] and morceaux:
+            await cache.aset(cle, ''.join(morceaux), config['CACHE_TTL'])
+
+    @classmethod
+    def reinitialiser(cls):
+        """Oublie la session et l'état du disjoncteur (tests)"""
+        with cls._verrou:
+            cls._session = None
+            cls._client_async = None
+            cls._appels.clear()
+            cls.disjoncteur = Disjoncteur()
@@ -0,0 +1,150 @@
+"""
+Stockage et rétention de l'historique du chatbot (conversations et messages).
+
+- Mode de stockage NLP (NLP) : 'complet' conserve tokens et entités spaCy de
+  chaque message utilisateur ; 'entites' ne conserve que les entités (les tokens
+  se recalculent depuis le contenu) ; 'aucun' ne calcule ni ne conserve rien.
+- Compactage : les données NLP des messages plus anciens que COMPACTER_APRES_JOURS
+  sont retirées (commande cleanup_chatbot_history).
+- Archivage : les conversations sans message depuis ARCHIVER_APRES_JOURS sont
+  déplacées dans ConversationArchivee (messages en un bloc JSON compressé), par
+  lots de conversations, chaque lot dans une transaction courte.
+"""
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+from datetime import timedelta
+import json
+import logging
+import time
+import zlib
+
+from .models import Conversation, ConversationArchivee, Message
+
+logger = logging.getLogger(__name__)
+
+MODES_NLP = ('complet', 'entites', 'aucun')
+
+
+def get_config():
+    return {
+        'NLP': 'complet',               # 'complet', 'entites' ou 'aucun' (voir MODES_NLP)
+        'COMPACTER_APRES_JOURS': 30,    # Données NLP retirées des messages plus anciens
+        'ARCHIVER_APRES_JOURS': 180,    # Conversations inactives archivées
+        **getattr(django_settings, 'CHATBOT_HISTORIQUE', {}),
+    }
+
+
+def mode_nlp():
+    mode = get_config()['NLP']
+    if mode not in MODES_NLP:
+        logger.warning(f"Mode de stockage NLP inconnu : {mode} (mode 'complet' utilisé)")
+        return 'complet'
+    return mode
+
+
+def artefacts_nlp(tokens, entites):
+    """(tokens, entités) à enregistrer sur un message selon le mode de stockage"""
+    mode = mode_nlp()
+    if mode == 'aucun':
+        return None, None
+    if mode == 'entites':
+        return None, entites
+    return tokens, entites
+
+
+class Historique:
+    """Compactage et archivage de l'historique, par lots"""
+
+    @staticmethod
+    def compacter(jours, batch_size=1000, pause=0):
+        """Retire les données NLP des messages de plus de `jours` jours"""
+        limite = timezone.now() - timedelta(days=jours)
+        messages = Message.objects.filter(timestamp__lt=limite).filter(
+            Q(spacy_tokens__isnull=False) | Q(spacy_entities__isnull=False)
+        )
+
+        total = Historique._par_lots(
+            messages,
+            lambda ids: Message.objects.filter(id__in=ids).update(spacy_tokens=None, spacy_entities=None),
+            batch_size, pause
+        )
+        logger.info(f"Historique du chatbot : {total} message(s) compacté(s)")
+        return total
+
+    @staticmethod
+    def conversations_inactives(jours):
+        """Conversations sans message depuis `jours` jours (ou vides et créées avant)"""
+        limite = timezone.now() - timedelta(days=jours)
+        return Conversation.objects.annotate(derniere_activite=Max('messages__timestamp')).filter(
+            Q(derniere_activite__lt=limite) | Q(derniere_activite__isnull=True, created_at__lt=limite)
+        )
+
+    @staticmethod
+    def archiver(jours, batch_size=100, pause=0):
+        """
+        Archive les conversations inactives depuis `jours` jours, par lots de
+        `batch_size` conversations ; retourne (conversations, messages) archivés
+        """
+        compteurs = {'messages': 0}
+
+        def archiver_lot(ids):
+            # Conversations du lot verrouillées puis relues : un message reçu entre-temps les garde actives
+            list(Conversation.objects.select_for_update().filter(id__in=ids).values_list('id', flat=True))
+            ids = list(Historique.conversations_inactives(jours).filter(id__in=ids).values_list('id', flat=True))
+            archives = []
+            conversations = Conversation.objects.filter(id__in=ids).annotate(
+                derniere_activite=Max('messages__timestamp')
+            )
+            messages_par_conversation = {}
+            for message in (
+                Message.objects.filter(conversation_id__in=ids)
+                .order_by('conversation_id', 'timestamp', 'id')
+                .values('conversation_id', 'sender', 'content', 'timestamp', 'deepseek_used')
+            ):
+                messages_par_conversation.setdefault(message.pop('conversation_id'), []).append({
+                    **message, 'timestamp': message['timestamp'].isoformat()
+                })
+
+            for conversation in conversations:
+                messages = messages_par_conversation.get(conversation.id, [])
+                archives.append(ConversationArchivee(
+                    user_id=conversation.user_id,
+                    session_id=conversation.session_id,
+                    conversation_id=conversation.id,
+                    created_at=conversation.created_at,
+                    derniere_activite=conversation.derniere_activite or conversation.created_at,
+                    nombre_messages=len(messages),
+                    messages=zlib.compress(json.dumps(messages, ensure_ascii=False).encode('utf-8')),
+                ))
+            ConversationArchivee.objects.bulk_create(archives)
+            compteurs['messages'] += sum(archive.nombre_messages for archive in archives)
+
+            # Suppression en cascade des messages archivés
+            Conversation.objects.filter(id__in=ids).delete()
+            return len(archives)
+
+        total = Historique._par_lots(
+            Historique.conversations_inactives(jours), archiver_lot, batch_size, pause
+        )
+        logger.info(f"Historique du chatbot : {total} conversation(s) archivée(s) ({compteurs['messages']} messages)")
+        return total, compteurs['messages']
+
+    @staticmethod
+    def _par_lots(queryset, operation, batch_size, pause=0):
+        """
+        Applique `operation` aux identifiants du queryset par lots : chaque lot est
+        une transaction courte. L'opération doit faire sortir les lignes du queryset.
+        """
+        total = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            with transaction.atomic():
+                total += operation(ids)
+            if len(ids) < batch_size:
+                return total
+            if pause:
+                time.sleep(pause)
@@ -0,0 +1,334 @@
+"""
+Détection des mots-clés des questions du chatbot en une seule passe.
+
+Les étapes d'analyse de ChatbotView (analyse contextuelle, méthode classique) et
+TextToSQLGenerator testaient chaque liste de mots-clés par des
+`any(mot in texte for mot in [...])` successifs : la même question était
+parcourue plusieurs dizaines de fois par requête.
+
+Tous les mots-clés sont désormais réunis dans un vocabulaire compilé une fois
+à l'import (une expression régulière en arbre de préfixes) : une question est
+parcourue une seule fois et l'ensemble des mots-clés présents est ensuite
+interrogé par groupe (`parle_de`) ou par mot (`contient`). La détection garde
+la sémantique des anciens tests : un mot-clé est trouvé s'il apparaît comme
+sous-chaîne du texte en minuscules.
+
+- corriger(question) : correction des fautes de frappe courantes (un accès
+  dictionnaire par mot) ;
+- AnalyseQuestion(question) : texte corrigé et mots-clés détectés, calculés une
+  fois par requête et partagés par les étapes d'analyse.
+"""
+import re
+
+
+# Fautes de frappe courantes : {mot correct: variantes reconnues}
+CORRECTIONS = {
+    # Mots liés aux projets
+    'projet': ['projets', 'projet', 'projé', 'projét'],
+    'projets': ['projets', 'projet', 'projé', 'projét'],
+    'tache': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
+    'taches': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
+    'tâche': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
+    'tâches': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
+
+    # Mots liés aux utilisateurs
+    'utilisateur': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
+    'utilisateurs': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
+    'user': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
+    'users': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
+
+    # Mots liés aux budgets
+    'budget': ['budget', 'budgets', 'budgé', 'budgét', 'budjet', 'budjets'],
+    'budgets': ['budget', 'budgets', 'budgé', 'budgét', 'budjet', 'budjets'],
+
+    # Mots liés aux statuts
+    'statut': ['statut', 'statuts', 'status', 'statue', 'statues'],
+    'statuts': ['statut', 'statuts', 'status', 'statue', 'statues'],
+    'status': ['statut', 'statuts', 'status', 'statue', 'statues'],
+
+    # Mots liés aux priorités
+    'priorite': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
+    'priorité': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
+    'priorites': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
+    'priorités': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
+
+    # Mots liés aux équipes
+    'equipe': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
+    'équipe': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
+    'equipes': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
+    'équipes': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
+
+    # Mots liés aux assignations
+    'assigne': ['assigne', 'assigné', 'assignee', 'assigné', 'assigné'],
+    'assigné': ['assigne', 'assigné', 'assignee', 'assigné', 'assigné'],
+    'assignee': ['assigne', 'assigné', 'assignee', 'assigné', 'assigné'],
+    'assignes': ['assignes', 'assignés', 'assignees', 'assignés', 'assignés'],
+    'assignés': ['assignes', 'assignés', 'assignees', 'assignés', 'assignés'],
+    'assignees': ['assignes', 'assignés', 'assignees', 'assignés', 'assignés'],
+
+    # Mots liés aux responsables
+    'responsable': ['responsable', 'responsables', 'responsabl', 'responsabls'],
+    'responsables': ['responsable', 'responsables', 'responsabl', 'responsabls'],
+
+    # Mots liés aux listes
+    'liste': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
+    'listes': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
+    'list': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
+    'lists': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
+
+    # Mots liés aux descriptions
+    'description': ['description', 'descriptions', 'descripton', 'descriptons'],
+    'descriptions': ['description', 'descriptions', 'descripton', 'descriptons'],
+
+    # Mots liés aux objectifs
+    'objectif': ['objectif', 'objectifs', 'objectiv', 'objectivs'],
+    'objectifs': ['objectif', 'objectifs', 'objectiv', 'objectivs'],
+
+    # Mots liés aux types
+    'type': ['type', 'types', 'typ', 'typs'],
+    'types': ['type', 'types', 'typ', 'typs'],
+
+    # Mots liés aux plannings
+    'planning': ['planning', 'plannings', 'planing', 'planings'],
+    'plannings': ['planning', 'plannings', 'planing', 'planings'],
+}
+
+# Mots-clés de l'analyse contextuelle (ordre de détection des contextes)
+CONTEXTES = {
+    'urgence': ['urgent', 'urgence', 'priorité', 'prioritaire', 'critique', 'important', 'pressé'],
+    'statut': ['statut', 'état', 'en cours', 'terminé', 'en attente', 'actif', 'fini'],
+    'projets': ['projet', 'projets', 'campagne', 'marketing', 'initiative'],
+    'taches': ['tâche', 'tâches', 'tache', 'taches', 'todo', 'travail', 'activité'],
+    'utilisateurs': ['utilisateur', 'utilisateurs', 'équipe', 'team', 'membre', 'membres', 'collaborateur'],
+    'quantite': ['combien', 'nombre', 'total', 'quantité', 'combien de'],
+    'liste': ['liste', 'afficher', 'montrer', 'voir', 'quels sont', 'donne-moi'],
+    'recent': ['récent', 'dernier', 'nouveau', 'récemment', 'dernièrement'],
+    'budgets': ['budget', 'budgets', 'coût', 'coûts', 'prix', 'argent', 'financement', 'financier', 'financière', 'économique', 'économiques'],
+    'planning': ['planning', 'planification', 'début', 'fin', 'échéance', 'échéances', 'date', 'dates', 'durée', 'estimation', 'estimations'],
+    'types': ['type', 'types', 'catégorie', 'catégories', 'classification'],
+    'objectifs': ['objectif', 'objectifs', 'but', 'buts', 'cible', 'cibles', 'mission'],
+    'descriptions': ['description', 'descriptions', 'détail', 'détails', 'contenu', 'contenus'],
+    'risques': ['risque', 'risques', 'danger', 'problème', 'problèmes', 'exposé', 'exposés', 'retard', 'retards', 'dépendance', 'dépendances', 'surcharge', 'équipe', 'ressource', 'ressources'],
+}
+
+# Autres groupes de mots-clés des étapes d'analyse
+GROUPES = {
+    # Question générale (pas liée à l'application)
+    'general': [
+        # Géographie
+        'congo', 'gabon', 'france', 'afrique', 'europe', 'pays', 'ville', 'capitale',
+        # Personnalité
+        'qui es-tu', 'qui es tu', 'présente', 'raconte', 'ton nom', 'ton âge',
+        # Questions personnelles
+        'comment ça va', 'ça va', 'humeur', 'sentiment', 'comment tu te sens',
+        # Salutations
+        'bonjour', 'salut', 'hello', 'bonsoir', 'coucou', 'bonne nuit',
+        # Questions générales
+        'que peux-tu', 'que peux tu', 'que sais-tu', 'que sais tu', 'capable',
+        'aide', 'help', 'conseil', 'suggestion',
+        # Questions sur le monde
+        'météo', 'temps', 'actualité', 'news', 'sport', 'musique', 'film',
+        # Questions philosophiques
+        'vie', 'mort', 'amour', 'bonheur', 'sens de la vie', 'philosophie',
+    ],
+    'application': [
+        'projet', 'projets', 'tâche', 'taches', 'utilisateur', 'utilisateurs',
+        'équipe', 'team', 'marketing', 'campagne', 'document', 'documents',
+        'statistique', 'statistiques', 'liste', 'afficher', 'montrer', 'voir',
+        'combien', 'nombre', 'total', 'qui', 'quels', 'donne-moi', 'donne moi',
+    ],
+
+    # Analyse contextuelle : aiguillage et analyses spécifiques
+    'equipes': ['equipe', 'équipe', 'equipes', 'équipes'],
+    'equipes_membres': ['equipe', 'équipe', 'equipes', 'équipes', 'membre', 'membres'],
+    'assignations': ['assignées', 'assignée', 'assignés', 'assigné', 'membre', 'membres', 'collaborateur', 'collaborateurs'],
+    'termines': ['terminés', 'terminé', 'terminées', 'terminée', 'fini', 'finis', 'finies', 'complété', 'complétés', 'complétées'],
+    'en_attente': ['en attente', 'attente', 'en attente de', 'en standby', 'standby'],
+    'hors_delai': ['hors délai', 'hors delai', 'retard', 'retards', 'en retard'],
+    'rejetes': ['rejetés', 'rejeté', 'rejetées', 'rejetée', 'annulés', 'annulé', 'annulées', 'annulée'],
+    'prioritaires': ['prioritaires', 'prioritaire', 'priorité', 'priorités', 'urgents', 'urgent', 'urgentes', 'urgente', 'critiques', 'critique'],
+    'taches_en_cours': ['en cours', 'cours', 'actives', 'active', 'en cours de', 'en réalisation', 'réalisation'],
+    'taches_en_attente': ['en attente', 'attente', 'en attente de', 'en standby', 'standby', 'bloquées', 'bloquée', 'bloqués', 'bloqué'],
+    'liste_taches': ['liste', 'afficher', 'montrer', 'voir', 'quelles sont', 'donne-moi'],
+    'taches_assignees': ['tache', 'taches', 'tâche', 'tâches', 'assigné', 'assignée', 'assignés', 'assignées', 'responsable', 'responsables'],
+    'equipes_taches': ['equipe', 'équipe', 'equipes', 'équipes', 'tache', 'taches', 'tâche', 'tâches', 'membre', 'membres', 'collaborateur', 'collaborateurs'],
+    'deduction_urgence': ['urgent', 'priorité', 'critique'],
+    'deduction_quantite': ['combien', 'nombre', 'total'],
+    'deduction_liste': ['liste', 'afficher', 'montrer'],
+    'projets_risques': ['projet', 'campagne', 'initiative'],
+
+    # Méthode classique (analyze_and_respond) et génération automatique
+    'recents': ['récent', 'dernier', 'nouveau'],
+
+    # Méthode classique (analyze_and_respond)
+    'classique_utilisateurs': ['utilisateur', 'utilisateurs', 'équipe', 'team', 'membre', 'membres', 'admin', 'administrateur', 'collaborateur'],
+    'classique_liste': ['liste', 'afficher', 'montrer', 'voir', 'donne-moi', 'donne moi'],
+    'classique_documents': ['document', 'documents', 'fichier', 'fichiers', 'généré', 'genere', 'générés', 'generes'],
+    'classique_projets_documents': ['projet', 'projets', 'combien', 'nombre', 'qui ont', 'avec'],
+    'classique_projets': ['projet', 'projets', 'marketing', 'campagne', 'budget', 'planification'],
+    'classique_urgence': ['urgent', 'urgence', 'priorité', 'prioritaire', 'critique', 'important'],
+    'classique_en_attente': ['en attente', 'attente', 'en_attente', 'pending'],
+    'classique_en_cours': ['en cours', 'cours', 'en_cours', 'active', 'actif'],
+    'classique_termines': ['terminé', 'termine', 'fini', 'complété'],
+    'classique_stats_projets': ['combien', 'nombre', 'total', 'statut', 'état', 'statistique'],
+    'classique_taches': ['tâche', 'tâches', 'tache', 'taches', 'todo', 'todos', 'travail', 'travaux', 'activité'],
+    'classique_phases': ['phase', 'phases', 'étape', 'étapes', 'etape', 'etapes', 'avancement', 'processus'],
+    'classique_services': ['service', 'services', 'rôle', 'role', 'rôles', 'roles', 'permission', 'permissions'],
+    'classique_historique': ['historique', 'historiques', 'modification', 'modifications', 'changement', 'changements'],
+    'classique_commentaires': ['commentaire', 'commentaires', 'avis', 'feedback'],
+    'classique_aide': ['aide', 'help', 'conseil', 'conseils', 'comment', 'pourquoi', 'quoi', 'suggestion'],
+    'classique_statistiques': ['statistique', 'statistiques', 'stats', 'résumé', 'resume', 'aperçu', 'apercu', 'vue d\'ensemble'],
+    'classique_salutations': ['bonjour', 'salut', 'hello', 'bonsoir', 'coucou', 'qui es-tu', 'qui es tu', 'présente', 'raconte'],
+    'classique_personnel': ['comment ça va', 'ça va', 'humeur', 'sentiment', 'pense', 'avis', 'opinion'],
+
+    # Génération automatique (TextToSQLGenerator)
+    'intention_compter': ['combien', 'nombre', 'total', 'count'],
+    'intention_lister': ['liste', 'afficher', 'montrer', 'voir'],
+    'intention_relation': ['avec', 'qui ont', 'contenant'],
+
+    # Mots testés isolément par les analyses spécifiques
+    'mots': [
+        'utilisateur', 'tâche', 'tache', 'projet', 'document', 'urgent', 'urgence', 'récent',
+        'tout', 'tous', 'complet', 'attente', 'somme', 'moyen', 'moyenne', 'plus', 'élevé',
+        'haut', 'bas', 'faible', 'commence', 'retard', 'exposé', 'exposés', 'dépendance',
+        'dépendances', 'surcharge', 'budget', 'ressource', 'généré', 'genere',
+    ],
+}
+
+# Mots-clés désignant un modèle (TextToSQLGenerator), dans l'ordre de priorité
+MODELES = {
+    'projet': 'Projet',
+    'projets': 'Projet',
+    'tache': 'Tache',
+    'tâche': 'Tache',
+    'taches': 'Tache',
+    'tâches': 'Tache',
+    'utilisateur': 'User',
+    'utilisateurs': 'User',
+    'user': 'User',
+    'users': 'User',
+    'document': 'DocumentProjet',
+    'documents': 'DocumentProjet',
+    'phase': 'PhaseProjet',
+    'phases': 'PhaseProjet',
+    'service': 'Service',
+    'services': 'Service',
+    'role': 'Role',
+    'rôle': 'Role',
+    'roles': 'Role',
+    'rôles': 'Role',
+    'permission': 'Permission',
+    'permissions': 'Permission',
+    'historique': 'HistoriqueDocumentProjet',
+    'commentaire': 'CommentaireDocumentProjet',
+    'commentaires': 'CommentaireDocumentProjet',
+}
+
+
+class Vocabulaire:
+    """
+    Ensemble de mots-clés compilé en une expression régulière : une passe sur le
+    texte donne tous les mots-clés présents, y compris ceux qui se chevauchent
+    """
+
+    def __init__(self, groupes):
+        self.groupes = {nom: frozenset(mots) for nom, mots in groupes.items()}
+        self.mots = frozenset().union(*self.groupes.values())
+
+        # À chaque position du texte, l'expression (dans une assertion avant, pour
+        # reprendre à la position suivante) renvoie le plus long mot-clé qui y commence ;
+        # les mots-clés plus courts commençant au même endroit en sont des préfixes.
+        self._motif = re.compile(f"(?=({self._arbre(self.mots)}))")
+        self._prefixes = {
+            mot: frozenset(autre for autre in self.mots if mot.startswith(autre))
+            for mot in self.mots
+        }
+
+    @staticmethod
+    def _arbre(mots):
+        """Alternative en arbre de préfixes : un seul chemin essayé par position"""
+        racine = {}
+        for mot in mots:
+            noeud = racine
+            for caractere in mot:
+                noeud = noeud.setdefault(caractere, {})
+            noeud[''] = {}
+
+        def motif(noeud):
+            branches = [re.escape(caractere) + motif(enfant) for caractere, enfant in sorted(noeud.items()) if caractere]
+            if not branches:
+                return ''
+            alternative = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+            # Fin de mot possible : la suite est facultative (gourmande, donc le plus long d'abord)
+            return f"(?:{alternative})?" if '' in noeud else alternative
+
+        return motif(racine)
+
+    def detecter(self, texte):
+        """Mots-clés présents dans `texte` (sous-chaînes, texte déjà en minuscules)"""
+        trouves = set()
+        for correspondance in self._motif.finditer(texte):
+            trouves |= self._prefixes[correspondance.group(1)]
+        return frozenset(trouves)
+
+
+VOCABULAIRE = Vocabulaire({**CONTEXTES, **GROUPES, 'modeles': MODELES})
+
+# Correction de chaque variante (la première correction déclarée l'emporte)
+_CORRECTION_DE = {}
+for _correct, _variantes in CORRECTIONS.items():
+    for _variante in _variantes:
+        _CORRECTION_DE.setdefault(_variante, _correct)
+
+
+def corriger(question):
+    """Corrige les fautes de frappe courantes, mot par mot (casse d'origine préservée)"""
+    mots = question.split()
+    for index, mot in enumerate(mots):
+        # Ponctuation ignorée pour la comparaison
+        correction = _CORRECTION_DE.get(''.join(c for c in mot.lower() if c.isalnum()))
+        if correction is None:
+            continue
+        if mot.isupper():
+            mots[index] = correction.upper()
+        elif mot.istitle():
+            mots[index] = correction.title()
+        else:
+            mots[index] = correction
+    return ' '.join(mots)
+
+
+class Correspondances:
+    """Mots-clés du vocabulaire présents dans un texte en minuscules"""
+
+    def __init__(self, texte):
+        self.texte = texte
+        self.mots = VOCABULAIRE.detecter(texte)
+
+    def parle_de(self, groupe):
+        """Au moins un mot-clé du groupe (contexte ou groupe de GROUPES) est présent"""
+        return not self.mots.isdisjoint(VOCABULAIRE.groupes[groupe])
+
+    def contient(self, *mots):
+        """Au moins un des mots est présent (recherche dans le texte s'il est hors vocabulaire)"""
+        return any(mot in self.mots if mot in VOCABULAIRE.mots else mot in self.texte for mot in mots)
+
+    @property
+    def contextes(self):
+        """Contextes détectés, dans l'ordre de CONTEXTES"""
+        return [contexte for contexte in CONTEXTES if self.parle_de(contexte)]
+
+
+class AnalyseQuestion:
+    """
+    Question analysée une fois par requête :
+    - `brute` : mots-clés de la question telle que posée (méthode classique, génération automatique) ;
+    - `corrigee` : mots-clés de la question corrigée (analyse contextuelle).
+    """
+
+    def __init__(self, question):
+        self.question = question
+        self.texte_corrige = corriger(question)
+        self.brute = Correspondances(question.lower())
+        corrige = self.texte_corrige.lower()
+        self.corrigee = self.brute if corrige == self.brute.texte else Correspondances(corrige)
@@ -0,0 +1,83 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from chatbot.historique import artefacts_nlp, get_config as get_historique_config, mode_nlp
+from chatbot.models import Message
+from chatbot.nlp import PipelineNLP, get_config
+from datetime import timedelta
+import time
+
+
+class Command(BaseCommand):
+    help = (
+        "Calcule les tokens et entités spaCy des messages utilisateur qui n'en ont pas "
+        "(analyse différée ou rattrapage), par lots avec nlp.pipe ; seules les données du "
+        "mode de stockage (CHATBOT_HISTORIQUE['NLP']) sont conservées"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Nombre de messages lus et mis à jour par lot (défaut: 500).'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            help='Nombre maximal de messages traités.'
+        )
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Recalculer aussi les messages déjà analysés (changement de modèle).'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+        limite = options['limit']
+
+        mode = mode_nlp()
+        if mode == 'aucun':
+            self.stdout.write(self.style.WARNING("⚠️ Mode de stockage NLP 'aucun' : rien à calculer"))
+            return
+
+        debut = time.perf_counter()
+        if PipelineNLP.obtenir() is None:
+            self.stdout.write(self.style.ERROR('❌ Aucun modèle spaCy disponible'))
+            return
+        self.stdout.write(
+            f'🧠 Modèle {PipelineNLP.modele} chargé en {time.perf_counter() - debut:.2f}s'
+        )
+
+        # Les messages compactés (cleanup_chatbot_history) ne sont pas réanalysés
+        compacter_apres = get_historique_config()['COMPACTER_APRES_JOURS']
+        messages = Message.objects.filter(sender='user')
+        if compacter_apres:
+            messages = messages.filter(timestamp__gte=timezone.now() - timedelta(days=compacter_apres))
+        if not options['all']:
+            champ = 'spacy_entities' if mode == 'entites' else 'spacy_tokens'
+            messages = messages.filter(**{f'{champ}__isnull': True})
+
+        total = 0
+        dernier_id = 0
+        debut = time.perf_counter()
+        while limite is None or total < limite:
+            taille = batch_size if limite is None else min(batch_size, limite - total)
+            lot = list(messages.filter(id__gt=dernier_id).order_by('id').only('id', 'content')[:taille])
+            if not lot:
+                break
+
+            analyses = PipelineNLP.analyser_lot([message.content for message in lot], get_config()['BATCH_SIZE'])
+            for message, (tokens, entites) in zip(lot, analyses):
+                message.spacy_tokens, message.spacy_entities = artefacts_nlp(tokens, entites)
+            Message.objects.bulk_update(lot, ['spacy_tokens', 'spacy_entities'])
+
+            total += len(lot)
+            dernier_id = lot[-1].id
+            self.stdout.write(f'   - {total} message(s) analysé(s)')
+
+        duree = time.perf_counter() - debut
+        self.stdout.write(self.style.SUCCESS(
+            f'✅ {total} message(s) analysé(s) en {duree:.2f}s'
+            + (f' ({total / duree:.0f} messages/s)' if total and duree else '')
+        ))
@@ -0,0 +1,80 @@
+from django.core.management.base import BaseCommand
+from chatbot.models import Message
+from chatbot.intentions import VOCABULAIRE, AnalyseQuestion, corriger
+import time
+
+EXEMPLES = [
+    "Combien de projets ai-je au total ?",
+    "Quelles tâches sont en cours ?",
+    "Quels projets sont les plus exposés aux retards ?",
+    "Quelles sont les tâches de chaque membre d'équipe ?",
+    "Quel est le budget total de mes projets ?",
+    "Bonjour, que peux-tu faire pour moi ?",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la détection des mots-clés des questions du chatbot : vocabulaire compilé "
+        "(une passe) contre le balayage de chaque liste de mots-clés"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=500,
+            help='Nombre de questions analysées (défaut: 500).'
+        )
+        parser.add_argument(
+            '--repetitions',
+            type=int,
+            default=20,
+            help='Nombre de passages sur les questions (défaut: 20).'
+        )
+
+    def handle(self, *args, **options):
+        questions = self._questions(max(1, options['messages']))
+        repetitions = max(1, options['repetitions'])
+        self.stdout.write(self.style.SUCCESS(
+            f'📊 Détection des mots-clés : {len(questions)} question(s), '
+            f'{len(VOCABULAIRE.mots)} mots-clés, {len(VOCABULAIRE.groupes)} groupes'
+        ))
+
+        # Référence : chaque groupe testé par des `in` successifs, sur la question brute et corrigée
+        groupes = [list(mots) for mots in VOCABULAIRE.groupes.values()]
+        textes = [(question.lower(), corriger(question).lower()) for question in questions]
+
+        def balayer():
+            for brute, corrigee in textes:
+                for texte in (brute, corrigee):
+                    for mots in groupes:
+                        any(mot in texte for mot in mots)
+
+        def analyser():
+            for question in questions:
+                AnalyseQuestion(question)
+
+        reference = self._mesurer(balayer, repetitions) / len(questions)
+        compilee = self._mesurer(analyser, repetitions) / len(questions)
+
+        self.stdout.write(f'   - Balayage des listes : {reference:.1f} µs/question')
+        self.stdout.write(f'   - Vocabulaire compilé : {compilee:.1f} µs/question (correction comprise)')
+        self.stdout.write(self.style.SUCCESS(f'✅ Gain : x{reference / compilee:.1f}'))
+
+    @staticmethod
+    def _questions(nombre):
+        questions = list(
+            Message.objects.filter(sender='user').order_by('-id').values_list('content', flat=True)[:nombre]
+        )
+        while len(questions) < nombre:
+            questions.append(EXEMPLES[len(questions) % len(EXEMPLES)])
+        return questions
+
+    @staticmethod
+    def _mesurer(fonction, repetitions):
+        """Durée moyenne d'un passage en µs"""
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            fonction()
+        return (time.perf_counter() - debut) * 1e6 / repetitions
@@ -0,0 +1,96 @@
+from django.core.management.base import BaseCommand
+from chatbot.models import Message
+from chatbot.nlp import PipelineNLP, get_config
+import time
+
+try:
+    import resource
+except ImportError:
+    # Indisponible sous Windows : la mémoire n'est pas mesurée
+    resource = None
+
+EXEMPLES = [
+    "Quels sont les projets en retard ?",
+    "Combien de tâches sont assignées à Marie Dupont ce mois-ci ?",
+    "Donne-moi l'avancement du projet Campagne Printemps à Paris",
+    "Quelles tâches urgentes restent à faire pour le service Marketing ?",
+    "Qui est le chef de projet du lancement produit prévu le 15 mars ?",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure le chargement du pipeline spaCy du chatbot (temps, mémoire) et la latence "
+        "de l'analyse, message par message et par lots (nlp.pipe)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--messages',
+            type=int,
+            default=500,
+            help='Nombre de messages analysés (défaut: 500).'
+        )
+        parser.add_argument(
+            '--complet',
+            action='store_true',
+            help='Mesurer aussi le pipeline complet (sans exclusion de composants) pour comparaison.'
+        )
+
+    def handle(self, *args, **options):
+        textes = self._textes(max(1, options['messages']))
+        self.stdout.write(self.style.SUCCESS(f'📊 Pipeline spaCy : {len(textes)} message(s)'))
+
+        # Le pic de mémoire ne redescend pas : le pipeline réduit est mesuré en premier
+        self._mesurer('Pipeline réduit', get_config()['EXCLURE'], textes)
+        if options['complet']:
+            self._mesurer('Pipeline complet', (), textes)
+
+    @staticmethod
+    def _textes(nombre):
+        textes = list(
+            Message.objects.filter(sender='user').order_by('-id').values_list('content', flat=True)[:nombre]
+        )
+        while len(textes) < nombre:
+            textes.append(EXEMPLES[len(textes) % len(EXEMPLES)])
+        return textes
+
+    def _mesurer(self, titre, exclure, textes):
+        memoire_avant = self._memoire()
+
+        debut = time.perf_counter()
+        nlp, modele = PipelineNLP.charger(exclure)
+        chargement = time.perf_counter() - debut
+        if nlp is None:
+            self.stdout.write(self.style.ERROR('   ❌ Aucun modèle spaCy disponible'))
+            return
+        memoire = self._memoire()
+
+        debut = time.perf_counter()
+        PipelineNLP.extraire(nlp(textes[0]))
+        premier = (time.perf_counter() - debut) * 1000
+
+        debut = time.perf_counter()
+        for texte in textes:
+            PipelineNLP.extraire(nlp(texte))
+        unitaire = (time.perf_counter() - debut) * 1000 / len(textes)
+
+        debut = time.perf_counter()
+        for doc in nlp.pipe(textes, batch_size=get_config()['BATCH_SIZE']):
+            PipelineNLP.extraire(doc)
+        lot = (time.perf_counter() - debut) * 1000 / len(textes)
+
+        self.stdout.write(f'\n   {titre} ({modele} : {", ".join(nlp.pipe_names) or "tokenizer"})')
+        self.stdout.write(f'   - Chargement         : {chargement:.2f} s')
+        if memoire is not None:
+            self.stdout.write(f'   - Mémoire (pic RSS)  : +{memoire - memoire_avant:.0f} Mo')
+        self.stdout.write(f'   - Premier message    : {premier:.1f} ms')
+        self.stdout.write(f'   - Message par message: {unitaire:.2f} ms/message')
+        self.stdout.write(f'   - Par lots (nlp.pipe): {lot:.2f} ms/message')
+
+    @staticmethod
+    def _memoire():
+        """Pic de mémoire résidente du processus en Mo (Linux : ru_maxrss en Ko)"""
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
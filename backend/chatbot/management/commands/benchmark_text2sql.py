@@ -0,0 +1,111 @@
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from chatbot.text2sql import MODELES_REQUETABLES, planifier, text2sql_generator
+import time
+
+EXEMPLES = [
+    "Combien de projets ai-je au total ?",
+    "Combien de projets sont en cours ?",
+    "Liste des tâches en attente",
+    "Montre-moi tous les utilisateurs",
+    "Liste des projets récents",
+    "Quels projets ont des documents ?",
+    "Liste des documents générés",
+    "Combien de tâches sont terminées ?",
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure l'exécution des requêtes générées par Text2SQL : plans compilés en appels ORM "
+        "(colonnes affichées, lignes limitées) contre le code ORM exécuté par eval()"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--repetitions',
+            type=int,
+            default=20,
+            help='Nombre de passages sur les questions (défaut: 20).'
+        )
+
+    def handle(self, *args, **options):
+        repetitions = max(1, options['repetitions'])
+        intentions = [
+            intention for intention in (text2sql_generator.analyze_query_intent(question) for question in EXEMPLES)
+            if intention['target_model']
+        ]
+        self.stdout.write(self.style.SUCCESS(f'📊 Text2SQL : {len(intentions)} question(s), {repetitions} passage(s)'))
+
+        contexte = {nom: apps.get_model(chemin) for nom, chemin in MODELES_REQUETABLES.items()}
+
+        def par_eval(intention):
+            # Ancienne exécution : code ORM en texte, eval() puis instances complètes
+            plan = planifier.__wrapped__(
+                intention['query_type'], intention['target_model'],
+                tuple(intention['filters']), tuple(intention['relations'])
+            )
+            try:
+                resultat = eval(str(plan), {"__builtins__": {}}, contexte)
+            except Exception:
+                return None, 0
+            if isinstance(resultat, int):
+                return text2sql_generator.format_query_result(resultat, intention), 0
+            elements = list(resultat)
+            return self._formater_instances(elements, intention), len(elements)
+
+        def par_plan(intention):
+            plan = text2sql_generator.generate_django_query(intention)
+            resultat = text2sql_generator.execute_generated_query(plan)
+            if resultat is None:
+                return None, 0
+            lignes = len(getattr(resultat, 'lignes', ()))
+            return text2sql_generator.format_query_result(resultat, intention, plan), lignes
+
+        mesures = {}
+        for nom, executer in (('eval', par_eval), ('plan', par_plan)):
+            reponses, lignes, requetes = [], 0, 0
+            debut = time.perf_counter()
+            for _ in range(repetitions):
+                with CaptureQueriesContext(connection) as capture:
+                    resultats = [executer(intention) for intention in intentions]
+                requetes += len(capture.captured_queries)
+                lignes += sum(nombre for _, nombre in resultats)
+                reponses = [reponse for reponse, _ in resultats]
+            duree = (time.perf_counter() - debut) * 1e3 / (repetitions * len(intentions))
+            mesures[nom] = (duree, lignes / repetitions, requetes / repetitions, reponses)
+
+        for nom, libelle in (('eval', 'Code ORM + eval()'), ('plan', 'Plans compilés')):
+            duree, lignes, requetes, _ = mesures[nom]
+            self.stdout.write(
+                f'   - {libelle} : {duree:.2f} ms/question, {lignes:.0f} instance(s)/ligne(s) chargée(s), '
+                f'{requetes:.0f} requête(s) par passage'
+            )
+
+        if mesures['eval'][3] == mesures['plan'][3]:
+            self.stdout.write(self.style.SUCCESS('✅ Réponses identiques'))
+        else:
+            self.stdout.write(self.style.WARNING('⚠️ Réponses différentes entre les deux exécutions'))
+        self.stdout.write(self.style.SUCCESS(f"✅ Gain : x{mesures['eval'][0] / mesures['plan'][0]:.1f}"))
+
+    @staticmethod
+    def _formater_instances(elements, intention):
+        """Ancien formatage d'une liste d'instances"""
+        if not elements:
+            return "Aucun élément trouvé."
+        reponse = f"Liste des {intention['target_model'].lower()} :\n"
+        for element in elements[:10]:
+            if hasattr(element, 'nom'):
+                reponse += f"- {element.nom}"
+                if hasattr(element, 'statut'):
+                    reponse += f" ({element.statut})"
+                reponse += "\n"
+            elif hasattr(element, 'username'):
+                reponse += f"- {element.username}\n"
+            else:
+                reponse += f"- {str(element)}\n"
+        if len(elements) > 10:
+            reponse += f"... et {len(elements) - 10} autres éléments"
+        return reponse
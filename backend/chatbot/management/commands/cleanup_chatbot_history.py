@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from chatbot.historique import Historique, get_config
+
+
+class Command(BaseCommand):
+    help = (
+        "Retire les données NLP des anciens messages du chatbot et archive les conversations "
+        "inactives (messages compressés dans ConversationArchivee), par lots"
+    )
+
+    def add_arguments(self, parser):
+        config = get_config()
+        parser.add_argument(
+            '--compact-days',
+            type=int,
+            default=config['COMPACTER_APRES_JOURS'],
+            help=f"Retirer les tokens et entités spaCy des messages de plus de N jours "
+                 f"(défaut: {config['COMPACTER_APRES_JOURS']} ; 0 : pas de compactage)."
+        )
+        parser.add_argument(
+            '--archive-days',
+            type=int,
+            default=config['ARCHIVER_APRES_JOURS'],
+            help=f"Archiver les conversations sans message depuis N jours "
+                 f"(défaut: {config['ARCHIVER_APRES_JOURS']} ; 0 : pas d'archivage)."
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=100,
+            help='Nombre de conversations archivées par transaction, x10 pour les messages compactés (défaut: 100).'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Pause en secondes entre deux lots pour limiter la charge (défaut: 0).'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+
+        self.stdout.write(self.style.WARNING("Début du nettoyage de l'historique du chatbot..."))
+
+        if options['compact_days']:
+            compactes = Historique.compacter(
+                options['compact_days'], batch_size=batch_size * 10, pause=options['pause']
+            )
+            self.stdout.write(self.style.SUCCESS(f'🗜️ {compactes} message(s) compacté(s)'))
+
+        if options['archive_days']:
+            conversations, messages = Historique.archiver(
+                options['archive_days'], batch_size=batch_size, pause=options['pause']
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f'📦 {conversations} conversation(s) archivée(s) ({messages} message(s))'
+            ))
+
+        self.stdout.write(self.style.SUCCESS('   - Nettoyage terminé avec succès!'))
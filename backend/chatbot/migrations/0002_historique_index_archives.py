@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:28
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chatbot', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationArchivee',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('session_id', models.CharField(max_length=100)),
+                ('conversation_id', models.PositiveBigIntegerField(help_text="Identifiant de la conversation d'origine")),
+                ('created_at', models.DateTimeField()),
+                ('derniere_activite', models.DateTimeField()),
+                ('archivee_le', models.DateTimeField(default=django.utils.timezone.now)),
+                ('nombre_messages', models.PositiveIntegerField(default=0)),
+                ('messages', models.BinaryField(help_text='Messages en JSON compressé (zlib)')),
+            ],
+            options={
+                'ordering': ['-derniere_activite'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', 'timestamp'], name='chatbot_mes_convers_476aed_idx'),
+        ),
+        migrations.AddField(
+            model_name='conversationarchivee',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='conversationarchivee',
+            index=models.Index(fields=['user', 'derniere_activite'], name='chatbot_con_user_id_cabc14_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversationarchivee',
+            index=models.Index(fields=['session_id'], name='chatbot_con_session_7e44ea_idx'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.conf import settings
 from django.utils import timezone
+import json
+import zlib
 
 class Conversation(models.Model):
     """Modèle pour stocker les conversations avec le chatbot"""
@@ -34,6 +36,39 @@ class Message(models.Model):
     
     class Meta:
         ordering = ['timestamp']
+        indexes = [
+            # Historique paginé par curseur d'une conversation, dernière activité (rétention)
+            models.Index(fields=['conversation', 'timestamp']),
+        ]
     
     def __str__(self):
         return f"{self.sender}: {self.content[:50]}..."
+
+class ConversationArchivee(models.Model):
+    """
+    Conversation inactive archivée par la commande cleanup_chatbot_history : ses
+    messages (sans données NLP) sont conservés en un seul bloc JSON compressé,
+    hors des tables Conversation et Message
+    """
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True)
+    session_id = models.CharField(max_length=100)
+    conversation_id = models.PositiveBigIntegerField(help_text="Identifiant de la conversation d'origine")
+    created_at = models.DateTimeField()
+    derniere_activite = models.DateTimeField()
+    archivee_le = models.DateTimeField(default=timezone.now)
+    nombre_messages = models.PositiveIntegerField(default=0)
+    messages = models.BinaryField(help_text="Messages en JSON compressé (zlib)")
+    
+    class Meta:
+        ordering = ['-derniere_activite']
+        indexes = [
+            models.Index(fields=['user', 'derniere_activite']),
+            models.Index(fields=['session_id']),
+        ]
+    
+    def __str__(self):
+        return f"Archive de la conversation {self.conversation_id} - {self.user or self.session_id}"
+    
+    def lire_messages(self):
+        """Messages archivés : [{'sender', 'content', 'timestamp', 'deepseek_used'}]"""
+        return json.loads(zlib.decompress(bytes(self.messages)).decode('utf-8'))
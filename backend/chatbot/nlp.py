@@ -0,0 +1,120 @@
+"""
+Pipeline spaCy partagé du chatbot, chargé à la première utilisation.
+
+Le modèle n'est plus chargé à l'import de chatbot.views : les commandes de
+gestion et les migrations ne paient ni son temps de chargement ni sa mémoire.
+Une seule instance est chargée par processus (verrou), avec seulement les
+composants utiles aux données conservées (tokens et entités nommées) : les
+autres composants (analyse syntaxique, lemmatisation, morphologie) sont exclus
+au chargement.
+
+- PipelineNLP.analyser(texte) : tokens et entités d'un message ;
+- PipelineNLP.analyser_lot(textes) : même résultat par lots (nlp.pipe), pour les
+  rattrapages de Message.spacy_tokens (commande backfill_spacy_tokens) ;
+- PipelineNLP.prechauffer_en_fond() : chargement au démarrage d'un worker
+  (CHATBOT_NLP['PRECHARGER']), sans bloquer le démarrage.
+"""
+from django.conf import settings as django_settings
+import logging
+import threading
+import time
+
+try:
+    import spacy
+except ImportError:
+    spacy = None
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        # Modèles essayés dans l'ordre
+        'MODELES': ['fr_core_news_md', 'fr_core_news_sm', 'en_core_web_sm'],
+        # Composants exclus au chargement (tokens et entités n'utilisent que tok2vec et ner)
+        'EXCLURE': ['parser', 'tagger', 'morphologizer', 'attribute_ruler', 'lemmatizer', 'senter'],
+        'EN_LIGNE': True,       # False : analyse différée (commande backfill_spacy_tokens)
+        'PRECHARGER': False,    # Chargement en fond au démarrage du worker (asgi / wsgi)
+        'BATCH_SIZE': 64,       # Textes par lot pour nlp.pipe
+        **getattr(django_settings, 'CHATBOT_NLP', {}),
+    }
+
+
+class PipelineNLP:
+    """Instance spaCy unique du processus, chargée paresseusement"""
+
+    _nlp = None
+    _charge = False             # Chargement tenté (réussi ou non) : pas de nouvel essai
+    _verrou = threading.Lock()
+
+    # Mesures du chargement (commande benchmark_nlp, logs)
+    modele = None
+    duree_chargement = None
+
+    @classmethod
+    def obtenir(cls):
+        """Pipeline spaCy du processus (None si spaCy ou aucun modèle n'est disponible)"""
+        if not cls._charge:
+            with cls._verrou:
+                if not cls._charge:
+                    debut = time.perf_counter()
+                    cls._nlp, cls.modele = cls.charger(get_config()['EXCLURE'])
+                    cls.duree_chargement = time.perf_counter() - debut
+                    cls._charge = True
+                    if cls._nlp is not None:
+                        logger.info(
+                            f"Modèle spaCy {cls.modele} chargé en {cls.duree_chargement:.2f}s "
+                            f"(composants: {', '.join(cls._nlp.pipe_names) or 'tokenizer'})"
+                        )
+        return cls._nlp
+
+    @staticmethod
+    def charger(exclure=()):
+        """Charge un nouveau pipeline (premier modèle disponible) : (nlp, modèle) ou (None, None)"""
+        if spacy is None:
+            logger.warning("spaCy non installé. Le traitement NLP sera désactivé.")
+            return None, None
+
+        for modele in get_config()['MODELES']:
+            try:
+                return spacy.load(modele, exclude=list(exclure)), modele
+            except OSError:
+                continue
+        logger.warning("Aucun modèle spaCy trouvé. Le traitement NLP sera désactivé.")
+        return None, None
+
+    @classmethod
+    def prechauffer_en_fond(cls):
+        """Charge le pipeline dans un thread pour que la première requête n'attende pas"""
+        threading.Thread(target=cls.obtenir, name='chatbot-nlp', daemon=True).start()
+
+    @staticmethod
+    def extraire(doc):
+        """(tokens, entités) d'un document spaCy"""
+        return [token.text for token in doc], [(ent.text, ent.label_) for ent in doc.ents]
+
+    @classmethod
+    def analyser(cls, texte):
+        """(tokens, entités) d'un texte ; listes vides si le NLP est indisponible"""
+        nlp = cls.obtenir()
+        if nlp is None:
+            return [], []
+        return cls.extraire(nlp(texte))
+
+    @classmethod
+    def analyser_lot(cls, textes, batch_size=None):
+        """(tokens, entités) de chaque texte, calculés par lots avec nlp.pipe"""
+        nlp = cls.obtenir()
+        if nlp is None:
+            return [([], []) for _ in textes]
+        batch_size = batch_size or get_config()['BATCH_SIZE']
+        return [cls.extraire(doc) for doc in nlp.pipe(textes, batch_size=batch_size)]
+
+    @classmethod
+    def reinitialiser(cls):
+        """Oublie l'instance chargée (tests)"""
+        with cls._verrou:
+            cls._nlp = None
+            cls._charge = False
+            cls.modele = None
+            cls.duree_chargement = None
@@ -0,0 +1,13 @@
+from gestion.pagination import KeysetCursorPagination
+
+
+class MessageCursorPagination(KeysetCursorPagination):
+    """
+    Pagination par curseur (keyset) sur (timestamp, id) pour l'historique d'une
+    conversation : la première page contient les messages les plus récents,
+    `next` mène aux messages plus anciens.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-timestamp', '-id')
@@ -0,0 +1,32 @@
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .connaissances import InstantaneConnaissances
+from projects.models import Projet, Tache, MembreProjet
+
+
+# ============================================================================
+# INVALIDATION DE L'INSTANTANÉ DES CONNAISSANCES DU CHATBOT
+# ============================================================================
+
+@receiver(post_save, sender=Projet)
+@receiver(post_save, sender=Tache)
+@receiver(post_save, sender=MembreProjet)
+@receiver(post_delete, sender=Projet)
+@receiver(post_delete, sender=Tache)
+@receiver(post_delete, sender=MembreProjet)
+def invalider_connaissances(sender, **kwargs):
+    """
+    Un projet, une tâche ou une équipe a changé : l'instantané lu par le
+    chatbot sera reconstruit après le commit
+    """
+    InstantaneConnaissances.invalider()
+
+
+@receiver(m2m_changed, sender=Tache.assigne_a.through)
+def invalider_connaissances_assignations(sender, action, **kwargs):
+    """
+    Les assignations d'une tâche ont changé (tâches par utilisateur et par équipe)
+    """
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        InstantaneConnaissances.invalider()
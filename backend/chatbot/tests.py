@@ -1,3 +1,591 @@
-from django.test import TestCase
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock, skipIf
+import json
+import threading
+import time
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .connaissances import InstantaneConnaissances, lire_budget
+from .deepseek import ClientDeepSeek, DeepSeekErreur, DeepSeekIndisponible, httpx
+from .historique import Historique, artefacts_nlp
+from .intentions import VOCABULAIRE, AnalyseQuestion
+from .models import Conversation, ConversationArchivee, Message
+from .text2sql import ResultatListe, planifier, text2sql_generator
+
+
+class _StubDeepSeek(BaseHTTPRequestHandler):
+    """Serveur local imitant /v1/chat/completions (compte les appels reçus)"""
+
+    appels = 0
+    statut = 200
+    delai = 0
+
+    def do_POST(self):
+        type(self).appels += 1
+        corps = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+        time.sleep(self.delai)
+        if corps.get('stream') and self.statut == 200:
+            return self.diffuser(f"Réponse à: {corps['messages'][-1]['content']}")
+        reponse = json.dumps({
+            'choices': [{'message': {'content': f"Réponse à: {corps['messages'][-1]['content']}"}}]
+        }).encode('utf-8')
+        self.send_response(self.statut)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(reponse)))
+        self.end_headers()
+        self.wfile.write(reponse)
+
+    def diffuser(self, texte):
+        """Réponse en Server-Sent Events, un morceau par mot"""
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.end_headers()
+        for mot in texte.split(' '):
+            morceau = {'choices': [{'delta': {'content': f"{mot} "}}]}
+            self.wfile.write(f"data: {json.dumps(morceau)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        self.wfile.write(b"data: [DONE]\n\n")
+
+    def log_message(self, *args):
+        pass
+
+
+class _ServeurDeepSeek:
+    """Serveur local _StubDeepSeek et configuration du client pour chaque test"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.serveur = ThreadingHTTPServer(('127.0.0.1', 0), _StubDeepSeek)
+        threading.Thread(target=cls.serveur.serve_forever, daemon=True).start()
+        cls.url = f"http://127.0.0.1:{cls.serveur.server_port}/v1/chat/completions"
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.serveur.shutdown()
+        cls.serveur.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        _StubDeepSeek.appels = 0
+        _StubDeepSeek.statut = 200
+        _StubDeepSeek.delai = 0
+        parametres = override_settings(
+            CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+            CHATBOT_DEEPSEEK={
+                'URL': self.url, 'API_KEY': 'test', 'TIMEOUT_LECTURE': 5,
+                'SEUIL_ECHECS': 2, 'DELAI_REOUVERTURE': 60,
+            },
+        )
+        parametres.enable()
+        self.addCleanup(parametres.disable)
+        cache.clear()
+        ClientDeepSeek.reinitialiser()
+
+
+class ClientDeepSeekTest(_ServeurDeepSeek, SimpleTestCase):
+    """Cache, appel unique et disjoncteur du client DeepSeek face à un serveur local"""
+
+    def test_question_identique_servie_depuis_le_cache(self):
+        premiere = ClientDeepSeek.completer('consigne', 'prompt 1', question='Combien de projets ?', donnees='12')
+        seconde = ClientDeepSeek.completer('consigne', 'prompt 2', question='  combien de PROJETS', donnees='12')
+        self.assertEqual(premiere, seconde)
+        self.assertEqual(_StubDeepSeek.appels, 1)
+
+        # Données différentes : nouvel appel
+        ClientDeepSeek.completer('consigne', 'prompt 3', question='Combien de projets ?', donnees='13')
+        self.assertEqual(_StubDeepSeek.appels, 2)
+
+    def test_requetes_simultanees_un_seul_appel(self):
+        _StubDeepSeek.delai = 0.3
+        resultats = []
+
+        def demander():
+            resultats.append(ClientDeepSeek.completer('consigne', 'prompt', question='q', donnees='d'))
+
+        threads = [threading.Thread(target=demander) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(resultats), 5)
+        self.assertEqual(len(set(resultats)), 1)
+        self.assertEqual(_StubDeepSeek.appels, 1)
+
+    def test_disjoncteur_ouvert_apres_echecs(self):
+        _StubDeepSeek.statut = 500
+        for index in range(2):
+            with self.assertRaises(DeepSeekErreur):
+                ClientDeepSeek.completer('consigne', f'prompt {index}')
+        self.assertEqual(_StubDeepSeek.appels, 2)
+
+        # Disjoncteur ouvert : DeepSeek n'est plus appelé
+        with self.assertRaises(DeepSeekIndisponible):
+            ClientDeepSeek.completer('consigne', 'prompt 3')
+        self.assertEqual(_StubDeepSeek.appels, 2)
+
+        # Délai écoulé : un appel d'essai réussi referme le disjoncteur
+        _StubDeepSeek.statut = 200
+        ClientDeepSeek.disjoncteur.ouvert_jusqu_a = 0
+        ClientDeepSeek.completer('consigne', 'prompt 4')
+        self.assertFalse(ClientDeepSeek.disjoncteur.ouvert)
+        self.assertEqual(_StubDeepSeek.appels, 3)
+
+    @skipIf(httpx is None, "httpx non installé")
+    async def test_reponse_diffusee_puis_servie_depuis_le_cache(self):
+        morceaux = [morceau async for morceau in ClientDeepSeek.diffuser('consigne', 'un deux', question='q')]
+        self.assertEqual(morceaux, ['Réponse ', 'à: ', 'un ', 'deux '])
+
+        # Réponse complète en cache, partagée avec completer()
+        self.assertEqual(
+            await sync_to_async(ClientDeepSeek.completer)('consigne', 'autre prompt', question='q'),
+            'Réponse à: un deux '
+        )
+        self.assertEqual(_StubDeepSeek.appels, 1)
+
+    @skipIf(httpx is None, "httpx non installé")
+    async def test_echec_de_diffusion_compte_pour_le_disjoncteur(self):
+        _StubDeepSeek.statut = 500
+        with self.assertRaises(DeepSeekErreur):
+            async for _ in ClientDeepSeek.diffuser('consigne', 'prompt'):
+                pass
+        self.assertEqual(ClientDeepSeek.disjoncteur.echecs, 1)
+
+    @skipIf(httpx is None, "httpx non installé")
+    async def test_client_parti_pendant_l_essai_libere_le_disjoncteur(self):
+        # Disjoncteur semi-ouvert : seuil atteint, délai écoulé
+        ClientDeepSeek.disjoncteur.echecs = 2
+        diffusion = ClientDeepSeek.diffuser('consigne', 'un deux trois')
+        self.assertEqual(await diffusion.__anext__(), 'Réponse ')
+        self.assertTrue(ClientDeepSeek.disjoncteur._essai_en_cours)
+
+        # Déconnexion du client : générateur fermé en cours de diffusion
+        await diffusion.aclose()
+        self.assertFalse(ClientDeepSeek.disjoncteur._essai_en_cours)
+        self.assertEqual(ClientDeepSeek.disjoncteur.echecs, 2)
+
+        morceaux = [morceau async for morceau in ClientDeepSeek.diffuser('consigne', 'quatre')]
+        self.assertEqual(''.join(morceaux), 'Réponse à: quatre ')
+        self.assertEqual(ClientDeepSeek.disjoncteur.echecs, 0)
+
+
+class ChatbotStreamViewTest(_ServeurDeepSeek, TransactionTestCase):
+    """Réponse diffusée en Server-Sent Events et messages sauvegardés à la fin"""
+
+    async def demander(self, question, session_id='session-sse'):
+        reponse = await self.async_client.post(
+            reverse('chatbot-ask-stream'),
+            {'question': question, 'session_id': session_id},
+            content_type='application/json'
+        )
+        self.assertEqual(reponse['Content-Type'], 'text/event-stream')
+        corps = b''.join([morceau async for morceau in reponse.streaming_content]).decode('utf-8')
+        evenements = []
+        for bloc in corps.strip().split('\n\n'):
+            nom, donnees = bloc.split('\n')
+            evenements.append((nom[len('event: '):], json.loads(donnees[len('data: '):])))
+        return evenements
+
+    async def test_morceaux_puis_reponse_complete(self):
+        evenements = await self.demander('Bonjour')
+        noms = [nom for nom, _ in evenements]
+        self.assertEqual(noms[0], 'debut')
+        self.assertEqual(noms[-1], 'fin')
+
+        fin = evenements[-1][1]
+        self.assertEqual(fin['session_id'], 'session-sse')
+        if httpx is not None:
+            self.assertGreater(noms.count('morceau'), 1)
+        # Réponse finale nettoyée comme celle de ChatbotView
+        texte = ''.join(donnees['texte'] for nom, donnees in evenements if nom == 'morceau').strip()
+        self.assertTrue(fin['deepseek_used'])
+        self.assertEqual(fin['answer'], f"{texte}\n\n🤖 DeepSeek IA")
+
+        messages = await sync_to_async(list)(
+            Message.objects.filter(conversation__session_id='session-sse')
+            .order_by('id').values_list('sender', 'content', 'deepseek_used')
+        )
+        self.assertEqual(messages, [('user', 'Bonjour', False), ('bot', texte, True)])
+
+    async def test_reponse_de_repli_si_deepseek_echoue(self):
+        _StubDeepSeek.statut = 500
+        evenements = await self.demander('Bonjour')
+        self.assertNotIn('morceau', [nom for nom, _ in evenements])
+        fin = evenements[-1][1]
+        self.assertFalse(fin['deepseek_used'])
+        self.assertTrue(fin['answer'].endswith('⚡ Système'))
+
+    async def test_question_vide(self):
+        reponse = await self.async_client.post(
+            reverse('chatbot-ask-stream'), {'question': ' '}, content_type='application/json'
+        )
+        self.assertEqual(reponse.status_code, 400)
+
+
+# Aiguillage relevé avant la détection compilée des mots-clés (chatbot/intentions.py) :
+# (question, analyse contextuelle, méthode classique, intention text2sql)
+ROUTAGE_ATTENDU = [
+    ("Combien d'utilisateurs ai-je ?", 'get_users_stats', 'get_users_stats', ('count', 'User', (), ())),
+    ("Combien d'utilisateurs sont actifs ?", 'get_active_projects', 'get_users_stats', ('count', 'User', (('statut', 'en_cours'),), ())),
+    ('Combien de projets ai-je au total ?', 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Combien de projets ont un budget défini ?', 'get_budgets_summary', 'get_completed_projects', ('count', 'Projet', (), ())),
+    ('Combien de projets par type ?', 'get_projects_types_count', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Combien de projets sont en cours ?', 'get_active_projects', 'get_active_projects', ('count', 'Projet', (('statut', 'en_cours'),), ())),
+    ('Combien de projets sont prioritaires ?', '_analyze_urgency_context', 'get_urgent_projects', ('count', 'Projet', (), ())),
+    ('Combien de projets sont terminés ?', 'get_completed_projects', 'get_completed_projects', ('count', 'Projet', (('statut', 'termine'),), ())),
+    ('Combien de tâches sont en attente ?', 'get_pending_projects', 'get_tasks_stats', ('count', 'Tache', (('statut', 'en_attente'),), ())),
+    ('Combien de tâches sont en cours ?', 'get_active_projects', 'get_tasks_stats', ('count', 'Tache', (('statut', 'en_cours'),), ())),
+    ('Comment optimiser mes projets ?', 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ("Comment puis-je t'utiliser ?", 'get_projects_stats', 'get_help_advice', ('count', None, (), ())),
+    ("Est-ce que l'étape de développement est critique ?", '_analyze_urgency_context', 'get_phases_stats', ('count', None, (), ())),
+    ('Que peux-tu faire pour moi ?', None, None, ('count', None, (), ())),
+    ('Quel est le budget moyen des projets ?', None, 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quel est le budget total de mes projets ?', 'get_budgets_summary', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quel est le nombre de projets urgents ?', '_analyze_urgency_context', 'get_urgent_projects', ('count', 'Projet', (('priorite', 'haute'),), ())),
+    ('Quel est le nombre total de tâches ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (), ())),
+    ('Quel est le type de projet le plus courant ?', 'get_projects_types_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quelle est la durée des projets ?', 'get_projects_duration', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quelles sont les dates de début des projets ?', 'get_projects_start_dates', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quelles sont les dates de fin des projets ?', 'get_projects_end_dates', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quelles sont les descriptions des projets ?', 'get_projects_descriptions_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quelles sont les statistiques générales de ma plateforme ?', 'get_projects_stats', 'get_general_stats', ('count', None, (), ())),
+    ("Quelles sont les tâches de chaque membre d'équipe ?", 'get_teams_tasks_list', 'get_users_stats', ('count', 'Tache', (), ())),
+    ('Quelles tâches ont une priorité basse ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (('priorite', 'haute'),), ())),
+    ('Quelles tâches ont une priorité haute ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (('priorite', 'haute'),), ())),
+    ('Quelles tâches ont une priorité moyenne ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (('priorite', 'haute'),), ())),
+    ('Quelles tâches sont en cours ?', 'get_active_projects', 'get_tasks_stats', ('count', 'Tache', (('statut', 'en_cours'),), ())),
+    ('Quelles tâches sont hors délai ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (), ())),
+    ('Quelles tâches sont rejetées ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (), ())),
+    ('Quelles tâches sont terminées ?', 'get_completed_projects', 'get_tasks_stats', ('count', 'Tache', (('statut', 'termine'),), ())),
+    ('Quels projets commencent bientôt ?', 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets ont des problèmes de budget ?', 'get_projects_budgets_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets ont les budgets les plus bas ?', 'get_lowest_budget_projects', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets ont les budgets les plus élevés ?', 'get_highest_budget_projects', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets ont une priorité élevée ?', 'get_projects_stats', 'get_urgent_projects', ('count', 'Projet', (('priorite', 'haute'),), ())),
+    ('Quels projets se terminent bientôt ?', 'get_projects_stats', 'get_completed_projects', ('count', 'Projet', (), ())),
+    ('Quels projets sont en retard ?', "get_projects_by_status('hors_delai',)", 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets sont exposés aux retards ?', "get_projects_by_status('hors_delai',)", 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets sont hors délai ?', "get_projects_by_status('hors_delai',)", 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets sont les plus exposés aux retards ?', "get_projects_by_status('hors_delai',)", 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets sont rejetés ?', "get_projects_by_status('rejete',)", 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels projets sont terminés ?', 'get_completed_projects', 'get_completed_projects', ('count', 'Projet', (('statut', 'termine'),), ())),
+    ('Quels projets sont terminés récemment ?', 'get_completed_projects', 'get_completed_projects', ('count', 'Projet', (('statut', 'termine'),), ())),
+    ('Quels sont les budgets des projets ?', 'get_projects_budgets_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels sont les objectifs des projets ?', 'get_projects_objectives_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ("Quels sont les projets dépendant d'une API externe ?", 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels sont les projets les plus urgents ?', '_analyze_urgency_context', 'get_urgent_projects', ('count', 'Projet', (('priorite', 'haute'),), ())),
+    ('Quels sont les risques actuels ?', 'get_projects_stats', None, ('count', None, (), ())),
+    ('Quels sont les risques budgétaires ?', 'get_projects_stats', None, ('count', None, (), ())),
+    ("Quels sont les risques d'équipe ?", 'get_users_list', 'get_users_stats', ('count', None, (), ())),
+    ('Quels sont les risques du projet marketing ?', 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels sont les types de projets ?', 'get_projects_types_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels sont mes projets actifs ?', 'get_active_projects', 'get_active_projects', ('count', 'Projet', (('statut', 'en_cours'),), ())),
+    ('Quels utilisateurs sont actifs ?', 'get_active_projects', 'get_users_stats', ('count', 'User', (('statut', 'en_cours'),), ())),
+    ('Qui a quelles tâches assignées ?', 'get_tasks_stats', 'get_tasks_stats', ('count', 'Tache', (), ())),
+    ('Qui sont les administrateurs ?', 'get_projects_stats', 'get_users_stats', ('count', None, (), ())),
+    ('Y a-t-il des risques de surcharge ?', '_analyze_overload_risks', None, ('count', None, (), ())),
+    ("Y a-t-il un risque si un utilisateur quitte l'équipe ?", 'get_users_list', 'get_users_stats', ('count', 'User', (), ())),
+    ('Bonjour', None, None, ('count', None, (), ())),
+    ('Tu connais le Congo ?', None, None, ('count', None, (), ())),
+    ('Liste mes utilisateurs', 'get_users_list', 'get_users_list', ('list', 'User', (), ())),
+    ('Donne-moi la liste des tâches', 'get_tasks_list', 'get_tasks_stats', ('list', 'Tache', (), ())),
+    ('Quels documents ont été générés ?', 'get_projects_stats', 'get_documents_stats', ('count', 'DocumentProjet', (('origine', 'genere'),), ())),
+    ('combien de projé en cours', 'get_active_projects', None, ('count', None, (('statut', 'en_cours'),), ())),
+    ('Statut des tachs', None, None, ('count', None, (), ())),
+    ('Montre les users', 'get_users_list', None, ('count', 'User', (), ())),
+    ('LISTE DES PROJETS', 'get_projects_stats', 'get_all_projects', ('list', 'Projet', (), ())),
+    ('Quels sont les commentaires ?', 'get_projects_stats', 'get_commentaires_stats', ('count', 'CommentaireDocumentProjet', (), ())),
+    ('Historique des modifications des documents', 'get_projects_stats', 'get_documents_stats', ('count', 'DocumentProjet', (), ())),
+    ('Quelles phases sont en cours ?', 'get_active_projects', 'get_phases_stats', ('count', 'PhaseProjet', (('statut', 'en_cours'),), ())),
+    ('Quels services et rôles existent ?', 'get_projects_stats', 'get_services_stats', ('count', 'Service', (), ())),
+    ('ça va ?', None, None, ('count', None, (), ())),
+    ("Qui sont les membres de l'équipe ?", 'get_users_list', 'get_users_stats', ('count', None, (), ())),
+    ('Planning des projets', 'get_projects_planning_overview', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('budjet total', 'get_budgets_summary', None, ('count', None, (), ())),
+    ('Affiche les Equipes et leurs tâches', 'get_teams_tasks_list', 'get_tasks_stats', ('count', 'Tache', (), ())),
+    ('Quels sont les derniers projets ?', 'get_projects_stats', 'get_recent_projects', ('recent', 'Projet', (), ())),
+    ('Que penses-tu de la vie ?', None, None, ('count', None, (), ())),
+    ("Quel temps fait-il à Libreville aujourd'hui ?", None, None, ('count', None, (), ())),
+    ('Quels projets ont des documents ?', 'get_projects_stats', 'get_projects_with_documents', ('count', 'Projet', (), ('documents',))),
+    ('Combien de documents ont été générés ?', 'get_projects_stats', 'get_projects_with_documents', ('count', 'DocumentProjet', (('origine', 'genere'),), ())),
+    ('Quelles sont les phases du projet ?', 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Résumé des statistiques de la plateforme', 'get_projects_stats', 'get_general_stats', ('count', None, (), ())),
+    ('Quels sont les feedbacks reçus ?', 'get_projects_stats', 'get_commentaires_stats', ('count', None, (), ())),
+    ('Quelles sont les permissions des rôles ?', 'get_projects_objectives_overview', 'get_services_stats', ('count', 'Role', (), ())),
+    ('Aide-moi à organiser ma campagne', 'get_projects_stats', 'get_projects_stats', ('count', None, (), ())),
+    ('Montre-moi tous les projets', 'get_projects_stats', 'get_projects_stats', ('count', 'Projet', (), ())),
+    ('Quels collaborateurs sont assignés ?', 'get_users_list', 'get_users_stats', ('count', None, (), ())),
+]
+
+
+class RoutageQuestionsTest(SimpleTestCase):
+    """La détection en une passe doit aiguiller les questions comme les anciens balayages"""
+
+    # Méthodes qui lisent la base : remplacées par leur nom
+    TERMINAUX = [
+        '_analyze_delay_risks', '_analyze_exposed_projects', '_analyze_dependency_risks',
+        '_analyze_overload_risks', '_analyze_budget_risks', '_analyze_team_risks',
+        'analyze_project_risks', '_analyze_urgency_context',
+    ]
+
+    def setUp(self):
+        from projects.models import Projet
+        from .views import ChatbotView
+
+        def terminal(nom):
+            def methode(vue, *args):
+                if nom == '_analyze_urgency_context':
+                    return nom
+                return nom + (repr(args) if args else '')
+            return methode
+
+        noms = [nom for nom in dir(ChatbotView) if nom.startswith('get_')] + self.TERMINAUX
+        for nom in noms:
+            remplacement = mock.patch.object(ChatbotView, nom, terminal(nom))
+            remplacement.start()
+            self.addCleanup(remplacement.stop)
+        remplacement = mock.patch.object(type(Projet.objects), 'count', lambda manager: 1)
+        remplacement.start()
+        self.addCleanup(remplacement.stop)
+        self.vue = ChatbotView()
+
+    def test_routage_identique(self):
+        from .text2sql import text2sql_generator
+
+        for question, contextuelle, classique, intention in ROUTAGE_ATTENDU:
+            with self.subTest(question=question):
+                analyse = AnalyseQuestion(question)
+                self.assertEqual(self.vue.intelligent_context_analysis(question, analyse), contextuelle)
+                self.assertEqual(self.vue.analyze_and_respond(question, analyse), classique)
+                obtenue = text2sql_generator.analyze_query_intent(question, analyse)
+                self.assertEqual(
+                    (obtenue['query_type'], obtenue['target_model'], tuple(obtenue['filters']), tuple(obtenue['relations'])),
+                    intention
+                )
+
+    def test_detection_equivalente_aux_sous_chaines(self):
+        textes = [question.lower() for question, *_ in ROUTAGE_ATTENDU]
+        textes += [AnalyseQuestion(question).corrigee.texte for question, *_ in ROUTAGE_ATTENDU]
+        # Mots-clés qui se chevauchent ou s'emboîtent
+        textes += ['combien de projets terminées en attente de', 'qui es-tu ? tâchesprojetsquels']
+        for texte in textes:
+            with self.subTest(texte=texte):
+                self.assertEqual(
+                    VOCABULAIRE.detecter(texte),
+                    frozenset(mot for mot in VOCABULAIRE.mots if mot in texte)
+                )
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class InstantaneConnaissancesTest(TestCase):
+    """Les réponses sur les projets, tâches et budgets sont formatées depuis l'instantané"""
+
+    def setUp(self):
+        from projects.models import Projet, Tache, MembreProjet
+        from .views import ChatbotView
+
+        cache.clear()
+        InstantaneConnaissances.reinitialiser()
+        self.addCleanup(InstantaneConnaissances.reinitialiser)
+
+        User = get_user_model()
+        self.chef = User.objects.create_user(
+            username='chef', email='chef@example.com', password='x', prenom='Chef', nom='Projet'
+        )
+        self.membre = User.objects.create_user(
+            username='membre', email='membre@example.com', password='x', prenom='Membre', nom='Un'
+        )
+        self.projet = Projet.objects.create(
+            code='PRJ-001', nom='Lancement', description='Description', objectif='Objectif',
+            type='marketing', proprietaire=self.chef, budget='15 000 €', statut='en_cours'
+        )
+        Projet.objects.create(
+            code='PRJ-002', nom='Salon', description='Description', objectif='Objectif',
+            type='evenement', proprietaire=self.chef, budget='Non défini'
+        )
+        # Sans les signaux : seul l'instantané est testé ici, pas les notifications d'équipe
+        MembreProjet.objects.bulk_create([
+            MembreProjet(projet=self.projet, utilisateur=self.membre, role_projet='membre')
+        ])
+        tache = Tache.objects.create(projet=self.projet, titre='Brief créatif', statut='en_cours')
+        tache.assigne_a.set([self.membre])
+        Tache.objects.create(projet=self.projet, titre='Plan média')
+        self.vue = ChatbotView()
+
+    def test_lire_budget(self):
+        self.assertEqual(lire_budget('15 000 €'), 15000.0)
+        self.assertEqual(lire_budget('2500,50'), 2500.5)
+        self.assertIsNone(lire_budget('Non défini'))
+        self.assertIsNone(lire_budget(None))
+
+    def test_reponses_sans_requete_apres_construction(self):
+        reponses = [
+            self.vue.get_all_projects, self.vue.get_users_tasks_list, self.vue.get_teams_tasks_list,
+            self.vue.get_budgets_summary, self.vue.get_highest_budget_projects,
+            self.vue.get_projects_budgets_overview, self.vue._analyze_all_projects_risks,
+        ]
+        premieres = [reponse() for reponse in reponses]
+        with self.assertNumQueries(0):
+            self.assertEqual([reponse() for reponse in reponses], premieres)
+
+        self.assertIn('Liste complète de tous les projets (2)', premieres[0])
+        self.assertIn('Brief créatif', premieres[1])
+        self.assertIn('Tâches non assignées (1)', premieres[1])
+        self.assertIn('Équipe du projet: Lancement (PRJ-001)', premieres[2])
+        self.assertIn('Budget total : 15,000.00€', premieres[3])
+        self.assertIn('• Salon: Non défini', premieres[3])
+        self.assertTrue(premieres[4].startswith('💰 Projets avec les budgets les plus élevés\n\n1. Lancement'))
+
+    def test_signal_invalide_l_instantane(self):
+        from projects.models import Projet
+
+        self.assertIn('(2)', self.vue.get_all_projects())
+        with self.captureOnCommitCallbacks(execute=True):
+            Projet.objects.create(
+                code='PRJ-003', nom='Webinaire', description='Description', objectif='Objectif',
+                type='digital', proprietaire=self.chef
+            )
+        reponse = self.vue.get_all_projects()
+        self.assertIn('(3)', reponse)
+        self.assertIn('Webinaire', reponse)
+
+
+class PlanRequeteTest(TestCase):
+    """Les intentions Text2SQL sont exécutées par des plans ORM, sans eval()"""
+
+    def setUp(self):
+        from projects.models import Projet
+
+        chef = get_user_model().objects.create_user(
+            username='chef', email='chef@example.com', password='x', prenom='Chef', nom='Projet'
+        )
+        Projet.objects.bulk_create([
+            Projet(
+                code=f'PRJ-{index:03d}', nom=f'Projet {index}', description='Description', objectif='Objectif',
+                type='marketing', proprietaire=chef, statut='en_cours' if index % 2 else 'termine'
+            )
+            for index in range(15)
+        ])
+
+    def _intention(self, question):
+        return text2sql_generator.analyze_query_intent(question)
+
+    def test_plan_en_cache_et_code_equivalent(self):
+        intention = self._intention('Combien de projets sont en cours ?')
+        plan = text2sql_generator.generate_django_query(intention)
+        self.assertIs(text2sql_generator.generate_django_query(dict(intention)), plan)
+        self.assertEqual(str(plan), "Projet.objects.filter(statut='en_cours').count()")
+        self.assertEqual(str(planifier('recent', 'Tache', (), ())), "Tache.objects.order_by('-cree_le')[:5]")
+        self.assertEqual(
+            str(planifier('list', 'Projet', (), ('documents',))),
+            "Projet.objects.filter(documents__isnull=False).distinct()"
+        )
+        self.assertEqual(text2sql_generator.process_natural_language_query('Combien de projets sont en cours ?'), 'Nombre de projet : 7')
+
+    def test_liste_limitee_aux_colonnes_affichees(self):
+        intention = self._intention('Liste des projets')
+        plan = text2sql_generator.generate_django_query(intention)
+        # Onze lignes lues (dix affichées + une pour savoir s'il en reste), puis le total
+        with self.assertNumQueries(2):
+            resultat = plan.executer()
+        self.assertIsInstance(resultat, ResultatListe)
+        self.assertEqual(resultat.total, 15)
+        self.assertEqual(set(resultat.lignes[0]), {'pk', 'nom', 'statut'})
+
+        reponse = text2sql_generator.format_query_result(resultat, intention, plan)
+        self.assertTrue(reponse.startswith('Liste des projet :\n- Projet 0 (termine)\n- Projet 1 (en_cours)\n'))
+        self.assertTrue(reponse.endswith('... et 5 autres éléments'))
+
+
+class HistoriqueTest(TestCase):
+    """Historique paginé par curseur, mode de stockage NLP, compactage et archivage"""
+
+    def creer_conversation(self, session_id, nombre, age_jours=0):
+        conversation = Conversation.objects.create(
+            session_id=session_id, created_at=timezone.now() - timedelta(days=age_jours + 1)
+        )
+        debut = timezone.now() - timedelta(days=age_jours)
+        Message.objects.bulk_create([
+            Message(
+                conversation=conversation,
+                sender='user' if index % 2 == 0 else 'bot',
+                content=f"Message {index}",
+                timestamp=debut + timedelta(seconds=index),
+                spacy_tokens=['Message', str(index)],
+                spacy_entities=[],
+            )
+            for index in range(nombre)
+        ])
+        return conversation
+
+    def test_historique_pagine_du_plus_recent_au_plus_ancien(self):
+        self.creer_conversation('session-historique', 120)
+
+        pages = []
+        url = reverse('chatbot-history') + '?session_id=session-historique&page_size=50'
+        while url:
+            with self.assertNumQueries(2):
+                donnees = self.client.get(url).json()
+            pages.append([message['text'] for message in donnees['messages']])
+            url = donnees['next']
+
+        self.assertEqual([len(page) for page in pages], [50, 50, 20])
+        # Chaque page est chronologique ; la première contient les messages les plus récents
+        self.assertEqual(pages[0][0], 'Message 70')
+        self.assertEqual(pages[0][-1], 'Message 119')
+        self.assertEqual(pages[2][0], 'Message 0')
+        self.assertEqual(sum(pages[::-1], []), [f"Message {index}" for index in range(120)])
+
+    def test_historique_pagine_avec_horodatages_identiques(self):
+        conversation = self.creer_conversation('session-ex-aequo', 60)
+        Message.objects.filter(conversation=conversation).update(timestamp=timezone.now())
+
+        textes = []
+        url = reverse('chatbot-history') + '?session_id=session-ex-aequo&page_size=25'
+        while url:
+            donnees = self.client.get(url).json()
+            textes.extend(message['text'] for message in donnees['messages'])
+            url = donnees['next']
+
+        # Départage sur l'id : chaque message une seule fois, sans OFFSET
+        self.assertEqual(sorted(textes), sorted(f"Message {index}" for index in range(60)))
+
+    def test_mode_de_stockage_nlp(self):
+        tokens, entites = ['Budget', 'Gabon'], [('Gabon', 'LOC')]
+        self.assertEqual(artefacts_nlp(tokens, entites), (tokens, entites))
+        with override_settings(CHATBOT_HISTORIQUE={'NLP': 'entites'}):
+            self.assertEqual(artefacts_nlp(tokens, entites), (None, entites))
+        with override_settings(CHATBOT_HISTORIQUE={'NLP': 'aucun'}):
+            self.assertEqual(artefacts_nlp(tokens, entites), (None, None))
+
+    def test_compactage_des_anciens_messages(self):
+        ancienne = self.creer_conversation('ancienne', 5, age_jours=40)
+        recente = self.creer_conversation('recente', 5)
+
+        self.assertEqual(Historique.compacter(30, batch_size=2), 5)
+        self.assertFalse(ancienne.messages.filter(spacy_tokens__isnull=False).exists())
+        self.assertEqual(recente.messages.filter(spacy_tokens__isnull=False).count(), 5)
+
+    def test_archivage_des_conversations_inactives(self):
+        ancienne = self.creer_conversation('ancienne', 3, age_jours=200)
+        self.creer_conversation('vide', 0, age_jours=200)
+        self.creer_conversation('active', 3)
+
+        self.assertEqual(Historique.archiver(180, batch_size=1), (2, 3))
+        self.assertEqual(list(Conversation.objects.values_list('session_id', flat=True)), ['active'])
+        self.assertEqual(Message.objects.count(), 3)
+
+        archive = ConversationArchivee.objects.get(conversation_id=ancienne.id)
+        self.assertEqual(archive.nombre_messages, 3)
+        self.assertEqual(
+            [(message['sender'], message['content']) for message in archive.lire_messages()],
+            [('user', 'Message 0'), ('bot', 'Message 1'), ('user', 'Message 2')]
+        )
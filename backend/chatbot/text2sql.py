@@ -2,14 +2,176 @@
 """
 Module pour la génération automatique de requêtes Django ORM à partir de texte naturel
 utilisant LangChain et l'IA.
+
+L'intention d'une question est traduite en plan de requête (PlanRequete : modèle,
+filtres, relations, tri, agrégat, limite) exécuté directement avec l'ORM, sans
+eval(). Les plans sont mis en cache par intention normalisée (LRU) et les listes
+ne lisent que les colonnes affichées (values()) des premières lignes.
 """
 
 import logging
-from typing import Optional, Dict, Any
+from functools import lru_cache
+from typing import Optional, Dict, Any, Tuple
+from django.apps import apps
 from django.db import models
 
+from .intentions import AnalyseQuestion, MODELES
+
 logger = logging.getLogger(__name__)
 
+# Modèles interrogeables : nom utilisé dans les intentions -> 'app.Modele'
+MODELES_REQUETABLES = {
+    'Projet': 'projects.Projet',
+    'Tache': 'projects.Tache',
+    'PhaseProjet': 'projects.PhaseProjet',
+    'User': 'accounts.User',
+    'Service': 'accounts.Service',
+    'Role': 'accounts.Role',
+    'Permission': 'accounts.Permission',
+    'DocumentProjet': 'documents.DocumentProjet',
+    'HistoriqueDocumentProjet': 'documents.HistoriqueDocumentProjet',
+    'CommentaireDocumentProjet': 'documents.CommentaireDocumentProjet',
+}
+
+
+def _affichage(modele, champ, valeur):
+    """Libellé d'une valeur à choix (équivalent de get_<champ>_display)"""
+    return dict(modele._meta.get_field(champ).flatchoices).get(valeur, valeur)
+
+
+def _libelle_document(ligne, prefixe=''):
+    from documents.models import DocumentProjet
+    type_document = _affichage(DocumentProjet, 'type_document', ligne[f'{prefixe}type_document'])
+    return f"{type_document or 'Document'} - {ligne[f'{prefixe}projet__nom']} (v{ligne[f'{prefixe}version']})"
+
+
+def _libelle_historique(ligne):
+    from documents.models import HistoriqueDocumentProjet
+    action = _affichage(HistoriqueDocumentProjet, 'action', ligne['action'])
+    return f"{_libelle_document(ligne, 'document__')} - {action} par {ligne['utilisateur__username']}"
+
+
+_COLONNES_DOCUMENT = ('type_document', 'projet__nom', 'version')
+_COLONNES_DOCUMENT_LIE = tuple(f'document__{colonne}' for colonne in _COLONNES_DOCUMENT)
+
+# Colonnes lues pour lister un modèle et libellé d'une ligne : nom (et statut) si le
+# modèle en a, sinon l'équivalent de son __str__
+PROJECTIONS = {
+    'Projet': (('nom', 'statut'), lambda ligne: f"{ligne['nom']} ({ligne['statut']})"),
+    'Tache': (('projet__code', 'titre'), lambda ligne: f"{ligne['projet__code']} - {ligne['titre']}"),
+    'PhaseProjet': (('nom',), lambda ligne: ligne['nom']),
+    'User': (('nom',), lambda ligne: ligne['nom']),
+    'Service': (('nom',), lambda ligne: ligne['nom']),
+    'Role': (('nom',), lambda ligne: ligne['nom']),
+    'Permission': (('code',), lambda ligne: ligne['code']),
+    'DocumentProjet': (_COLONNES_DOCUMENT, _libelle_document),
+    'HistoriqueDocumentProjet': (_COLONNES_DOCUMENT_LIE + ('action', 'utilisateur__username'), _libelle_historique),
+    'CommentaireDocumentProjet': (
+        _COLONNES_DOCUMENT_LIE + ('auteur__username',),
+        lambda ligne: f"Commentaire sur {_libelle_document(ligne, 'document__')} par {ligne['auteur__username']}",
+    ),
+}
+
+
+class ResultatListe:
+    """Premières lignes d'une liste (dictionnaires values()) et nombre total d'éléments"""
+
+    def __init__(self, lignes, total):
+        self.lignes = lignes
+        self.total = total
+
+
+class PlanRequete:
+    """
+    Requête ORM décrite par des données : modèle, filtres (champ, valeur), relations
+    non vides (avec distinct), tri, limite et agrégat ('count' ou None pour une liste)
+    """
+
+    # Lignes affichées dans une liste ; une de plus est lue pour savoir s'il en reste
+    LIGNES_AFFICHEES = 10
+
+    def __init__(self, modele, filtres=(), relations=(), tri=None, limite=None, agregat=None):
+        self.modele = modele
+        self.filtres = tuple(filtres)
+        self.relations = tuple(relations)
+        self.tri = tri
+        self.limite = limite
+        self.agregat = agregat
+
+    def __str__(self):
+        """Code ORM équivalent (logs et comparaison avec l'ancienne exécution par eval)"""
+        code = f"{self.modele}.objects"
+        conditions = [f"{champ}={valeur!r}" for champ, valeur in self.filtres]
+        conditions += [f"{relation}__isnull=False" for relation in self.relations]
+        if conditions:
+            code += f".filter({', '.join(conditions)})"
+        if self.relations:
+            code += ".distinct()"
+        if self.tri:
+            code += f".order_by('{self.tri}')"
+        if self.agregat == 'count':
+            return code + ".count()"
+        if not conditions and not self.tri:
+            code += ".all()"
+        if self.limite is not None:
+            code += f"[:{self.limite}]"
+        return code
+
+    def queryset(self):
+        queryset = apps.get_model(MODELES_REQUETABLES[self.modele]).objects.all()
+        if self.filtres:
+            queryset = queryset.filter(**dict(self.filtres))
+        if self.relations:
+            queryset = queryset.filter(**{f"{relation}__isnull": False for relation in self.relations}).distinct()
+        if self.tri:
+            queryset = queryset.order_by(self.tri)
+        return queryset
+
+    def executer(self):
+        """Nombre d'éléments, ou ResultatListe limitée aux colonnes affichées"""
+        queryset = self.queryset()
+        if self.agregat == 'count':
+            return queryset.count()
+
+        # La clé primaire garde les lignes distinctes malgré la projection ; sans tri
+        # (ni ordre par défaut du modèle), les lignes suivent la clé primaire
+        if not queryset.ordered:
+            queryset = queryset.order_by('pk')
+        queryset = queryset.values('pk', *PROJECTIONS[self.modele][0])
+        borne = self.LIGNES_AFFICHEES + 1
+        if self.limite is not None:
+            borne = min(borne, self.limite)
+        lignes = list(queryset[:borne])
+        total = len(lignes)
+        if total > self.LIGNES_AFFICHEES:
+            total = queryset.count()
+            if self.limite is not None:
+                total = min(total, self.limite)
+        return ResultatListe(lignes[:self.LIGNES_AFFICHEES], total)
+
+    def libelle(self, ligne):
+        return PROJECTIONS[self.modele][1](ligne)
+
+
+@lru_cache(maxsize=256)
+def planifier(query_type: str, model: str, filters: Tuple, relations: Tuple) -> PlanRequete:
+    """Plan de requête d'une intention normalisée (mis en cache)"""
+    if query_type in ("count", "list"):
+        agregat = 'count' if query_type == "count" else None
+        if filters:
+            return PlanRequete(model, filtres=filters, agregat=agregat)
+        if relations:
+            return PlanRequete(model, relations=relations, agregat=agregat)
+        return PlanRequete(model, agregat=agregat)
+
+    if query_type == "recent":
+        return PlanRequete(model, tri='-cree_le', limite=5)
+
+    if query_type == "with_relation" and relations:
+        return PlanRequete(model, relations=relations)
+
+    return PlanRequete(model)
+
 class TextToSQLGenerator:
     """
     Générateur de requêtes Django ORM à partir de texte naturel.
@@ -22,33 +184,7 @@ class TextToSQLGenerator:
     
     def _get_model_mappings(self) -> Dict[str, str]:
         """Mappage des modèles Django disponibles"""
-        return {
-            'projet': 'Projet',
-            'projets': 'Projet',
-            'tache': 'Tache',
-            'tâche': 'Tache',
-            'taches': 'Tache',
-            'tâches': 'Tache',
-            'utilisateur': 'User',
-            'utilisateurs': 'User',
-            'user': 'User',
-            'users': 'User',
-            'document': 'DocumentProjet',
-            'documents': 'DocumentProjet',
-            'phase': 'PhaseProjet',
-            'phases': 'PhaseProjet',
-            'service': 'Service',
-            'services': 'Service',
-            'role': 'Role',
-            'rôle': 'Role',
-            'roles': 'Role',
-            'rôles': 'Role',
-            'permission': 'Permission',
-            'permissions': 'Permission',
-            'historique': 'HistoriqueDocumentProjet',
-            'commentaire': 'CommentaireDocumentProjet',
-            'commentaires': 'CommentaireDocumentProjet',
-        }
+        return dict(MODELES)
     
     def _get_query_templates(self) -> Dict[str, str]:
         """Templates de requêtes courantes"""
@@ -62,50 +198,50 @@ class TextToSQLGenerator:
             'with_relation': "{model}.objects.filter({relation}__isnull=False).distinct()",
         }
     
-    def analyze_query_intent(self, user_input: str) -> Dict[str, Any]:
+    def analyze_query_intent(self, user_input: str, analyse: Optional[AnalyseQuestion] = None) -> Dict[str, Any]:
         """
         Analyse l'intention de la requête utilisateur
         """
-        user_input_lower = user_input.lower()
+        question = (analyse or AnalyseQuestion(user_input)).brute
         
         # Détecter le type de requête
         query_type = "count"  # Par défaut
-        if any(word in user_input_lower for word in ['combien', 'nombre', 'total', 'count']):
+        if question.parle_de('intention_compter'):
             query_type = "count"
-        elif any(word in user_input_lower for word in ['liste', 'afficher', 'montrer', 'voir']):
+        elif question.parle_de('intention_lister'):
             query_type = "list"
-        elif any(word in user_input_lower for word in ['récent', 'dernier', 'nouveau']):
+        elif question.parle_de('recents'):
             query_type = "recent"
-        elif any(word in user_input_lower for word in ['avec', 'qui ont', 'contenant']):
+        elif question.parle_de('intention_relation'):
             query_type = "with_relation"
         
         # Détecter le modèle cible
         target_model = None
         for keyword, model_name in self.model_mappings.items():
-            if keyword in user_input_lower:
+            if question.contient(keyword):
                 target_model = model_name
                 break
         
-        # Détecter les filtres
+        # Détecter les filtres (champ, valeur)
         filters = []
-        if 'actif' in user_input_lower or 'en cours' in user_input_lower:
-            filters.append("statut='en_cours'")
-        elif 'terminé' in user_input_lower or 'terminé' in user_input_lower:
-            filters.append("statut='termine'")
-        elif 'en attente' in user_input_lower:
-            filters.append("statut='en_attente'")
-        elif 'urgent' in user_input_lower or 'urgence' in user_input_lower or 'priorité' in user_input_lower:
-            filters.append("priorite='haute'")
-        elif 'généré' in user_input_lower or 'genere' in user_input_lower:
-            filters.append("origine='genere'")
+        if question.contient('actif', 'en cours'):
+            filters.append(('statut', 'en_cours'))
+        elif question.contient('terminé'):
+            filters.append(('statut', 'termine'))
+        elif question.contient('en attente'):
+            filters.append(('statut', 'en_attente'))
+        elif question.contient('urgent', 'urgence', 'priorité'):
+            filters.append(('priorite', 'haute'))
+        elif question.contient('généré', 'genere'):
+            filters.append(('origine', 'genere'))
         
         # Détecter les relations
         relations = []
-        if 'document' in user_input_lower and 'projet' in user_input_lower:
+        if question.contient('document') and question.contient('projet'):
             relations.append("documents")
-        elif 'tache' in user_input_lower and 'projet' in user_input_lower:
+        elif question.contient('tache') and question.contient('projet'):
             relations.append("taches")
-        elif 'utilisateur' in user_input_lower and 'projet' in user_input_lower:
+        elif question.contient('utilisateur') and question.contient('projet'):
             relations.append("membres")
         
         return {
@@ -116,94 +252,41 @@ class TextToSQLGenerator:
             'original_input': user_input
         }
     
-    def generate_django_query(self, intent: Dict[str, Any]) -> Optional[str]:
+    def generate_django_query(self, intent: Dict[str, Any]) -> Optional[PlanRequete]:
         """
-        Génère une requête Django ORM basée sur l'intention analysée
+        Plan de requête correspondant à l'intention analysée
         """
         try:
             if not intent['target_model']:
                 return None
             
-            model = intent['target_model']
-            query_type = intent['query_type']
-            filters = intent['filters']
-            relations = intent['relations']
-            
-            # Construire la requête selon le type
-            if query_type == "count":
-                if filters:
-                    filter_str = ", ".join(filters)
-                    query = f"{model}.objects.filter({filter_str}).count()"
-                elif relations:
-                    relation_str = ", ".join([f"{rel}__isnull=False" for rel in relations])
-                    query = f"{model}.objects.filter({relation_str}).distinct().count()"
-                else:
-                    query = f"{model}.objects.count()"
-            
-            elif query_type == "list":
-                if filters:
-                    filter_str = ", ".join(filters)
-                    query = f"{model}.objects.filter({filter_str})"
-                elif relations:
-                    relation_str = ", ".join([f"{rel}__isnull=False" for rel in relations])
-                    query = f"{model}.objects.filter({relation_str}).distinct()"
-                else:
-                    query = f"{model}.objects.all()"
-            
-            elif query_type == "recent":
-                query = f"{model}.objects.order_by('-cree_le')[:5]"
-            
-            elif query_type == "with_relation":
-                if relations:
-                    relation_str = ", ".join([f"{rel}__isnull=False" for rel in relations])
-                    query = f"{model}.objects.filter({relation_str}).distinct()"
-                else:
-                    query = f"{model}.objects.all()"
-            
-            else:
-                query = f"{model}.objects.all()"
-            
-            logger.info(f"[Text2SQL] Requête générée: {query}")
-            return query
+            plan = planifier(
+                intent['query_type'],
+                intent['target_model'],
+                tuple(intent['filters']),
+                tuple(intent['relations']),
+            )
+            logger.info(f"[Text2SQL] Requête générée: {plan}")
+            return plan
             
         except Exception as e:
             logger.error(f"[Text2SQL] Erreur lors de la génération de requête: {e}")
             return None
     
-    def execute_generated_query(self, query: str) -> Any:
+    def execute_generated_query(self, plan: PlanRequete) -> Any:
         """
-        Exécute la requête générée et retourne les résultats
+        Exécute le plan de requête et retourne les résultats
         """
         try:
-            # Import dynamique des modèles
-            from projects.models import Projet, Tache, PhaseProjet
-            from accounts.models import User, Service, Role, Permission
-            from documents.models import DocumentProjet, HistoriqueDocumentProjet, CommentaireDocumentProjet
-            
-            # Créer un contexte local avec tous les modèles
-            local_context = {
-                'Projet': Projet,
-                'Tache': Tache,
-                'PhaseProjet': PhaseProjet,
-                'User': User,
-                'Service': Service,
-                'Role': Role,
-                'Permission': Permission,
-                'DocumentProjet': DocumentProjet,
-                'HistoriqueDocumentProjet': HistoriqueDocumentProjet,
-                'CommentaireDocumentProjet': CommentaireDocumentProjet,
-            }
-            
-            # Exécuter la requête
-            result = eval(query, {"__builtins__": {}}, local_context)
-            logger.info(f"[Text2SQL] Requête exécutée avec succès: {query}")
+            result = plan.executer()
+            logger.info(f"[Text2SQL] Requête exécutée avec succès: {plan}")
             return result
             
         except Exception as e:
             logger.error(f"[Text2SQL] Erreur lors de l'exécution de la requête: {e}")
             return None
     
-    def format_query_result(self, result: Any, intent: Dict[str, Any]) -> str:
+    def format_query_result(self, result: Any, intent: Dict[str, Any], plan: Optional[PlanRequete] = None) -> str:
         """
         Formate le résultat de la requête en texte lisible
         """
@@ -216,28 +299,20 @@ class TextToSQLGenerator:
                 model_name = intent['target_model']
                 return f"Nombre de {model_name.lower()} : {result}"
             
-            # Si c'est une QuerySet
-            elif hasattr(result, '__iter__') and not isinstance(result, str):
-                items = list(result)
-                if not items:
+            # Si c'est une liste (premières lignes et total)
+            elif isinstance(result, ResultatListe):
+                if not result.total:
                     return "Aucun élément trouvé."
                 
+                plan = plan or self.generate_django_query(intent)
                 model_name = intent['target_model']
                 response = f"Liste des {model_name.lower()} :\n"
                 
-                for item in items[:10]:  # Limiter à 10 éléments
-                    if hasattr(item, 'nom'):
-                        response += f"- {item.nom}"
-                        if hasattr(item, 'statut'):
-                            response += f" ({item.statut})"
-                        response += "\n"
-                    elif hasattr(item, 'username'):
-                        response += f"- {item.username}\n"
-                    else:
-                        response += f"- {str(item)}\n"
+                for ligne in result.lignes:
+                    response += f"- {plan.libelle(ligne)}\n"
                 
-                if len(items) > 10:
-                    response += f"... et {len(items) - 10} autres éléments"
+                if result.total > len(result.lignes):
+                    response += f"... et {result.total - len(result.lignes)} autres éléments"
                 
                 return response
             
@@ -249,27 +324,27 @@ class TextToSQLGenerator:
             logger.error(f"[Text2SQL] Erreur lors du formatage: {e}")
             return "Erreur lors du formatage des résultats."
     
-    def process_natural_language_query(self, user_input: str) -> str:
+    def process_natural_language_query(self, user_input: str, analyse: Optional[AnalyseQuestion] = None) -> str:
         """
         Traite une requête en langage naturel et retourne la réponse formatée
         """
         try:
             # Analyser l'intention
-            intent = self.analyze_query_intent(user_input)
+            intent = self.analyze_query_intent(user_input, analyse)
             logger.info(f"[Text2SQL] Intention analysée: {intent}")
             
-            # Générer la requête
-            query = self.generate_django_query(intent)
-            if not query:
+            # Générer le plan de requête
+            plan = self.generate_django_query(intent)
+            if not plan:
                 return "Je n'ai pas pu comprendre votre question. Pouvez-vous la reformuler ?"
             
             # Exécuter la requête
-            result = self.execute_generated_query(query)
+            result = self.execute_generated_query(plan)
             if result is None:
                 return "Erreur lors de l'exécution de la requête."
             
             # Formater le résultat
-            formatted_result = self.format_query_result(result, intent)
+            formatted_result = self.format_query_result(result, intent, plan)
             return formatted_result
             
         except Exception as e:
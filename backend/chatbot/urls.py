@@ -1,9 +1,11 @@
 # chatbot/urls.py
 from django.urls import path
-from .views import ChatbotView, ChatHistoryView, DeleteConversationView, ClearAllConversationsView
+from django.views.decorators.csrf import csrf_exempt
+from .views import ChatbotView, ChatbotStreamView, ChatHistoryView, DeleteConversationView, ClearAllConversationsView
 
 urlpatterns = [
     path("ask/", ChatbotView.as_view(), name="chatbot-ask"),
+    path("ask/stream/", csrf_exempt(ChatbotStreamView.as_view()), name="chatbot-ask-stream"),
     path("history/", ChatHistoryView.as_view(), name="chatbot-history"),
     path("delete/", DeleteConversationView.as_view(), name="chatbot-delete"),
     path("clear-all/", ClearAllConversationsView.as_view(), name="chatbot-clear-all"),
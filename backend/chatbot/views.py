@@ -2,21 +2,28 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
 from django.conf import settings
 from django.db.models import Count, Q
-from django.db import models
+from django.db import models, transaction
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views import View
 
-try:
-    import spacy
-except ImportError:
-    spacy = None
-
-import requests
-import os
+import asyncio
+import json
 import logging
 import uuid
 import re
 from .models import Conversation, Message
+from .nlp import PipelineNLP, get_config as get_nlp_config
+from .deepseek import ClientDeepSeek, DeepSeekErreur
+from .intentions import AnalyseQuestion
+from .connaissances import InstantaneConnaissances, lire_budget
+from .historique import artefacts_nlp, mode_nlp
+from .pagination import MessageCursorPagination
 from projects.models import Projet, Tache, PhaseProjet
 from accounts.models import User
 from .text2sql import text2sql_generator
@@ -38,31 +45,53 @@ except ImportError:
 
 logger = logging.getLogger(__name__)
 
-# Charger le modèle spaCy (français moyen)
-nlp = None
-if spacy:
-    try:
-        # Essayer de charger le modèle français
-        nlp = spacy.load("fr_core_news_md")
-        logger.info("Modèle spaCy français chargé avec succès")
-    except OSError:
-        try:
-            # Fallback vers le modèle français simple
-            nlp = spacy.load("fr_core_news_sm")
-            logger.info("Modèle spaCy français simple chargé avec succès")
-        except OSError:
-            try:
-                # Fallback vers le modèle anglais si disponible
-                nlp = spacy.load("en_core_web_sm")
-                logger.warning("Modèle spaCy anglais chargé (modèle français non trouvé)")
-            except OSError:
-                logger.warning("Aucun modèle spaCy trouvé. Le traitement NLP sera désactivé.")
-                nlp = None
-else:
-    logger.warning("spaCy non installé. Le traitement NLP sera désactivé.")
+# Le modèle spaCy est chargé à la première utilisation (voir chatbot/nlp.py)
 
 class ChatbotView(APIView):
     permission_classes = []  # Permettre l'accès sans authentification
+
+    # Consigne système envoyée à DeepSeek (réponses complètes et diffusées)
+    CONSIGNE_DEEPSEEK = """Tu es Marketges IA, un assistant intelligent et humain spécialisé dans la gestion de projets marketing, mais capable de répondre à TOUTES les questions.
+
+TON PERSONNALITÉ :
+- Tu es chaleureux, intelligent et empathique
+- Tu parles comme un vrai humain, pas comme un robot
+- Tu utilises un langage naturel et conversationnel
+- Tu es curieux et tu poses des questions de suivi
+- Tu adaptes ton ton selon le contexte
+
+TES COMPÉTENCES :
+- Gestion de projets marketing chez GABON Telecom au Gabon (ton domaine d'expertise)
+- Questions générales sur la vie, le travail, la technologie
+- Conseils personnels et professionnels
+- Discussions amicales et philosophiques
+- Tu peux parler de tout avec intelligence et bienveillance
+- Tu as maintenant accès à un système intelligent qui peut répondre automatiquement aux questions sur les données
+
+TON STYLE DE RÉPONSE - RÈGLES STRICTES :
+- INTERDICTION ABSOLUE d'utiliser des astérisques (*) ou tout formatage markdown
+- INTERDICTION d'utiliser des tirets (-) pour les listes
+- INTERDICTION d'utiliser des numéros (1., 2., etc.) pour les listes
+- Utiliser UNIQUEMENT des emojis et du texte naturel
+- Pour les listes, utiliser des tirets simples (-) ou des puces (•)
+- Être naturel, chaleureux et humain
+- Reformuler intelligemment les données brutes en réponses naturelles
+- Si tu reçois des données de la base, les utiliser pour donner une réponse précise et engageante
+- Toujours terminer par une question ou une invitation à continuer
+
+EXEMPLES DE TON COMPORTEMENT :
+- Pour une question marketing avec données : "Excellente question ! D'après votre base de données, voici ce que j'ai trouvé..."
+- Pour une question générale : "Ah, c'est une question intéressante ! Laisse-moi te donner mon avis..."
+- Pour une question personnelle : "Je comprends ta situation. Voici ce que je pense..."
+- Toujours être bienveillant et constructif
+
+FORMATAGE INTERDIT :
+❌ *texte en gras*
+❌ **texte en gras**
+❌ - liste avec tirets
+❌ 1. liste numérotée
+✅ Texte naturel avec emojis
+✅ • Liste avec puces simples"""
     
     def post(self, request):
         # Récupérer la question (format frontend)
@@ -75,17 +104,7 @@ class ChatbotView(APIView):
         # Obtenir ou créer une conversation
         conversation = self.get_or_create_conversation(request.user, session_id)
         
-        # Traitement NLP avec spaCy (pour l'analyse du texte, pas pour générer des requêtes)
-        tokens = []
-        entities = []
-        if nlp:
-            try:
-                doc = nlp(user_input)
-                tokens = [token.text for token in doc]
-                entities = [(ent.text, ent.label_) for ent in doc.ents]
-                logger.info(f"[spaCy] Tokens: {tokens[:5]}..., Entités: {entities}")
-            except Exception as e:
-                logger.warning(f"Erreur spaCy : {e}")
+        tokens, entities = self.analyser_nlp(user_input)
 
         # Sauvegarder le message utilisateur
         user_message = Message.objects.create(
@@ -96,14 +115,66 @@ class ChatbotView(APIView):
             spacy_entities=entities
         )
 
+        data_response = self.rechercher_donnees(user_input)
+        enhanced_prompt = self.construire_prompt(user_input, data_response)
+        
+        deepseek_used = False  # Initialiser la variable
+        try:
+            logger.info(f"[Chatbot] Tentative d'appel DeepSeek avec prompt: {enhanced_prompt[:200]}...")
+            bot_response = self.query_deepseek(enhanced_prompt, question=user_input, donnees=data_response or '')
+            deepseek_used = True
+            logger.info(f"[Chatbot] Réponse DeepSeek générée avec succès: {bot_response[:100]}...")
+        except Exception as e:
+            logger.error(f"[Chatbot] Erreur DeepSeek détaillée : {e}")
+            logger.error(f"[Chatbot] Type d'erreur : {type(e).__name__}")
+            bot_response = self.reponse_de_repli(data_response)
+
+        # Sauvegarder la réponse du bot
+        bot_message = Message.objects.create(
+            conversation=conversation,
+            sender='bot',
+            content=bot_response,
+            deepseek_used=deepseek_used
+        )
+
+        return Response({
+            "answer": self.avec_indicateur(bot_response, deepseek_used),
+            "session_id": session_id,
+            "deepseek_used": deepseek_used
+        })
+
+    # ===== ÉTAPES D'UNE RÉPONSE (partagées avec ChatbotStreamView) =====
+
+    def analyser_nlp(self, user_input):
+        """
+        Tokens et entités spaCy du message (pour l'analyse du texte, pas pour générer
+        des requêtes) ; en mode différé, les tokens sont calculés par lots (commande
+        backfill_spacy_tokens)
+        """
+        tokens = None
+        entities = None
+        if get_nlp_config()['EN_LIGNE'] and mode_nlp() != 'aucun':
+            try:
+                tokens, entities = PipelineNLP.analyser(user_input)
+                logger.info(f"[spaCy] Tokens: {tokens[:5]}..., Entités: {entities}")
+            except Exception as e:
+                logger.warning(f"Erreur spaCy : {e}")
+        # Seules les données du mode de stockage sont conservées (chatbot/historique.py)
+        return artefacts_nlp(tokens, entities)
+
+    def rechercher_donnees(self, user_input):
+        """Données de la base utiles à la question (None si aucune ne correspond)"""
+        # Mots-clés de la question détectés une fois pour les trois étapes d'analyse
+        analyse = AnalyseQuestion(user_input)
+
         # ANALYSE INTELLIGENTE CONTEXTUELLE
-        data_response = self.intelligent_context_analysis(user_input)
+        data_response = self.intelligent_context_analysis(user_input, analyse)
         logger.info(f"[Chatbot] Analyse contextuelle: {'Oui' if data_response else 'Non'}")
         
         # Si l'analyse contextuelle échoue, essayer la génération automatique
         if not data_response or "Je n'ai pas pu comprendre" in data_response:
             try:
-                auto_response = text2sql_generator.process_natural_language_query(user_input)
+                auto_response = text2sql_generator.process_natural_language_query(user_input, analyse)
                 if auto_response and "Je n'ai pas pu comprendre" not in auto_response:
                     data_response = auto_response
                     logger.info(f"[Chatbot] Réponse automatique générée: Oui")
@@ -112,10 +183,13 @@ class ChatbotView(APIView):
         
         # Dernier recours : méthode classique
         if not data_response or "Je n'ai pas pu comprendre" in data_response:
-            data_response = self.analyze_and_respond(user_input.lower())
+            data_response = self.analyze_and_respond(user_input, analyse)
             logger.info(f"[Chatbot] Données récupérées (méthode classique): {'Oui' if data_response else 'Non'}")
         
-        # Toujours utiliser DeepSeek avec les données disponibles
+        return data_response
+
+    def construire_prompt(self, user_input, data_response):
+        """Prompt envoyé à DeepSeek : toujours utilisé, avec les données disponibles"""
         if data_response:
             enhanced_prompt = f"""Question: {user_input}
 
@@ -135,43 +209,22 @@ IMPORTANT:
 Tu es Marketges IA, assistant intelligent pour la gestion de projets marketing.
 Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations spécifiques, propose des conseils généraux sur la gestion de projets marketing."""
             logger.info(f"[Chatbot] Prompt simple pour DeepSeek")
-        
-        deepseek_used = False  # Initialiser la variable
-        try:
-            logger.info(f"[Chatbot] Tentative d'appel DeepSeek avec prompt: {enhanced_prompt[:200]}...")
-            bot_response = self.query_deepseek(enhanced_prompt)
-            deepseek_used = True
-            logger.info(f"[Chatbot] Réponse DeepSeek générée avec succès: {bot_response[:100]}...")
-        except Exception as e:
-            logger.error(f"[Chatbot] Erreur DeepSeek détaillée : {e}")
-            logger.error(f"[Chatbot] Type d'erreur : {type(e).__name__}")
-            # En cas d'erreur, utiliser les données avec reformulation intelligente
-            if data_response:
-                bot_response = f"Voici les informations demandées :\n\n{data_response}"
-                logger.info(f"[Chatbot] Utilisation des données avec reformulation simple")
-            else:
-                bot_response = "Je n'ai pas pu récupérer les informations demandées. Veuillez réessayer dans quelques instants."
-                logger.info(f"[Chatbot] Aucune donnée disponible")
+        return enhanced_prompt
 
-        # Ajouter l'indicateur DeepSeek à la réponse
+    def reponse_de_repli(self, data_response):
+        """Réponse sans DeepSeek : les données avec une reformulation simple"""
+        if data_response:
+            logger.info(f"[Chatbot] Utilisation des données avec reformulation simple")
+            return f"Voici les informations demandées :\n\n{data_response}"
+        logger.info(f"[Chatbot] Aucune donnée disponible")
+        return "Je n'ai pas pu récupérer les informations demandées. Veuillez réessayer dans quelques instants."
+
+    @staticmethod
+    def avec_indicateur(bot_response, deepseek_used):
+        """Réponse affichée, avec l'indicateur de la source"""
         if deepseek_used:
-            bot_response_with_indicator = f"{bot_response}\n\n🤖 DeepSeek IA"
-        else:
-            bot_response_with_indicator = f"{bot_response}\n\n⚡ Système"
-
-        # Sauvegarder la réponse du bot
-        bot_message = Message.objects.create(
-            conversation=conversation,
-            sender='bot',
-            content=bot_response,
-            deepseek_used=deepseek_used
-        )
-
-        return Response({
-            "answer": bot_response_with_indicator, 
-            "session_id": session_id,
-            "deepseek_used": deepseek_used
-        })
+            return f"{bot_response}\n\n🤖 DeepSeek IA"
+        return f"{bot_response}\n\n⚡ Système"
 
     def get_or_create_conversation(self, user, session_id):
         """Obtenir ou créer une conversation"""
@@ -187,231 +240,84 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             )
         return conversation
 
-    def intelligent_context_analysis(self, user_input):
+    def intelligent_context_analysis(self, user_input, analyse=None):
         """
         Analyse contextuelle intelligente qui comprend le langage naturel
         et fait des déductions basées sur les données disponibles
         """
-        # Correction des fautes de frappe courantes
-        corrected_input = self._correct_typos(user_input)
-        user_input_lower = corrected_input.lower()
+        # Correction des fautes de frappe courantes et détection des mots-clés (une passe)
+        analyse = analyse or AnalyseQuestion(user_input)
+        question = analyse.corrigee
         logger.info(f"[Analyse Contextuelle] Question originale: {user_input}")
-        logger.info(f"[Analyse Contextuelle] Question corrigée: {corrected_input}")
+        logger.info(f"[Analyse Contextuelle] Question corrigée: {analyse.texte_corrige}")
         
         try:
             # 1. VÉRIFICATION SI C'EST UNE QUESTION GÉNÉRALE (pas liée à l'application)
-            if self._is_general_question(user_input_lower):
+            if self._is_general_question(question):
                 logger.info("[Analyse Contextuelle] Question générale détectée - pas de données spécifiques")
                 return None  # Laisser DeepSeek répondre naturellement
             
-            # 2. ANALYSE DES MOTS-CLÉS CONTEXTUELS
-            context_keywords = {
-                'urgence': ['urgent', 'urgence', 'priorité', 'prioritaire', 'critique', 'important', 'pressé'],
-                'statut': ['statut', 'état', 'en cours', 'terminé', 'en attente', 'actif', 'fini'],
-                'projets': ['projet', 'projets', 'campagne', 'marketing', 'initiative'],
-                'taches': ['tâche', 'tâches', 'tache', 'taches', 'todo', 'travail', 'activité'],
-                'utilisateurs': ['utilisateur', 'utilisateurs', 'équipe', 'team', 'membre', 'membres', 'collaborateur'],
-                'quantite': ['combien', 'nombre', 'total', 'quantité', 'combien de'],
-                'liste': ['liste', 'afficher', 'montrer', 'voir', 'quels sont', 'donne-moi'],
-                'recent': ['récent', 'dernier', 'nouveau', 'récemment', 'dernièrement'],
-                'budgets': ['budget', 'budgets', 'coût', 'coûts', 'prix', 'argent', 'financement', 'financier', 'financière', 'économique', 'économiques'],
-                'planning': ['planning', 'planification', 'début', 'fin', 'échéance', 'échéances', 'date', 'dates', 'durée', 'estimation', 'estimations'],
-                'types': ['type', 'types', 'catégorie', 'catégories', 'classification'],
-                'objectifs': ['objectif', 'objectifs', 'but', 'buts', 'cible', 'cibles', 'mission'],
-                'descriptions': ['description', 'descriptions', 'détail', 'détails', 'contenu', 'contenus'],
-                'risques': ['risque', 'risques', 'danger', 'problème', 'problèmes', 'exposé', 'exposés', 'retard', 'retards', 'dépendance', 'dépendances', 'surcharge', 'équipe', 'ressource', 'ressources']
-            }
-            
-            # 3. DÉTECTION DU CONTEXTE PRINCIPAL
-            detected_contexts = []
-            for context, keywords in context_keywords.items():
-                if any(keyword in user_input_lower for keyword in keywords):
-                    detected_contexts.append(context)
+            # 2. DÉTECTION DU CONTEXTE PRINCIPAL (mots-clés : chatbot/intentions.py)
+            detected_contexts = question.contextes
             
             logger.info(f"[Analyse Contextuelle] Contextes détectés: {detected_contexts}")
-            logger.info(f"[Analyse Contextuelle] Question analysée: '{user_input_lower}'")
+            logger.info(f"[Analyse Contextuelle] Question analysée: '{question.texte}'")
             
-            # 4. ANALYSE SPÉCIFIQUE PAR CONTEXTE
+            # 3. ANALYSE SPÉCIFIQUE PAR CONTEXTE
             if 'budgets' in detected_contexts:
-                return self._analyze_budgets_context(user_input_lower, detected_contexts)
+                return self._analyze_budgets_context(question, detected_contexts)
             elif 'planning' in detected_contexts:
-                return self._analyze_planning_context(user_input_lower, detected_contexts)
+                return self._analyze_planning_context(question, detected_contexts)
             elif 'types' in detected_contexts:
-                return self._analyze_types_context(user_input_lower, detected_contexts)
+                return self._analyze_types_context(question, detected_contexts)
             elif 'objectifs' in detected_contexts:
-                return self._analyze_objectives_context(user_input_lower, detected_contexts)
+                return self._analyze_objectives_context(question, detected_contexts)
             elif 'descriptions' in detected_contexts:
-                return self._analyze_descriptions_context(user_input_lower, detected_contexts)
+                return self._analyze_descriptions_context(question, detected_contexts)
             elif 'urgence' in detected_contexts:
-                return self._analyze_urgency_context(user_input_lower, detected_contexts)
+                return self._analyze_urgency_context(question, detected_contexts)
             elif 'statut' in detected_contexts:
-                return self._analyze_status_context(user_input_lower, detected_contexts)
+                return self._analyze_status_context(question, detected_contexts)
             elif 'projets' in detected_contexts:
-                return self._analyze_projects_context(user_input_lower, detected_contexts)
+                return self._analyze_projects_context(question, detected_contexts)
             # Conditions spécifiques AVANT les conditions générales
-            elif 'taches' in detected_contexts and ('equipe' in user_input_lower or 'équipe' in user_input_lower or 'equipes' in user_input_lower or 'équipes' in user_input_lower or 'membre' in user_input_lower or 'membres' in user_input_lower):
-                return self._analyze_teams_tasks_context(user_input_lower, detected_contexts)
-            elif 'taches' in detected_contexts and ('utilisateur' in user_input_lower or 'utilisateurs' in detected_contexts):
-                return self._analyze_users_tasks_context(user_input_lower, detected_contexts)
+            elif 'taches' in detected_contexts and question.parle_de('equipes_membres'):
+                return self._analyze_teams_tasks_context(question, detected_contexts)
+            elif 'taches' in detected_contexts and (question.contient('utilisateur') or 'utilisateurs' in detected_contexts):
+                return self._analyze_users_tasks_context(question, detected_contexts)
             elif 'taches' in detected_contexts:
-                return self._analyze_tasks_context(user_input_lower, detected_contexts)
-            elif 'utilisateurs' in detected_contexts or 'utilisateur' in user_input_lower:
-                return self._analyze_users_context(user_input_lower, detected_contexts)
+                return self._analyze_tasks_context(question, detected_contexts)
+            elif 'utilisateurs' in detected_contexts or question.contient('utilisateur'):
+                return self._analyze_users_context(question, detected_contexts)
             # Détection spécifique pour les équipes (même sans le mot "tâches")
-            elif 'equipe' in user_input_lower or 'équipe' in user_input_lower or 'equipes' in user_input_lower or 'équipes' in user_input_lower:
-                return self._analyze_teams_tasks_context(user_input_lower, detected_contexts)
+            elif question.parle_de('equipes'):
+                return self._analyze_teams_tasks_context(question, detected_contexts)
             # Détection pour les questions sur les assignations et membres
-            elif any(keyword in user_input_lower for keyword in ['assignées', 'assignée', 'assignés', 'assigné', 'membre', 'membres', 'collaborateur', 'collaborateurs']):
-                return self._analyze_teams_tasks_context(user_input_lower, detected_contexts)
+            elif question.parle_de('assignations'):
+                return self._analyze_teams_tasks_context(question, detected_contexts)
             elif 'quantite' in detected_contexts:
-                return self._analyze_quantity_context(user_input_lower, detected_contexts)
+                return self._analyze_quantity_context(question, detected_contexts)
             elif 'liste' in detected_contexts:
-                return self._analyze_list_context(user_input_lower, detected_contexts)
+                return self._analyze_list_context(question, detected_contexts)
             elif 'risques' in detected_contexts:
-                return self._analyze_risks_context(user_input_lower, detected_contexts)
+                return self._analyze_risks_context(question, detected_contexts)
             
-            # 5. ANALYSE PAR DÉDUCTION LOGIQUE
-            return self._logical_deduction_analysis(user_input_lower)
+            # 4. ANALYSE PAR DÉDUCTION LOGIQUE
+            return self._logical_deduction_analysis(question)
             
         except Exception as e:
             logger.error(f"[Analyse Contextuelle] Erreur: {e}")
             return None
     
-    def _correct_typos(self, user_input):
-        """
-        Corrige les fautes de frappe courantes dans les questions
-        """
-        # Dictionnaire de corrections courantes
-        corrections = {
-            # Mots liés aux projets
-            'projet': ['projets', 'projet', 'projé', 'projét'],
-            'projets': ['projets', 'projet', 'projé', 'projét'],
-            'tache': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
-            'taches': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
-            'tâche': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
-            'tâches': ['tache', 'taches', 'tâche', 'tâches', 'tach', 'tachs'],
-            
-            # Mots liés aux utilisateurs
-            'utilisateur': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
-            'utilisateurs': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
-            'user': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
-            'users': ['utilisateur', 'utilisateurs', 'user', 'users', 'utilisatuer', 'utilisateurs'],
-            
-            # Mots liés aux budgets
-            'budget': ['budget', 'budgets', 'budgé', 'budgét', 'budjet', 'budjets'],
-            'budgets': ['budget', 'budgets', 'budgé', 'budgét', 'budjet', 'budjets'],
-            
-            # Mots liés aux statuts
-            'statut': ['statut', 'statuts', 'status', 'statue', 'statues'],
-            'statuts': ['statut', 'statuts', 'status', 'statue', 'statues'],
-            'status': ['statut', 'statuts', 'status', 'statue', 'statues'],
-            
-            # Mots liés aux priorités
-            'priorite': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
-            'priorité': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
-            'priorites': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
-            'priorités': ['priorite', 'priorité', 'priorites', 'priorités', 'priorité', 'priorites'],
-            
-            # Mots liés aux équipes
-            'equipe': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
-            'équipe': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
-            'equipes': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
-            'équipes': ['equipe', 'équipe', 'equipes', 'équipes', 'equip', 'equips'],
-            
-            # Mots liés aux assignations
-            'assigne': ['assigne', 'assigné', 'assignee', 'assigné', 'assigné'],
-            'assigné': ['assigne', 'assigné', 'assignee', 'assigné', 'assigné'],
-            'assignee': ['assigne', 'assigné', 'assignee', 'assigné', 'assigné'],
-            'assignes': ['assignes', 'assignés', 'assignees', 'assignés', 'assignés'],
-            'assignés': ['assignes', 'assignés', 'assignees', 'assignés', 'assignés'],
-            'assignees': ['assignes', 'assignés', 'assignees', 'assignés', 'assignés'],
-            
-            # Mots liés aux responsables
-            'responsable': ['responsable', 'responsables', 'responsabl', 'responsabls'],
-            'responsables': ['responsable', 'responsables', 'responsabl', 'responsabls'],
-            
-            # Mots liés aux listes
-            'liste': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
-            'listes': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
-            'list': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
-            'lists': ['liste', 'listes', 'list', 'lists', 'lise', 'lises'],
-            
-            # Mots liés aux descriptions
-            'description': ['description', 'descriptions', 'descripton', 'descriptons'],
-            'descriptions': ['description', 'descriptions', 'descripton', 'descriptons'],
-            
-            # Mots liés aux objectifs
-            'objectif': ['objectif', 'objectifs', 'objectiv', 'objectivs'],
-            'objectifs': ['objectif', 'objectifs', 'objectiv', 'objectivs'],
-            
-            # Mots liés aux types
-            'type': ['type', 'types', 'typ', 'typs'],
-            'types': ['type', 'types', 'typ', 'typs'],
-            
-            # Mots liés aux plannings
-            'planning': ['planning', 'plannings', 'planing', 'planings'],
-            'plannings': ['planning', 'plannings', 'planing', 'planings'],
-        }
-        
-        # Correction des mots
-        corrected_input = user_input
-        words = corrected_input.split()
-        
-        for i, word in enumerate(words):
-            word_lower = word.lower()
-            # Supprimer la ponctuation pour la comparaison
-            word_clean = ''.join(c for c in word_lower if c.isalnum())
-            
-            # Chercher une correction
-            for correct_word, variations in corrections.items():
-                if word_clean in variations:
-                    # Préserver la casse originale
-                    if word.isupper():
-                        words[i] = correct_word.upper()
-                    elif word.istitle():
-                        words[i] = correct_word.title()
-                    else:
-                        words[i] = correct_word
-                    break
-        
-        return ' '.join(words)
-    
-    def _is_general_question(self, user_input_lower):
+    def _is_general_question(self, question):
         """
         Détermine si c'est une question générale (pas liée à l'application)
         """
-        # Mots-clés qui indiquent une question générale
-        general_keywords = [
-            # Géographie
-            'congo', 'gabon', 'france', 'afrique', 'europe', 'pays', 'ville', 'capitale',
-            # Personnalité
-            'qui es-tu', 'qui es tu', 'présente', 'raconte', 'ton nom', 'ton âge',
-            # Questions personnelles
-            'comment ça va', 'ça va', 'humeur', 'sentiment', 'comment tu te sens',
-            # Salutations
-            'bonjour', 'salut', 'hello', 'bonsoir', 'coucou', 'bonne nuit',
-            # Questions générales
-            'que peux-tu', 'que peux tu', 'que sais-tu', 'que sais tu', 'capable',
-            'aide', 'help', 'conseil', 'suggestion',
-            # Questions sur le monde
-            'météo', 'temps', 'actualité', 'news', 'sport', 'musique', 'film',
-            # Questions philosophiques
-            'vie', 'mort', 'amour', 'bonheur', 'sens de la vie', 'philosophie'
-        ]
-        
-        # Mots-clés qui indiquent clairement une question sur l'application
-        app_keywords = [
-            'projet', 'projets', 'tâche', 'taches', 'utilisateur', 'utilisateurs', 
-            'équipe', 'team', 'marketing', 'campagne', 'document', 'documents',
-            'statistique', 'statistiques', 'liste', 'afficher', 'montrer', 'voir',
-            'combien', 'nombre', 'total', 'qui', 'quels', 'donne-moi', 'donne moi'
-        ]
-        
         # Vérifier si la question contient des mots-clés généraux
-        has_general_keywords = any(keyword in user_input_lower for keyword in general_keywords)
+        has_general_keywords = question.parle_de('general')
         
         # Vérifier si c'est une question avec mots-clés liés à l'application
-        has_app_keywords = any(keyword in user_input_lower for keyword in app_keywords)
+        has_app_keywords = question.parle_de('application')
         
         # Si c'est une question avec des mots-clés d'application, ce n'est PAS une question générale
         if has_app_keywords:
@@ -422,12 +328,12 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             return True
         
         # Si c'est une question très courte sans contexte d'application
-        if len(user_input_lower.split()) <= 3 and not has_app_keywords:
+        if len(question.texte.split()) <= 3 and not has_app_keywords:
             return True
             
         return False
     
-    def _analyze_urgency_context(self, user_input_lower, contexts):
+    def _analyze_urgency_context(self, question, contexts):
         """Analyse spécifique pour les questions d'urgence"""
         logger.info("[Analyse Urgence] Analyse des projets/tâches urgents")
         
@@ -475,16 +381,16 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Urgence] Erreur: {e}")
             return None
     
-    def _analyze_status_context(self, user_input_lower, contexts):
+    def _analyze_status_context(self, question, contexts):
         """Analyse spécifique pour les questions de statut"""
         logger.info("[Analyse Statut] Analyse des statuts")
         
         try:
-            if 'en attente' in user_input_lower or 'attente' in user_input_lower:
+            if question.contient('en attente', 'attente'):
                 return self.get_pending_projects()
-            elif 'en cours' in user_input_lower or 'actif' in user_input_lower:
+            elif question.contient('en cours', 'actif'):
                 return self.get_active_projects()
-            elif 'terminé' in user_input_lower or 'fini' in user_input_lower:
+            elif question.contient('terminé', 'fini'):
                 return self.get_completed_projects()
             else:
                 return self.get_projects_stats()
@@ -492,43 +398,43 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Statut] Erreur: {e}")
             return None
     
-    def _analyze_projects_context(self, user_input_lower, contexts):
+    def _analyze_projects_context(self, question, contexts):
         """Analyse spécifique pour les questions sur les projets"""
-        logger.info(f"[Analyse Projets] Analyse des projets - Question: '{user_input_lower}'")
+        logger.info(f"[Analyse Projets] Analyse des projets - Question: '{question.texte}'")
         
         try:
             # Questions sur les projets terminés
-            if any(keyword in user_input_lower for keyword in ['terminés', 'terminé', 'terminées', 'terminée', 'fini', 'finis', 'finies', 'complété', 'complétés', 'complétées', 'complété']):
+            if question.parle_de('termines'):
                 logger.info("[Analyse Projets] Détection: projets terminés")
                 return self.get_projects_by_status('termine')
             
             # Questions sur les projets en attente
-            elif any(keyword in user_input_lower for keyword in ['en attente', 'attente', 'en attente de', 'en standby', 'standby']):
+            elif question.parle_de('en_attente'):
                 logger.info("[Analyse Projets] Détection: projets en attente")
                 return self.get_projects_by_status('en_attente')
             
             # Questions sur les projets hors délai
-            elif any(keyword in user_input_lower for keyword in ['hors délai', 'hors delai', 'retard', 'retards', 'en retard']):
+            elif question.parle_de('hors_delai'):
                 logger.info("[Analyse Projets] Détection: projets hors délai")
                 return self.get_projects_by_status('hors_delai')
             
             # Questions sur les projets rejetés
-            elif any(keyword in user_input_lower for keyword in ['rejetés', 'rejeté', 'rejetées', 'rejetée', 'annulés', 'annulé', 'annulées', 'annulée']):
+            elif question.parle_de('rejetes'):
                 logger.info("[Analyse Projets] Détection: projets rejetés")
                 return self.get_projects_by_status('rejete')
             
             # Questions sur les projets prioritaires
-            elif any(keyword in user_input_lower for keyword in ['prioritaires', 'prioritaire', 'priorité', 'priorités', 'urgents', 'urgent', 'urgentes', 'urgente', 'critiques', 'critique']):
+            elif question.parle_de('prioritaires'):
                 logger.info("[Analyse Projets] Détection: projets prioritaires")
                 return self.get_projects_by_priority('haut')
             
             # Questions sur le nombre/quantité de projets
-            elif any(keyword in user_input_lower for keyword in ['combien', 'nombre', 'total', 'quantité', 'combien de']):
+            elif question.parle_de('quantite'):
                 logger.info("[Analyse Projets] Détection: quantité de projets")
                 return self.get_projects_stats()
             
             # Questions sur la liste des projets
-            elif any(keyword in user_input_lower for keyword in ['liste', 'afficher', 'montrer', 'voir', 'quels sont', 'donne-moi']):
+            elif question.parle_de('liste'):
                 logger.info("[Analyse Projets] Détection: liste des projets")
                 return self.get_projects_list()
             
@@ -541,38 +447,38 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Projets] Erreur: {e}")
             return self.get_projects_stats()
     
-    def _analyze_tasks_context(self, user_input_lower, contexts):
+    def _analyze_tasks_context(self, question, contexts):
         """Analyse spécifique pour les questions sur les tâches"""
-        logger.info(f"[Analyse Tâches] Analyse des tâches - Question: '{user_input_lower}'")
+        logger.info(f"[Analyse Tâches] Analyse des tâches - Question: '{question.texte}'")
         
         try:
             # Questions sur les tâches terminées
-            if any(keyword in user_input_lower for keyword in ['terminées', 'terminée', 'terminés', 'terminé', 'fini', 'finies', 'finis', 'complété', 'complétées', 'complétés', 'complété']):
+            if question.parle_de('termines'):
                 logger.info("[Analyse Tâches] Détection: tâches terminées")
                 return self.get_tasks_by_status('termine')
             
             # Questions sur les tâches en cours
-            elif any(keyword in user_input_lower for keyword in ['en cours', 'cours', 'actives', 'active', 'en cours de', 'en réalisation', 'réalisation']):
+            elif question.parle_de('taches_en_cours'):
                 logger.info("[Analyse Tâches] Détection: tâches en cours")
                 return self.get_tasks_by_status('en_cours')
             
             # Questions sur les tâches en attente
-            elif any(keyword in user_input_lower for keyword in ['en attente', 'attente', 'en attente de', 'en standby', 'standby', 'bloquées', 'bloquée', 'bloqués', 'bloqué']):
+            elif question.parle_de('taches_en_attente'):
                 logger.info("[Analyse Tâches] Détection: tâches en attente")
                 return self.get_tasks_by_status('en_attente')
             
             # Questions sur les tâches prioritaires
-            elif any(keyword in user_input_lower for keyword in ['prioritaires', 'prioritaire', 'priorité', 'priorités', 'urgentes', 'urgente', 'urgents', 'urgent', 'critiques', 'critique']):
+            elif question.parle_de('prioritaires'):
                 logger.info("[Analyse Tâches] Détection: tâches prioritaires")
                 return self.get_tasks_by_priority('haute')
             
             # Questions sur le nombre/quantité de tâches
-            elif any(keyword in user_input_lower for keyword in ['combien', 'nombre', 'total', 'quantité', 'combien de']):
+            elif question.parle_de('quantite'):
                 logger.info("[Analyse Tâches] Détection: quantité de tâches")
                 return self.get_tasks_stats()
             
             # Questions sur la liste des tâches
-            elif any(keyword in user_input_lower for keyword in ['liste', 'afficher', 'montrer', 'voir', 'quelles sont', 'donne-moi']):
+            elif question.parle_de('liste_taches'):
                 logger.info("[Analyse Tâches] Détection: liste des tâches")
                 return self.get_tasks_list()
             
@@ -585,14 +491,14 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Tâches] Erreur: {e}")
         return self.get_tasks_stats()
     
-    def _analyze_users_context(self, user_input_lower, contexts):
+    def _analyze_users_context(self, question, contexts):
         """Analyse spécifique pour les questions sur les utilisateurs"""
         logger.info("[Analyse Utilisateurs] Analyse des utilisateurs")
         
         try:
-            if 'liste' in user_input_lower or 'afficher' in user_input_lower or 'montrer' in user_input_lower or 'voir' in user_input_lower:
+            if question.contient('liste', 'afficher', 'montrer', 'voir'):
                 return self.get_users_list()
-            elif 'combien' in user_input_lower or 'nombre' in user_input_lower or 'total' in user_input_lower:
+            elif question.contient('combien', 'nombre', 'total'):
                 return self.get_users_stats()
             else:
                 return self.get_users_list()  # Par défaut, donner la liste
@@ -600,13 +506,13 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Utilisateurs] Erreur: {e}")
             return None
 
-    def _analyze_users_tasks_context(self, user_input_lower, contexts):
+    def _analyze_users_tasks_context(self, question, contexts):
         """Analyse spécifique pour les questions sur les utilisateurs avec leurs tâches"""
         logger.info("[Analyse Utilisateurs-Tâches] Analyse des utilisateurs avec leurs tâches")
         
         try:
             # Vérifier si la question demande spécifiquement les utilisateurs avec leurs tâches
-            if any(keyword in user_input_lower for keyword in ['tache', 'taches', 'tâche', 'tâches', 'assigné', 'assignée', 'assignés', 'assignées', 'responsable', 'responsables']):
+            if question.parle_de('taches_assignees'):
                 return self.get_users_tasks_list()
             else:
                 return self.get_users_tasks_list()  # Par défaut, donner la liste complète
@@ -614,13 +520,13 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Utilisateurs-Tâches] Erreur: {e}")
             return None
 
-    def _analyze_teams_tasks_context(self, user_input_lower, contexts):
+    def _analyze_teams_tasks_context(self, question, contexts):
         """Analyse spécifique pour les questions sur les équipes avec leurs tâches"""
-        logger.info(f"[Analyse Équipes-Tâches] Analyse des équipes avec leurs tâches - Question: '{user_input_lower}'")
+        logger.info(f"[Analyse Équipes-Tâches] Analyse des équipes avec leurs tâches - Question: '{question.texte}'")
         
         try:
             # Vérifier si la question demande spécifiquement les équipes avec leurs tâches
-            if any(keyword in user_input_lower for keyword in ['equipe', 'équipe', 'equipes', 'équipes', 'tache', 'taches', 'tâche', 'tâches', 'membre', 'membres', 'collaborateur', 'collaborateurs']):
+            if question.parle_de('equipes_taches'):
                 logger.info("[Analyse Équipes-Tâches] Mots-clés détectés, appel de get_teams_tasks_list()")
                 result = self.get_teams_tasks_list()
                 logger.info(f"[Analyse Équipes-Tâches] Résultat: {result[:100] if result else 'None'}...")
@@ -634,16 +540,16 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Équipes-Tâches] Erreur: {e}")
             return None
     
-    def _analyze_quantity_context(self, user_input_lower, contexts):
+    def _analyze_quantity_context(self, question, contexts):
         """Analyse spécifique pour les questions de quantité"""
         logger.info("[Analyse Quantité] Analyse des quantités")
         
         try:
-            if 'projet' in user_input_lower:
+            if question.contient('projet'):
                 return self.get_projects_stats()
-            elif 'utilisateur' in user_input_lower or 'équipe' in user_input_lower:
+            elif question.contient('utilisateur', 'équipe'):
                 return self.get_users_stats()
-            elif 'tâche' in user_input_lower or 'tache' in user_input_lower:
+            elif question.contient('tâche', 'tache'):
                 return self.get_tasks_stats()
             else:
                 return self.get_projects_stats()  # Par défaut
@@ -651,17 +557,17 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Quantité] Erreur: {e}")
             return None
     
-    def _analyze_list_context(self, user_input_lower, contexts):
+    def _analyze_list_context(self, question, contexts):
         """Analyse spécifique pour les demandes de liste"""
         logger.info("[Analyse Liste] Analyse des listes")
         
         try:
-            if 'projet' in user_input_lower:
-                if 'urgent' in user_input_lower:
+            if question.contient('projet'):
+                if question.contient('urgent'):
                     return self.get_urgent_projects()
-                elif 'récent' in user_input_lower:
+                elif question.contient('récent'):
                     return self.get_recent_projects()
-                elif 'tout' in user_input_lower or 'tous' in user_input_lower or 'complet' in user_input_lower:
+                elif question.contient('tout', 'tous', 'complet'):
                     return self.get_all_projects()
                 else:
                     return self.get_all_projects()  # Par défaut, montrer tous les projets
@@ -671,7 +577,7 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Liste] Erreur: {e}")
             return None
     
-    def _logical_deduction_analysis(self, user_input_lower):
+    def _logical_deduction_analysis(self, question):
         """Analyse par déduction logique basée sur les mots-clés"""
         logger.info("[Analyse Logique] Déduction logique")
         
@@ -682,12 +588,12 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
                 return "Aucun projet trouvé dans la base de données."
             
             # Déduction basée sur les mots-clés
-            if any(word in user_input_lower for word in ['urgent', 'priorité', 'critique']):
+            if question.parle_de('deduction_urgence'):
                 return self.get_urgent_projects()
-            elif any(word in user_input_lower for word in ['combien', 'nombre', 'total']):
+            elif question.parle_de('deduction_quantite'):
                 return self.get_projects_stats()
-            elif any(word in user_input_lower for word in ['liste', 'afficher', 'montrer']):
-                if 'tout' in user_input_lower or 'tous' in user_input_lower:
+            elif question.parle_de('deduction_liste'):
+                if question.contient('tout', 'tous'):
                     return self.get_all_projects()
                 else:
                     return self.get_all_projects()  # Par défaut, montrer tous les projets
@@ -698,104 +604,22 @@ Réponds de manière naturelle et professionnelle. Si tu n'as pas d'informations
             logger.error(f"[Analyse Logique] Erreur: {e}")
             return None
 
-    def query_deepseek(self, prompt):
-        """Appel à l'API DeepSeek"""
-        api_key = os.getenv("DEEPSEEK_API_KEY")
-        logger.info(f"[DeepSeek] Tentative d'appel avec clé API: {'Présente' if api_key else 'Absente'}")
-        
-        if not api_key:
-            raise Exception("Clé API DeepSeek manquante. Veuillez configurer DEEPSEEK_API_KEY dans vos variables d'environnement.")
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-
-        data = {
-            "model": "deepseek-chat",
-            "messages": [
-                {
-                    "role": "system",
-                    "content": """Tu es Marketges IA, un assistant intelligent et humain spécialisé dans la gestion de projets marketing, mais capable de répondre à TOUTES les questions.
-
-TON PERSONNALITÉ :
-- Tu es chaleureux, intelligent et empathique
-- Tu parles comme un vrai humain, pas comme un robot
-- Tu utilises un langage naturel et conversationnel
-- Tu es curieux et tu poses des questions de suivi
-- Tu adaptes ton ton selon le contexte
-
-TES COMPÉTENCES :
-- Gestion de projets marketing chez GABON Telecom au Gabon (ton domaine d'expertise)
-- Questions générales sur la vie, le travail, la technologie
-- Conseils personnels et professionnels
-- Discussions amicales et philosophiques
-- Tu peux parler de tout avec intelligence et bienveillance
-- Tu as maintenant accès à un système intelligent qui peut répondre automatiquement aux questions sur les données
-
-TON STYLE DE RÉPONSE - RÈGLES STRICTES :
-- INTERDICTION ABSOLUE d'utiliser des astérisques (*) ou tout formatage markdown
-- INTERDICTION d'utiliser des tirets (-) pour les listes
-- INTERDICTION d'utiliser des numéros (1., 2., etc.) pour les listes
-- Utiliser UNIQUEMENT des emojis et du texte naturel
-- Pour les listes, utiliser des tirets simples (-) ou des puces (•)
-- Être naturel, chaleureux et humain
-- Reformuler intelligemment les données brutes en réponses naturelles
-- Si tu reçois des données de la base, les utiliser pour donner une réponse précise et engageante
-- Toujours terminer par une question ou une invitation à continuer
-
-EXEMPLES DE TON COMPORTEMENT :
-- Pour une question marketing avec données : "Excellente question ! D'après votre base de données, voici ce que j'ai trouvé..."
-- Pour une question générale : "Ah, c'est une question intéressante ! Laisse-moi te donner mon avis..."
-- Pour une question personnelle : "Je comprends ta situation. Voici ce que je pense..."
-- Toujours être bienveillant et constructif
-
-FORMATAGE INTERDIT :
-❌ *texte en gras*
-❌ **texte en gras**
-❌ - liste avec tirets
-❌ 1. liste numérotée
-✅ Texte naturel avec emojis
-✅ • Liste avec puces simples"""
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ],
-            "temperature": 0.7
-        }
-
+    def query_deepseek(self, prompt, question=None, donnees=None):
+        """
+        Appel à l'API DeepSeek (chatbot.deepseek : cache, appel unique, session
+        partagée et disjoncteur). `question` et `donnees` indexent le cache.
+        """
         try:
-            logger.info(f"[DeepSeek] Envoi de la requête: {prompt[:100]}...")
-            res = requests.post(
-                "https://api.deepseek.com/v1/chat/completions", 
-                headers=headers, 
-                json=data, 
-                timeout=30  # Augmenter le timeout à 30 secondes
-            )
-            res.raise_for_status()
-
-            response_data = res.json()
-            logger.info(f"[DeepSeek] Réponse reçue avec succès")
-            raw_response = response_data["choices"][0]["message"]["content"]
-            
-            # Nettoyer la réponse des astérisques et formatage markdown
-            cleaned_response = self.clean_markdown_formatting(raw_response)
-            return cleaned_response
-        except requests.exceptions.Timeout:
-            logger.warning(f"[DeepSeek] Timeout de connexion (30s) - utilisation du fallback")
-            raise Exception("Timeout de connexion à DeepSeek")
-        except requests.exceptions.ConnectionError as e:
-            logger.warning(f"[DeepSeek] Erreur de connexion - utilisation du fallback: {e}")
-            raise Exception("Erreur de connexion à DeepSeek")
-        except requests.exceptions.RequestException as e:
-            logger.error(f"[DeepSeek] Erreur de requête: {e}")
-            raise Exception(f"Erreur de requête DeepSeek: {e}")
+            raw_response = ClientDeepSeek.completer(self.CONSIGNE_DEEPSEEK, prompt, question=question, donnees=donnees)
+        except DeepSeekErreur:
+            raise
         except Exception as e:
             logger.error(f"[DeepSeek] Erreur inattendue: {e}")
             raise Exception(f"Erreur DeepSeek: {e}")
 
+        # Nettoyer la réponse des astérisques et formatage markdown
+        return self.clean_markdown_formatting(raw_response)
+
     def clean_markdown_formatting(self, text):
         """Nettoie le formatage markdown des réponses DeepSeek"""
         import re
@@ -832,41 +656,41 @@ FORMATAGE INTERDIT :
         else:
             return "Je suis Marketges IA, votre assistant pour la gestion de projets marketing. Comment puis-je vous aider ?"
 
-    def analyze_and_respond(self, user_input):
+    def analyze_and_respond(self, user_input, analyse=None):
         """Analyser la question et répondre avec les données appropriées"""
-        user_input_lower = user_input.lower()
+        question = (analyse or AnalyseQuestion(user_input)).brute
         
         # Priorité 1: Questions sur les utilisateurs/équipe (très spécifique)
-        if any(word in user_input_lower for word in ['utilisateur', 'utilisateurs', 'équipe', 'team', 'membre', 'membres', 'admin', 'administrateur', 'collaborateur']):
-            if any(word in user_input_lower for word in ['liste', 'afficher', 'montrer', 'voir', 'donne-moi', 'donne moi']):
+        if question.parle_de('classique_utilisateurs'):
+            if question.parle_de('classique_liste'):
                 return self.get_users_list()  # Nouvelle fonction pour liste détaillée
             else:
                 return self.get_users_stats()
         
         # Priorité 2: Questions sur les documents (plus spécifique)
-        elif any(word in user_input_lower for word in ['document', 'documents', 'fichier', 'fichiers', 'généré', 'genere', 'générés', 'generes']):
+        elif question.parle_de('classique_documents'):
             # Si c'est combiné avec "projet", c'est une question sur les projets avec documents
-            if any(word in user_input_lower for word in ['projet', 'projets', 'combien', 'nombre', 'qui ont', 'avec']):
+            if question.parle_de('classique_projets_documents'):
                 return self.get_projects_with_documents()
             else:
                 return self.get_documents_stats()
         
         # Priorité 3: Questions spécifiques sur l'application (marketing/projets)
-        elif any(word in user_input_lower for word in ['projet', 'projets', 'marketing', 'campagne', 'budget', 'planification']):
-            if any(word in user_input_lower for word in ['urgent', 'urgence', 'priorité', 'prioritaire', 'critique', 'important']):
+        elif question.parle_de('classique_projets'):
+            if question.parle_de('classique_urgence'):
                 return self.get_urgent_projects()
-            elif any(word in user_input_lower for word in ['en attente', 'attente', 'en_attente', 'pending']):
+            elif question.parle_de('classique_en_attente'):
                 return self.get_pending_projects()
-            elif any(word in user_input_lower for word in ['en cours', 'cours', 'en_cours', 'active', 'actif']):
+            elif question.parle_de('classique_en_cours'):
                 return self.get_active_projects()
-            elif any(word in user_input_lower for word in ['terminé', 'termine', 'terminé', 'fini', 'complété']):
+            elif question.parle_de('classique_termines'):
                 return self.get_completed_projects()
-            elif any(word in user_input_lower for word in ['combien', 'nombre', 'total', 'statut', 'état', 'statistique']):
+            elif question.parle_de('classique_stats_projets'):
                 return self.get_projects_stats()
-            elif any(word in user_input_lower for word in ['récent', 'dernier', 'nouveau']):
+            elif question.parle_de('recents'):
                 return self.get_recent_projects()
-            elif any(word in user_input_lower for word in ['liste', 'afficher', 'montrer', 'voir', 'donne-moi', 'donne moi']):
-                if 'tout' in user_input_lower or 'tous' in user_input_lower:
+            elif question.parle_de('classique_liste'):
+                if question.contient('tout', 'tous'):
                     return self.get_all_projects()
                 else:
                     return self.get_all_projects()  # Par défaut, montrer tous les projets
@@ -874,59 +698,59 @@ FORMATAGE INTERDIT :
                 return self.get_projects_stats()
         
         # Questions sur les tâches
-        elif any(word in user_input_lower for word in ['tâche', 'tâches', 'tache', 'taches', 'todo', 'todos', 'travail', 'travaux', 'activité']):
+        elif question.parle_de('classique_taches'):
             return self.get_tasks_stats()
         
         # Questions sur les phases/étapes
-        elif any(word in user_input_lower for word in ['phase', 'phases', 'étape', 'étapes', 'etape', 'etapes', 'avancement', 'processus']):
+        elif question.parle_de('classique_phases'):
             return self.get_phases_stats()
         
         # Questions sur les services/rôles
-        elif any(word in user_input_lower for word in ['service', 'services', 'rôle', 'role', 'rôles', 'roles', 'permission', 'permissions']):
+        elif question.parle_de('classique_services'):
             return self.get_services_stats()
         
         # Questions sur l'historique des documents
-        elif any(word in user_input_lower for word in ['historique', 'historiques', 'modification', 'modifications', 'changement', 'changements']):
+        elif question.parle_de('classique_historique'):
             return self.get_historique_stats()
         
         # Questions sur les commentaires
-        elif any(word in user_input_lower for word in ['commentaire', 'commentaires', 'avis', 'feedback']):
+        elif question.parle_de('classique_commentaires'):
             return self.get_commentaires_stats()
         
         # Questions sur l'aide/conseils marketing
-        elif any(word in user_input_lower for word in ['aide', 'help', 'conseil', 'conseils', 'comment', 'pourquoi', 'quoi', 'suggestion']):
+        elif question.parle_de('classique_aide'):
             return self.get_help_advice()
         
         # Questions sur les statistiques générales
-        elif any(word in user_input_lower for word in ['statistique', 'statistiques', 'stats', 'résumé', 'resume', 'aperçu', 'apercu', 'vue d\'ensemble']):
+        elif question.parle_de('classique_statistiques'):
             return self.get_general_stats()
         
         # Questions de salutation ou générales - ne pas retourner de données spécifiques
-        elif any(word in user_input_lower for word in ['bonjour', 'salut', 'hello', 'bonsoir', 'coucou', 'qui es-tu', 'qui es tu', 'présente', 'raconte']):
+        elif question.parle_de('classique_salutations'):
             return None  # Laisser DeepSeek répondre naturellement
         
         # Questions personnelles ou générales - ne pas retourner de données spécifiques
-        elif any(word in user_input_lower for word in ['comment ça va', 'ça va', 'humeur', 'sentiment', 'pense', 'avis', 'opinion']):
+        elif question.parle_de('classique_personnel'):
             return None  # Laisser DeepSeek répondre naturellement
         
         # Par défaut, ne pas forcer les données si ce n'est pas clairement lié à l'application
         else:
             return None
 
-    def _analyze_budgets_context(self, user_input_lower, detected_contexts):
+    def _analyze_budgets_context(self, question, detected_contexts):
         """Analyser le contexte des budgets"""
         logger.info("[Analyse Budgets] Analyse des budgets des projets")
         
         try:
-            if 'liste' in user_input_lower or 'afficher' in user_input_lower or 'montrer' in user_input_lower or 'voir' in user_input_lower:
+            if question.contient('liste', 'afficher', 'montrer', 'voir'):
                 return self.get_projects_budgets_list()
-            elif 'combien' in user_input_lower or 'total' in user_input_lower or 'somme' in user_input_lower:
+            elif question.contient('combien', 'total', 'somme'):
                 return self.get_budgets_summary()
-            elif 'moyen' in user_input_lower or 'moyenne' in user_input_lower:
+            elif question.contient('moyen', 'moyenne'):
                 return self.get_budgets_average()
-            elif 'plus' in user_input_lower and ('élevé' in user_input_lower or 'haut' in user_input_lower):
+            elif question.contient('plus') and (question.contient('élevé', 'haut')):
                 return self.get_highest_budget_projects()
-            elif 'plus' in user_input_lower and ('bas' in user_input_lower or 'faible' in user_input_lower):
+            elif question.contient('plus') and (question.contient('bas', 'faible')):
                 return self.get_lowest_budget_projects()
             else:
                 return self.get_projects_budgets_overview()
@@ -934,18 +758,18 @@ FORMATAGE INTERDIT :
             logger.error(f"[Analyse Budgets] Erreur: {e}")
             return None
 
-    def _analyze_planning_context(self, user_input_lower, detected_contexts):
+    def _analyze_planning_context(self, question, detected_contexts):
         """Analyser le contexte du planning"""
         logger.info("[Analyse Planning] Analyse du planning des projets")
         
         try:
-            if 'début' in user_input_lower or 'commence' in user_input_lower:
+            if question.contient('début', 'commence'):
                 return self.get_projects_start_dates()
-            elif 'fin' in user_input_lower or 'échéance' in user_input_lower:
+            elif question.contient('fin', 'échéance'):
                 return self.get_projects_end_dates()
-            elif 'durée' in user_input_lower or 'estimation' in user_input_lower:
+            elif question.contient('durée', 'estimation'):
                 return self.get_projects_duration()
-            elif 'en retard' in user_input_lower or 'retard' in user_input_lower:
+            elif question.contient('en retard', 'retard'):
                 return self.get_delayed_projects()
             else:
                 return self.get_projects_planning_overview()
@@ -953,14 +777,14 @@ FORMATAGE INTERDIT :
             logger.error(f"[Analyse Planning] Erreur: {e}")
             return None
 
-    def _analyze_types_context(self, user_input_lower, detected_contexts):
+    def _analyze_types_context(self, question, detected_contexts):
         """Analyser le contexte des types de projets"""
         logger.info("[Analyse Types] Analyse des types de projets")
         
         try:
-            if 'liste' in user_input_lower or 'afficher' in user_input_lower:
+            if question.contient('liste', 'afficher'):
                 return self.get_projects_types_list()
-            elif 'combien' in user_input_lower or 'nombre' in user_input_lower:
+            elif question.contient('combien', 'nombre'):
                 return self.get_projects_types_count()
             else:
                 return self.get_projects_types_overview()
@@ -968,12 +792,12 @@ FORMATAGE INTERDIT :
             logger.error(f"[Analyse Types] Erreur: {e}")
             return None
 
-    def _analyze_objectives_context(self, user_input_lower, detected_contexts):
+    def _analyze_objectives_context(self, question, detected_contexts):
         """Analyser le contexte des objectifs"""
         logger.info("[Analyse Objectifs] Analyse des objectifs des projets")
         
         try:
-            if 'liste' in user_input_lower or 'afficher' in user_input_lower:
+            if question.contient('liste', 'afficher'):
                 return self.get_projects_objectives_list()
             else:
                 return self.get_projects_objectives_overview()
@@ -981,12 +805,12 @@ FORMATAGE INTERDIT :
             logger.error(f"[Analyse Objectifs] Erreur: {e}")
             return None
 
-    def _analyze_descriptions_context(self, user_input_lower, detected_contexts):
+    def _analyze_descriptions_context(self, question, detected_contexts):
         """Analyser le contexte des descriptions"""
         logger.info("[Analyse Descriptions] Analyse des descriptions des projets")
         
         try:
-            if 'liste' in user_input_lower or 'afficher' in user_input_lower:
+            if question.contient('liste', 'afficher'):
                 return self.get_projects_descriptions_list()
             else:
                 return self.get_projects_descriptions_overview()
@@ -994,21 +818,21 @@ FORMATAGE INTERDIT :
             logger.error(f"[Analyse Descriptions] Erreur: {e}")
             return None
 
-    def _analyze_risks_context(self, user_input_lower, detected_contexts):
+    def _analyze_risks_context(self, question, detected_contexts):
         """Analyser le contexte des risques"""
         try:
             # Questions spécifiques sur les risques
-            if 'retard' in user_input_lower or 'retards' in user_input_lower:
+            if question.contient('retard', 'retards'):
                 return self._analyze_delay_risks()
-            elif 'exposé' in user_input_lower or 'exposés' in user_input_lower:
+            elif question.contient('exposé', 'exposés'):
                 return self._analyze_exposed_projects()
-            elif 'dépendance' in user_input_lower or 'dépendances' in user_input_lower:
+            elif question.contient('dépendance', 'dépendances'):
                 return self._analyze_dependency_risks()
-            elif 'surcharge' in user_input_lower:
+            elif question.contient('surcharge'):
                 return self._analyze_overload_risks()
-            elif 'budget' in user_input_lower:
+            elif question.contient('budget'):
                 return self._analyze_budget_risks()
-            elif 'équipe' in user_input_lower or 'ressource' in user_input_lower:
+            elif question.contient('équipe', 'ressource'):
                 return self._analyze_team_risks()
             
             # Détecter si c'est une question sur un projet spécifique
@@ -1016,9 +840,9 @@ FORMATAGE INTERDIT :
             project_name = None
             
             for keyword in project_keywords:
-                if keyword in user_input_lower:
+                if question.contient(keyword):
                     # Essayer d'extraire le nom du projet
-                    words = user_input_lower.split()
+                    words = question.texte.split()
                     for i, word in enumerate(words):
                         if keyword in word and i + 1 < len(words):
                             # Prendre le mot suivant comme nom de projet
@@ -1040,14 +864,7 @@ FORMATAGE INTERDIT :
     def _analyze_delay_risks(self):
         """Analyser les risques de retard"""
         try:
-            projects = Projet.objects.filter(statut='en_cours')
-            delay_risks = []
-            
-            for project in projects:
-                delay_risk = self._check_delay_risk(project)
-                if delay_risk:
-                    delay_risk['project'] = project.nom
-                    delay_risks.append(delay_risk)
+            delay_risks = self._risques_actifs('retard')
             
             if not delay_risks:
                 return "✅ Aucun risque de retard identifié sur les projets actifs."
@@ -1072,29 +889,12 @@ FORMATAGE INTERDIT :
     def _analyze_exposed_projects(self):
         """Analyser les projets les plus exposés aux risques"""
         try:
-            projects = Projet.objects.filter(statut='en_cours')
             exposed_projects = []
             
-            for project in projects:
-                risk_count = 0
-                risks = []
-                
+            for project, project_risks in self._risques_projets_actifs():
                 # Compter les risques
-                if self._check_delay_risk(project):
-                    risk_count += 1
-                    risks.append("Retard")
-                if self._check_resource_risk(project):
-                    risk_count += 1
-                    risks.append("Ressources")
-                if self._check_dependency_risk(project):
-                    risk_count += 1
-                    risks.append("Dépendances")
-                if self._check_budget_risk(project):
-                    risk_count += 1
-                    risks.append("Budget")
-                if self._check_team_risk(project):
-                    risk_count += 1
-                    risks.append("Équipe")
+                risks = [self.LIBELLES_RISQUES[type_risque] for type_risque, risk in project_risks.items() if risk]
+                risk_count = len(risks)
                 
                 if risk_count > 0:
                     exposed_projects.append({
@@ -1126,14 +926,7 @@ FORMATAGE INTERDIT :
     def _analyze_dependency_risks(self):
         """Analyser les risques de dépendances"""
         try:
-            projects = Projet.objects.filter(statut='en_cours')
-            dependency_risks = []
-            
-            for project in projects:
-                dependency_risk = self._check_dependency_risk(project)
-                if dependency_risk:
-                    dependency_risk['project'] = project.nom
-                    dependency_risks.append(dependency_risk)
+            dependency_risks = self._risques_actifs('dependances')
             
             if not dependency_risks:
                 return "✅ Aucun risque de dépendance identifié."
@@ -1155,14 +948,7 @@ FORMATAGE INTERDIT :
     def _analyze_overload_risks(self):
         """Analyser les risques de surcharge"""
         try:
-            projects = Projet.objects.filter(statut='en_cours')
-            overload_risks = []
-            
-            for project in projects:
-                resource_risk = self._check_resource_risk(project)
-                if resource_risk:
-                    resource_risk['project'] = project.nom
-                    overload_risks.append(resource_risk)
+            overload_risks = self._risques_actifs('ressources')
             
             if not overload_risks:
                 return "✅ Aucun risque de surcharge identifié."
@@ -1184,14 +970,7 @@ FORMATAGE INTERDIT :
     def _analyze_budget_risks(self):
         """Analyser les risques budgétaires"""
         try:
-            projects = Projet.objects.filter(statut='en_cours')
-            budget_risks = []
-            
-            for project in projects:
-                budget_risk = self._check_budget_risk(project)
-                if budget_risk:
-                    budget_risk['project'] = project.nom
-                    budget_risks.append(budget_risk)
+            budget_risks = self._risques_actifs('budget')
             
             if not budget_risks:
                 return "✅ Aucun risque budgétaire identifié."
@@ -1213,14 +992,7 @@ FORMATAGE INTERDIT :
     def _analyze_team_risks(self):
         """Analyser les risques d'équipe"""
         try:
-            projects = Projet.objects.filter(statut='en_cours')
-            team_risks = []
-            
-            for project in projects:
-                team_risk = self._check_team_risk(project)
-                if team_risk:
-                    team_risk['project'] = project.nom
-                    team_risks.append(team_risk)
+            team_risks = self._risques_actifs('equipe')
             
             if not team_risks:
                 return "✅ Aucun risque d'équipe identifié."
@@ -1244,30 +1016,31 @@ FORMATAGE INTERDIT :
     def get_projects_budgets_overview(self):
         """Vue d'ensemble des budgets des projets"""
         try:
-            projects = Projet.objects.all()
-            if not projects.exists():
+            connaissances = InstantaneConnaissances.obtenir()
+            projects = connaissances.projets
+            if not projects:
                 return "Aucun projet trouvé dans la base de données."
             
-            projects_with_budget = projects.exclude(budget__isnull=True).exclude(budget='')
-            projects_without_budget = projects.filter(models.Q(budget__isnull=True) | models.Q(budget=''))
+            projects_with_budget = [project for project, _ in connaissances.budgets]
+            projects_without_budget = connaissances.projets_sans_budget
             
             response = f"""💰 Aperçu des budgets des projets
 
 📊 Statistiques générales :
-• Total des projets : {projects.count()}
-• Projets avec budget défini : {projects_with_budget.count()}
-• Projets sans budget : {projects_without_budget.count()}
+• Total des projets : {len(projects)}
+• Projets avec budget défini : {len(projects_with_budget)}
+• Projets sans budget : {len(projects_without_budget)}
 
 📋 Projets avec budget :"""
             
-            if projects_with_budget.exists():
+            if projects_with_budget:
                 for project in projects_with_budget[:10]:  # Limiter à 10 pour éviter une réponse trop longue
                     response += f"\n• {project.nom} : {project.budget}"
             else:
                 response += "\n• Aucun projet n'a de budget défini"
             
-            if projects_without_budget.exists():
-                response += f"\n\n⚠️ Projets sans budget ({projects_without_budget.count()}) :"
+            if projects_without_budget:
+                response += f"\n\n⚠️ Projets sans budget ({len(projects_without_budget)}) :"
                 for project in projects_without_budget[:5]:
                     response += f"\n• {project.nom}"
             
@@ -1279,14 +1052,14 @@ FORMATAGE INTERDIT :
     def get_projects_budgets_list(self):
         """Liste détaillée des budgets des projets"""
         try:
-            projects = Projet.objects.exclude(budget__isnull=True).exclude(budget='').order_by('nom')
+            budgets = InstantaneConnaissances.obtenir().budgets_par_nom
             
-            if not projects.exists():
+            if not budgets:
                 return "Aucun projet avec budget défini trouvé."
             
-            response = f"💰 Liste des budgets des projets ({projects.count()} projets)\n\n"
+            response = f"💰 Liste des budgets des projets ({len(budgets)} projets)\n\n"
             
-            for project in projects:
+            for project, _ in budgets:
                 response += f"• {project.nom}\n"
                 response += f"   💰 Budget : {project.budget}\n"
                 response += f"   📊 Statut : {project.get_statut_display()}\n"
@@ -1300,35 +1073,16 @@ FORMATAGE INTERDIT :
     def get_budgets_summary(self):
         """Résumé des budgets"""
         try:
-            projects = Projet.objects.exclude(budget__isnull=True).exclude(budget='')
+            budgets = InstantaneConnaissances.obtenir().budgets
             
-            if not projects.exists():
+            if not budgets:
                 return "Aucun projet avec budget défini trouvé."
             
-            # Essayer de convertir les budgets en nombres pour calculer des statistiques
-            numeric_budgets = []
-            text_budgets = []
+            # Montants lus à la construction de l'instantané (chatbot.connaissances.lire_budget)
+            numeric_budgets = [amount for _, amount in budgets if amount is not None]
+            text_budgets = [f"{project.nom}: {str(project.budget).strip()}" for project, _ in budgets]
             
-            for project in projects:
-                budget_str = str(project.budget).strip()
-                # Essayer d'extraire des nombres du budget
-                import re
-                numbers = re.findall(r'[\d,.\s]+', budget_str)
-                if numbers:
-                    try:
-                        # Nettoyer et convertir le premier nombre trouvé
-                        clean_number = re.sub(r'[^\d.,]', '', numbers[0])
-                        if clean_number:
-                            # Remplacer les virgules par des points pour la conversion
-                            clean_number = clean_number.replace(',', '.')
-                            numeric_budgets.append(float(clean_number))
-                            text_budgets.append(f"{project.nom}: {budget_str}")
-                    except:
-                        text_budgets.append(f"{project.nom}: {budget_str}")
-                else:
-                    text_budgets.append(f"{project.nom}: {budget_str}")
-            
-            response = f"💰 Résumé des budgets ({projects.count()} projets)\n\n"
+            response = f"💰 Résumé des budgets ({len(budgets)} projets)\n\n"
             
             if numeric_budgets:
                 total_budget = sum(numeric_budgets)
@@ -1357,19 +1111,16 @@ FORMATAGE INTERDIT :
     def get_highest_budget_projects(self):
         """Projets avec les budgets les plus élevés"""
         try:
-            projects = Projet.objects.exclude(budget__isnull=True).exclude(budget='')
+            budgets = InstantaneConnaissances.obtenir().budgets
             
-            if not projects.exists():
+            if not budgets:
                 return "Aucun projet avec budget défini trouvé."
             
-            # Trier par budget (en supposant que les budgets sont des chaînes contenant des nombres)
-            projects_list = []
-            for project in projects:
-                projects_list.append({
-                    'project': project,
-                    'budget_str': project.budget,
-                    'budget_num': self._extract_budget_number(project.budget)
-                })
+            # Trier par montant lu dans le budget (0 si le budget ne contient pas de nombre)
+            projects_list = [
+                {'project': project, 'budget_str': project.budget, 'budget_num': amount or 0}
+                for project, amount in budgets
+            ]
             
             # Trier par budget numérique (descendant)
             projects_list.sort(key=lambda x: x['budget_num'], reverse=True)
@@ -1391,19 +1142,16 @@ FORMATAGE INTERDIT :
     def get_lowest_budget_projects(self):
         """Projets avec les budgets les plus bas"""
         try:
-            projects = Projet.objects.exclude(budget__isnull=True).exclude(budget='')
+            budgets = InstantaneConnaissances.obtenir().budgets
             
-            if not projects.exists():
+            if not budgets:
                 return "Aucun projet avec budget défini trouvé."
             
-            # Trier par budget (en supposant que les budgets sont des chaînes contenant des nombres)
-            projects_list = []
-            for project in projects:
-                projects_list.append({
-                    'project': project,
-                    'budget_str': project.budget,
-                    'budget_num': self._extract_budget_number(project.budget)
-                })
+            # Trier par montant lu dans le budget (0 si le budget ne contient pas de nombre)
+            projects_list = [
+                {'project': project, 'budget_str': project.budget, 'budget_num': amount or 0}
+                for project, amount in budgets
+            ]
             
             # Trier par budget numérique (ascendant)
             projects_list.sort(key=lambda x: x['budget_num'])
@@ -1424,17 +1172,7 @@ FORMATAGE INTERDIT :
 
     def _extract_budget_number(self, budget_str):
         """Extraire un nombre d'une chaîne de budget"""
-        try:
-            import re
-            numbers = re.findall(r'[\d,.\s]+', str(budget_str))
-            if numbers:
-                clean_number = re.sub(r'[^\d.,]', '', numbers[0])
-                if clean_number:
-                    clean_number = clean_number.replace(',', '.')
-                    return float(clean_number)
-            return 0
-        except:
-            return 0
+        return lire_budget(budget_str) or 0
 
     # ===== FONCTIONS POUR LE PLANNING =====
     
@@ -2036,8 +1774,8 @@ FORMATAGE INTERDIT :
     def get_all_projects(self):
         """Récupérer TOUS les projets"""
         try:
-            all_projects = Projet.objects.all().order_by('-cree_le')
-            if not all_projects.exists():
+            all_projects = InstantaneConnaissances.obtenir().projets_recents
+            if not all_projects:
                 return "Aucun projet trouvé dans la base de données."
             
             projects_list = []
@@ -2045,7 +1783,7 @@ FORMATAGE INTERDIT :
                 status_emoji = "🚀" if project.statut == 'en_cours' else "⏳" if project.statut == 'en_attente' else "✅"
                 projects_list.append(f"• {project.nom} {status_emoji} ({project.statut})")
             
-            return f"📋 Liste complète de tous les projets ({all_projects.count()})\n\n{chr(10).join(projects_list)}"
+            return f"📋 Liste complète de tous les projets ({len(all_projects)})\n\n{chr(10).join(projects_list)}"
         except Exception as e:
             logger.error(f"Erreur lors de la récupération de tous les projets : {e}")
             return "Impossible de récupérer la liste des projets."
@@ -2162,42 +1900,17 @@ Que souhaitez-vous savoir ? 😊"""
     def _analyze_all_projects_risks(self):
         """Analyser les risques de tous les projets actifs"""
         try:
-            active_projects = Projet.objects.filter(statut='en_cours')
-            if not active_projects.exists():
+            active_projects = self._risques_projets_actifs()
+            if not active_projects:
                 return "Aucun projet actif à analyser."
 
-            all_risks = []
-            
-            for project in active_projects:
-                project_risks = []
-                
-                # Analyser chaque type de risque
-                delay_risk = self._check_delay_risk(project)
-                if delay_risk:
-                    delay_risk['project'] = project.nom
-                    project_risks.append(delay_risk)
-                
-                resource_risk = self._check_resource_risk(project)
-                if resource_risk:
-                    resource_risk['project'] = project.nom
-                    project_risks.append(resource_risk)
-                
-                dependency_risk = self._check_dependency_risk(project)
-                if dependency_risk:
-                    dependency_risk['project'] = project.nom
-                    project_risks.append(dependency_risk)
-                
-                budget_risk = self._check_budget_risk(project)
-                if budget_risk:
-                    budget_risk['project'] = project.nom
-                    project_risks.append(budget_risk)
-                
-                team_risk = self._check_team_risk(project)
-                if team_risk:
-                    team_risk['project'] = project.nom
-                    project_risks.append(team_risk)
-                
-                all_risks.extend(project_risks)
+            # Risques de chaque projet, dans l'ordre des contrôles
+            all_risks = [
+                dict(risk, project=project.nom)
+                for project, project_risks in active_projects
+                for risk in project_risks.values()
+                if risk
+            ]
 
             if not all_risks:
                 return "✅ Aucun risque majeur identifié sur les projets actifs."
@@ -2231,6 +1944,40 @@ Que souhaitez-vous savoir ? 😊"""
             logger.error(f"Erreur analyse générale : {e}")
             return "Erreur lors de l'analyse générale des risques."
 
+    # Types de risque contrôlés sur chaque projet actif (libellés des projets exposés)
+    LIBELLES_RISQUES = {
+        'retard': "Retard",
+        'ressources': "Ressources",
+        'dependances': "Dépendances",
+        'budget': "Budget",
+        'equipe': "Équipe",
+    }
+
+    def _risques_projets_actifs(self):
+        """
+        [(projet, {type: risque ou None})] des projets actifs, évalués une fois par
+        version de l'instantané des connaissances
+        """
+        connaissances = InstantaneConnaissances.obtenir()
+        return connaissances.memoriser('risques', lambda: [
+            (project, {
+                'retard': self._check_delay_risk(project),
+                'ressources': self._check_resource_risk(project),
+                'dependances': self._check_dependency_risk(project),
+                'budget': self._check_budget_risk(project),
+                'equipe': self._check_team_risk(project),
+            })
+            for project in connaissances.projets_actifs
+        ])
+
+    def _risques_actifs(self, type_risque):
+        """Risques d'un type sur les projets actifs (copies annotées du nom du projet)"""
+        return [
+            dict(project_risks[type_risque], project=project.nom)
+            for project, project_risks in self._risques_projets_actifs()
+            if project_risks[type_risque]
+        ]
+
     def _check_delay_risk(self, project):
         """Vérifier le risque de retard"""
         try:
@@ -2428,29 +2175,14 @@ Que souhaitez-vous savoir ? 😊"""
     def get_users_tasks_list(self):
         """Récupérer la liste des utilisateurs avec leurs tâches respectives"""
         try:
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
+            connaissances = InstantaneConnaissances.obtenir()
             
-            # Récupérer toutes les tâches avec leurs utilisateurs assignés
-            all_tasks = Tache.objects.select_related('projet').prefetch_related('assigne_a').all()
-            
-            if not all_tasks.exists():
+            if not connaissances.taches:
                 return "Aucune tâche trouvée dans le système."
             
-            # Grouper les tâches par utilisateur
-            users_tasks = {}
-            unassigned_tasks = []
-            
-            for task in all_tasks:
-                assignes = task.assigne_a.all()
-                if assignes.exists():
-                    # Ajouter la tâche à chaque utilisateur assigné
-                    for user in assignes:
-                        if user not in users_tasks:
-                            users_tasks[user] = []
-                        users_tasks[user].append(task)
-                else:
-                    unassigned_tasks.append(task)
+            # Tâches groupées par utilisateur dans l'instantané
+            users_tasks = connaissances.taches_par_utilisateur
+            unassigned_tasks = connaissances.taches_non_assignees
             
             users_info = []
             
@@ -2490,42 +2222,29 @@ Que souhaitez-vous savoir ? 😊"""
     def get_teams_tasks_list(self):
         """Récupérer la liste des équipes avec leurs tâches respectives"""
         try:
-            from django.contrib.auth import get_user_model
-            User = get_user_model()
-            from projects.models import MembreProjet
-            
-            # Récupérer tous les projets avec leurs membres
-            projets_with_members = Projet.objects.prefetch_related('membres__utilisateur', 'taches__assigne_a').all()
+            connaissances = InstantaneConnaissances.obtenir()
             
-            if not projets_with_members.exists():
+            if not connaissances.projets:
                 return "Aucun projet trouvé dans le système."
             
             teams_info = []
-            has_teams_with_members = False
             
             # 1. Essayer d'abord avec les équipes formelles (membres de projet)
-            for projet in projets_with_members:
-                # Récupérer les membres de l'équipe
-                membres = projet.membres.all()
-                
-                if not membres.exists():
-                    continue
-                
-                has_teams_with_members = True
+            equipes = connaissances.equipes
+            for projet, membres, unassigned_tasks in equipes:
                 projet_info = f"**🏢 Équipe du projet: {projet.nom} ({projet.code})**\n"
-                projet_info += f"📋 **{membres.count()} membre(s) dans l'équipe**\n\n"
+                projet_info += f"📋 **{len(membres)} membre(s) dans l'équipe**\n\n"
                 
-                # Pour chaque membre, récupérer ses tâches dans ce projet
-                for membre in membres:
+                # Pour chaque membre, ses tâches dans ce projet
+                for membre, user_tasks in membres:
                     user = membre.utilisateur
-                    user_tasks = projet.taches.filter(assigne_a=user)
                     
                     membre_info = f"  **👤 {user.get_full_name() or user.username}**\n"
                     membre_info += f"    - Rôle: {membre.role_projet}\n"
                     membre_info += f"    - Service: {membre.service.nom if membre.service else 'Non défini'}\n"
-                    membre_info += f"    - Tâches assignées: {user_tasks.count()}\n"
+                    membre_info += f"    - Tâches assignées: {len(user_tasks)}\n"
                     
-                    if user_tasks.exists():
+                    if user_tasks:
                         for task in user_tasks:
                             membre_info += f"      • **{task.titre}**\n"
                             membre_info += f"        - Statut: {task.get_statut_display()}\n"
@@ -2540,9 +2259,8 @@ Que souhaitez-vous savoir ? 😊"""
                     projet_info += membre_info
                 
                 # Ajouter les tâches non assignées dans ce projet
-                unassigned_tasks = projet.taches.filter(assigne_a__isnull=True)
-                if unassigned_tasks.exists():
-                    projet_info += f"  **⚠️ Tâches non assignées dans ce projet ({unassigned_tasks.count()})**\n"
+                if unassigned_tasks:
+                    projet_info += f"  **⚠️ Tâches non assignées dans ce projet ({len(unassigned_tasks)})**\n"
                     for task in unassigned_tasks:
                         projet_info += f"    • **{task.titre}** ({task.get_statut_display()})\n"
                     projet_info += "\n"
@@ -2550,22 +2268,20 @@ Que souhaitez-vous savoir ? 😊"""
                 teams_info.append(projet_info)
             
             # 2. Si aucune équipe formelle n'est trouvée, créer des équipes basées sur les tâches assignées
-            if not has_teams_with_members:
+            if not equipes:
                 logger.info("[Équipes] Aucune équipe formelle trouvée, création d'équipes basées sur les tâches")
                 
-                # Récupérer tous les utilisateurs qui ont des tâches assignées
-                users_with_tasks = User.objects.filter(taches_assignees__isnull=False).distinct()
+                # Utilisateurs qui ont des tâches assignées
+                users_with_tasks = sorted(connaissances.taches_par_utilisateur.items(), key=lambda item: item[0].pk)
                 
-                if users_with_tasks.exists():
+                if users_with_tasks:
                     teams_info.append("**🏢 Équipes basées sur les tâches assignées :**\n")
                     teams_info.append("*Note: Aucune équipe formelle n'est définie dans les projets. Voici les équipes basées sur les tâches assignées :*\n")
                     
-                    for user in users_with_tasks:
-                        user_tasks = Tache.objects.filter(assigne_a=user).select_related('projet').prefetch_related('assigne_a')
-                        
+                    for user, user_tasks in users_with_tasks:
                         user_info = f"**👤 Équipe de {user.get_full_name() or user.username}**\n"
                         user_info += f"📧 Email: {user.email}\n"
-                        user_info += f"📊 **{user_tasks.count()} tâche(s) assignée(s)**\n\n"
+                        user_info += f"📊 **{len(user_tasks)} tâche(s) assignée(s)**\n\n"
                         
                         # Grouper les tâches par projet
                         tasks_by_project = {}
@@ -2588,9 +2304,9 @@ Que souhaitez-vous savoir ? 😊"""
                         teams_info.append(user_info)
                     
                     # Ajouter les tâches non assignées
-                    unassigned_tasks = Tache.objects.filter(assigne_a__isnull=True)
-                    if unassigned_tasks.exists():
-                        unassigned_info = f"**⚠️ Tâches non assignées ({unassigned_tasks.count()})**\n"
+                    unassigned_tasks = connaissances.taches_non_assignees
+                    if unassigned_tasks:
+                        unassigned_info = f"**⚠️ Tâches non assignées ({len(unassigned_tasks)})**\n"
                         for task in unassigned_tasks:
                             unassigned_info += f"  • **{task.titre}** - {task.projet.nom} ({task.get_statut_display()})\n"
                         teams_info.append(unassigned_info)
@@ -2991,8 +2707,110 @@ Y a-t-il autre chose que vous aimeriez savoir ? 😊"""
         else:
             return "C'est une question intéressante ! 🤔 Je suis là pour t'aider, que ce soit avec tes projets marketing ou pour discuter de tout autre chose. Dis-moi, qu'est-ce qui te préoccupe ou t'intéresse en ce moment ? Je suis tout ouïe ! 😊"
 
+class ChatbotStreamView(View):
+    """
+    Variante asynchrone de ChatbotView : la réponse de DeepSeek est diffusée en
+    Server-Sent Events au fil de sa génération.
+
+    - Événements : `debut` (session_id), `morceau` (texte reçu, brut), puis `fin`
+      (réponse complète nettoyée avec son indicateur, session_id, deepseek_used)
+      une fois les messages sauvegardés.
+    - La conversation, l'analyse spaCy et la recherche des données s'exécutent en
+      parallèle dans des threads ; la boucle ASGI reste libre pendant l'appel
+      à DeepSeek.
+    - En cas d'échec de DeepSeek, `fin` porte la réponse de repli de ChatbotView.
+    """
+
+    async def post(self, request):
+        try:
+            donnees = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"error": "Corps JSON invalide"}, status=400)
+
+        try:
+            user = await self.authentifier(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=401)
+
+        user_input = donnees.get("question", "")
+        session_id = donnees.get("session_id") or str(uuid.uuid4())
+        if not user_input.strip():
+            return JsonResponse({"answer": "Veuillez poser une question."}, status=400)
+
+        chatbot = ChatbotView()
+        conversation, (tokens, entities), data_response = await asyncio.gather(
+            database_sync_to_async(chatbot.get_or_create_conversation, thread_sensitive=False)(user, session_id),
+            sync_to_async(chatbot.analyser_nlp, thread_sensitive=False)(user_input),
+            database_sync_to_async(chatbot.rechercher_donnees, thread_sensitive=False)(user_input),
+        )
+
+        async def evenements():
+            yield self.evenement('debut', {"session_id": session_id})
+
+            morceaux = []
+            deepseek_used = False
+            try:
+                async for morceau in ClientDeepSeek.diffuser(
+                    ChatbotView.CONSIGNE_DEEPSEEK,
+                    chatbot.construire_prompt(user_input, data_response),
+                    question=user_input,
+                    donnees=data_response or ''
+                ):
+                    morceaux.append(morceau)
+                    yield self.evenement('morceau', {"texte": morceau})
+                bot_response = chatbot.clean_markdown_formatting(''.join(morceaux))
+                deepseek_used = True
+            except Exception as e:
+                logger.error(f"[Chatbot] Erreur DeepSeek (streaming) : {e}")
+                bot_response = chatbot.reponse_de_repli(data_response)
+
+            await database_sync_to_async(self.sauvegarder)(
+                conversation, user_input, tokens, entities, bot_response, deepseek_used
+            )
+            yield self.evenement('fin', {
+                "answer": ChatbotView.avec_indicateur(bot_response, deepseek_used),
+                "session_id": session_id,
+                "deepseek_used": deepseek_used
+            })
+
+        reponse = StreamingHttpResponse(evenements(), content_type='text/event-stream')
+        reponse['Cache-Control'] = 'no-cache'
+        reponse['X-Accel-Buffering'] = 'no'   # Pas de mise en tampon par nginx
+        return reponse
+
+    @staticmethod
+    async def authentifier(request):
+        """Utilisateur du jeton JWT (None sans jeton), comme l'authentification DRF de ChatbotView"""
+        resultat = await sync_to_async(JWTAuthentication().authenticate)(request)
+        return resultat[0] if resultat else None
+
+    @staticmethod
+    def sauvegarder(conversation, user_input, tokens, entities, bot_response, deepseek_used):
+        """Message utilisateur et réponse du bot, une fois la réponse complète"""
+        with transaction.atomic():
+            Message.objects.create(
+                conversation=conversation,
+                sender='user',
+                content=user_input,
+                spacy_tokens=tokens,
+                spacy_entities=entities
+            )
+            Message.objects.create(
+                conversation=conversation,
+                sender='bot',
+                content=bot_response,
+                deepseek_used=deepseek_used
+            )
+
+    @staticmethod
+    def evenement(nom, donnees):
+        return f"event: {nom}\ndata: {json.dumps(donnees, ensure_ascii=False)}\n\n"
+
 class ChatHistoryView(APIView):
-    """Vue pour récupérer l'historique des conversations"""
+    """
+    Vue pour récupérer l'historique des conversations, paginé par curseur
+    (?cursor=...&page_size=...) sur (timestamp, id)
+    """
     permission_classes = []  # Permettre l'accès sans authentification
     
     def get(self, request):
@@ -3012,24 +2830,33 @@ class ChatHistoryView(APIView):
             if not conversation:
                 return Response({"messages": []})
             
-            # Récupérer tous les messages de la conversation
-            messages = conversation.messages.all()
+            # Une page de messages (les plus récents d'abord), sans les données NLP
+            paginator = MessageCursorPagination()
+            messages = paginator.paginate_queryset(
+                Message.objects.filter(conversation=conversation).values(
+                    'id', 'sender', 'content', 'timestamp', 'deepseek_used'
+                ),
+                request,
+                view=self
+            )
             
-            # Formater les messages pour le frontend
+            # Formater les messages pour le frontend (ordre chronologique dans la page)
             formatted_messages = []
-            for msg in messages:
+            for msg in reversed(messages):
                 formatted_messages.append({
-                    'id': msg.id,
-                    'sender': msg.sender,
-                    'text': msg.content,
-                    'timestamp': msg.timestamp.isoformat(),
-                    'deepseek_used': msg.deepseek_used
+                    'id': msg['id'],
+                    'sender': msg['sender'],
+                    'text': msg['content'],
+                    'timestamp': msg['timestamp'].isoformat(),
+                    'deepseek_used': msg['deepseek_used']
                 })
             
             return Response({
                 "messages": formatted_messages,
                 "conversation_id": conversation.id,
-                "created_at": conversation.created_at.isoformat()
+                "created_at": conversation.created_at.isoformat(),
+                "next": paginator.get_next_link(),          # Messages plus anciens
+                "previous": paginator.get_previous_link()   # Messages plus récents
             })
             
         except Exception as e:
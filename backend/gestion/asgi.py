@@ -18,6 +18,11 @@ django_asgi_app = get_asgi_application()
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.auth import AuthMiddlewareStack
 from notifications.routing import websocket_urlpatterns
+from chatbot.nlp import PipelineNLP, get_config as get_nlp_config
+
+# Modèle spaCy du chatbot chargé en fond au démarrage du worker (optionnel)
+if get_nlp_config()['PRECHARGER']:
+    PipelineNLP.prechauffer_en_fond()
 
 application = ProtocolTypeRouter({
     "http": django_asgi_app,
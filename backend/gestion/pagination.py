@@ -0,0 +1,102 @@
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+
+
+class KeysetCursorPagination(CursorPagination):
+    """
+    Pagination par curseur (keyset) sur un couple (champ, id).
+    
+    CursorPagination ne place que le premier champ de l'ordre dans le curseur et
+    départage les ex æquo par un OFFSET. Ici la position contient les deux
+    valeurs (« valeur|id ») et chaque page filtre (champ, id) < (x, y) (ou >
+    selon le sens) : aucune ligne n'est sautée ni relue, même si plusieurs
+    lignes partagent la même valeur du premier champ, et le coût d'une page ne
+    dépend pas de sa position. `ordering` vaut ('-champ', '-id') ou ('champ', 'id').
+    """
+    SEPARATEUR = '|'
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        # Copie de CursorPagination.paginate_queryset : seul le filtre sur la position change
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        if self.cursor is None:
+            (offset, reverse, current_position) = (0, False, None)
+        else:
+            (offset, reverse, current_position) = self.cursor
+        
+        if reverse:
+            queryset = queryset.order_by(*[
+                champ[1:] if champ.startswith('-') else f'-{champ}' for champ in self.ordering
+            ])
+        else:
+            queryset = queryset.order_by(*self.ordering)
+        
+        if current_position is not None:
+            # (curseur inversé) XOR (ordre décroissant) : éléments avant la position
+            avant = self.cursor.reverse != self.ordering[0].startswith('-')
+            queryset = queryset.filter(self._filtre_position(queryset.model, current_position, avant))
+        
+        results = list(queryset[offset:offset + self.page_size + 1])
+        self.page = list(results[:self.page_size])
+        
+        if len(results) > len(self.page):
+            has_following_position = True
+            following_position = self._get_position_from_instance(results[-1], self.ordering)
+        else:
+            has_following_position = False
+            following_position = None
+        
+        if reverse:
+            self.page = list(reversed(self.page))
+            self.has_next = (current_position is not None) or (offset > 0)
+            self.has_previous = has_following_position
+            if self.has_next:
+                self.next_position = current_position
+            if self.has_previous:
+                self.previous_position = following_position
+        else:
+            self.has_next = has_following_position
+            self.has_previous = (current_position is not None) or (offset > 0)
+            if self.has_next:
+                self.next_position = following_position
+            if self.has_previous:
+                self.previous_position = current_position
+        
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        
+        return self.page
+    
+    def _filtre_position(self, model, position, avant):
+        """Filtre (champ, id) < (valeur, id) si `avant`, sinon (champ, id) > (valeur, id)"""
+        champ, champ_id = (nom.lstrip('-') for nom in self.ordering[:2])
+        valeur, _, identifiant = position.rpartition(self.SEPARATEUR)
+        try:
+            valeur = model._meta.get_field(champ).to_python(valeur)
+            identifiant = model._meta.get_field(champ_id).to_python(identifiant)
+        except ValidationError:
+            raise NotFound(self.invalid_cursor_message)
+        if valeur is None or identifiant is None:
+            raise NotFound(self.invalid_cursor_message)
+        operateur = 'lt' if avant else 'gt'
+        # Borne large redondante : permet un parcours d'index par intervalle sur le champ
+        return Q(**{f'{champ}__{operateur}e': valeur}) & (
+            Q(**{f'{champ}__{operateur}': valeur}) | Q(**{champ: valeur, f'{champ_id}__{operateur}': identifiant})
+        )
+    
+    def _get_position_from_instance(self, instance, ordering):
+        champ, champ_id = (nom.lstrip('-') for nom in ordering[:2])
+        if isinstance(instance, dict):
+            valeur, identifiant = instance[champ], instance[champ_id]
+        else:
+            valeur, identifiant = getattr(instance, champ), getattr(instance, champ_id)
+        valeur = valeur.isoformat() if hasattr(valeur, 'isoformat') else str(valeur)
+        return f'{valeur}{self.SEPARATEUR}{identifiant}'
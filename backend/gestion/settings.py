@@ -325,6 +325,16 @@ DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'marketges174@gmail.com')
 # Timeout pour la connexion SMTP (en secondes) - augmenté pour les connexions lentes
 EMAIL_TIMEOUT = 30
 
+# File d'attente des emails sortants (voir projects/email_outbox.py)
+# Les emails sont envoyés par : python manage.py process_email_outbox --loop
+EMAIL_OUTBOX = {
+    'BATCH_SIZE': int(os.getenv('EMAIL_OUTBOX_BATCH_SIZE', '50')),
+    'MAX_ATTEMPTS': 5,
+    'BACKOFF_BASE': 30,
+    'BACKOFF_MAX': 3600,
+    'LOCK_TIMEOUT': 600,
+}
+
 # URL du frontend pour les liens dans les emails
 FRONTEND_URL = os.getenv('FRONTEND_URL', 'http://localhost:5173')
 
@@ -337,22 +347,136 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 SITE_ID = 1
 
 # Configuration Django Channels
-# Configuration pour le développement (sans Redis)
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# CHANNEL_LAYER choisit la couche de messages des WebSockets :
+#   - "memory"       : en mémoire, un seul processus Daphne (développement)
+#   - "redis"        : channels_redis.core.RedisChannelLayer (production, plusieurs workers)
+#   - "redis_pubsub" : channels_redis.pubsub.RedisPubSubChannelLayer (fonctionne aussi avec
+#                      le serveur local notifications/local_redis.py pour les tests)
+CHANNEL_LAYER = os.getenv('CHANNEL_LAYER', 'memory')
+REDIS_URL = os.getenv('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+# Réglages de capacité et d'expiration (couches "memory" et "redis")
+CHANNEL_LAYER_TUNING = {
+    # Messages en attente par canal avant ChannelFull
+    'capacity': int(os.getenv('CHANNEL_CAPACITY', '200')),
+    # Durée de vie (s) d'un message non consommé
+    'expiry': int(os.getenv('CHANNEL_EXPIRY', '60')),
+    # Durée (s) d'appartenance à un groupe : au moins la durée de vie d'une connexion WebSocket
+    'group_expiry': int(os.getenv('CHANNEL_GROUP_EXPIRY', '86400')),
+}
+
+if CHANNEL_LAYER == 'redis':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+                'prefix': 'gestion',
+                **CHANNEL_LAYER_TUNING,
+            },
+        },
+    }
+elif CHANNEL_LAYER == 'redis_pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': [REDIS_URL],
+                'prefix': 'gestion',
+            },
+        },
     }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer',
+            'CONFIG': CHANNEL_LAYER_TUNING,
+        },
+    }
+
+# Registre de présence WebSocket (voir notifications/presence.py) : partagé via
+# Redis avec la couche "redis", local au processus sinon (le serveur local
+# pub/sub ne supporte pas les ensembles triés)
+PRESENCE = {
+    'BACKEND': os.getenv('PRESENCE_BACKEND', 'redis' if CHANNEL_LAYER == 'redis' else 'memory'),
+    'TTL': 90,
+    'HEARTBEAT': 30,
+    'DIFFUSION_MS': 1000,
+}
+
+# Historique récent des salons de chat et écriture différée des messages
+# (voir notifications/historique_chat.py) : tampon partagé via Redis avec la couche "redis"
+CHAT_HISTORIQUE = {
+    'BACKEND': os.getenv('CHAT_HISTORIQUE_BACKEND', 'redis' if CHANNEL_LAYER == 'redis' else 'memory'),
+    'TAILLE': 50,
+    'ASYNC': os.getenv('CHAT_ECRITURE_ASYNC', 'True') == 'True',
+    'INTERVALLE_MS': 500,
+    'LOT': 200,
+}
+
+# Regroupement des messages WebSocket de notification par groupe (voir notifications/diffusion.py)
+NOTIFICATIONS_COALESCING = {
+    'ACTIF': True,
+    'FENETRE_MS': 100,
+    'LATENCE_MAX_MS': 200,
+    'TAILLE_MAX': 50,
 }
 
-# Configuration alternative pour la production (avec Redis)
-# CHANNEL_LAYERS = {
-#     'default': {
-#         'BACKEND': 'channels_redis.core.RedisChannelLayer',
-#         'CONFIG': {
-#             "hosts": [('127.0.0.1', 6379)],
-#         },
-#     },
-# }
+# Cache Django (compteurs de notifications non lues, voir notifications/compteurs.py)
+# Avec plusieurs workers, le cache doit être partagé : CACHE_BACKEND=redis
+if os.getenv('CACHE_BACKEND', 'memory') == 'redis':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': 'gestion',
+        },
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+    }
+
+# Notifications émises par les signaux (voir notifications/dispatcher.py) :
+# créées après le commit, insérées et diffusées par lot dans un thread de fond
+NOTIFICATIONS_DISPATCH = {
+    'ASYNC': os.getenv('NOTIFICATIONS_DISPATCH_ASYNC', 'True') == 'True',
+    'BATCH_SIZE': 500,
+}
+
+# Pipeline spaCy du chatbot (voir chatbot/nlp.py) : chargé à la première utilisation,
+# ou au démarrage des workers avec CHATBOT_NLP_PRECHARGER=True
+CHATBOT_NLP = {
+    'EN_LIGNE': os.getenv('CHATBOT_NLP_EN_LIGNE', 'True') == 'True',
+    'PRECHARGER': os.getenv('CHATBOT_NLP_PRECHARGER', 'False') == 'True',
+    'BATCH_SIZE': 64,
+}
+
+# Appels DeepSeek du chatbot (voir chatbot/deepseek.py) : cache des réponses,
+# appel unique par question, session HTTP partagée et disjoncteur
+CHATBOT_DEEPSEEK = {
+    'URL': os.getenv('CHATBOT_DEEPSEEK_URL', 'https://api.deepseek.com/v1/chat/completions'),
+    'CACHE_TTL': int(os.getenv('CHATBOT_DEEPSEEK_CACHE_TTL', '300')),
+    'TIMEOUT_LECTURE': 30,
+    'SEUIL_ECHECS': 5,
+    'DELAI_REOUVERTURE': 30,
+}
+
+# Instantané des données lues par le chatbot (voir chatbot/connaissances.py) :
+# invalidé par les signaux des projets et des tâches, reconstruit au plus tard après TTL secondes
+CHATBOT_CONNAISSANCES = {
+    'TTL': int(os.getenv('CHATBOT_CONNAISSANCES_TTL', '300')),
+}
+
+# Historique du chatbot (voir chatbot/historique.py) : données spaCy conservées
+# ('complet', 'entites' ou 'aucun') et rétention appliquée par cleanup_chatbot_history
+CHATBOT_HISTORIQUE = {
+    'NLP': os.getenv('CHATBOT_HISTORIQUE_NLP', 'complet'),
+    'COMPACTER_APRES_JOURS': int(os.getenv('CHATBOT_HISTORIQUE_COMPACTER_APRES_JOURS', '30')),
+    'ARCHIVER_APRES_JOURS': int(os.getenv('CHATBOT_HISTORIQUE_ARCHIVER_APRES_JOURS', '180')),
+}
 
 # Configuration des fichiers médias
 MEDIA_URL = '/media/'
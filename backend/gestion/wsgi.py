@@ -14,3 +14,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'gestion.settings')
 
 application = get_wsgi_application()
+
+# Modèle spaCy du chatbot chargé en fond au démarrage du worker (optionnel)
+from chatbot.nlp import PipelineNLP, get_config as get_nlp_config
+
+if get_nlp_config()['PRECHARGER']:
+    PipelineNLP.prechauffer_en_fond()
@@ -4,8 +4,9 @@ from django.urls import reverse
 from django.utils import timezone
 from .models import (
     Notification, NotificationType, ChatMessage, 
-    NotificationPreference, NotificationLog
+    NotificationPreference, NotificationLog, NotificationGeneraleEtat
 )
+from .compteurs import CompteurNonLues
 
 
 @admin.register(NotificationType)
@@ -86,10 +87,10 @@ class NotificationAdmin(admin.ModelAdmin):
 
 @admin.register(ChatMessage)
 class ChatMessageAdmin(admin.ModelAdmin):
-    list_display = ['expediteur', 'message_short', 'est_systeme', 'service', 'cree_le']
-    list_filter = ['est_systeme', 'service', 'cree_le']
+    list_display = ['expediteur', 'message_short', 'salon', 'est_systeme', 'service', 'cree_le']
+    list_filter = ['salon', 'est_systeme', 'service', 'cree_le']
     search_fields = ['message', 'expediteur__username']
-    readonly_fields = ['cree_le']
+    readonly_fields = ['uid', 'cree_le']
     date_hierarchy = 'cree_le'
     
     def message_short(self, obj):
@@ -100,6 +101,13 @@ class ChatMessageAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('expediteur', 'service')
 
 
+@admin.register(NotificationGeneraleEtat)
+class NotificationGeneraleEtatAdmin(admin.ModelAdmin):
+    list_display = ['utilisateur', 'derniere_lue_id', 'mis_a_jour_le']
+    search_fields = ['utilisateur__username']
+    readonly_fields = ['mis_a_jour_le']
+
+
 @admin.register(NotificationPreference)
 class NotificationPreferenceAdmin(admin.ModelAdmin):
     list_display = ['utilisateur', 'notifications_email', 'notifications_push', 'notifications_chat']
@@ -143,20 +151,16 @@ class NotificationLogAdmin(admin.ModelAdmin):
 # Actions personnalisées
 @admin.action(description="Marquer comme lues")
 def marquer_comme_lues(modeladmin, request, queryset):
-    updated = 0
-    for notification in queryset:
-        if notification.statut == 'non_lue':
-            notification.marquer_comme_lue()
-            updated += 1
+    non_lues = queryset.filter(statut='non_lue')
+    CompteurNonLues.invalider(non_lues.values_list('destinataire_id', flat=True).distinct())
+    updated = non_lues.update(statut='lue', lue_le=timezone.now())
     
     modeladmin.message_user(request, f"{updated} notification(s) marquée(s) comme lue(s).")
 
 @admin.action(description="Archiver")
 def archiver_notifications(modeladmin, request, queryset):
-    updated = 0
-    for notification in queryset:
-        notification.archiver()
-        updated += 1
+    CompteurNonLues.invalider(queryset.filter(statut='non_lue').values_list('destinataire_id', flat=True).distinct())
+    updated = queryset.update(statut='archivee')
     
     modeladmin.message_user(request, f"{updated} notification(s) archivée(s).")
 
@@ -0,0 +1,88 @@
+"""
+Compteur de notifications non lues par utilisateur, conservé dans le cache Django.
+
+Le badge de la cloche (API unread-count, push WebSocket) lit ce compteur au lieu
+de relancer un COUNT(*) à chaque événement. Le compteur est :
+
+- calculé à la première lecture puis mis en cache (TIMEOUT) ;
+- incrémenté / décrémenté après le commit lors d'une création, d'une lecture
+  ou d'un archivage unitaire ;
+- invalidé par les opérations en masse (UPDATE / DELETE sur un queryset), la
+  lecture suivante le recalcule.
+
+En production multi-processus, le cache doit être partagé (CACHES « redis ») ;
+avec le cache mémoire local, l'écart éventuel entre processus est borné par TIMEOUT.
+
+Chaque ajustement ou invalidation invalide aussi l'instantané envoyé à la
+connexion WebSocket (InstantaneNonLues) des mêmes utilisateurs.
+"""
+from django.core.cache import cache
+from django.db import transaction
+import logging
+
+from .instantanes import InstantaneNonLues
+
+logger = logging.getLogger(__name__)
+
+
+class CompteurNonLues:
+    """Compteur de notifications personnelles non lues, par utilisateur"""
+
+    # Durée de vie (s) d'un compteur : borne l'écart en cas de mise à jour non suivie
+    TIMEOUT = 300
+
+    @staticmethod
+    def _cle(user_id):
+        return f"notifications:non_lues:{user_id}"
+
+    @classmethod
+    def obtenir(cls, user_id):
+        """Nombre de notifications non lues, recalculé si absent du cache"""
+        cle = cls._cle(user_id)
+        valeur = cache.get(cle)
+        if valeur is not None and valeur >= 0:
+            return valeur
+        return cls.definir(user_id, cls._compter(user_id), remplacer=valeur is not None)
+
+    @classmethod
+    def definir(cls, user_id, valeur, remplacer=True):
+        """Enregistre une valeur exacte (calculée par ailleurs) et la retourne"""
+        if remplacer:
+            cache.set(cls._cle(user_id), valeur, cls.TIMEOUT)
+        else:
+            # add : ne pas écraser un incrément concurrent arrivé entre-temps
+            cache.add(cls._cle(user_id), valeur, cls.TIMEOUT)
+        return valeur
+
+    @staticmethod
+    def _compter(user_id):
+        from .models import Notification
+        return Notification.objects.filter(destinataire_id=user_id, statut='non_lue').count()
+
+    @classmethod
+    def ajuster(cls, deltas):
+        """Applique {user_id: delta} après le commit de la transaction courante"""
+        InstantaneNonLues.invalider(user_id for user_id, delta in deltas.items() if delta)
+        deltas = {user_id: delta for user_id, delta in deltas.items() if user_id and delta}
+        if deltas:
+            transaction.on_commit(lambda: cls._appliquer(deltas))
+
+    @classmethod
+    def _appliquer(cls, deltas):
+        for user_id, delta in deltas.items():
+            try:
+                cache.incr(cls._cle(user_id), delta)
+            except ValueError:
+                # Compteur absent : il sera calculé à la prochaine lecture
+                pass
+            except Exception as e:
+                logger.error(f"Erreur lors de la mise à jour du compteur de notifications ({user_id}): {e}")
+
+    @classmethod
+    def invalider(cls, user_ids):
+        """Supprime les compteurs après le commit (opérations en masse)"""
+        user_ids = set(user_ids)
+        InstantaneNonLues.invalider(user_ids)
+        cles = [cls._cle(user_id) for user_id in set(user_ids) if user_id]
+        if cles:
+            transaction.on_commit(lambda: cache.delete_many(cles))
@@ -1,11 +1,19 @@
+import asyncio
 import json
 import logging
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 from django.utils import timezone
+from urllib.parse import parse_qs
 from .models import Notification, ChatMessage, NotificationType
-from .services import NotificationService
+from .compteurs import CompteurNonLues
+from .diffusion import DiffusionGroupee
+from .instantanes import InstantaneNonLues
+from .presence import AnnoncesPresence, PresenceService, get_config as get_presence_config
+from .services import NotificationService, ChatService
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
@@ -31,24 +39,32 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         self.chat_group = "chat_general"
         self.online_group = "online_users"
         
-        # Rejoindre les groupes
-        await self.channel_layer.group_add(self.general_group, self.channel_name)
-        await self.channel_layer.group_add(self.personal_group, self.channel_name)
-        await self.channel_layer.group_add(self.chat_group, self.channel_name)
-        await self.channel_layer.group_add(self.online_group, self.channel_name)
+        # Rejoindre les groupes (en parallèle)
+        await asyncio.gather(*[
+            self.channel_layer.group_add(groupe, self.channel_name)
+            for groupe in (self.general_group, self.personal_group, self.chat_group, self.online_group)
+        ])
+        
+        # Les notifications (différées ou regroupées) sont diffusées dans la boucle de ce processus
+        DiffusionGroupee.attacher_boucle(asyncio.get_running_loop())
         
         await self.accept()
         
-        # Marquer l'utilisateur comme en ligne
-        await self.mark_user_online()
+        # Enregistrer la connexion dans le registre de présence (battements périodiques)
+        arrive = await self.mark_user_online()
+        self.battements = asyncio.ensure_future(self.battre())
+        AnnoncesPresence.demarrer_expiration()
         
-        # Envoyer les notifications non lues
-        await self.send_notifications_non_lues()
+        # Envoyer les notifications non lues (seulement les nouvelles si le client
+        # indique la dernière notification reçue avant sa reconnexion : ?last_id=)
+        await self.send_notifications_non_lues(self.get_dernier_vu())
         
         # Les messages de connexion sont maintenant gérés par le composant ConnectionStatus
         
-        # Diffuser la liste des utilisateurs en ligne
-        await self.broadcast_online_users()
+        # Liste complète pour ce client, puis seule l'arrivée est diffusée aux autres
+        await self.send_online_users()
+        if arrive:
+            await self.broadcast_presence('arrive', [self.user.id])
     
     @database_sync_to_async
     def get_or_create_test_user(self):
@@ -84,15 +100,19 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     
     async def disconnect(self, close_code):
         """Déconnexion WebSocket"""
+        if hasattr(self, 'battements'):
+            self.battements.cancel()
+        
         if hasattr(self, 'user') and not self.user.is_anonymous:
-            # Marquer l'utilisateur comme hors ligne
-            await self.mark_user_offline()
+            # Retirer la connexion du registre de présence
+            parti = await self.mark_user_offline()
             
             # Notifier la déconnexion dans le chat
             await self.notifier_deconnexion()
             
-            # Diffuser la liste des utilisateurs en ligne mise à jour
-            await self.broadcast_online_users()
+            # Diffuser le départ si c'était la dernière connexion de l'utilisateur
+            if parti:
+                await self.broadcast_presence('parti', [self.user.id])
             
             # Quitter les groupes
             await self.channel_layer.group_discard(self.general_group, self.channel_name)
@@ -116,6 +136,9 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 await self.handle_mark_notification_read(data)
             elif message_type == 'get_notifications':
                 await self.handle_get_notifications(data)
+            elif message_type == 'ping':
+                await sync_to_async(PresenceService.battement, thread_sensitive=False)(self.user.id, self.channel_name)
+                await self.send(text_data=json.dumps({'type': 'pong'}))
             else:
                 await self.send(text_data=json.dumps({
                     'type': 'error',
@@ -145,7 +168,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             }))
             return
         
-        # Créer le message de chat
+        # Créer le message de chat (diffusé avant son insertion en base)
         chat_message = await self.create_chat_message(message_text)
         
         # Diffuser le message à tous les utilisateurs connectés
@@ -153,13 +176,7 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             self.chat_group,
             {
                 'type': 'chat_message',
-                'message': {
-                    'id': chat_message['id'],
-                    'expediteur': chat_message['expediteur'],
-                    'message': chat_message['message'],
-                    'cree_le': chat_message['cree_le'],
-                    'service_nom': chat_message.get('service_nom')
-                }
+                'message': chat_message
             }
         )
     
@@ -205,15 +222,16 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                 }))
         else:
             # Supprimer un message spécifique
-            success = await self.delete_chat_message(message_id, self.user)
+            supprime = await self.delete_chat_message(message_id, self.user)
             
-            if success:
-                # Diffuser la suppression à tous les utilisateurs connectés
+            if supprime:
+                # Diffuser la suppression aux utilisateurs du salon du message
+                message_uid, salon = supprime
                 await self.channel_layer.group_send(
-                    self.chat_group,
+                    f"chat_{salon}",
                     {
                         'type': 'message_deleted',
-                        'message_id': message_id,
+                        'message_id': message_uid,
                         'deleted_by': {
                             'id': self.user.id,
                             'prenom': self.user.prenom,
@@ -259,6 +277,13 @@ class NotificationConsumer(AsyncWebsocketConsumer):
             'data': event['notification']
         }))
     
+    async def notification_batch(self, event):
+        """Diffuser un lot de notifications regroupées (DiffusionGroupee) en une seule trame"""
+        await self.send(text_data=json.dumps({
+            'type': 'notifications_batch',
+            'data': event['messages']
+        }))
+    
     async def notification_system(self, event):
         """Diffuser une notification système"""
         await self.send(text_data=json.dumps({
@@ -268,54 +293,26 @@ class NotificationConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def create_chat_message(self, message_text):
-        """Créer un message de chat"""
-        chat_message = ChatMessage.objects.create(
-            expediteur=self.user,
-            message=message_text,
-            service=self.user.service
-        )
-        
-        return {
-            'id': chat_message.id,
-            'expediteur': {
-                'id': self.user.id,
-                'username': self.user.username,
-                'prenom': self.user.prenom,
-                'nom': self.user.nom,
-                'service': {
-                    'id': self.user.service.id if self.user.service else None,
-                    'nom': self.user.service.nom if self.user.service else None
-                }
-            },
-            'message': chat_message.message,
-            'cree_le': chat_message.cree_le.isoformat(),
-            'service_nom': self.user.service.nom if self.user.service else None
-        }
+        """Créer un message de chat dans le salon général (insertion différée)"""
+        return ChatService.publier_message(self.user, message_text, salon='general')
     
     @database_sync_to_async
     def delete_chat_message(self, message_id, user):
-        """Supprimer un message de chat"""
+        """
+        Supprimer un message de chat (propriétaire du message ou super admin) ;
+        retourne (uid, salon) du message supprimé ou None
+        """
         try:
-            chat_message = ChatMessage.objects.get(id=message_id)
-            
-            # Vérifier que l'utilisateur peut supprimer ce message
-            # (propriétaire du message ou super admin)
-            if chat_message.expediteur != user and not user.is_superuser:
-                return False
-            
-            chat_message.delete()
-            return True
-        except ChatMessage.DoesNotExist:
-            return False
+            return ChatService.supprimer_message(message_id, user)
         except Exception as e:
             logger.error(f"Erreur lors de la suppression du message {message_id}: {e}")
-            return False
+            return None
     
     @database_sync_to_async
     def delete_all_chat_messages(self):
         """Supprimer tous les messages de chat"""
         try:
-            ChatMessage.objects.all().delete()
+            ChatService.supprimer_tous_messages()
             return True
         except Exception as e:
             logger.error(f"Erreur lors de la suppression de tous les messages: {e}")
@@ -326,28 +323,43 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         """Marquer une notification comme lue"""
         try:
             notification = Notification.objects.get(
-                id=notification_id,
-                destinataire=self.user
+                Q(destinataire=self.user) | Q(destinataire__isnull=True),
+                id=notification_id
             )
-            notification.marquer_comme_lue()
+            if notification.destinataire_id is None:
+                NotificationService.mark_general_notifications_read(self.user, [notification.id])
+            else:
+                notification.marquer_comme_lue()
             return True
         except Notification.DoesNotExist:
             return False
     
+    def get_dernier_vu(self):
+        """Identifiant de la dernière notification reçue par le client (paramètre last_id)"""
+        parametres = parse_qs(self.scope.get('query_string', b'').decode())
+        try:
+            return int(parametres['last_id'][0])
+        except (KeyError, IndexError, ValueError):
+            return None
+    
     @database_sync_to_async
     def get_notifications_non_lues(self):
-        """Récupérer les notifications non lues"""
+        """Notifications non lues depuis l'instantané en cache (construit au besoin)"""
+        return InstantaneNonLues.obtenir(self.user.id, self.construire_notifications_non_lues)
+    
+    def construire_notifications_non_lues(self):
+        """Construire l'instantané des notifications non lues"""
         # Notifications personnelles non lues
         notifications_personnelles = Notification.objects.filter(
             destinataire=self.user,
             statut='non_lue'
         ).select_related('type_notification', 'projet', 'tache')[:10]
         
-        # Notifications générales récentes
+        # Notifications générales non lues (au-delà du repère de lecture de l'utilisateur)
+        etat = NotificationService.get_general_state(self.user)
         notifications_generales = Notification.objects.filter(
-            destinataire__isnull=True,
-            cree_le__gte=timezone.now() - timezone.timedelta(days=7)
-        ).select_related('type_notification', 'projet', 'tache')[:10]
+            NotificationService.general_status_q(etat, 'non_lue')
+        ).select_related('type_notification', 'projet', 'tache').order_by('-id')[:10]
         
         return {
             'personnelles': [
@@ -375,16 +387,33 @@ class NotificationConsumer(AsyncWebsocketConsumer):
                     'tache_titre': n.tache.titre if n.tache else None
                 }
                 for n in notifications_generales
-            ]
+            ],
+            'nombre_non_lues': CompteurNonLues.obtenir(self.user.id),
+            'nombre_generales_non_lues': NotificationService.get_general_unread_count(self.user, etat)
         }
     
-    async def send_notifications_non_lues(self):
-        """Envoyer les notifications non lues au client"""
+    async def send_notifications_non_lues(self, dernier_vu=None):
+        """
+        Envoyer les notifications non lues au client ; avec `dernier_vu`, seulement
+        celles qu'il n'a pas encore reçues (delta de reconnexion)
+        """
         notifications = await self.get_notifications_non_lues()
         
+        if dernier_vu is not None:
+            notifications = {
+                **notifications,
+                'personnelles': [n for n in notifications['personnelles'] if n['id'] > dernier_vu],
+                'generales': [n for n in notifications['generales'] if n['id'] > dernier_vu],
+            }
+        
+        dernier_id = max(
+            [n['id'] for n in notifications['personnelles'] + notifications['generales']] + [dernier_vu or 0]
+        )
         await self.send(text_data=json.dumps({
             'type': 'notifications_non_lues',
-            'data': notifications
+            'data': notifications,
+            'delta': dernier_vu is not None,
+            'dernier_id': dernier_id
         }))
     
     async def send_notifications(self, notification_type):
@@ -415,11 +444,10 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         
         if not recent_connection:
             # Créer un message système de connexion
-            ChatMessage.objects.create(
-                expediteur=self.user,
-                message=f"{self.user.prenom or self.user.username} s'est connecté",
-                est_systeme=True,
-                service=self.user.service
+            ChatService.publier_message(
+                self.user,
+                f"{self.user.prenom or self.user.username} s'est connecté",
+                est_systeme=True
             )
     
     @database_sync_to_async
@@ -434,77 +462,71 @@ class NotificationConsumer(AsyncWebsocketConsumer):
         
         if not recent_disconnection:
             # Créer un message système de déconnexion
-            ChatMessage.objects.create(
-                expediteur=self.user,
-                message=f"{self.user.prenom or self.user.username} s'est déconnecté",
-                est_systeme=True,
-                service=self.user.service
+            ChatService.publier_message(
+                self.user,
+                f"{self.user.prenom or self.user.username} s'est déconnecté",
+                est_systeme=True
             )
     
     @database_sync_to_async
     def mark_user_online(self):
-        """Marquer l'utilisateur comme en ligne"""
-        from .services import ChatService
+        """Enregistrer la connexion ; True si l'utilisateur vient de passer en ligne"""
         try:
             # Vérifier si l'utilisateur n'est pas anonyme avant de le marquer en ligne
             if not self.user.is_anonymous and hasattr(self.user, 'save'):
-                logger.info(f"Marquage en ligne de l'utilisateur: {self.user.username}")
-                ChatService.mark_user_online(self.user)
-                logger.info(f"Utilisateur {self.user.username} marqué comme en ligne")
-            else:
-                logger.warning(f"Utilisateur anonyme ou sans méthode save: {self.user}")
+                return ChatService.mark_user_online(self.user, self.channel_name)
+            logger.warning(f"Utilisateur anonyme ou sans méthode save: {self.user}")
         except Exception as e:
             logger.warning(f"Erreur lors du marquage en ligne: {e}")
-            pass
+        return False
     
     @database_sync_to_async
     def mark_user_offline(self):
-        """Marquer l'utilisateur comme hors ligne"""
-        from .services import ChatService
+        """Retirer la connexion ; True si c'était la dernière de l'utilisateur"""
         try:
             # Vérifier si l'utilisateur n'est pas anonyme avant de le marquer hors ligne
             if not self.user.is_anonymous and hasattr(self.user, 'save'):
-                ChatService.mark_user_offline(self.user)
+                return ChatService.mark_user_offline(self.user, self.channel_name)
         except Exception as e:
             logger.warning(f"Erreur lors du marquage hors ligne: {e}")
-            pass
-    
-    @database_sync_to_async
-    def get_online_users_list(self):
-        """Récupérer la liste des utilisateurs en ligne"""
-        from .services import ChatService
-        users = ChatService.get_online_users()
-        
-        return [
-            {
-                'id': user.id,
-                'username': user.username,
-                'prenom': user.prenom,
-                'nom': user.nom,
-                'service': user.service.nom if user.service else None,
-                'last_login': user.last_login.isoformat() if user.last_login else None
-            }
-            for user in users
-        ]
+        return False
+    
+    async def battre(self):
+        """
+        Rafraîchit la connexion dans le registre tant que le WebSocket est ouvert ;
+        l'expiration des connexions est faite une fois par processus (AnnoncesPresence)
+        """
+        intervalle = get_presence_config()['HEARTBEAT']
+        while True:
+            await asyncio.sleep(intervalle)
+            try:
+                await sync_to_async(PresenceService.battement, thread_sensitive=False)(self.user.id, self.channel_name)
+            except Exception as e:
+                logger.warning(f"Erreur lors du battement de présence: {e}")
+    
+    async def send_online_users(self):
+        """Envoyer la liste complète des utilisateurs en ligne à ce client"""
+        online_users = await AnnoncesPresence.liste_en_ligne()
+        await self.send(text_data=json.dumps({
+            'type': 'online_users',
+            'users': online_users,
+            'count': len(online_users)
+        }))
     
-    async def broadcast_online_users(self):
-        """Diffuser la liste des utilisateurs en ligne"""
-        online_users = await self.get_online_users_list()
-        
-        await self.channel_layer.group_send(
-            self.online_group,
-            {
-                'type': 'online_users_update',
-                'users': online_users,
-                'count': len(online_users)
-            }
-        )
+    async def broadcast_presence(self, etat, user_ids):
+        """
+        Annoncer l'arrivée ou le départ d'utilisateurs (pas la liste complète) ;
+        les annonces du processus sont regroupées avant diffusion (AnnoncesPresence)
+        """
+        AnnoncesPresence.annoncer(etat, user_ids)
     
-    async def online_users_update(self, event):
-        """Diffuser la mise à jour des utilisateurs en ligne"""
+    async def presence_update(self, event):
+        """Transmettre une arrivée / un départ au client"""
+        AnnoncesPresence.oublier_liste()
         await self.send(text_data=json.dumps({
-            'type': 'online_users_update',
+            'type': 'presence_update',
             'data': {
+                'etat': event['etat'],
                 'users': event['users'],
                 'count': event['count']
             }
@@ -525,7 +547,9 @@ class ChatConsumer(AsyncWebsocketConsumer):
             # Créer un utilisateur temporaire pour les tests
             self.user = await self.get_or_create_test_user()
         
-        self.room_group_name = "chat_general"
+        # Un groupe par salon (ws/chat/<room_name>/)
+        self.room_name = self.scope['url_route']['kwargs'].get('room_name', 'general')
+        self.room_group_name = f"chat_{self.room_name}"
         
         # Rejoindre le groupe de chat
         await self.channel_layer.group_add(
@@ -535,7 +559,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         
         await self.accept()
         
-        # Envoyer les derniers messages
+        # Envoyer les derniers messages (depuis le tampon du salon)
         await self.send_recent_messages()
         
         # Les messages de connexion sont maintenant gérés par le composant ConnectionStatus
@@ -618,7 +642,7 @@ class ChatConsumer(AsyncWebsocketConsumer):
         """Créer et diffuser un message"""
         chat_message = await self.create_chat_message(message_text)
         
-        # Diffuser à tous les utilisateurs connectés
+        # Diffuser à tous les utilisateurs du salon
         await self.channel_layer.group_send(
             self.room_group_name,
             {
@@ -629,48 +653,13 @@ class ChatConsumer(AsyncWebsocketConsumer):
     
     @database_sync_to_async
     def create_chat_message(self, message_text):
-        """Créer un message de chat"""
-        chat_message = ChatMessage.objects.create(
-            expediteur=self.user,
-            message=message_text,
-            service=self.user.service
-        )
-        
-        return {
-            'id': chat_message.id,
-            'expediteur': {
-                'id': self.user.id,
-                'username': self.user.username,
-                'prenom': self.user.prenom,
-                'nom': self.user.nom
-            },
-            'message': chat_message.message,
-            'cree_le': chat_message.cree_le.isoformat(),
-            'service_nom': self.user.service.nom if self.user.service else None,
-            'est_systeme': chat_message.est_systeme
-        }
+        """Créer un message dans le salon (insertion différée)"""
+        return ChatService.publier_message(self.user, message_text, salon=self.room_name)
     
     @database_sync_to_async
     def get_recent_messages(self):
-        """Récupérer les derniers messages de chat"""
-        messages = ChatMessage.objects.select_related('expediteur', 'service').order_by('-cree_le')[:50]
-        
-        return [
-            {
-                'id': msg.id,
-                'expediteur': {
-                    'id': msg.expediteur.id,
-                    'username': msg.expediteur.username,
-                    'prenom': msg.expediteur.prenom,
-                    'nom': msg.expediteur.nom
-                },
-                'message': msg.message,
-                'cree_le': msg.cree_le.isoformat(),
-                'service_nom': msg.service.nom if msg.service else None,
-                'est_systeme': msg.est_systeme
-            }
-            for msg in messages
-        ]
+        """Récupérer les derniers messages du salon (tampon en mémoire)"""
+        return ChatService.get_historique_recent(self.room_name)
     
     async def send_recent_messages(self):
         """Envoyer les derniers messages"""
@@ -692,11 +681,11 @@ class ChatConsumer(AsyncWebsocketConsumer):
         ).exists()
         
         if not recent_connection:
-            ChatMessage.objects.create(
-                expediteur=self.user,
-                message=f"🟢 {self.user.prenom or self.user.username} s'est connecté",
-                est_systeme=True,
-                service=self.user.service
+            ChatService.publier_message(
+                self.user,
+                f"🟢 {self.user.prenom or self.user.username} s'est connecté",
+                salon=self.room_name,
+                est_systeme=True
             )
     
     @database_sync_to_async
@@ -710,22 +699,25 @@ class ChatConsumer(AsyncWebsocketConsumer):
         ).exists()
         
         if not recent_disconnection:
-            ChatMessage.objects.create(
-                expediteur=self.user,
-                message=f"🔴 {self.user.prenom or self.user.username} s'est déconnecté",
-                est_systeme=True,
-                service=self.user.service
+            ChatService.publier_message(
+                self.user,
+                f"🔴 {self.user.prenom or self.user.username} s'est déconnecté",
+                salon=self.room_name,
+                est_systeme=True
             )
     
-    @database_sync_to_async
-    def delete_message(self, message_id):
-        """Supprimer un message"""
-        try:
-            message = ChatMessage.objects.get(id=message_id)
-            message.delete()
-            return True
-        except ChatMessage.DoesNotExist:
-            return False
+    async def delete_message(self, message_id):
+        """Supprimer un message et diffuser sa suppression dans son salon"""
+        supprime = await database_sync_to_async(ChatService.supprimer_message)(message_id)
+        if supprime:
+            message_uid, salon = supprime
+            await self.channel_layer.group_send(
+                f"chat_{salon}",
+                {
+                    'type': 'message_deleted',
+                    'message_id': message_uid
+                }
+            )
     
     async def message_deleted(self, event):
         """Diffuser la suppression d'un message"""
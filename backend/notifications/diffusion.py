@@ -0,0 +1,166 @@
+"""
+Regroupement des messages WebSocket de notification par groupe (micro-lots).
+
+Une seule modification de projet déclenche plusieurs signaux (projet, phase,
+historique, documents) qui visent souvent le même groupe : au lieu d'un
+group_send par notification, les messages d'un groupe sont retenus pendant une
+courte fenêtre puis envoyés en une seule trame `notification_batch`.
+
+- FENETRE_MS : délai sans nouveau message avant l'envoi du lot ;
+- LATENCE_MAX_MS : délai maximal entre le premier message d'un lot et son envoi ;
+- TAILLE_MAX : nombre de messages au-delà duquel le lot part immédiatement.
+
+Un lot d'un seul message est envoyé sous sa forme d'origine
+(notification_general / notification_personal).
+"""
+from django.conf import settings as django_settings
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+import asyncio
+import atexit
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        'ACTIF': True,
+        'FENETRE_MS': 100,
+        'LATENCE_MAX_MS': 200,
+        'TAILLE_MAX': 50,
+        **getattr(django_settings, 'NOTIFICATIONS_COALESCING', {}),
+    }
+
+
+class DiffusionGroupee:
+    """Tampons par groupe WebSocket, vidés par un thread de fond à échéance"""
+
+    _condition = threading.Condition()
+    _tampons = {}   # groupe -> {'messages': [(type, données)], 'premier': t, 'dernier': t}
+    _thread = None
+
+    # Boucle asyncio du serveur ASGI de ce processus (attachée par NotificationConsumer)
+    _boucle = None
+
+    @classmethod
+    def attacher_boucle(cls, boucle):
+        cls._boucle = boucle
+
+    @classmethod
+    def envoyer(cls, groupe, type_message, donnees):
+        """Ajoute un message au lot du groupe (envoi immédiat si le regroupement est désactivé)"""
+        config = get_config()
+        if not config['ACTIF']:
+            cls.publier([(groupe, {'type': type_message, 'notification': donnees})])
+            return
+
+        lot = None
+        with cls._condition:
+            maintenant = time.monotonic()
+            tampon = cls._tampons.setdefault(groupe, {'messages': [], 'premier': maintenant})
+            tampon['messages'].append((type_message, donnees))
+            tampon['dernier'] = maintenant
+            if len(tampon['messages']) >= config['TAILLE_MAX']:
+                lot = cls._extraire(groupe)
+            else:
+                cls._demarrer()
+                cls._condition.notify()
+        if lot:
+            cls.publier([lot])
+
+    @classmethod
+    def vider(cls, arret=False):
+        """Envoie immédiatement tous les lots en attente (`arret` : à la sortie du processus)"""
+        with cls._condition:
+            lots = [cls._extraire(groupe) for groupe in list(cls._tampons)]
+        cls.publier(lots, arret)
+
+    # ------------------------------------------------------------------
+    # Thread de fond
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _demarrer(cls):
+        # Appelé sous cls._condition
+        if cls._thread is None or not cls._thread.is_alive():
+            cls._thread = threading.Thread(target=cls._boucle_thread, name='notifications-diffusion', daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def _boucle_thread(cls):
+        while True:
+            with cls._condition:
+                while not cls._tampons:
+                    cls._condition.wait()
+                config = get_config()
+                maintenant = time.monotonic()
+                echeances = {groupe: cls._echeance(tampon, config) for groupe, tampon in cls._tampons.items()}
+                prets = [groupe for groupe, echeance in echeances.items() if echeance <= maintenant]
+                if not prets:
+                    cls._condition.wait(min(echeances.values()) - maintenant)
+                    continue
+                lots = [cls._extraire(groupe) for groupe in prets]
+            try:
+                cls.publier(lots)
+            except Exception as e:
+                logger.error(f"Erreur lors de la diffusion WebSocket groupée: {e}", exc_info=True)
+
+    @staticmethod
+    def _echeance(tampon, config):
+        return min(
+            tampon['dernier'] + config['FENETRE_MS'] / 1000,
+            tampon['premier'] + config['LATENCE_MAX_MS'] / 1000,
+        )
+
+    @classmethod
+    def _extraire(cls, groupe):
+        """Retire le tampon d'un groupe et construit le message à publier (sous cls._condition)"""
+        messages = cls._tampons.pop(groupe)['messages']
+        if len(messages) == 1:
+            type_message, donnees = messages[0]
+            return groupe, {'type': type_message, 'notification': donnees}
+        return groupe, {
+            'type': 'notification_batch',
+            'messages': [{'type': type_message, 'data': donnees} for type_message, donnees in messages],
+        }
+
+    # ------------------------------------------------------------------
+    # Publication
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def publier(cls, lots, arret=False):
+        """Pousse des couples (groupe, message) sans bloquer plus que nécessaire"""
+        if not lots:
+            return
+        channel_layer = get_channel_layer()
+        if not channel_layer:
+            return
+
+        async def envoyer():
+            resultats = await asyncio.gather(*[
+                channel_layer.group_send(groupe, message) for groupe, message in lots
+            ], return_exceptions=True)
+            # Un envoi en échec n'empêche pas les autres, mais ne doit pas passer inaperçu
+            for (groupe, message), resultat in zip(lots, resultats):
+                if isinstance(resultat, BaseException):
+                    logger.error(
+                        f"Diffusion WebSocket impossible vers {groupe} ({message['type']}): {resultat!r}"
+                    )
+
+        boucle = cls._boucle
+        if arret:
+            # Sortie du processus : l'exécuteur d'async_to_sync n'accepte plus de tâches
+            asyncio.run(envoyer())
+        elif boucle is not None and boucle.is_running():
+            # Processus ASGI : diffusion dans la boucle des consumers, sans attendre
+            asyncio.run_coroutine_threadsafe(envoyer(), boucle)
+        else:
+            async_to_sync(envoyer)()
+
+
+# Lots en attente envoyés à l'arrêt du processus (enregistré une seule fois)
+atexit.register(DiffusionGroupee.vider, arret=True)
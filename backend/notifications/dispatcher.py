@@ -0,0 +1,247 @@
+"""
+Création et diffusion différées des notifications émises par les signaux.
+
+Dans un signal, NotificationService.create_notification ne fait plus ni
+requête ni envoi WebSocket : la notification est confiée au dispatcher après
+le commit de la transaction en cours (transaction.on_commit). Un thread de
+fond regroupe les notifications en attente, les insère en une requête
+(bulk_create), les sérialise en une passe et pousse les messages WebSocket de
+façon asynchrone. Une transaction annulée n'émet aucune notification.
+"""
+from django.conf import settings as django_settings
+from django.db import close_old_connections, connection, transaction
+from collections import Counter
+from contextvars import ContextVar
+from functools import wraps
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from .compteurs import CompteurNonLues
+from .diffusion import DiffusionGroupee
+
+logger = logging.getLogger(__name__)
+
+
+# Mode différé actif pendant l'exécution d'un signal décoré
+_mode_differe = ContextVar('notifications_mode_differe', default=False)
+
+
+def notifications_differees(func):
+    """Décorateur des receivers : les notifications créées sont différées après le commit"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        jeton = _mode_differe.set(True)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _mode_differe.reset(jeton)
+    return wrapper
+
+
+def mode_differe_actif():
+    return _mode_differe.get()
+
+
+def get_config():
+    return {
+        'ASYNC': True,        # False : le lot est traité dans le callback on_commit (tests)
+        'BATCH_SIZE': 500,    # Nombre maximal de notifications insérées par requête
+        'TYPES_TTL': 300,     # Durée (s) de vie des types de notification en cache
+        **getattr(django_settings, 'NOTIFICATIONS_DISPATCH', {}),
+    }
+
+
+class NotificationDispatcher:
+    """Dispatcher de fond : insertion groupée, sérialisation et diffusion WebSocket"""
+
+    _file = queue.Queue()
+    _thread = None
+    _verrou = threading.Lock()
+
+    # Cache des types de notification : {code: (NotificationType, chargé le)}, rechargés
+    # après TYPES_TTL (autres processus) ou vidé à leur modification (invalider_types)
+    _types = {}
+
+    # ------------------------------------------------------------------
+    # Mise en lot (thread de la requête)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def planifier(cls, **donnees):
+        """Confie une notification au dispatcher après le commit de la transaction courante"""
+        transaction.on_commit(lambda: cls._valider([donnees]))
+
+    @classmethod
+    def _valider(cls, lot):
+        if get_config()['ASYNC']:
+            cls._demarrer()
+            cls._file.put(lot)
+        else:
+            cls.traiter(lot)
+
+    # ------------------------------------------------------------------
+    # Thread de fond
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _demarrer(cls):
+        with cls._verrou:
+            if cls._thread is None or not cls._thread.is_alive():
+                cls._thread = threading.Thread(target=cls._boucle_thread, name='notifications-dispatcher', daemon=True)
+                cls._thread.start()
+
+    @classmethod
+    def _boucle_thread(cls):
+        taille_max = get_config()['BATCH_SIZE']
+        while True:
+            lots = [cls._file.get()]
+            # Regrouper les lots arrivés pendant le traitement précédent
+            while sum(len(lot) for lot in lots) < taille_max:
+                try:
+                    lots.append(cls._file.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                cls.traiter([donnees for lot in lots for donnees in lot])
+            except Exception as e:
+                logger.error(f"Erreur lors de la diffusion d'un lot de notifications: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+                for _ in lots:
+                    cls._file.task_done()
+
+    @classmethod
+    def vider(cls, timeout=10):
+        """Attend le traitement des lots en file (arrêt du processus, commandes)"""
+        if cls._thread is None or not cls._thread.is_alive():
+            return
+        fin = threading.Event()
+
+        def attendre():
+            cls._file.join()
+            fin.set()
+
+        threading.Thread(target=attendre, daemon=True).start()
+        if not fin.wait(timeout):
+            logger.warning("Des notifications en attente n'ont pas pu être diffusées avant l'arrêt")
+        DiffusionGroupee.vider()
+
+    # ------------------------------------------------------------------
+    # Traitement d'un lot
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def traiter(cls, lot):
+        """Insère, sérialise et diffuse un lot de notifications"""
+        notifications = cls._inserer(lot)
+        if not notifications:
+            return []
+
+        from .serializers import NotificationListSerializer
+        donnees = NotificationListSerializer(notifications, many=True).data
+
+        messages = []
+        for notification, data in zip(notifications, donnees):
+            if notification.destinataire_id:
+                messages.append((f"notifications_personal_{notification.destinataire_id}", 'notification_personal', data))
+            else:
+                messages.append(("notifications_general", 'notification_general', data))
+        cls._diffuser(messages)
+        logger.info(f"{len(notifications)} notification(s) créée(s) et diffusée(s) par lot")
+        return notifications
+
+    @classmethod
+    def _inserer(cls, lot):
+        from .models import Notification
+
+        types = cls._get_types({donnees['type_code'] for donnees in lot})
+        existants = cls._objets_existants(lot)
+
+        notifications = []
+        for donnees in lot:
+            type_notification = types.get(donnees['type_code'])
+            if type_notification is None:
+                logger.error(f"Type de notification non trouvé: {donnees['type_code']}")
+                continue
+            destinataire = donnees.get('destinataire')
+            if destinataire is not None and destinataire.pk not in existants['destinataire']:
+                continue
+            # Objet supprimé entre-temps (ex: suppression en cascade) : le lien est retiré
+            relations = {}
+            for champ in ('projet', 'tache', 'service', 'cree_par'):
+                objet = donnees.get(champ)
+                relations[champ] = objet if objet is not None and objet.pk in existants[champ] else None
+            notifications.append(Notification(
+                type_notification=type_notification,
+                destinataire=destinataire,
+                titre=donnees['titre'],
+                message=donnees['message'],
+                description_detaillee=donnees.get('description_detaillee', ''),
+                priorite=donnees.get('priorite', 'normale'),
+                donnees_supplementaires=donnees.get('donnees_supplementaires') or {},
+                expire_le=donnees.get('expire_le'),
+                **relations
+            ))
+
+        taille = get_config()['BATCH_SIZE']
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Notification.objects.bulk_create(notifications, batch_size=taille)
+            else:
+                # MySQL / MariaDB ne renvoient pas les clés : elles sont nécessaires au client WebSocket
+                for notification in notifications:
+                    notification.save(force_insert=True)
+        CompteurNonLues.ajuster(Counter(notification.destinataire_id for notification in notifications))
+        return notifications
+
+    @staticmethod
+    def _objets_existants(lot):
+        """Identifiants encore présents en base pour chaque relation du lot (une requête par relation)"""
+        existants = {}
+        for champ in ('destinataire', 'projet', 'tache', 'service', 'cree_par'):
+            objets = [donnees[champ] for donnees in lot if donnees.get(champ) is not None]
+            if not objets:
+                existants[champ] = set()
+                continue
+            modele = type(objets[0])
+            existants[champ] = set(modele._default_manager.filter(
+                pk__in={objet.pk for objet in objets}
+            ).values_list('pk', flat=True))
+        return existants
+
+    @classmethod
+    def _get_types(cls, codes):
+        from .models import NotificationType
+
+        maintenant = time.monotonic()
+        limite = maintenant - get_config()['TYPES_TTL']
+        manquants = {code for code in codes if cls._types.get(code, (None, limite))[1] <= limite}
+        if manquants:
+            for code in manquants:
+                cls._types.pop(code, None)
+            for type_notification in NotificationType.objects.filter(code__in=manquants):
+                cls._types[type_notification.code] = (type_notification, maintenant)
+        types = {}
+        for code in codes:
+            entree = cls._types.get(code)
+            if entree is not None:
+                types[code] = entree[0]
+        return types
+
+    @classmethod
+    def invalider_types(cls):
+        """Vide le cache des types de notification (type modifié ou supprimé)"""
+        cls._types.clear()
+
+    @staticmethod
+    def _diffuser(messages):
+        """Confie les messages au regroupement par groupe WebSocket (DiffusionGroupee)"""
+        for groupe, type_message, data in messages:
+            DiffusionGroupee.envoyer(groupe, type_message, data)
+
+
+# Lots en file traités à l'arrêt du processus (enregistré une seule fois)
+atexit.register(NotificationDispatcher.vider)
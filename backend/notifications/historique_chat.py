@@ -0,0 +1,411 @@
+"""
+Historique récent des salons de chat en mémoire et écriture différée des messages.
+
+- Tampon circulaire par salon : les TAILLE derniers messages, déjà sérialisés au
+  format WebSocket. L'arrivée dans un salon (recent_messages) est servie depuis
+  le tampon ; la base n'est lue qu'une fois par salon pour l'amorcer.
+- Écriture différée : un message est ajouté au tampon et diffusé aussitôt, puis
+  inséré avec les autres messages en attente (bulk_create) par un thread de fond
+  toutes les INTERVALLE_MS ou dès LOT messages. Le message est identifié par son
+  `uid`, attribué à l'envoi, avant même son insertion.
+- Suppression d'un message encore en attente dans un autre worker : le message
+  est retrouvé dans le tampon partagé et sa suppression est enregistrée dans le
+  backend (TTL_SUPPRESSION) ; l'insertion différée l'écarte, et le supprime s'il
+  a été inséré pendant la suppression.
+
+Fenêtre connue : un message en attente (au plus INTERVALLE_MS) n'apparaît pas
+encore dans l'API REST, et il est perdu si le processus est tué sans arrêt
+propre (SIGKILL) ; un arrêt normal insère les messages en attente (atexit).
+
+Deux backends pour le tampon :
+- « memory » : deque par salon, local au processus (développement, un seul worker) ;
+- « redis » : listes Redis partagées entre workers.
+"""
+from django.conf import settings as django_settings
+from django.db import close_old_connections, transaction
+from django.utils.module_loading import import_string
+from collections import deque
+import atexit
+import json
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        'BACKEND': 'memory',        # 'memory' ou 'redis'
+        'REDIS_URL': getattr(django_settings, 'REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        'TAILLE': 50,               # Messages conservés par salon
+        'TTL': 86400,               # Durée de vie (s) d'un tampon Redis sans nouveau message
+        'ASYNC': True,              # False : insertion immédiate (tests)
+        'INTERVALLE_MS': 500,       # Délai maximal avant l'insertion d'un message
+        'LOT': 200,                 # Nombre de messages déclenchant une insertion immédiate
+        'TTL_SUPPRESSION': 3600,    # Durée (s) de conservation d'une suppression de message en attente
+        **getattr(django_settings, 'CHAT_HISTORIQUE', {}),
+    }
+
+
+class MemoryHistoriqueBackend:
+    """Tampons locaux au processus : {salon: deque(messages)} ; `complets` : salons amorcés"""
+
+    def __init__(self, taille, ttl_suppression=3600, **options):
+        self.taille = taille
+        self.ttl_suppression = ttl_suppression
+        self._tampons = {}
+        self._complets = set()
+        self._supprimes = {}    # {uid: échéance}
+        self._verrou = threading.Lock()
+
+    def lire(self, salon):
+        """Messages du salon (du plus ancien au plus récent), None si le tampon n'est pas amorcé"""
+        with self._verrou:
+            if salon not in self._complets:
+                return None
+            return list(self._tampons.get(salon, ()))
+
+    def ajouter(self, salon, message):
+        with self._verrou:
+            self._tampons.setdefault(salon, deque(maxlen=self.taille)).append(message)
+
+    def amorcer(self, salon, messages):
+        """Complète le tampon avec l'historique lu en base (sans perdre les ajouts concurrents)"""
+        with self._verrou:
+            tampon = self._tampons.get(salon, ())
+            self._tampons[salon] = deque(fusionner(messages, tampon), maxlen=self.taille)
+            self._complets.add(salon)
+            return list(self._tampons[salon])
+
+    def retirer(self, salon, message_uid):
+        with self._verrou:
+            tampon = self._tampons.get(salon)
+            if tampon is not None:
+                self._tampons[salon] = deque(
+                    (message for message in tampon if message['uid'] != message_uid), maxlen=self.taille
+                )
+
+    def trouver(self, message_uid):
+        """Message du tampon (tous salons confondus) ou None"""
+        with self._verrou:
+            for tampon in self._tampons.values():
+                for message in tampon:
+                    if message['uid'] == message_uid:
+                        return message
+        return None
+
+    def marquer_supprime(self, message_uid):
+        maintenant = time.monotonic()
+        with self._verrou:
+            self._supprimes = {uid: fin for uid, fin in self._supprimes.items() if fin > maintenant}
+            self._supprimes[message_uid] = maintenant + self.ttl_suppression
+
+    def supprimes(self, message_uids):
+        maintenant = time.monotonic()
+        with self._verrou:
+            return {uid for uid in message_uids if self._supprimes.get(uid, 0) > maintenant}
+
+    def vider(self):
+        with self._verrou:
+            self._tampons.clear()
+            self._complets.clear()
+
+
+class RedisHistoriqueBackend:
+    """
+    Tampons partagés entre workers :
+    - chat:salon:<salon> : liste des messages JSON (du plus ancien au plus récent) ;
+    - chat:salon:<salon>:complet : présent une fois le tampon amorcé depuis la base ;
+    - chat:supprime:<uid> : message supprimé avant son insertion (TTL_SUPPRESSION).
+    """
+
+    PREFIXE = 'gestion:chat:salon'
+    PREFIXE_SUPPRESSION = 'gestion:chat:supprime'
+
+    def __init__(self, taille, redis_url=None, ttl=86400, ttl_suppression=3600, **options):
+        import redis
+        self.taille = taille
+        self.ttl = ttl
+        self.ttl_suppression = ttl_suppression
+        self.client = redis.Redis.from_url(redis_url)
+
+    def _cles(self, salon):
+        cle = f"{self.PREFIXE}:{salon}"
+        return cle, f"{cle}:complet"
+
+    def lire(self, salon):
+        cle, cle_complet = self._cles(salon)
+        pipe = self.client.pipeline()
+        pipe.exists(cle_complet)
+        pipe.lrange(cle, 0, -1)
+        complet, messages = pipe.execute()
+        if not complet:
+            return None
+        return [json.loads(message) for message in messages]
+
+    def ajouter(self, salon, message):
+        cle, cle_complet = self._cles(salon)
+        pipe = self.client.pipeline()
+        pipe.rpush(cle, json.dumps(message))
+        pipe.ltrim(cle, -self.taille, -1)
+        pipe.expire(cle, self.ttl)
+        pipe.expire(cle_complet, self.ttl)
+        pipe.execute()
+
+    def amorcer(self, salon, messages):
+        import redis
+        cle, cle_complet = self._cles(salon)
+        with self.client.pipeline() as pipe:
+            while True:
+                try:
+                    # Transaction optimiste : recommencée si un autre worker écrit entre-temps
+                    pipe.watch(cle)
+                    tampon = [json.loads(message) for message in pipe.lrange(cle, 0, -1)]
+                    fusion = fusionner(messages, tampon)[-self.taille:]
+                    pipe.multi()
+                    pipe.delete(cle)
+                    if fusion:
+                        pipe.rpush(cle, *[json.dumps(message) for message in fusion])
+                    pipe.expire(cle, self.ttl)
+                    pipe.set(cle_complet, 1, ex=self.ttl)
+                    pipe.execute()
+                    return fusion
+                except redis.WatchError:
+                    continue
+
+    def retirer(self, salon, message_uid):
+        cle, _ = self._cles(salon)
+        for brut in self.client.lrange(cle, 0, -1):
+            if json.loads(brut)['uid'] == message_uid:
+                self.client.lrem(cle, 0, brut)
+
+    def trouver(self, message_uid):
+        for cle in self.client.scan_iter(f"{self.PREFIXE}:*"):
+            if cle.endswith(b':complet'):
+                continue
+            for brut in self.client.lrange(cle, 0, -1):
+                message = json.loads(brut)
+                if message['uid'] == message_uid:
+                    return message
+        return None
+
+    def marquer_supprime(self, message_uid):
+        self.client.set(f"{self.PREFIXE_SUPPRESSION}:{message_uid}", 1, ex=self.ttl_suppression)
+
+    def supprimes(self, message_uids):
+        message_uids = list(message_uids)
+        if not message_uids:
+            return set()
+        valeurs = self.client.mget([f"{self.PREFIXE_SUPPRESSION}:{uid}" for uid in message_uids])
+        return {uid for uid, valeur in zip(message_uids, valeurs) if valeur is not None}
+
+    def vider(self):
+        cles = list(self.client.scan_iter(f"{self.PREFIXE}:*"))
+        if cles:
+            self.client.delete(*cles)
+
+
+BACKENDS = {
+    'memory': MemoryHistoriqueBackend,
+    'redis': RedisHistoriqueBackend,
+}
+
+
+def fusionner(anciens, recents):
+    """Union sans doublon (par uid) de deux listes de messages, triée par date d'envoi"""
+    messages = {message['uid']: message for message in anciens}
+    messages.update((message['uid'], message) for message in recents)
+    return sorted(messages.values(), key=lambda message: message['cree_le'])
+
+
+class HistoriqueChat:
+    """Point d'accès au tampon des salons configuré (settings.CHAT_HISTORIQUE)"""
+
+    _backend = None
+    _verrou = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            with cls._verrou:
+                if cls._backend is None:
+                    config = get_config()
+                    classe = BACKENDS.get(config['BACKEND']) or import_string(config['BACKEND'])
+                    cls._backend = classe(
+                        taille=config['TAILLE'], redis_url=config['REDIS_URL'], ttl=config['TTL'],
+                        ttl_suppression=config['TTL_SUPPRESSION']
+                    )
+        return cls._backend
+
+    @classmethod
+    def reinitialiser(cls):
+        """Oublie le backend courant (changement de configuration, tests)"""
+        with cls._verrou:
+            cls._backend = None
+
+    @classmethod
+    def messages_recents(cls, salon, charger):
+        """
+        Derniers messages du salon, du plus ancien au plus récent ; `charger()` lit
+        l'historique en base quand le tampon n'est pas encore amorcé
+        """
+        messages = cls.backend().lire(salon)
+        if messages is None:
+            messages = cls.backend().amorcer(salon, charger())
+        return messages
+
+    @classmethod
+    def ajouter(cls, salon, message):
+        cls.backend().ajouter(salon, message)
+
+    @classmethod
+    def retirer(cls, salon, message_uid):
+        cls.backend().retirer(salon, message_uid)
+
+    @classmethod
+    def trouver(cls, message_uid):
+        """Message encore présent dans le tampon de son salon (ou None)"""
+        return cls.backend().trouver(message_uid)
+
+    @classmethod
+    def marquer_supprime(cls, message_uid):
+        """Enregistre la suppression d'un message, visible de tous les workers"""
+        cls.backend().marquer_supprime(message_uid)
+
+    @classmethod
+    def supprimes(cls, message_uids):
+        """Parmi `message_uids`, ceux dont la suppression a été enregistrée"""
+        return cls.backend().supprimes(message_uids)
+
+    @classmethod
+    def vider(cls):
+        cls.backend().vider()
+
+
+class EcritureChat:
+    """Insertion différée et groupée des messages de chat (thread de fond)"""
+
+    _condition = threading.Condition()
+    _en_attente = []        # ChatMessage non encore insérés, dans l'ordre d'envoi
+    _premier = None         # Date d'arrivée du plus ancien message en attente
+    _thread = None
+
+    # Tenu pendant une insertion : une suppression attend la fin du lot en cours
+    _ecriture = threading.Lock()
+
+    @classmethod
+    def planifier(cls, message):
+        """Confie un message (ChatMessage non sauvegardé) à l'insertion différée"""
+        config = get_config()
+        if not config['ASYNC']:
+            cls._inserer([message])
+            return
+        with cls._condition:
+            if not cls._en_attente:
+                cls._premier = time.monotonic()
+            cls._en_attente.append(message)
+            cls._demarrer()
+            cls._condition.notify()
+
+    @classmethod
+    def retirer(cls, message_uid):
+        """
+        Retire un message encore en attente ; sinon enregistre sa suppression
+        (message en attente dans un autre worker) et le supprime en base.
+        Retourne le message retiré (en attente) ou True / False (base).
+        """
+        from .models import ChatMessage
+
+        with cls._ecriture:
+            with cls._condition:
+                for index, message in enumerate(cls._en_attente):
+                    if str(message.uid) == message_uid:
+                        return cls._en_attente.pop(index)
+            # Enregistrée avant la suppression en base : une insertion concurrente la voit
+            HistoriqueChat.marquer_supprime(message_uid)
+            return ChatMessage.objects.filter(uid=message_uid).delete()[0] > 0
+
+    @classmethod
+    def retirer_tout(cls):
+        """Abandonne les messages en attente et supprime l'historique en base"""
+        from .models import ChatMessage
+
+        with cls._ecriture:
+            with cls._condition:
+                cls._en_attente.clear()
+            ChatMessage.objects.all().delete()
+
+    @classmethod
+    def en_attente(cls, message_uid):
+        """Message encore en attente d'insertion (ou None)"""
+        with cls._condition:
+            return next((message for message in cls._en_attente if str(message.uid) == message_uid), None)
+
+    @classmethod
+    def vider(cls):
+        """Insère immédiatement les messages en attente (arrêt du processus, commandes)"""
+        with cls._ecriture:
+            with cls._condition:
+                lot = list(cls._en_attente)
+                cls._en_attente.clear()
+            cls._inserer(lot)
+
+    # ------------------------------------------------------------------
+    # Thread de fond
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def _demarrer(cls):
+        # Appelé sous cls._condition
+        if cls._thread is None or not cls._thread.is_alive():
+            cls._thread = threading.Thread(target=cls._boucle_thread, name='chat-ecriture', daemon=True)
+            cls._thread.start()
+
+    @classmethod
+    def _boucle_thread(cls):
+        while True:
+            with cls._condition:
+                while not cls._en_attente:
+                    cls._condition.wait()
+                config = get_config()
+                echeance = cls._premier + config['INTERVALLE_MS'] / 1000
+                if len(cls._en_attente) < config['LOT'] and time.monotonic() < echeance:
+                    cls._condition.wait(echeance - time.monotonic())
+                    continue
+            try:
+                cls.vider()
+            except Exception as e:
+                logger.error(f"Erreur lors de l'insertion des messages de chat: {e}", exc_info=True)
+            finally:
+                close_old_connections()
+
+    @staticmethod
+    def _inserer(messages):
+        from .models import ChatMessage
+
+        # Messages supprimés depuis un autre worker avant leur insertion
+        supprimes = HistoriqueChat.supprimes(str(message.uid) for message in messages)
+        messages = [message for message in messages if str(message.uid) not in supprimes]
+        if not messages:
+            return
+        try:
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create(messages, batch_size=get_config()['LOT'])
+        except Exception as e:
+            # Un message invalide (ex: expéditeur supprimé entre-temps) ne doit pas faire perdre le lot
+            logger.warning(f"Insertion groupée des messages de chat impossible, insertion unitaire: {e}")
+            for message in messages:
+                try:
+                    with transaction.atomic():
+                        message.save(force_insert=True)
+                except Exception as erreur:
+                    logger.error(f"Message de chat {message.uid} non enregistré: {erreur}")
+
+        # Suppression enregistrée pendant l'insertion : la suppression en base ne voyait pas encore le lot
+        supprimes = HistoriqueChat.supprimes(str(message.uid) for message in messages)
+        if supprimes:
+            ChatMessage.objects.filter(uid__in=supprimes).delete()
+
+
+atexit.register(EcritureChat.vider)
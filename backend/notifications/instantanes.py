@@ -0,0 +1,83 @@
+"""
+Instantané des notifications non lues envoyé à la connexion WebSocket.
+
+À chaque (re)connexion, NotificationConsumer envoie les dernières notifications
+non lues de l'utilisateur. Après un déploiement, tous les clients se
+reconnectent en même temps : l'instantané est conservé dans le cache Django
+pour que ces reconnexions ne relancent pas les requêtes. L'instantané est :
+
+- construit à la première connexion puis mis en cache (TIMEOUT) ;
+- invalidé après le commit de toute écriture qui modifie les notifications non
+  lues d'un utilisateur (mises à jour de CompteurNonLues, état de lecture des
+  notifications générales) ;
+- invalidé pour tous les utilisateurs par une notification générale.
+
+L'invalidation incrémente une version incluse dans la clé (par utilisateur et
+globale) plutôt que de supprimer l'instantané : un instantané construit pendant
+une écriture concurrente est rangé sous l'ancienne version et n'est jamais relu.
+"""
+from django.core.cache import cache
+from django.db import transaction
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class InstantaneNonLues:
+    """Instantané par utilisateur des notifications non lues (charge initiale du WebSocket)"""
+
+    # Durée de vie (s) d'un instantané
+    TIMEOUT = 300
+
+    CLE_GENERALE = 'notifications:instantane:version'
+
+    @staticmethod
+    def _cle_version(user_id):
+        return f"notifications:instantane:version:{user_id}"
+
+    @classmethod
+    def _versions(cls, user_id):
+        """Versions (globale, utilisateur) courantes, initialisées au besoin"""
+        cles = [cls.CLE_GENERALE, cls._cle_version(user_id)]
+        versions = cache.get_many(cles)
+        for cle in cles:
+            if cle not in versions:
+                # Valeur initiale distincte de toute version précédemment évincée
+                cache.add(cle, time.time_ns(), None)
+                versions[cle] = cache.get(cle)
+        return versions[cles[0]], versions[cles[1]]
+
+    @classmethod
+    def obtenir(cls, user_id, construire):
+        """Instantané de l'utilisateur ; `construire()` le calcule s'il est absent du cache"""
+        generale, version = cls._versions(user_id)
+        cle = f"notifications:instantane:{user_id}:{generale}:{version}"
+        instantane = cache.get(cle)
+        if instantane is None:
+            instantane = construire()
+            cache.set(cle, instantane, cls.TIMEOUT)
+        return instantane
+
+    @classmethod
+    def invalider(cls, user_ids):
+        """
+        Invalide les instantanés après le commit ; un identifiant None (notification
+        générale) les invalide tous
+        """
+        user_ids = set(user_ids)
+        if not user_ids:
+            return
+        cles = [cls.CLE_GENERALE] if None in user_ids else [cls._cle_version(user_id) for user_id in user_ids]
+        transaction.on_commit(lambda: cls._incrementer(cles))
+
+    @staticmethod
+    def _incrementer(cles):
+        for cle in cles:
+            try:
+                cache.incr(cle)
+            except ValueError:
+                # Version absente : la prochaine lecture en crée une nouvelle
+                pass
+            except Exception as e:
+                logger.error(f"Erreur lors de l'invalidation de l'instantané des notifications ({cle}): {e}")
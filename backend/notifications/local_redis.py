@@ -0,0 +1,210 @@
+"""
+Serveur local parlant le protocole Redis (RESP2), limité au pub/sub.
+
+Remplace un vrai serveur Redis pour les tests et le développement de la couche
+channels_redis.pubsub.RedisPubSubChannelLayer : plusieurs processus (workers
+Daphne, tests de charge) se connectent au même serveur et échangent leurs
+messages de groupe comme avec Redis. Seules les commandes utilisées par la
+couche pub/sub sont implémentées (PUBLISH, SUBSCRIBE, UNSUBSCRIBE, PING...) ;
+la couche channels_redis.core.RedisChannelLayer, qui repose sur des scripts
+Lua, nécessite un vrai Redis.
+
+Usage :
+    serveur = LocalRedisServer()
+    url = serveur.start()      # "redis://127.0.0.1:<port>/0"
+    ...
+    serveur.stop()
+
+Ou en ligne de commande : python -m notifications.local_redis --port 6379
+"""
+import asyncio
+import threading
+
+
+def _bulk(valeur):
+    if valeur is None:
+        return b"$-1\r\n"
+    return b"$%d\r\n%s\r\n" % (len(valeur), valeur)
+
+
+def _tableau(*elements):
+    return b"*%d\r\n" % len(elements) + b"".join(elements)
+
+
+def _entier(valeur):
+    return b":%d\r\n" % valeur
+
+
+class _Client:
+    """Connexion d'un client et ses abonnements"""
+
+    def __init__(self, writer):
+        self.writer = writer
+        self.abonnements = set()
+
+    def envoyer(self, donnees):
+        if not self.writer.is_closing():
+            self.writer.write(donnees)
+
+
+class LocalRedisServer:
+    """Serveur pub/sub compatible Redis exécuté dans un thread de fond"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self._abonnes = {}  # canal -> set de _Client
+        self._loop = None
+        self._server = None
+        self._thread = None
+        self._pret = threading.Event()
+
+    @property
+    def url(self):
+        return f"redis://{self.host}:{self.port}/0"
+
+    def start(self):
+        """Démarre le serveur et retourne son URL redis://"""
+        self._thread = threading.Thread(target=self._executer, name='local-redis', daemon=True)
+        self._thread.start()
+        self._pret.wait()
+        return self.url
+
+    def stop(self):
+        """Arrête le serveur et ferme les connexions"""
+        if self._loop is None:
+            return
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join(timeout=5)
+        self._loop = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    # ------------------------------------------------------------------
+    # Boucle asyncio
+    # ------------------------------------------------------------------
+
+    def _executer(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        self._server = self._loop.run_until_complete(
+            asyncio.start_server(self._gerer_client, self.host, self.port)
+        )
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._pret.set()
+        try:
+            self._loop.run_forever()
+        finally:
+            self._server.close()
+            taches = asyncio.all_tasks(self._loop)
+            for tache in taches:
+                tache.cancel()
+            self._loop.run_until_complete(asyncio.gather(*taches, return_exceptions=True))
+            self._loop.close()
+
+    async def _gerer_client(self, reader, writer):
+        client = _Client(writer)
+        try:
+            while True:
+                commande = await self._lire_commande(reader)
+                if commande is None:
+                    break
+                if not commande:
+                    continue
+                if not self._executer_commande(client, commande):
+                    break
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            for canal in list(client.abonnements):
+                self._desabonner(client, canal)
+            writer.close()
+
+    @staticmethod
+    async def _lire_commande(reader):
+        """Lit une commande RESP (tableau de chaînes) ou une commande inline"""
+        ligne = await reader.readline()
+        if not ligne:
+            return None
+        if not ligne.startswith(b"*"):
+            return ligne.strip().split()
+        arguments = []
+        for _ in range(int(ligne[1:])):
+            entete = await reader.readline()
+            longueur = int(entete[1:])
+            arguments.append((await reader.readexactly(longueur + 2))[:-2])
+        return arguments
+
+    # ------------------------------------------------------------------
+    # Commandes
+    # ------------------------------------------------------------------
+
+    def _executer_commande(self, client, commande):
+        nom, arguments = commande[0].upper(), commande[1:]
+
+        if nom == b"PING":
+            if client.abonnements:
+                client.envoyer(_tableau(_bulk(b"pong"), _bulk(arguments[0] if arguments else b"")))
+            else:
+                client.envoyer(_bulk(arguments[0]) if arguments else b"+PONG\r\n")
+        elif nom == b"ECHO":
+            client.envoyer(_bulk(arguments[0]))
+        elif nom in (b"SELECT", b"CLIENT", b"AUTH", b"FLUSHDB", b"FLUSHALL"):
+            client.envoyer(b"+OK\r\n")
+        elif nom == b"QUIT":
+            client.envoyer(b"+OK\r\n")
+            return False
+        elif nom == b"PUBLISH":
+            canal, message = arguments
+            abonnes = self._abonnes.get(canal, ())
+            donnees = _tableau(_bulk(b"message"), _bulk(canal), _bulk(message))
+            for abonne in abonnes:
+                abonne.envoyer(donnees)
+            client.envoyer(_entier(len(abonnes)))
+        elif nom == b"SUBSCRIBE":
+            for canal in arguments:
+                client.abonnements.add(canal)
+                self._abonnes.setdefault(canal, set()).add(client)
+                client.envoyer(_tableau(_bulk(b"subscribe"), _bulk(canal), _entier(len(client.abonnements))))
+        elif nom == b"UNSUBSCRIBE":
+            canaux = arguments or sorted(client.abonnements)
+            if not canaux:
+                client.envoyer(_tableau(_bulk(b"unsubscribe"), _bulk(None), _entier(0)))
+            for canal in canaux:
+                self._desabonner(client, canal)
+                client.envoyer(_tableau(_bulk(b"unsubscribe"), _bulk(canal), _entier(len(client.abonnements))))
+        else:
+            client.envoyer(b"-ERR unknown command '%s'\r\n" % nom.lower())
+        return True
+
+    def _desabonner(self, client, canal):
+        client.abonnements.discard(canal)
+        abonnes = self._abonnes.get(canal)
+        if abonnes is not None:
+            abonnes.discard(client)
+            if not abonnes:
+                del self._abonnes[canal]
+
+
+if __name__ == '__main__':
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Serveur pub/sub local compatible Redis")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6379)
+    options = parser.parse_args()
+
+    serveur = LocalRedisServer(options.host, options.port)
+    print(f"Serveur pub/sub local démarré sur {serveur.start()}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        serveur.stop()
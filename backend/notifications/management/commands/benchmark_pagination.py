@@ -0,0 +1,172 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory
+from django.utils import timezone
+from datetime import timedelta
+from rest_framework.request import Request
+from urllib.parse import parse_qs, urlparse
+from notifications.models import Notification, NotificationType, ChatMessage
+from notifications.pagination import NotificationCursorPagination, ChatMessageCursorPagination
+from notifications.services import ChatService
+import time
+
+User = get_user_model()
+
+PAGES_MESUREES = (1, 10, 50, 100, 250, 500, 1000)
+
+
+class _Annulation(Exception):
+    """Annule la transaction des données de test"""
+
+
+class Command(BaseCommand):
+    help = (
+        "Mesure la latence de la pagination par curseur (notifications et chat) de la "
+        "page 1 à la page N, comparée à une pagination par OFFSET"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--pages',
+            type=int,
+            default=500,
+            help='Nombre de pages parcourues (défaut: 500).'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=50,
+            help='Taille des pages (défaut: 50).'
+        )
+        parser.add_argument(
+            '--cible',
+            choices=['notifications', 'chat', 'tout'],
+            default='tout',
+            help='Historique mesuré (défaut: tout).'
+        )
+        parser.add_argument(
+            '--keep',
+            action='store_true',
+            help='Conserver les données générées (par défaut elles sont annulées à la fin).'
+        )
+
+    def handle(self, *args, **options):
+        pages = max(1, options['pages'])
+        taille = max(1, options['page_size'])
+
+        try:
+            with transaction.atomic():
+                utilisateur = self._preparer_utilisateur()
+                if options['cible'] in ('notifications', 'tout'):
+                    self._generer_notifications(utilisateur, pages * taille)
+                    queryset = Notification.objects.filter(destinataire=utilisateur).select_related(
+                        'type_notification', 'projet', 'tache', 'service'
+                    ).order_by('-cree_le', '-id')
+                    self._mesurer('Notifications', queryset, NotificationCursorPagination, pages, taille)
+                if options['cible'] in ('chat', 'tout'):
+                    self._generer_messages(utilisateur, pages * taille)
+                    self._mesurer(
+                        'Chat', ChatService.get_messages_queryset(), ChatMessageCursorPagination, pages, taille
+                    )
+                if not options['keep']:
+                    raise _Annulation()
+        except _Annulation:
+            self.stdout.write(self.style.WARNING('\n🧹 Données de test annulées (utilisez --keep pour les conserver)'))
+
+    # ------------------------------------------------------------------
+    # Données de test
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def _preparer_utilisateur():
+        utilisateur, _ = User.objects.get_or_create(
+            username='benchmark_pagination',
+            defaults={'email': 'benchmark_pagination@example.com', 'prenom': 'Benchmark', 'nom': 'Pagination'}
+        )
+        return utilisateur
+
+    def _generer_notifications(self, utilisateur, nombre):
+        manquantes = nombre - Notification.objects.filter(destinataire=utilisateur).count()
+        if manquantes <= 0:
+            return
+        type_notification, _ = NotificationType.objects.get_or_create(
+            code='notification_personnelle',
+            defaults={'nom': 'Notification personnelle', 'est_generale': False}
+        )
+        Notification.objects.bulk_create([
+            Notification(
+                type_notification=type_notification,
+                destinataire=utilisateur,
+                titre=f'Benchmark {index}',
+                message='Notification générée pour le benchmark de pagination',
+            )
+            for index in range(manquantes)
+        ], batch_size=1000)
+        self._etaler_dates(Notification.objects.filter(destinataire=utilisateur))
+        self.stdout.write(f'   - {manquantes} notification(s) générée(s)')
+
+    def _generer_messages(self, utilisateur, nombre):
+        manquants = nombre - ChatMessage.objects.count()
+        if manquants <= 0:
+            return
+        ChatMessage.objects.bulk_create([
+            ChatMessage(expediteur=utilisateur, message=f'Message de benchmark {index}')
+            for index in range(manquants)
+        ], batch_size=1000)
+        self._etaler_dates(ChatMessage.objects.filter(expediteur=utilisateur))
+        self.stdout.write(f'   - {manquants} message(s) de chat généré(s)')
+
+    @staticmethod
+    def _etaler_dates(queryset):
+        """Répartit les dates de création sur une minute par ligne"""
+        maintenant = timezone.now()
+        lignes = list(queryset.order_by('id').only('id', 'cree_le'))
+        for index, ligne in enumerate(lignes):
+            ligne.cree_le = maintenant - timedelta(minutes=len(lignes) - index)
+        queryset.model.objects.bulk_update(lignes, ['cree_le'], batch_size=1000)
+
+    # ------------------------------------------------------------------
+    # Mesures
+    # ------------------------------------------------------------------
+
+    def _mesurer(self, titre, queryset, pagination_class, pages, taille):
+        self.stdout.write(self.style.SUCCESS(f'\n📊 {titre} : {pages} page(s) de {taille}'))
+        factory = RequestFactory()
+        hote = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+
+        curseur = None
+        resultats = []
+        for numero in range(1, pages + 1):
+            params = {'page_size': taille}
+            if curseur:
+                params['cursor'] = curseur
+            request = Request(factory.get('/', params, HTTP_HOST=hote))
+            paginator = pagination_class()
+
+            debut = time.perf_counter()
+            page = paginator.paginate_queryset(queryset, request)
+            duree_curseur = (time.perf_counter() - debut) * 1000
+
+            if numero in PAGES_MESUREES or numero == pages:
+                debut = time.perf_counter()
+                list(queryset[(numero - 1) * taille:numero * taille])
+                duree_offset = (time.perf_counter() - debut) * 1000
+                resultats.append((numero, len(page), duree_curseur, duree_offset))
+
+            lien = paginator.get_next_link()
+            if not lien:
+                break
+            curseur = parse_qs(urlparse(lien).query)['cursor'][0]
+
+        self.stdout.write(f"   {'Page':>6} {'Lignes':>7} {'Curseur (ms)':>14} {'OFFSET (ms)':>13}")
+        for numero, lignes, duree_curseur, duree_offset in resultats:
+            self.stdout.write(f'   {numero:>6} {lignes:>7} {duree_curseur:>14.2f} {duree_offset:>13.2f}')
+
+        if len(resultats) > 1:
+            premiere, derniere = resultats[0], resultats[-1]
+            self.stdout.write(self.style.SUCCESS(
+                f'   ✅ Curseur : page {derniere[0]} / page 1 = {derniere[2] / max(premiere[2], 0.001):.1f}x'
+                f' — OFFSET : {derniere[3] / max(premiere[3], 0.001):.1f}x'
+            ))
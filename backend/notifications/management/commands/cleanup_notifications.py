@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from notifications.services import NotificationService
+
+
+class Command(BaseCommand):
+    help = 'Archive les notifications lues anciennes et supprime les notifications archivées, par lots'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='Archiver les notifications lues depuis plus de N jours (défaut: 30).'
+        )
+        parser.add_argument(
+            '--purge-days',
+            type=int,
+            help='Supprimer définitivement les notifications archivées et générales créées il y a plus de N jours.'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Nombre de lignes modifiées par transaction (défaut: 1000).'
+        )
+        parser.add_argument(
+            '--pause',
+            type=float,
+            default=0.0,
+            help='Pause en secondes entre deux lots pour limiter la charge (défaut: 0).'
+        )
+
+    def handle(self, *args, **options):
+        batch_size = max(1, options['batch_size'])
+
+        self.stdout.write(self.style.WARNING('Début du nettoyage des notifications...'))
+
+        archived_count = NotificationService.cleanup_old_notifications(
+            options['days'], batch_size=batch_size, pause=options['pause']
+        )
+        self.stdout.write(self.style.SUCCESS(f'📦 {archived_count} notification(s) archivée(s)'))
+
+        if options['purge_days'] is not None:
+            deleted_count = NotificationService.purge_archived_notifications(
+                options['purge_days'], batch_size=batch_size, pause=options['pause']
+            )
+            self.stdout.write(self.style.SUCCESS(f'🗑️ {deleted_count} notification(s) supprimée(s)'))
+
+        self.stdout.write(self.style.SUCCESS('   - Nettoyage terminé avec succès!'))
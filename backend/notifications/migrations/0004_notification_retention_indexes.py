@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0003_add_projet_tache_debut_notification_types'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['statut', 'lue_le'], name='notificatio_statut_c304bd_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['statut', 'cree_le'], name='notificatio_statut_66b98b_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-17 20:40
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0004_notification_retention_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationGeneraleEtat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('derniere_lue_id', models.PositiveBigIntegerField(default=0)),
+                ('lues', models.JSONField(blank=True, default=list)),
+                ('masquees', models.JSONField(blank=True, default=list)),
+                ('mis_a_jour_le', models.DateTimeField(auto_now=True)),
+                ('utilisateur', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='etat_notifications_generales', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'État des notifications générales',
+                'verbose_name_plural': 'États des notifications générales',
+                'db_table': 'notification_general_states',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['destinataire', 'id'], name='notificatio_destina_c3c173_idx'),
+        ),
+    ]
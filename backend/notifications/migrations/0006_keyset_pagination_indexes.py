@@ -0,0 +1,25 @@
+# Generated by Django 5.2.5 on 2026-10-17 21:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0005_notification_general_states'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['cree_le', 'id'], name='notificatio_cree_le_6bd6ff_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['cree_le', 'id'], name='chat_messag_cree_le_80ba38_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='chatmessage',
+            name='chat_messag_cree_le_fdc51c_idx',
+        ),
+    ]
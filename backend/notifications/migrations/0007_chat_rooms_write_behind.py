@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-17 22:10
+
+import django.utils.timezone
+import uuid
+from django.db import migrations, models
+
+
+def generer_uids(apps, schema_editor):
+    """Attribue un identifiant public aux messages existants (par lots)"""
+    ChatMessage = apps.get_model('notifications', 'ChatMessage')
+    ids = list(ChatMessage.objects.filter(uid__isnull=True).values_list('id', flat=True))
+    for debut in range(0, len(ids), 1000):
+        messages = [ChatMessage(id=message_id, uid=uuid.uuid4()) for message_id in ids[debut:debut + 1000]]
+        ChatMessage.objects.bulk_update(messages, ['uid'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('notifications', '0006_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='salon',
+            field=models.CharField(default='general', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='uid',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.RunPython(generer_uids, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='uid',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='chatmessage',
+            name='cree_le',
+            field=models.DateTimeField(default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['salon', 'cree_le', 'id'], name='chat_messag_salon_acda3e_idx'),
+        ),
+    ]
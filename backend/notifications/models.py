@@ -1,9 +1,12 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.utils import timezone
+import uuid
 from projects.models import Projet, Tache
 from accounts.models import Service
 
+from .compteurs import CompteurNonLues
+
 User = get_user_model()
 
 
@@ -121,6 +124,13 @@ class Notification(models.Model):
             models.Index(fields=['type_notification', 'cree_le']),
             models.Index(fields=['projet', 'cree_le']),
             models.Index(fields=['tache', 'cree_le']),
+            # Rétention : archivage des notifications lues, purge des archivées
+            models.Index(fields=['statut', 'lue_le']),
+            models.Index(fields=['statut', 'cree_le']),
+            # Notifications générales non lues : intervalle sur l'id au-delà du repère de lecture
+            models.Index(fields=['destinataire', 'id']),
+            # Pagination par curseur sur (cree_le, id)
+            models.Index(fields=['cree_le', 'id']),
         ]
     
     def __str__(self):
@@ -132,12 +142,17 @@ class Notification(models.Model):
         if self.statut == 'non_lue':
             self.statut = 'lue'
             self.lue_le = timezone.now()
-            self.save(update_fields=['statut', 'lue_le'])
+            # UPDATE conditionnel : une lecture concurrente ne décrémente pas deux fois le compteur
+            if Notification.objects.filter(pk=self.pk, statut='non_lue').update(statut='lue', lue_le=self.lue_le):
+                CompteurNonLues.ajuster({self.destinataire_id: -1})
     
     def archiver(self):
         """Archiver la notification"""
+        etait_non_lue = Notification.objects.filter(pk=self.pk, statut='non_lue').exists()
         self.statut = 'archivee'
         self.save(update_fields=['statut'])
+        if etait_non_lue:
+            CompteurNonLues.ajuster({self.destinataire_id: -1})
     
     @property
     def est_expiree(self):
@@ -161,9 +176,14 @@ class ChatMessage(models.Model):
     """
     Messages du chat en temps réel (notifications générales)
     """
+    # Identifiant public attribué à l'envoi : les messages sont diffusés avant
+    # leur insertion (écriture différée, voir notifications/historique_chat.py)
+    uid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    salon = models.CharField(max_length=100, default='general')
     expediteur = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
-    cree_le = models.DateTimeField(auto_now_add=True)
+    # Date d'envoi (et non d'insertion, qui peut être différée)
+    cree_le = models.DateTimeField(default=timezone.now, editable=False)
     
     # Métadonnées
     est_systeme = models.BooleanField(default=False, help_text="Message système (connexion/déconnexion)")
@@ -175,8 +195,11 @@ class ChatMessage(models.Model):
         verbose_name_plural = "Messages de chat"
         ordering = ['-cree_le']
         indexes = [
-            models.Index(fields=['cree_le']),
+            # Pagination par curseur sur (cree_le, id) ; couvre aussi les filtres sur cree_le
+            models.Index(fields=['cree_le', 'id']),
             models.Index(fields=['expediteur', 'cree_le']),
+            # Historique d'un salon (chargement du tampon, pagination filtrée)
+            models.Index(fields=['salon', 'cree_le', 'id']),
         ]
     
     def __str__(self):
@@ -218,6 +241,38 @@ class NotificationPreference(models.Model):
         return f"Préférences de {self.utilisateur.username}"
 
 
+class NotificationGeneraleEtat(models.Model):
+    """
+    État de lecture des notifications générales (destinataire nul) par utilisateur.
+
+    Les identifiants étant croissants, un repère suffit : toutes les notifications
+    générales d'id <= derniere_lue_id sont lues. Les lectures individuelles au-delà
+    du repère sont conservées dans `lues` jusqu'à ce que le repère les rattrape.
+    """
+    utilisateur = models.OneToOneField(User, on_delete=models.CASCADE, related_name='etat_notifications_generales')
+    derniere_lue_id = models.PositiveBigIntegerField(default=0)
+    lues = models.JSONField(default=list, blank=True)       # ids > derniere_lue_id lus individuellement
+    masquees = models.JSONField(default=list, blank=True)   # ids retirés de la liste par l'utilisateur
+    mis_a_jour_le = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        db_table = "notification_general_states"
+        verbose_name = "État des notifications générales"
+        verbose_name_plural = "États des notifications générales"
+    
+    def __str__(self):
+        return f"Notifications générales de {self.utilisateur.username} (lues jusqu'à {self.derniere_lue_id})"
+    
+    def est_lue(self, notification_id):
+        return notification_id <= self.derniere_lue_id or notification_id in self.lues
+    
+    def statut_de(self, notification_id):
+        """Statut d'une notification générale pour cet utilisateur"""
+        if notification_id in self.masquees:
+            return 'archivee'
+        return 'lue' if self.est_lue(notification_id) else 'non_lue'
+
+
 class NotificationLog(models.Model):
     """
     Log des notifications envoyées (pour audit et debug)
@@ -0,0 +1,24 @@
+from gestion.pagination import KeysetCursorPagination
+
+
+class NotificationCursorPagination(KeysetCursorPagination):
+    """
+    Pagination par curseur (keyset) sur (cree_le, id) pour la liste des notifications.
+    
+    Le coût d'une page ne dépend pas de sa position : chaque page reprend après
+    le dernier couple (cree_le, id) de la précédente, sans OFFSET.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-cree_le', '-id')
+
+
+class ChatMessageCursorPagination(KeysetCursorPagination):
+    """
+    Pagination par curseur (keyset) sur (cree_le, id) pour l'historique du chat.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-cree_le', '-id')
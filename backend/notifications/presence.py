@@ -0,0 +1,382 @@
+"""
+Registre de présence des utilisateurs connectés en WebSocket.
+
+Chaque connexion (canal du consumer) est enregistrée pour son utilisateur avec
+une date d'expiration, rafraîchie par un battement périodique du consumer. Un
+utilisateur est en ligne tant qu'il lui reste au moins une connexion non
+expirée : la vérification est une lecture de clé, sans requête SQL ni écriture
+de User.last_login.
+
+Les connexions expirées sont retirées par une tâche par processus
+(AnnoncesPresence.demarrer_expiration), toutes les HEARTBEAT secondes ; avec
+Redis, un seul processus de la flotte parcourt le registre par intervalle
+(verrou SET NX).
+
+Seules les transitions sont diffusées (« utilisateur arrivé / parti ») : la
+première connexion d'un utilisateur et la disparition de la dernière (fermeture
+ou expiration quand le worker qui la portait a disparu). Elles sont regroupées
+par processus sur DIFFUSION_MS (AnnoncesPresence) pour qu'une vague de
+reconnexions ne produise pas un message par connexion à chaque client.
+
+Deux backends :
+- « memory » : dictionnaire du processus (développement, un seul worker) ;
+- « redis » : registre partagé entre workers (ensembles triés Redis).
+"""
+from django.conf import settings as django_settings
+from django.utils.module_loading import import_string
+import asyncio
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def get_config():
+    return {
+        'BACKEND': 'memory',        # 'memory' ou 'redis'
+        'REDIS_URL': getattr(django_settings, 'REDIS_URL', 'redis://127.0.0.1:6379/0'),
+        'TTL': 90,                  # Durée de vie (s) d'une connexion sans battement
+        'HEARTBEAT': 30,            # Intervalle (s) des battements des consumers
+        'DIFFUSION_MS': 1000,       # Regroupement (ms) des arrivées / départs diffusés
+        **getattr(django_settings, 'PRESENCE', {}),
+    }
+
+
+class MemoryPresenceBackend:
+    """Registre local au processus : {user_id: {connexion: expiration}}"""
+
+    def __init__(self, ttl, **options):
+        self.ttl = ttl
+        self._connexions = {}
+        self._verrou = threading.Lock()
+
+    def connecter(self, user_id, connexion):
+        with self._verrou:
+            connexions = self._connexions.setdefault(user_id, {})
+            self._purger(connexions)
+            arrivee = not connexions
+            connexions[connexion] = time.time() + self.ttl
+            return arrivee
+
+    def deconnecter(self, user_id, connexion):
+        with self._verrou:
+            connexions = self._connexions.get(user_id)
+            if connexions is None:
+                return False
+            connexions.pop(connexion, None)
+            self._purger(connexions)
+            if connexions:
+                return False
+            del self._connexions[user_id]
+            return True
+
+    def battement(self, user_id, connexion):
+        with self._verrou:
+            connexions = self._connexions.get(user_id)
+            if connexions is not None and connexion in connexions:
+                connexions[connexion] = time.time() + self.ttl
+
+    def est_en_ligne(self, user_id):
+        with self._verrou:
+            connexions = self._connexions.get(user_id)
+            return bool(connexions) and max(connexions.values()) > time.time()
+
+    def utilisateurs_en_ligne(self):
+        maintenant = time.time()
+        with self._verrou:
+            return {
+                user_id for user_id, connexions in self._connexions.items()
+                if any(expiration > maintenant for expiration in connexions.values())
+            }
+
+    def nombre_en_ligne(self):
+        return len(self.utilisateurs_en_ligne())
+
+    def prendre_tour_expiration(self, intervalle):
+        """Registre local : chaque processus expire ses propres connexions"""
+        return True
+
+    def expirer(self):
+        """Retire les connexions expirées ; retourne les utilisateurs passés hors ligne"""
+        partis = []
+        with self._verrou:
+            for user_id, connexions in list(self._connexions.items()):
+                self._purger(connexions)
+                if not connexions:
+                    del self._connexions[user_id]
+                    partis.append(user_id)
+        return partis
+
+    @staticmethod
+    def _purger(connexions):
+        maintenant = time.time()
+        for connexion, expiration in list(connexions.items()):
+            if expiration <= maintenant:
+                del connexions[connexion]
+
+
+class RedisPresenceBackend:
+    """
+    Registre partagé entre workers :
+    - presence:user:<id> : ensemble trié des connexions (score = expiration) ;
+    - presence:online : ensemble trié des utilisateurs en ligne (score = expiration).
+    """
+
+    PREFIXE = 'gestion:presence'
+
+    # Retire une connexion (ARGV[1], optionnelle) et les connexions expirées, puis
+    # l'utilisateur s'il n'en reste aucune ; atomique face aux connexions concurrentes
+    SCRIPT_RETRAIT = """
+        if ARGV[1] ~= '' then redis.call('ZREM', KEYS[1], ARGV[1]) end
+        redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+        if redis.call('ZCARD', KEYS[1]) > 0 then return 0 end
+        return redis.call('ZREM', KEYS[2], ARGV[3])
+    """
+
+    def __init__(self, ttl, redis_url=None, **options):
+        import redis
+        self.ttl = ttl
+        self.client = redis.Redis.from_url(redis_url)
+        self.cle_en_ligne = f"{self.PREFIXE}:online"
+        self.cle_expiration = f"{self.PREFIXE}:expiration"
+        self._retrait = self.client.register_script(self.SCRIPT_RETRAIT)
+
+    def _cle(self, user_id):
+        return f"{self.PREFIXE}:user:{user_id}"
+
+    def connecter(self, user_id, connexion):
+        maintenant = time.time()
+        cle = self._cle(user_id)
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(cle, '-inf', maintenant)
+        pipe.zadd(cle, {connexion: maintenant + self.ttl})
+        pipe.zcard(cle)
+        pipe.expire(cle, int(self.ttl) * 2)
+        pipe.zadd(self.cle_en_ligne, {user_id: maintenant + self.ttl})
+        _, _, nombre, _, _ = pipe.execute()
+        return nombre == 1
+
+    def deconnecter(self, user_id, connexion):
+        # Seul le worker qui retire effectivement l'utilisateur annonce son départ
+        return bool(self._retirer(user_id, connexion))
+
+    def _retirer(self, user_id, connexion=''):
+        return self._retrait(
+            keys=[self._cle(user_id), self.cle_en_ligne],
+            args=[connexion, time.time(), user_id],
+        )
+
+    def battement(self, user_id, connexion):
+        expiration = time.time() + self.ttl
+        pipe = self.client.pipeline()
+        pipe.zadd(self._cle(user_id), {connexion: expiration}, xx=True)
+        pipe.expire(self._cle(user_id), int(self.ttl) * 2)
+        pipe.zadd(self.cle_en_ligne, {user_id: expiration}, gt=True)
+        pipe.execute()
+
+    def est_en_ligne(self, user_id):
+        score = self.client.zscore(self.cle_en_ligne, user_id)
+        return score is not None and score > time.time()
+
+    def utilisateurs_en_ligne(self):
+        return {int(user_id) for user_id in self.client.zrangebyscore(self.cle_en_ligne, time.time(), '+inf')}
+
+    def nombre_en_ligne(self):
+        return self.client.zcount(self.cle_en_ligne, time.time(), '+inf')
+
+    def prendre_tour_expiration(self, intervalle):
+        """Un seul processus de la flotte parcourt le registre par intervalle"""
+        return bool(self.client.set(self.cle_expiration, 1, nx=True, px=int(intervalle * 1000)))
+
+    def expirer(self):
+        partis = []
+        for user_id in self.client.zrangebyscore(self.cle_en_ligne, '-inf', time.time()):
+            user_id = int(user_id)
+            if self._retirer(user_id):
+                partis.append(user_id)
+        return partis
+
+
+BACKENDS = {
+    'memory': MemoryPresenceBackend,
+    'redis': RedisPresenceBackend,
+}
+
+
+class PresenceService:
+    """Point d'accès au registre de présence configuré (settings.PRESENCE)"""
+
+    _backend = None
+    _verrou = threading.Lock()
+
+    @classmethod
+    def backend(cls):
+        if cls._backend is None:
+            with cls._verrou:
+                if cls._backend is None:
+                    config = get_config()
+                    classe = BACKENDS.get(config['BACKEND']) or import_string(config['BACKEND'])
+                    cls._backend = classe(ttl=config['TTL'], redis_url=config['REDIS_URL'])
+        return cls._backend
+
+    @classmethod
+    def connecter(cls, user_id, connexion):
+        """Enregistre une connexion ; True si l'utilisateur vient d'arriver"""
+        return cls.backend().connecter(user_id, connexion)
+
+    @classmethod
+    def deconnecter(cls, user_id, connexion):
+        """Retire une connexion ; True si l'utilisateur vient de partir"""
+        return cls.backend().deconnecter(user_id, connexion)
+
+    @classmethod
+    def battement(cls, user_id, connexion):
+        cls.backend().battement(user_id, connexion)
+
+    @classmethod
+    def est_en_ligne(cls, user_id):
+        return cls.backend().est_en_ligne(user_id)
+
+    @classmethod
+    def utilisateurs_en_ligne(cls):
+        return cls.backend().utilisateurs_en_ligne()
+
+    @classmethod
+    def nombre_en_ligne(cls):
+        return cls.backend().nombre_en_ligne()
+
+    @classmethod
+    def expirer(cls):
+        return cls.backend().expirer()
+
+    @classmethod
+    def expirer_periodique(cls):
+        """Expiration d'un intervalle de battement, si ce processus en a le tour"""
+        backend = cls.backend()
+        if backend.prendre_tour_expiration(get_config()['HEARTBEAT']):
+            return backend.expirer()
+        return []
+
+    @classmethod
+    def reinitialiser(cls):
+        """Oublie le backend (tests, changement de configuration)"""
+        cls._backend = None
+
+
+class AnnoncesPresence:
+    """
+    Diffusion regroupée des arrivées / départs depuis la boucle ASGI du processus.
+
+    Les transitions sont retenues pendant DIFFUSION_MS puis diffusées au groupe
+    « online_users » en un message par état ; un utilisateur arrivé puis reparti
+    dans l'intervalle n'est pas annoncé. La liste complète envoyée aux nouvelles
+    connexions est mise en cache pour le même intervalle et oubliée dès qu'une
+    diffusion de présence (de n'importe quel worker) est reçue.
+    """
+
+    GROUPE = 'online_users'
+
+    _en_attente = {}    # user_id -> 'arrive' | 'parti'
+    _tache = None
+    _expiration = None  # Tâche d'expiration du processus
+    _liste = None       # (expiration, utilisateurs sérialisés)
+    _generation = 0     # Incrémentée à chaque diffusion reçue
+
+    @classmethod
+    def annoncer(cls, etat, user_ids):
+        """Ajoute des transitions à la prochaine diffusion (appelé dans la boucle ASGI)"""
+        for user_id in user_ids:
+            if cls._en_attente.get(user_id, etat) != etat:
+                # Arrivé puis parti (ou l'inverse) avant la diffusion : rien à annoncer
+                del cls._en_attente[user_id]
+            else:
+                cls._en_attente[user_id] = etat
+
+        boucle = asyncio.get_running_loop()
+        if cls._tache is None or cls._tache.done() or cls._tache.get_loop() is not boucle:
+            cls._tache = boucle.create_task(cls._diffuser_apres(get_config()['DIFFUSION_MS'] / 1000))
+
+    @classmethod
+    def demarrer_expiration(cls):
+        """Démarre la tâche d'expiration du processus (une par boucle ASGI)"""
+        boucle = asyncio.get_running_loop()
+        if cls._expiration is None or cls._expiration.done() or cls._expiration.get_loop() is not boucle:
+            cls._expiration = boucle.create_task(cls._expirer_periodiquement())
+
+    @classmethod
+    async def _expirer_periodiquement(cls):
+        """Annonce le départ des utilisateurs dont les connexions ont expiré (worker arrêté)"""
+        from asgiref.sync import sync_to_async
+
+        while True:
+            await asyncio.sleep(get_config()['HEARTBEAT'])
+            try:
+                partis = await sync_to_async(PresenceService.expirer_periodique, thread_sensitive=False)()
+                if partis:
+                    cls.annoncer('parti', partis)
+            except Exception as e:
+                logger.warning(f"Erreur lors de l'expiration des connexions: {e}")
+
+    @classmethod
+    async def _diffuser_apres(cls, delai):
+        await asyncio.sleep(delai)
+        en_attente, cls._en_attente = cls._en_attente, {}
+        try:
+            await cls.diffuser(en_attente)
+        except Exception as e:
+            logger.warning(f"Erreur lors de la diffusion de la présence: {e}")
+
+    @classmethod
+    async def diffuser(cls, transitions):
+        """Diffuse {user_id: état} : un message presence_update par état"""
+        from channels.db import database_sync_to_async
+        from channels.layers import get_channel_layer
+
+        par_etat = {}
+        for user_id, etat in transitions.items():
+            par_etat.setdefault(etat, []).append(user_id)
+        if not par_etat:
+            return
+
+        channel_layer = get_channel_layer()
+        nombre = await database_sync_to_async(PresenceService.nombre_en_ligne)()
+        for etat, user_ids in par_etat.items():
+            users = await database_sync_to_async(cls._serialiser)(user_ids)
+            await channel_layer.group_send(cls.GROUPE, {
+                'type': 'presence_update',
+                'etat': etat,
+                'users': users,
+                'count': nombre,
+            })
+
+    @classmethod
+    async def liste_en_ligne(cls):
+        """Utilisateurs en ligne sérialisés, partagés par les connexions de l'intervalle"""
+        from channels.db import database_sync_to_async
+
+        maintenant = time.monotonic()
+        if cls._liste is not None and cls._liste[0] > maintenant:
+            return cls._liste[1]
+        generation = cls._generation
+        users = await database_sync_to_async(cls._serialiser)()
+        if generation == cls._generation:
+            # Pas de diffusion reçue pendant la lecture : la liste peut être partagée
+            cls._liste = (maintenant + get_config()['DIFFUSION_MS'] / 1000, users)
+        return users
+
+    @classmethod
+    def oublier_liste(cls):
+        cls._generation += 1
+        cls._liste = None
+
+    @staticmethod
+    def _serialiser(user_ids=None):
+        from django.contrib.auth import get_user_model
+        from .services import ChatService
+
+        if user_ids is None:
+            users = ChatService.get_online_users()
+        else:
+            users = get_user_model().objects.filter(id__in=user_ids).select_related('service')
+        return [ChatService.serialize_online_user(user) for user in users]
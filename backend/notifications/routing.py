@@ -3,5 +3,5 @@ from . import consumers
 
 websocket_urlpatterns = [
     re_path(r'^ws/notifications/$', consumers.NotificationConsumer.as_asgi()),
-    re_path(r'^ws/chat/(?P<room_name>\w+)/$', consumers.ChatConsumer.as_asgi()),
+    re_path(r'^ws/chat/(?P<room_name>[A-Za-z0-9_-]{1,80})/$', consumers.ChatConsumer.as_asgi()),
 ]
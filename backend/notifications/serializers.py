@@ -62,6 +62,14 @@ class NotificationListSerializer(serializers.ModelSerializer):
             'destinataire', 'destinataire_nom', 'projet_nom', 'tache_titre',
             'est_generale', 'est_personnelle'
         ]
+    
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Notification générale : statut propre à l'utilisateur (NotificationGeneraleEtat)
+        etat = self.context.get('etat_general')
+        if etat is not None and instance.destinataire_id is None:
+            data['statut'] = etat.statut_de(instance.id)
+        return data
 
 
 class NotificationCreateSerializer(serializers.ModelSerializer):
@@ -101,16 +109,16 @@ class ChatMessageSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
         fields = [
-            'id', 'expediteur', 'expediteur_id', 'message',
+            'id', 'uid', 'salon', 'expediteur', 'expediteur_id', 'message',
             'cree_le', 'est_systeme', 'service', 'service_nom'
         ]
-        read_only_fields = ['cree_le']
+        read_only_fields = ['uid', 'cree_le']
 
 
 class ChatMessageCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = ChatMessage
-        fields = ['message', 'est_systeme']
+        fields = ['message', 'salon', 'est_systeme']
     
     def create(self, validated_data):
         # Le service sera défini automatiquement depuis l'utilisateur si nécessaire
@@ -147,6 +155,7 @@ class NotificationStatsSerializer(serializers.Serializer):
     total_notifications = serializers.IntegerField()
     notifications_non_lues = serializers.IntegerField()
     notifications_generales = serializers.IntegerField()
+    notifications_generales_non_lues = serializers.IntegerField()
     notifications_par_type = serializers.DictField()
     notifications_par_priorite = serializers.DictField()
     notifications_recentes = NotificationListSerializer(many=True)
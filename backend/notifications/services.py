@@ -1,12 +1,21 @@
 from django.contrib.auth import get_user_model
 from django.utils import timezone
-from django.db.models import Q, Count
+from django.db import transaction
+from django.db.models import Q, Count, Max
 from datetime import timedelta
 import logging
+import time
+import uuid
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
 
-from .models import Notification, NotificationType, ChatMessage, NotificationPreference
+from .compteurs import CompteurNonLues
+from .instantanes import InstantaneNonLues
+from .diffusion import DiffusionGroupee
+from .historique_chat import HistoriqueChat, EcritureChat
+from .dispatcher import NotificationDispatcher, mode_differe_actif
+from .presence import PresenceService
+from .models import Notification, NotificationType, ChatMessage, NotificationPreference, NotificationGeneraleEtat
 from projects.models import Projet, Tache, MembreProjet
 from accounts.models import Service
 
@@ -36,7 +45,28 @@ class NotificationService:
     ):
         """
         Créer une notification et l'envoyer via WebSocket
+
+        Depuis un signal décoré par @notifications_differees, la notification
+        est confiée au NotificationDispatcher après le commit et None est
+        retourné : l'insertion et l'envoi WebSocket se font par lot.
         """
+        if mode_differe_actif():
+            NotificationDispatcher.planifier(
+                type_code=type_code,
+                titre=titre,
+                message=message,
+                destinataire=destinataire,
+                projet=projet,
+                tache=tache,
+                service=service,
+                priorite=priorite,
+                description_detaillee=description_detaillee,
+                donnees_supplementaires=donnees_supplementaires,
+                expire_le=expire_le,
+                cree_par=cree_par
+            )
+            return None
+
         try:
             # Récupérer le type de notification
             type_notification = NotificationType.objects.get(code=type_code)
@@ -58,6 +88,7 @@ class NotificationService:
             )
             
             logger.info(f"Notification créée: {notification.titre}")
+            CompteurNonLues.ajuster({notification.destinataire_id: 1})
             
             # Envoyer via WebSocket en temps réel
             NotificationService.send_websocket_notification(notification)
@@ -298,9 +329,27 @@ class NotificationService:
         """
         Récupérer les statistiques de notifications pour un utilisateur
         """
-        # Notifications personnelles
-        notifications_personnelles = Notification.objects.filter(destinataire=user)
-        notifications_non_lues = notifications_personnelles.filter(statut='non_lue').count()
+        # Notifications personnelles : une seule requête groupée par statut, type et priorité
+        repartition = Notification.objects.filter(destinataire=user).values(
+            'statut', 'type_notification__code', 'priorite'
+        ).annotate(nombre=Count('id')).order_by()
+        
+        total_notifications = 0
+        notifications_non_lues = 0
+        notifications_par_type = {}
+        notifications_par_priorite = {}
+        for groupe in repartition:
+            total_notifications += groupe['nombre']
+            if groupe['statut'] != 'non_lue':
+                continue
+            notifications_non_lues += groupe['nombre']
+            type_code = groupe['type_notification__code']
+            notifications_par_type[type_code] = notifications_par_type.get(type_code, 0) + groupe['nombre']
+            priorite = groupe['priorite']
+            notifications_par_priorite[priorite] = notifications_par_priorite.get(priorite, 0) + groupe['nombre']
+        
+        # Valeur exacte : rafraîchit le compteur en cache
+        CompteurNonLues.definir(user.id, notifications_non_lues)
         
         # Notifications générales récentes
         notifications_generales = Notification.objects.filter(
@@ -308,22 +357,11 @@ class NotificationService:
             cree_le__gte=timezone.now() - timedelta(days=7)
         ).count()
         
-        # Par type
-        notifications_par_type = {}
-        for notification in notifications_personnelles.filter(statut='non_lue'):
-            type_code = notification.type_notification.code
-            notifications_par_type[type_code] = notifications_par_type.get(type_code, 0) + 1
-        
-        # Par priorité
-        notifications_par_priorite = {}
-        for notification in notifications_personnelles.filter(statut='non_lue'):
-            priorite = notification.priorite
-            notifications_par_priorite[priorite] = notifications_par_priorite.get(priorite, 0) + 1
-        
         return {
-            'total_notifications': notifications_personnelles.count(),
+            'total_notifications': total_notifications,
             'notifications_non_lues': notifications_non_lues,
             'notifications_generales': notifications_generales,
+            'notifications_generales_non_lues': NotificationService.get_general_unread_count(user),
             'notifications_par_type': notifications_par_type,
             'notifications_par_priorite': notifications_par_priorite
         }
@@ -331,62 +369,218 @@ class NotificationService:
     @staticmethod
     def mark_notifications_read(user, notification_ids=None):
         """
-        Marquer des notifications comme lues
+        Marquer des notifications comme lues (une seule requête UPDATE)
         """
         queryset = Notification.objects.filter(destinataire=user, statut='non_lue')
         
         if notification_ids:
             queryset = queryset.filter(id__in=notification_ids)
         
-        updated_count = 0
-        for notification in queryset:
-            notification.marquer_comme_lue()
-            updated_count += 1
+        updated_count = queryset.update(statut='lue', lue_le=timezone.now())
         
-        # Envoyer le nouveau compteur via WebSocket
+        # Envoyer le nouveau compteur via WebSocket (après le commit : le compteur est alors invalidé)
         if updated_count > 0:
-            NotificationService.send_websocket_unread_count(user)
+            CompteurNonLues.invalider([user.id])
+            transaction.on_commit(lambda: NotificationService.send_websocket_unread_count(user))
+        
+        # Notifications générales : état de lecture propre à l'utilisateur
+        updated_count += NotificationService.mark_general_notifications_read(user, notification_ids)
         
         return updated_count
     
     @staticmethod
     def archive_notifications(user, notification_ids=None):
         """
-        Archiver des notifications
+        Archiver des notifications (une seule requête UPDATE)
         """
-        queryset = Notification.objects.filter(destinataire=user)
+        queryset = Notification.objects.filter(destinataire=user).exclude(statut='archivee')
         
         if notification_ids:
             queryset = queryset.filter(id__in=notification_ids)
         
-        updated_count = 0
-        for notification in queryset:
-            notification.archiver()
-            updated_count += 1
+        # Des notifications non lues peuvent être archivées : le compteur change
+        non_lues = queryset.filter(statut='non_lue').exists()
+        updated_count = queryset.update(statut='archivee')
+        
+        if non_lues:
+            CompteurNonLues.invalider([user.id])
+            transaction.on_commit(lambda: NotificationService.send_websocket_unread_count(user))
+        
+        # Notifications générales désignées : retirées de la liste de l'utilisateur
+        if notification_ids:
+            updated_count += NotificationService.dismiss_general_notifications(user, notification_ids)
         
         return updated_count
     
     @staticmethod
-    def cleanup_old_notifications(days=30):
+    def get_general_state(user):
+        """État de lecture des notifications générales de l'utilisateur (créé au besoin)"""
+        etat, _ = NotificationGeneraleEtat.objects.get_or_create(utilisateur=user)
+        return etat
+    
+    @staticmethod
+    def general_status_q(etat, statut='non_lue'):
+        """Filtre des notifications générales ayant ce statut pour l'utilisateur de l'état"""
+        generales = Q(destinataire__isnull=True)
+        if statut == 'archivee':
+            return generales & Q(id__in=etat.masquees)
+        lues = Q(id__lte=etat.derniere_lue_id) | Q(id__in=etat.lues)
+        if statut == 'lue':
+            return generales & lues & ~Q(id__in=etat.masquees)
+        return generales & ~lues & ~Q(id__in=etat.masquees)
+    
+    @staticmethod
+    def get_general_unread_count(user, etat=None):
+        """Nombre de notifications générales non lues : intervalle sur l'id au-delà du repère"""
+        etat = etat or NotificationService.get_general_state(user)
+        return Notification.objects.filter(NotificationService.general_status_q(etat, 'non_lue')).count()
+    
+    @staticmethod
+    def mark_general_notifications_read(user, notification_ids=None):
+        """
+        Marquer des notifications générales comme lues pour un utilisateur.
+        Sans identifiants, le repère avance jusqu'à la dernière notification générale.
+        """
+        with transaction.atomic():
+            etat, _ = NotificationGeneraleEtat.objects.select_for_update().get_or_create(utilisateur=user)
+            non_lues = Notification.objects.filter(NotificationService.general_status_q(etat, 'non_lue'))
+            
+            if notification_ids:
+                ids = set(non_lues.filter(id__in=notification_ids).values_list('id', flat=True))
+                if not ids:
+                    return 0
+                etat.lues = sorted(set(etat.lues) | ids)
+                NotificationService._compacter_etat(etat)
+                updated_count = len(ids)
+            else:
+                derniere = Notification.objects.filter(destinataire__isnull=True).aggregate(derniere=Max('id'))['derniere']
+                if not derniere or derniere <= etat.derniere_lue_id:
+                    return 0
+                updated_count = non_lues.count()
+                etat.derniere_lue_id = derniere
+                etat.lues = []
+            etat.save()
+            InstantaneNonLues.invalider([user.id])
+        return updated_count
+    
+    @staticmethod
+    def dismiss_general_notifications(user, notification_ids):
+        """Retirer des notifications générales de la liste d'un utilisateur"""
+        with transaction.atomic():
+            etat, _ = NotificationGeneraleEtat.objects.select_for_update().get_or_create(utilisateur=user)
+            ids = set(Notification.objects.filter(
+                destinataire__isnull=True, id__in=notification_ids
+            ).values_list('id', flat=True)) - set(etat.masquees)
+            if not ids:
+                return 0
+            etat.masquees = sorted(set(etat.masquees) | ids)
+            NotificationService._compacter_etat(etat)
+            etat.save()
+            InstantaneNonLues.invalider([user.id])
+        return len(ids)
+    
+    @staticmethod
+    def _compacter_etat(etat):
+        """Avance le repère tant que les notifications générales suivantes sont lues ou masquées"""
+        traitees = set(etat.lues) | set(etat.masquees)
+        suivantes = Notification.objects.filter(
+            destinataire__isnull=True, id__gt=etat.derniere_lue_id
+        ).order_by('id').values_list('id', flat=True)[:len(traitees) + 1]
+        for notification_id in suivantes:
+            if notification_id not in traitees:
+                break
+            etat.derniere_lue_id = notification_id
+        etat.lues = [notification_id for notification_id in etat.lues if notification_id > etat.derniere_lue_id]
+    
+    @staticmethod
+    def cleanup_old_notifications(days=30, batch_size=1000, pause=0):
         """
-        Nettoyer les anciennes notifications
+        Nettoyer les anciennes notifications : archive les notifications lues
+        depuis plus de `days` jours, par lots de `batch_size` lignes
         """
         cutoff_date = timezone.now() - timedelta(days=days)
+        old_read_notifications = Notification.objects.filter(statut='lue', lue_le__lt=cutoff_date)
         
-        # Archiver les notifications lues anciennes
-        old_read_notifications = Notification.objects.filter(
-            statut='lue',
-            lue_le__lt=cutoff_date
+        archived_count = NotificationService._par_lots(
+            old_read_notifications, lambda lot: lot.update(statut='archivee'), batch_size, pause
         )
         
-        archived_count = 0
-        for notification in old_read_notifications:
-            notification.archiver()
-            archived_count += 1
-        
         logger.info(f"Nettoyage: {archived_count} notifications archivées")
         return archived_count
     
+    @staticmethod
+    def purge_archived_notifications(days=180, batch_size=1000, pause=0):
+        """
+        Supprimer définitivement les notifications archivées et les notifications
+        générales créées il y a plus de `days` jours, par lots de `batch_size` lignes.
+        Les notifications générales purgées sont retirées des listes masquées.
+        """
+        cutoff_date = timezone.now() - timedelta(days=days)
+        old_archived_notifications = Notification.objects.filter(
+            Q(statut='archivee') | Q(destinataire__isnull=True), cree_le__lt=cutoff_date
+        )
+        
+        deleted_count = NotificationService._par_lots(
+            old_archived_notifications, lambda lot: lot.delete()[1].get(Notification._meta.label, 0),
+            batch_size, pause
+        )
+        elaguees = NotificationService.prune_general_states(batch_size)
+        
+        logger.info(f"Nettoyage: {deleted_count} notifications supprimées, {elaguees} masquage(s) retiré(s)")
+        return deleted_count
+    
+    @staticmethod
+    def prune_general_states(batch_size=1000):
+        """
+        Retire des listes `masquees` les notifications générales qui n'existent plus :
+        chaque liste reste bornée par l'horizon de purge. Par lots d'états verrouillés.
+        """
+        total = 0
+        dernier_id = 0
+        while True:
+            with transaction.atomic():
+                etats = list(
+                    NotificationGeneraleEtat.objects.select_for_update().filter(id__gt=dernier_id)
+                    .order_by('id').only('id', 'masquees')[:batch_size]
+                )
+                if not etats:
+                    return total
+                dernier_id = etats[-1].id
+                masquees = {notification_id for etat in etats for notification_id in etat.masquees}
+                existantes = set(Notification.objects.filter(
+                    destinataire__isnull=True, id__in=masquees
+                ).values_list('id', flat=True)) if masquees else set()
+                
+                modifies = []
+                for etat in etats:
+                    conservees = [notification_id for notification_id in etat.masquees if notification_id in existantes]
+                    if len(conservees) != len(etat.masquees):
+                        total += len(etat.masquees) - len(conservees)
+                        etat.masquees = conservees
+                        modifies.append(etat)
+                NotificationGeneraleEtat.objects.bulk_update(modifies, ['masquees'])
+            if len(etats) < batch_size:
+                return total
+    
+    @staticmethod
+    def _par_lots(queryset, operation, batch_size, pause=0):
+        """
+        Applique `operation` au queryset par lots d'identifiants : chaque lot est
+        une transaction courte, sans verrou prolongé sur la table. L'opération
+        doit faire sortir les lignes du queryset (changement de statut, suppression).
+        """
+        total = 0
+        while True:
+            ids = list(queryset.order_by('id').values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return total
+            with transaction.atomic():
+                total += operation(Notification.objects.filter(id__in=ids))
+            if len(ids) < batch_size:
+                return total
+            if pause:
+                time.sleep(pause)
+    
     @staticmethod
     def send_websocket_notification(notification):
         """
@@ -413,14 +607,8 @@ class NotificationService:
                 message_type = 'notification_general'
                 group_name = "notifications_general"
             
-            # Envoyer le message via WebSocket
-            async_to_sync(channel_layer.group_send)(
-                group_name,
-                {
-                    'type': message_type,
-                    'notification': notification_data
-                }
-            )
+            # Envoyer le message via WebSocket, regroupé avec les autres messages du groupe
+            DiffusionGroupee.envoyer(group_name, message_type, notification_data)
             
             logger.info(f"Notification WebSocket envoyée: {notification.titre}")
             
@@ -437,11 +625,8 @@ class NotificationService:
             if not channel_layer:
                 return
             
-            # Calculer le nombre de notifications non lues
-            unread_count = Notification.objects.filter(
-                destinataire=user,
-                statut='non_lue'
-            ).count()
+            # Compteur en cache (recalculé s'il a été invalidé)
+            unread_count = CompteurNonLues.obtenir(user.id)
             
             # Envoyer le message via WebSocket
             async_to_sync(channel_layer.group_send)(
@@ -462,74 +647,162 @@ class ChatService:
     """
     
     @staticmethod
-    def get_recent_messages(limit=50):
+    def get_recent_messages(limit=50, salon=None):
         """
         Récupérer les derniers messages de chat
         """
-        return ChatMessage.objects.select_related(
-            'expediteur', 'service'
-        ).order_by('-cree_le')[:limit]
+        return ChatService.get_messages_queryset(salon)[:limit]
     
     @staticmethod
-    def get_online_users():
+    def get_messages_queryset(salon=None):
         """
-        Récupérer les utilisateurs en ligne (basé sur last_login et WebSocket)
+        Historique du chat (d'un salon), du plus récent au plus ancien (à paginer par curseur)
         """
-        # Utilisateurs connectés récemment (dans les 5 dernières minutes pour plus de flexibilité)
-        cutoff_time = timezone.now() - timedelta(minutes=5)
-        recent_users = User.objects.filter(
-            last_login__gte=cutoff_time,
-            is_active=True
-        ).select_related('service')
-        
-        # Filtrer pour ne garder que les utilisateurs vraiment actifs
-        # (ceux qui ont une session récente)
-        active_users = []
-        for user in recent_users:
-            # Vérifier si l'utilisateur a une session récente
-            if user.last_login:
-                time_diff = timezone.now() - user.last_login
-                # Seulement les utilisateurs connectés dans les 5 dernières minutes
-                if time_diff.total_seconds() < 300:  # 5 minutes
-                    active_users.append(user)
+        queryset = ChatMessage.objects.select_related(
+            'expediteur', 'expediteur__service', 'service'
+        ).order_by('-cree_le', '-id')
+        if salon:
+            queryset = queryset.filter(salon=salon)
+        return queryset
+    
+    @staticmethod
+    def get_historique_recent(salon='general'):
+        """
+        Derniers messages d'un salon au format WebSocket, du plus récent au plus
+        ancien, servis depuis le tampon (la base n'est lue que pour l'amorcer)
+        """
+        def charger():
+            messages = ChatService.get_recent_messages(HistoriqueChat.backend().taille, salon)
+            return [ChatService.serialize_chat_message(message) for message in messages]
         
-        return active_users
+        return list(reversed(HistoriqueChat.messages_recents(salon, charger)))
+    
+    @staticmethod
+    def publier_message(user, texte, salon='general', est_systeme=False):
+        """
+        Enregistrer un message dans le tampon du salon et planifier son insertion
+        (écriture différée) ; retourne le message au format WebSocket, à diffuser
+        """
+        message = ChatMessage(
+            salon=salon,
+            expediteur=user,
+            message=texte,
+            est_systeme=est_systeme,
+            service=user.service
+        )
+        donnees = ChatService.serialize_chat_message(message)
+        HistoriqueChat.ajouter(salon, donnees)
+        EcritureChat.planifier(message)
+        return donnees
+    
+    @staticmethod
+    def ajouter_a_l_historique(message):
+        """Ajouter au tampon un message inséré directement en base (API REST)"""
+        donnees = ChatService.serialize_chat_message(message)
+        transaction.on_commit(lambda: HistoriqueChat.ajouter(message.salon, donnees))
+        return donnees
+    
+    @staticmethod
+    def serialize_chat_message(message):
+        """Représentation d'un message de chat pour les messages WebSocket (identifié par son uid)"""
+        expediteur = message.expediteur
+        return {
+            'id': str(message.uid),
+            'uid': str(message.uid),
+            'salon': message.salon,
+            'expediteur': {
+                'id': expediteur.id,
+                'username': expediteur.username,
+                'prenom': expediteur.prenom,
+                'nom': expediteur.nom,
+                'service': {
+                    'id': expediteur.service.id if expediteur.service else None,
+                    'nom': expediteur.service.nom if expediteur.service else None
+                }
+            },
+            'message': message.message,
+            'cree_le': message.cree_le.isoformat(),
+            'service_nom': message.service.nom if message.service else None,
+            'est_systeme': message.est_systeme
+        }
     
     @staticmethod
-    def mark_user_online(user):
+    def supprimer_message(message_id, user=None):
         """
-        Marquer un utilisateur comme en ligne (pour WebSocket)
+        Supprimer un message (en attente d'insertion ou en base) et le retirer du
+        tampon de son salon. `message_id` est l'uid ou l'identifiant en base ;
+        avec `user`, seul l'expéditeur ou un super utilisateur peut supprimer.
+        Retourne (uid, salon) du message supprimé, ou None.
         """
+        message_uid = None
         try:
-            # Vérifier si l'utilisateur a une méthode save (utilisateur Django)
-            if hasattr(user, 'save') and not user.is_anonymous and hasattr(user, 'last_login'):
-                logger.info(f"Marquage en ligne de {user.username}")
-                user.last_login = timezone.now()
-                user.save(update_fields=['last_login'])
-                logger.info(f"Utilisateur {user.username} marqué comme en ligne à {user.last_login}")
-            else:
-                logger.warning(f"Utilisateur sans méthode save ou anonyme: {user}")
-        except Exception as e:
-            # Ignorer les erreurs pour les utilisateurs anonymes ou de test
-            logger.warning(f"Impossible de marquer l'utilisateur comme en ligne: {e}")
-            pass
+            message_uid = str(uuid.UUID(str(message_id)))
+            message = EcritureChat.en_attente(message_uid) or ChatMessage.objects.filter(uid=message_uid).first()
+        except ValueError:
+            message = ChatMessage.objects.filter(id=message_id).first() if str(message_id).isdigit() else None
+        if message is not None:
+            message_uid, salon, expediteur_id = str(message.uid), message.salon, message.expediteur_id
+        else:
+            # En attente d'insertion dans un autre worker : seul le tampon partagé le connaît
+            donnees = HistoriqueChat.trouver(message_uid) if message_uid else None
+            if donnees is None:
+                return None
+            salon, expediteur_id = donnees['salon'], donnees['expediteur']['id']
+        if user is not None and expediteur_id != user.id and not user.is_superuser:
+            return None
+        
+        if not EcritureChat.retirer(message_uid) and message is not None:
+            return None
+        HistoriqueChat.retirer(salon, message_uid)
+        return message_uid, salon
+    
+    @staticmethod
+    def supprimer_tous_messages():
+        """Supprimer tout l'historique du chat (en attente, en base et tampons)"""
+        EcritureChat.retirer_tout()
+        HistoriqueChat.vider()
+    
+    @staticmethod
+    def get_online_users():
+        """
+        Récupérer les utilisateurs en ligne (registre de présence WebSocket)
+        """
+        return list(User.objects.filter(
+            id__in=PresenceService.utilisateurs_en_ligne(),
+            is_active=True
+        ).select_related('service'))
+    
+    @staticmethod
+    def mark_user_online(user, connexion):
+        """
+        Enregistrer une connexion WebSocket de l'utilisateur.
+        Retourne True si l'utilisateur vient de passer en ligne.
+        """
+        return PresenceService.connecter(user.id, connexion)
     
     @staticmethod
-    def mark_user_offline(user):
+    def mark_user_offline(user, connexion):
         """
-        Marquer un utilisateur comme hors ligne
+        Retirer une connexion WebSocket de l'utilisateur.
+        Retourne True si c'était sa dernière connexion.
         """
-        # Dans une implémentation complète, on supprimerait l'utilisateur
-        # de la liste Redis des utilisateurs en ligne
-        pass
+        return PresenceService.deconnecter(user.id, connexion)
+    
+    @staticmethod
+    def serialize_online_user(user):
+        """Représentation d'un utilisateur en ligne pour les messages WebSocket et l'API"""
+        return {
+            'id': user.id,
+            'username': user.username,
+            'prenom': user.prenom,
+            'nom': user.nom,
+            'service': user.service.nom if user.service else None,
+            'last_login': user.last_login.isoformat() if user.last_login else None
+        }
     
     @staticmethod
     def create_system_message(message, user=None):
         """
         Créer un message système
         """
-        return ChatMessage.objects.create(
-            expediteur=user or User.objects.first(),
-            message=message,
-            est_systeme=True
-        )
+        return ChatService.publier_message(user or User.objects.first(), message, est_systeme=True)
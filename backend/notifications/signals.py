@@ -4,12 +4,15 @@ from django.contrib.auth import get_user_model
 from django.utils import timezone
 from django.contrib.auth.signals import user_logged_in, user_logged_out
 
+from .dispatcher import NotificationDispatcher, notifications_differees
+from .models import NotificationType
 from .services import NotificationService
 from projects.models import (
     Projet, Tache, MembreProjet, ProjetPhaseEtat, 
     HistoriqueEtat, PermissionProjet
 )
 from projects.email_service import ProjectEmailService
+from projects.services import operation_en_masse_en_cours
 from documents.models import (
     DocumentProjet, DocumentTeleverse, CommentaireDocumentProjet,
     HistoriqueDocumentProjet
@@ -20,6 +23,7 @@ User = get_user_model()
 
 
 @receiver(post_save, sender=Projet)
+@notifications_differees
 def notify_project_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de projet
@@ -68,10 +72,14 @@ def notify_project_changes(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=Tache)
+@notifications_differees
 def notify_task_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de tâche
     """
+    if operation_en_masse_en_cours():
+        # Les opérations en masse envoient une notification agrégée par destinataire
+        return
     if created:
         # Nouvelle tâche créée
         if instance.assigne_a.exists():
@@ -98,6 +106,7 @@ def notify_task_changes(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=MembreProjet)
+@notifications_differees
 def notify_team_member_added(sender, instance, created, **kwargs):
     """
     Notifier l'ajout d'un membre à l'équipe
@@ -111,6 +120,7 @@ def notify_team_member_added(sender, instance, created, **kwargs):
 # ============================================================================
 
 @receiver(post_save, sender=ProjetPhaseEtat)
+@notifications_differees
 def notify_phase_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de phase de projet
@@ -136,6 +146,7 @@ def notify_phase_changes(sender, instance, created, **kwargs):
             )
 
 @receiver(post_save, sender=HistoriqueEtat)
+@notifications_differees
 def notify_project_status_change(sender, instance, created, **kwargs):
     """
     Notifier les changements de statut de projet
@@ -150,6 +161,7 @@ def notify_project_status_change(sender, instance, created, **kwargs):
         )
 
 @receiver(post_save, sender=PermissionProjet)
+@notifications_differees
 def notify_permission_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de permissions sur un projet
@@ -169,6 +181,7 @@ def notify_permission_changes(sender, instance, created, **kwargs):
 # ============================================================================
 
 @receiver(post_save, sender=DocumentProjet)
+@notifications_differees
 def notify_document_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de documents de projet
@@ -202,6 +215,7 @@ def notify_document_changes(sender, instance, created, **kwargs):
             )
 
 @receiver(post_save, sender=DocumentTeleverse)
+@notifications_differees
 def notify_uploaded_document_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de documents téléversés
@@ -235,6 +249,7 @@ def notify_uploaded_document_changes(sender, instance, created, **kwargs):
             )
 
 @receiver(post_save, sender=CommentaireDocumentProjet)
+@notifications_differees
 def notify_document_comment_changes(sender, instance, created, **kwargs):
     """
     Notifier les nouveaux commentaires sur les documents
@@ -250,6 +265,7 @@ def notify_document_comment_changes(sender, instance, created, **kwargs):
         )
 
 @receiver(post_save, sender=HistoriqueDocumentProjet)
+@notifications_differees
 def notify_document_history_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements dans l'historique des documents
@@ -268,6 +284,7 @@ def notify_document_history_changes(sender, instance, created, **kwargs):
 # ============================================================================
 
 @receiver(user_logged_in)
+@notifications_differees
 def notify_user_login_signal(sender, request, user, **kwargs):
     """
     Notifier la connexion d'un utilisateur via le signal Django
@@ -275,6 +292,7 @@ def notify_user_login_signal(sender, request, user, **kwargs):
     NotificationService.notify_user_login(user)
 
 @receiver(user_logged_out)
+@notifications_differees
 def notify_user_logout_signal(sender, request, user, **kwargs):
     """
     Notifier la déconnexion d'un utilisateur via le signal Django
@@ -288,6 +306,7 @@ def notify_user_logout_signal(sender, request, user, **kwargs):
         )
 
 @receiver(post_save, sender=User)
+@notifications_differees
 def notify_user_profile_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de profil utilisateur
@@ -302,6 +321,7 @@ def notify_user_profile_changes(sender, instance, created, **kwargs):
         )
 
 @receiver(post_save, sender=Service)
+@notifications_differees
 def notify_service_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de service
@@ -315,6 +335,7 @@ def notify_service_changes(sender, instance, created, **kwargs):
         )
 
 @receiver(post_save, sender=Role)
+@notifications_differees
 def notify_role_changes(sender, instance, created, **kwargs):
     """
     Notifier les changements de rôle
@@ -327,11 +348,23 @@ def notify_role_changes(sender, instance, created, **kwargs):
             priorite='normale'
         )
 
+# ============================================================================
+# CACHE DES TYPES DE NOTIFICATION
+# ============================================================================
+
+@receiver(post_save, sender=NotificationType)
+@receiver(post_delete, sender=NotificationType)
+def invalidate_notification_type_cache(sender, instance, **kwargs):
+    """Type renommé ou supprimé : le dispatcher relit les types au prochain lot"""
+    NotificationDispatcher.invalider_types()
+
+
 # ============================================================================
 # SIGNALS POUR LES SUPPRESSIONS
 # ============================================================================
 
 @receiver(post_delete, sender=Projet)
+@notifications_differees
 def notify_project_deletion(sender, instance, **kwargs):
     """
     Notifier la suppression d'un projet
@@ -359,6 +392,7 @@ def notify_project_deletion(sender, instance, **kwargs):
     )
 
 @receiver(post_delete, sender=Tache)
+@notifications_differees
 def notify_task_deletion(sender, instance, **kwargs):
     """
     Notifier la suppression d'une tâche
@@ -386,6 +420,7 @@ def notify_task_deletion(sender, instance, **kwargs):
     )
 
 @receiver(post_delete, sender=DocumentProjet)
+@notifications_differees
 def notify_document_deletion(sender, instance, **kwargs):
     """
     Notifier la suppression d'un document
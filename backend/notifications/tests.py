@@ -1,3 +1,1050 @@
-from django.test import TestCase
+import asyncio
+import multiprocessing
+from unittest import skipUnless
 
-# Create your tests here.
+from django.test import TestCase, override_settings
+
+from .local_redis import LocalRedisServer
+
+try:
+    from channels_redis.pubsub import RedisPubSubChannelLayer
+except ImportError:
+    RedisPubSubChannelLayer = None
+
+
+def _worker_websocket(url, user_ids, nb_attendus, pret, resultats):
+    """
+    Simule un processus Daphne : une connexion WebSocket par utilisateur, abonnée
+    aux mêmes groupes que NotificationConsumer. Exécuté dans un processus séparé
+    (ce module ne doit donc pas importer de modèles au chargement).
+    """
+    async def executer():
+        layer = RedisPubSubChannelLayer(hosts=[url], prefix='gestion')
+        canaux = {}
+        for user_id in user_ids:
+            canal = await layer.new_channel()
+            await layer.group_add(f"notifications_personal_{user_id}", canal)
+            await layer.group_add("notifications_general", canal)
+            canaux[canal] = user_id
+        pret.set()
+
+        async def recevoir(canal):
+            ids = []
+            while len(ids) < nb_attendus[canaux[canal]]:
+                message = await layer.receive(canal)
+                if message['type'] == 'notification_batch':
+                    # Messages regroupés par DiffusionGroupee
+                    ids.extend(element['data']['id'] for element in message['messages'])
+                else:
+                    ids.append(message['notification']['id'])
+            return canaux[canal], ids
+
+        recus = {}
+        taches = [asyncio.ensure_future(recevoir(canal)) for canal in canaux]
+        await asyncio.wait(taches, timeout=60)
+        for tache in taches:
+            if tache.done() and not tache.exception():
+                user_id, ids = tache.result()
+                recus[user_id] = ids
+            else:
+                tache.cancel()
+        await layer.flush()
+        return recus
+
+    resultats.put(asyncio.run(executer()))
+
+
+@skipUnless(RedisPubSubChannelLayer, "channels_redis n'est pas installé")
+class ChannelLayerMultiWorkerTest(TestCase):
+    """Les notifications doivent atteindre les clients connectés à des workers différents"""
+
+    NB_WORKERS = 3
+    UTILISATEURS_PAR_WORKER = 5
+    NOTIFICATIONS_PAR_UTILISATEUR = 20
+    NOTIFICATIONS_GENERALES = 5
+
+    def setUp(self):
+        self.serveur = LocalRedisServer()
+        self.url = self.serveur.start()
+        self.addCleanup(self.serveur.stop)
+
+    def test_notifications_reach_clients_on_every_worker(self):
+        from django.contrib.auth import get_user_model
+        from .diffusion import DiffusionGroupee
+        from .models import Notification, NotificationType
+        from .services import NotificationService
+        User = get_user_model()
+
+        utilisateurs = [
+            User.objects.create_user(
+                username=f'ws{index}', email=f'ws{index}@example.com', password='x',
+                prenom='Client', nom=str(index)
+            )
+            for index in range(self.NB_WORKERS * self.UTILISATEURS_PAR_WORKER)
+        ]
+        type_personnel, _ = NotificationType.objects.get_or_create(
+            code='notification_personnelle', defaults={'nom': 'Notification personnelle', 'est_generale': False}
+        )
+        type_general, _ = NotificationType.objects.get_or_create(
+            code='annonce_generale', defaults={'nom': 'Annonce générale', 'est_generale': True}
+        )
+
+        # Un processus par worker Daphne simulé
+        contexte = multiprocessing.get_context('spawn')
+        resultats = contexte.Queue()
+        nb_attendus = {
+            user.id: self.NOTIFICATIONS_PAR_UTILISATEUR + self.NOTIFICATIONS_GENERALES for user in utilisateurs
+        }
+        workers = []
+        for index in range(self.NB_WORKERS):
+            pret = contexte.Event()
+            lot = utilisateurs[index::self.NB_WORKERS]
+            processus = contexte.Process(
+                target=_worker_websocket,
+                args=(self.url, [user.id for user in lot], nb_attendus, pret, resultats),
+            )
+            processus.start()
+            self.addCleanup(processus.kill)
+            workers.append((processus, pret))
+        for _, pret in workers:
+            self.assertTrue(pret.wait(timeout=60), "Un worker n'a pas rejoint ses groupes")
+
+        attendus = {user.id: [] for user in utilisateurs}
+        couche = {
+            'default': {
+                'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+                'CONFIG': {'hosts': [self.url], 'prefix': 'gestion'},
+            }
+        }
+        with self.settings(CHANNEL_LAYERS=couche):
+            for index in range(self.NOTIFICATIONS_PAR_UTILISATEUR):
+                for user in utilisateurs:
+                    notification = Notification.objects.create(
+                        type_notification=type_personnel, destinataire=user,
+                        titre=f'Notification {index}', message='Test de charge'
+                    )
+                    NotificationService.send_websocket_notification(notification)
+                    attendus[user.id].append(notification.id)
+            for index in range(self.NOTIFICATIONS_GENERALES):
+                notification = Notification.objects.create(
+                    type_notification=type_general, titre=f'Annonce {index}', message='Test de charge'
+                )
+                NotificationService.send_websocket_notification(notification)
+                for ids in attendus.values():
+                    ids.append(notification.id)
+            # Envoyer les lots encore retenus tant que la couche Redis est active
+            DiffusionGroupee.vider()
+
+        recus = {}
+        for _ in workers:
+            recus.update(resultats.get(timeout=90))
+        for processus, _ in workers:
+            processus.join(timeout=10)
+
+        self.assertEqual(set(recus), set(attendus))
+        for user_id, ids in attendus.items():
+            self.assertEqual(sorted(recus[user_id]), sorted(ids))
+
+
+# Insertion au commit, sans le thread de fond (NOTIFICATIONS_DISPATCH_ASYNC vaut True par défaut)
+@override_settings(NOTIFICATIONS_DISPATCH={'ASYNC': False})
+class NotificationDispatcherTest(TestCase):
+    """Notifications différées : insertion après le commit, cache des types de notification"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from .dispatcher import NotificationDispatcher
+        from .models import Notification, NotificationType
+
+        self.Notification = Notification
+        self.NotificationType = NotificationType
+        NotificationDispatcher.invalider_types()
+        self.addCleanup(NotificationDispatcher.invalider_types)
+        self.type = NotificationType.objects.create(code='annonce_generale', nom='Annonce générale')
+        self.destinataire = get_user_model().objects.create_user(
+            username='dest', email='dest@example.com', password='x', prenom='Dest', nom='Test'
+        )
+
+    def _creer(self, type_code='annonce_generale', **donnees):
+        """Création depuis un receiver décoré (mode différé)"""
+        from .dispatcher import notifications_differees
+        from .services import NotificationService
+
+        @notifications_differees
+        def receiver():
+            return NotificationService.create_notification(
+                type_code=type_code, titre='Titre', message='Message', destinataire=self.destinataire, **donnees
+            )
+        return receiver()
+
+    def test_insertion_apres_le_commit(self):
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            self.assertIsNone(self._creer())
+        self.assertFalse(self.Notification.objects.exists())
+
+        for callback in callbacks:
+            callback()
+        notification = self.Notification.objects.get()
+        self.assertEqual(notification.destinataire, self.destinataire)
+        self.assertEqual(notification.type_notification, self.type)
+
+    def test_rien_si_transaction_annulee(self):
+        from django.db import transaction
+
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                self._creer()
+                raise RuntimeError('annulation')
+        self.assertEqual(callbacks, [])
+        self.assertFalse(self.Notification.objects.exists())
+
+    def test_type_renomme_ou_supprime_non_servi_depuis_le_cache(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._creer()
+
+        self.type.code = 'systeme_maintenance'
+        self.type.save()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._creer('annonce_generale')
+            self._creer('systeme_maintenance')
+        self.assertEqual(
+            list(self.Notification.objects.values_list('type_notification__code', flat=True)),
+            ['systeme_maintenance', 'systeme_maintenance']
+        )
+
+        self.type.delete()
+        with self.captureOnCommitCallbacks(execute=True):
+            self._creer('systeme_maintenance')
+        self.assertFalse(self.Notification.objects.exists())
+
+    def test_types_recharges_apres_expiration(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self._creer()
+        # Modification par un autre processus : aucun signal reçu ici
+        self.NotificationType.objects.filter(pk=self.type.pk).update(code='systeme_maintenance')
+
+        with override_settings(NOTIFICATIONS_DISPATCH={'ASYNC': False, 'TYPES_TTL': 0}):
+            with self.captureOnCommitCallbacks(execute=True):
+                self._creer('annonce_generale')
+        self.assertEqual(self.Notification.objects.count(), 1)
+
+    def test_arret_enregistre_une_seule_fois(self):
+        from unittest import mock
+        from .dispatcher import NotificationDispatcher
+
+        with mock.patch('notifications.dispatcher.atexit.register') as enregistrer, \
+                mock.patch.object(NotificationDispatcher, '_thread', None), \
+                mock.patch('notifications.dispatcher.threading.Thread'):
+            NotificationDispatcher._demarrer()
+        enregistrer.assert_not_called()
+
+
+class CleanupNotificationsViewTest(TestCase):
+    """Paramètres du nettoyage des notifications validés (400 au lieu d'une erreur serveur)"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from rest_framework.test import APIClient
+
+        admin = get_user_model().objects.create_user(
+            username='admin', email='admin@example.com', password='x', prenom='Admin', nom='Test', is_staff=True
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def _post(self, donnees):
+        from django.urls import reverse
+
+        with override_settings(ROOT_URLCONF='notifications.urls'):
+            return self.client.post(reverse('cleanup-notifications'), donnees, format='json')
+
+    def test_parametres_invalides(self):
+        for donnees in ({'days': 'abc'}, {'days': None}, {'days': -1}, {'purge_days': 'x'}, {'purge_days': -5}):
+            self.assertEqual(self._post(donnees).status_code, 400, donnees)
+
+    def test_parametres_valides(self):
+        reponse = self._post({'days': '30', 'purge_days': 90})
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual((reponse.data['archived_count'], reponse.data['deleted_count']), (0, 0))
+
+
+class PurgeNotificationsGeneralesTest(TestCase):
+    """La purge retire les notifications générales anciennes et borne les listes masquées"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from .models import Notification, NotificationType
+
+        self.Notification = Notification
+        self.type = NotificationType.objects.create(code='annonce_generale', nom='Annonce générale')
+        self.utilisateur = get_user_model().objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='x', prenom='Lecteur', nom='Test'
+        )
+
+    def _generale(self, age_jours):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        notification = self.Notification.objects.create(type_notification=self.type, titre='Annonce', message='Message')
+        self.Notification.objects.filter(pk=notification.pk).update(cree_le=timezone.now() - timedelta(days=age_jours))
+        return notification
+
+    def test_masquees_elaguees_a_la_purge(self):
+        from .services import NotificationService
+
+        ancienne, recente = self._generale(200), self._generale(1)
+        NotificationService.dismiss_general_notifications(self.utilisateur, [ancienne.id, recente.id])
+
+        supprimees = NotificationService.purge_archived_notifications(180)
+
+        self.assertEqual(supprimees, 1)
+        self.assertEqual(list(self.Notification.objects.values_list('id', flat=True)), [recente.id])
+        etat = NotificationService.get_general_state(self.utilisateur)
+        self.assertEqual(etat.masquees, [recente.id])
+        self.assertEqual(NotificationService.prune_general_states(), 0)
+        self.assertEqual(etat.statut_de(recente.id), 'archivee')
+
+
+class KeysetCursorPaginationTest(TestCase):
+    """Curseur composite (cree_le, id) : pages complètes et sans doublon malgré les ex æquo sur cree_le"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.utils import timezone
+        from .models import ChatMessage
+
+        expediteur = get_user_model().objects.create_user(
+            username='bavard', email='bavard@example.com', password='x', prenom='Bavard', nom='Test'
+        )
+        instant = timezone.now()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(expediteur=expediteur, message=f'Message {index}', cree_le=instant)
+            for index in range(25)
+        ] + [ChatMessage(expediteur=expediteur, message='Plus ancien', cree_le=instant.replace(year=instant.year - 1))])
+        self.ids_attendus = list(ChatMessage.objects.order_by('-cree_le', '-id').values_list('id', flat=True))
+
+    def _page(self, lien=None):
+        from urllib.parse import parse_qs, urlparse
+        from django.test import RequestFactory
+        from rest_framework.request import Request
+        from .pagination import ChatMessageCursorPagination
+        from .services import ChatService
+
+        params = {'page_size': 10}
+        if lien:
+            params['cursor'] = parse_qs(urlparse(lien).query)['cursor'][0]
+        paginator = ChatMessageCursorPagination()
+        page = paginator.paginate_queryset(ChatService.get_messages_queryset(), Request(RequestFactory().get('/', params)))
+        return [message.id for message in page], paginator.get_next_link(), paginator.get_previous_link()
+
+    def test_parcours_avant_et_arriere(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        pages, lien = [], None
+        while True:
+            with CaptureQueriesContext(connection) as requetes:
+                ids, lien, precedent = self._page(lien)
+            self.assertNotIn('OFFSET', requetes.captured_queries[-1]['sql'].upper())
+            pages.append((ids, precedent))
+            if not lien:
+                break
+
+        self.assertEqual([len(ids) for ids, _ in pages], [10, 10, 6])
+        self.assertEqual([i for ids, _ in pages for i in ids], self.ids_attendus)
+
+        # Retour en arrière depuis la dernière page
+        ids, _, _ = self._page(pages[-1][1])
+        self.assertEqual(ids, pages[1][0])
+
+    def test_curseur_invalide(self):
+        from base64 import b64encode
+        from rest_framework.exceptions import NotFound
+
+        for position in ('p=abc|1', 'p=2026-01-01T00:00:00|x', 'p=sans-separateur'):
+            curseur = b64encode(position.encode('ascii')).decode('ascii')
+            with self.assertRaises(NotFound):
+                self._page(f'http://testserver/?cursor={curseur}')
+
+
+class PresenceTest(TestCase):
+    """Registre de présence (backend mémoire) et expiration une fois par processus"""
+
+    def setUp(self):
+        from .presence import MemoryPresenceBackend, PresenceService
+
+        self.backend = MemoryPresenceBackend(ttl=90)
+        PresenceService.reinitialiser()
+        self.addCleanup(PresenceService.reinitialiser)
+
+    def _dans(self, secondes):
+        """Avance l'horloge du registre de `secondes`"""
+        import time
+        from unittest import mock
+
+        return mock.patch('notifications.presence.time.time', return_value=time.time() + secondes)
+
+    def test_arrivee_et_depart_sur_la_premiere_et_la_derniere_connexion(self):
+        self.assertTrue(self.backend.connecter(1, 'canal-a'))
+        self.assertFalse(self.backend.connecter(1, 'canal-b'))
+        self.assertTrue(self.backend.connecter(2, 'canal-c'))
+        self.assertEqual(self.backend.utilisateurs_en_ligne(), {1, 2})
+
+        self.assertFalse(self.backend.deconnecter(1, 'canal-a'))
+        self.assertTrue(self.backend.est_en_ligne(1))
+        self.assertTrue(self.backend.deconnecter(1, 'canal-b'))
+        self.assertFalse(self.backend.est_en_ligne(1))
+        self.assertFalse(self.backend.deconnecter(1, 'canal-b'))
+        self.assertEqual(self.backend.nombre_en_ligne(), 1)
+
+    def test_expiration_sans_battement(self):
+        self.backend.connecter(1, 'canal-a')
+        self.backend.connecter(2, 'canal-b')
+        with self._dans(60):
+            self.backend.battement(2, 'canal-b')
+
+        with self._dans(100):
+            self.assertFalse(self.backend.est_en_ligne(1))
+            self.assertTrue(self.backend.est_en_ligne(2))
+            self.assertEqual(self.backend.expirer(), [1])
+            self.assertEqual(self.backend.expirer(), [])
+            # Reconnexion après expiration : nouvelle arrivée
+            self.assertTrue(self.backend.connecter(1, 'canal-c'))
+
+    def test_expiration_periodique(self):
+        from .presence import PresenceService
+
+        with override_settings(PRESENCE={'BACKEND': 'memory', 'TTL': 90}):
+            PresenceService.connecter(1, 'canal-a')
+            self.assertEqual(PresenceService.expirer_periodique(), [])
+            with self._dans(100):
+                self.assertEqual(PresenceService.expirer_periodique(), [1])
+
+    def test_un_seul_processus_expire_par_intervalle_avec_redis(self):
+        from unittest import mock
+        from .presence import RedisPresenceBackend
+
+        backend = RedisPresenceBackend(ttl=90, redis_url='redis://127.0.0.1:1/0')
+        backend.client = mock.Mock()
+        backend.client.set.side_effect = [True, None]
+
+        self.assertTrue(backend.prendre_tour_expiration(30))
+        self.assertFalse(backend.prendre_tour_expiration(30))
+        backend.client.set.assert_called_with(backend.cle_expiration, 1, nx=True, px=30000)
+
+    def test_une_tache_d_expiration_par_processus(self):
+        import asyncio
+        from unittest import mock
+        from .presence import AnnoncesPresence, PresenceService
+
+        async def scenario():
+            AnnoncesPresence.demarrer_expiration()
+            tache = AnnoncesPresence._expiration
+            for _ in range(10):
+                # Dix connexions du même processus
+                AnnoncesPresence.demarrer_expiration()
+            self.assertIs(AnnoncesPresence._expiration, tache)
+            await asyncio.sleep(0.05)
+            tache.cancel()
+
+        with override_settings(PRESENCE={'BACKEND': 'memory', 'HEARTBEAT': 0.01}), \
+                mock.patch.object(PresenceService, 'expirer_periodique', return_value=[7]) as expirer, \
+                mock.patch.object(AnnoncesPresence, 'annoncer') as annoncer:
+            asyncio.run(scenario())
+
+        self.assertGreaterEqual(expirer.call_count, 1)
+        self.assertLessEqual(expirer.call_count, 6)
+        annoncer.assert_called_with('parti', [7])
+
+
+class InstantaneNonLuesTest(TestCase):
+    """Instantané versionné des notifications non lues et delta de reconnexion"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.core.cache import cache
+        from .consumers import NotificationConsumer
+        from .models import NotificationType
+
+        cache.clear()
+        NotificationType.objects.create(code='annonce_generale', nom='Annonce générale')
+        User = get_user_model()
+        self.user = User.objects.create_user(
+            username='lecteur', email='lecteur@example.com', password='x', prenom='Lecteur', nom='Test'
+        )
+        self.autre = User.objects.create_user(
+            username='autre', email='autre@example.com', password='x', prenom='Autre', nom='Test'
+        )
+        self.consumer = NotificationConsumer()
+        self.consumer.user = self.user
+
+    def _obtenir(self, user=None):
+        from .instantanes import InstantaneNonLues
+
+        consumer = self.consumer
+        if user is not None:
+            consumer = type(self.consumer)()
+            consumer.user = user
+        return InstantaneNonLues.obtenir(consumer.user.id, consumer.construire_notifications_non_lues)
+
+    def _creer(self, destinataire):
+        from .services import NotificationService
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return NotificationService.create_notification(
+                type_code='annonce_generale', titre='Titre', message='Message', destinataire=destinataire
+            )
+
+    def test_instantane_servi_depuis_le_cache(self):
+        self._creer(self.user)
+        premier = self._obtenir()
+        with self.assertNumQueries(0):
+            self.assertEqual(self._obtenir(), premier)
+
+    def test_ecriture_apres_construction_change_la_version(self):
+        ancienne = self._creer(self.user)
+        self.assertEqual([n['id'] for n in self._obtenir()['personnelles']], [ancienne.id])
+        self._obtenir(self.autre)
+
+        nouvelle = self._creer(self.user)
+        instantane = self._obtenir()
+        self.assertEqual({n['id'] for n in instantane['personnelles']}, {ancienne.id, nouvelle.id})
+        self.assertEqual(instantane['nombre_non_lues'], 2)
+        # Les instantanés des autres utilisateurs restent en cache
+        with self.assertNumQueries(0):
+            self._obtenir(self.autre)
+
+        # Une notification générale invalide tous les instantanés
+        generale = self._creer(None)
+        self.assertEqual([n['id'] for n in self._obtenir(self.autre)['generales']], [generale.id])
+
+    def test_invalidation_seulement_apres_le_commit(self):
+        from .instantanes import InstantaneNonLues
+
+        premier = self._obtenir()
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            InstantaneNonLues.invalider([self.user.id])
+        with self.assertNumQueries(0):
+            self.assertEqual(self._obtenir(), premier)
+        for callback in callbacks:
+            callback()
+        self._creer(self.user)
+        self.assertEqual(len(self._obtenir()['personnelles']), 1)
+
+    def test_instantane_construit_pendant_une_ecriture_jamais_relu(self):
+        from .instantanes import InstantaneNonLues
+
+        def construire():
+            instantane = self.consumer.construire_notifications_non_lues()
+            # Écriture concurrente validée pendant la construction
+            self._creer(self.user)
+            return instantane
+
+        self.assertEqual(InstantaneNonLues.obtenir(self.user.id, construire)['personnelles'], [])
+        self.assertEqual(len(self._obtenir()['personnelles']), 1)
+
+    def _envoyer(self, dernier_vu):
+        import asyncio
+        import json
+        from unittest import mock
+
+        instantane = self._obtenir()
+        envoyes = []
+
+        async def envoyer(text_data):
+            envoyes.append(json.loads(text_data))
+
+        with mock.patch.object(self.consumer, 'get_notifications_non_lues', mock.AsyncMock(return_value=instantane)), \
+                mock.patch.object(self.consumer, 'send', envoyer):
+            asyncio.run(self.consumer.send_notifications_non_lues(dernier_vu))
+        return envoyes[0]
+
+    def test_delta_seulement_au_dela_de_last_id(self):
+        personnelles = [self._creer(self.user) for _ in range(3)]
+        generales = [self._creer(None) for _ in range(2)]
+
+        message = self._envoyer(personnelles[1].id)
+        self.assertTrue(message['delta'])
+        self.assertEqual([n['id'] for n in message['data']['personnelles']], [personnelles[2].id])
+        self.assertEqual(
+            sorted(n['id'] for n in message['data']['generales']), sorted(n.id for n in generales)
+        )
+        self.assertEqual(message['dernier_id'], generales[-1].id)
+        # Les compteurs restent ceux de l'instantané complet
+        self.assertEqual(message['data']['nombre_non_lues'], 3)
+
+        message = self._envoyer(generales[-1].id)
+        self.assertEqual(message['data']['personnelles'], [])
+        self.assertEqual(message['data']['generales'], [])
+        self.assertEqual(message['dernier_id'], generales[-1].id)
+
+        message = self._envoyer(None)
+        self.assertFalse(message['delta'])
+        self.assertEqual(len(message['data']['personnelles']), 3)
+
+    def test_last_id_lu_dans_la_query_string(self):
+        self.consumer.scope = {'query_string': b'last_id=42'}
+        self.assertEqual(self.consumer.get_dernier_vu(), 42)
+        self.consumer.scope = {'query_string': b'last_id=abc'}
+        self.assertIsNone(self.consumer.get_dernier_vu())
+        self.consumer.scope = {}
+        self.assertIsNone(self.consumer.get_dernier_vu())
+
+
+class HistoriqueChatTest(TestCase):
+    """Tampon des salons, écriture différée et suppression des messages de chat"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from .historique_chat import HistoriqueChat
+        from .models import ChatMessage
+
+        reglages = override_settings(CHAT_HISTORIQUE={'BACKEND': 'memory', 'TAILLE': 3, 'ASYNC': False})
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+        HistoriqueChat.reinitialiser()
+        self.addCleanup(HistoriqueChat.reinitialiser)
+
+        self.ChatMessage = ChatMessage
+        User = get_user_model()
+        self.auteur = User.objects.create_user(
+            username='auteur', email='auteur@example.com', password='x', prenom='Auteur', nom='Test'
+        )
+        self.autre = User.objects.create_user(
+            username='autre', email='autre@example.com', password='x', prenom='Autre', nom='Test'
+        )
+
+    def _message(self, texte='Bonjour', salon='general', **champs):
+        from datetime import timedelta
+        from django.utils import timezone
+
+        decalage = champs.pop('decalage', 0)
+        return self.ChatMessage(
+            salon=salon, expediteur=self.auteur, message=texte,
+            cree_le=timezone.now() + timedelta(seconds=decalage), **champs
+        )
+
+    def _donnees(self, message):
+        from .services import ChatService
+
+        return ChatService.serialize_chat_message(message)
+
+    def test_tampon_circulaire(self):
+        from .historique_chat import HistoriqueChat
+
+        backend = HistoriqueChat.backend()
+        self.assertIsNone(backend.lire('general'))
+        messages = [self._donnees(self._message(str(i), decalage=i)) for i in range(5)]
+        backend.amorcer('general', [])
+        for message in messages:
+            backend.ajouter('general', message)
+        self.assertEqual(backend.lire('general'), messages[-3:])
+
+        backend.retirer('general', messages[3]['uid'])
+        self.assertEqual(backend.lire('general'), [messages[2], messages[4]])
+        self.assertIsNone(backend.lire('autre-salon'))
+
+    def test_amorcage_fusionne_les_ajouts_concurrents(self):
+        from .historique_chat import HistoriqueChat
+
+        en_base = [self._donnees(self._message(str(i), decalage=i)) for i in range(3)]
+        # Envoyé pendant la lecture de la base, et déjà présent dans la lecture
+        concurrent = self._donnees(self._message('concurrent', decalage=10))
+        charges = []
+
+        def charger():
+            charges.append(1)
+            HistoriqueChat.ajouter('general', concurrent)
+            HistoriqueChat.ajouter('general', en_base[2])
+            return en_base
+
+        messages = HistoriqueChat.messages_recents('general', charger)
+        self.assertEqual([m['uid'] for m in messages], [m['uid'] for m in en_base[1:] + [concurrent]])
+        self.assertEqual(HistoriqueChat.messages_recents('general', charger), messages)
+        self.assertEqual(len(charges), 1)
+
+    def test_insertion_unitaire_si_le_lot_echoue(self):
+        from unittest import mock
+        from .historique_chat import EcritureChat
+
+        existant = self._message('existant')
+        existant.save()
+        # Même uid qu'un message déjà inséré : le lot échoue, seul ce message est perdu
+        doublon = self._message('doublon', uid=existant.uid)
+        valide = self._message('valide')
+        with mock.patch('notifications.historique_chat.logger') as logger:
+            EcritureChat._inserer([doublon, valide])
+        logger.warning.assert_called_once()
+        logger.error.assert_called_once()
+        self.assertEqual(
+            sorted(self.ChatMessage.objects.values_list('message', flat=True)), ['existant', 'valide']
+        )
+
+    def test_suppression_par_uid_et_par_identifiant(self):
+        from .historique_chat import HistoriqueChat
+        from .services import ChatService
+
+        HistoriqueChat.backend().amorcer('general', [])
+        premier = ChatService.publier_message(self.auteur, 'premier')
+        second = ChatService.publier_message(self.auteur, 'second')
+        self.assertEqual(self.ChatMessage.objects.count(), 2)
+
+        self.assertIsNone(ChatService.supprimer_message(premier['uid'], self.autre))
+        self.assertEqual(ChatService.supprimer_message(premier['uid'], self.auteur), (premier['uid'], 'general'))
+        self.assertIsNone(ChatService.supprimer_message(premier['uid'], self.auteur))
+
+        pk = self.ChatMessage.objects.get(uid=second['uid']).pk
+        self.assertEqual(ChatService.supprimer_message(pk), (second['uid'], 'general'))
+        self.assertFalse(self.ChatMessage.objects.exists())
+        self.assertEqual(HistoriqueChat.backend().lire('general'), [])
+        self.assertIsNone(ChatService.supprimer_message('inconnu'))
+
+    def test_suppression_d_un_message_en_attente_localement(self):
+        from .historique_chat import EcritureChat
+        from .services import ChatService
+
+        with override_settings(CHAT_HISTORIQUE={'BACKEND': 'memory', 'ASYNC': True}), \
+                mock_thread_ecriture():
+            donnees = ChatService.publier_message(self.auteur, 'en attente')
+            self.assertIsNotNone(EcritureChat.en_attente(donnees['uid']))
+            self.assertEqual(ChatService.supprimer_message(donnees['uid'], self.auteur), (donnees['uid'], 'general'))
+            self.assertIsNone(EcritureChat.en_attente(donnees['uid']))
+            EcritureChat.vider()
+        self.assertFalse(self.ChatMessage.objects.exists())
+
+    def test_suppression_d_un_message_en_attente_dans_un_autre_worker(self):
+        from .historique_chat import EcritureChat, HistoriqueChat
+        from .services import ChatService
+
+        # Diffusé et en attente d'insertion dans un autre processus : seul le tampon partagé le connaît
+        message = self._message('ailleurs')
+        donnees = self._donnees(message)
+        HistoriqueChat.ajouter('general', donnees)
+
+        self.assertIsNone(ChatService.supprimer_message(donnees['uid'], self.autre))
+        self.assertEqual(ChatService.supprimer_message(donnees['uid'], self.auteur), (donnees['uid'], 'general'))
+        self.assertIsNone(HistoriqueChat.trouver(donnees['uid']))
+
+        # Insertion ultérieure par l'autre processus : message écarté
+        autre = self._message('conservé')
+        EcritureChat._inserer([message, autre])
+        self.assertEqual(list(self.ChatMessage.objects.values_list('message', flat=True)), ['conservé'])
+
+    def test_suppression_pendant_l_insertion(self):
+        from unittest import mock
+        from .historique_chat import EcritureChat, HistoriqueChat
+
+        message = self._message('supprimé pendant le lot')
+        bulk_create = self.ChatMessage.objects.bulk_create
+
+        def inserer(messages, **options):
+            # Suppression enregistrée par un autre worker entre la vérification et l'insertion
+            HistoriqueChat.marquer_supprime(str(message.uid))
+            return bulk_create(messages, **options)
+
+        with mock.patch.object(type(self.ChatMessage.objects), 'bulk_create', side_effect=inserer):
+            EcritureChat._inserer([message])
+        self.assertFalse(self.ChatMessage.objects.exists())
+
+    def test_arret_enregistre_une_seule_fois(self):
+        from unittest import mock
+        from .historique_chat import EcritureChat
+
+        with mock.patch('notifications.historique_chat.atexit.register') as enregistrer, \
+                mock.patch.object(EcritureChat, '_thread', None), \
+                mock.patch('notifications.historique_chat.threading.Thread'):
+            EcritureChat._demarrer()
+        enregistrer.assert_not_called()
+
+
+def mock_thread_ecriture():
+    """Écriture différée sans thread de fond : les messages restent en attente"""
+    from unittest import mock
+    from .historique_chat import EcritureChat
+
+    return mock.patch.object(EcritureChat, '_demarrer')
+
+
+@override_settings(NOTIFICATIONS_DISPATCH={'ASYNC': False})
+class CompteurNonLuesTest(TestCase):
+    """Compteur de notifications non lues en cache et statistiques en une requête groupée"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from django.core.cache import cache
+        from .models import NotificationType
+
+        cache.clear()
+        self.types = [
+            NotificationType.objects.create(code=code, nom=code)
+            for code in ('annonce_generale', 'tache_assignee', 'projet_modifie')
+        ]
+        self.user = get_user_model().objects.create_user(
+            username='compte', email='compte@example.com', password='x', prenom='Compte', nom='Test'
+        )
+
+    def _creer(self, nombre, type_code='annonce_generale', priorite='normale'):
+        from .services import NotificationService
+
+        with self.captureOnCommitCallbacks(execute=True):
+            return [
+                NotificationService.create_notification(
+                    type_code=type_code, titre='Titre', message='Message', destinataire=self.user, priorite=priorite
+                )
+                for _ in range(nombre)
+            ]
+
+    def _envois(self):
+        """Compteurs poussés par WebSocket (couche de canaux simulée)"""
+        from unittest import mock
+
+        couche = mock.Mock()
+        couche.group_send = mock.AsyncMock()
+        patch = mock.patch('notifications.services.get_channel_layer', return_value=couche)
+        patch.start()
+        self.addCleanup(patch.stop)
+        return lambda: [
+            appel.args[1]['unread_count'] for appel in couche.group_send.call_args_list
+            if appel.args[1]['type'] == 'notifications_non_lues'
+        ]
+
+    def test_compteur_servi_depuis_le_cache(self):
+        from .compteurs import CompteurNonLues
+
+        self._creer(2)
+        with self.assertNumQueries(1):
+            self.assertEqual(CompteurNonLues.obtenir(self.user.id), 2)
+        with self.assertNumQueries(0):
+            self.assertEqual(CompteurNonLues.obtenir(self.user.id), 2)
+
+        # Création unitaire : incrément après le commit, sans recomptage
+        self._creer(1)
+        with self.assertNumQueries(0):
+            self.assertEqual(CompteurNonLues.obtenir(self.user.id), 3)
+
+    def test_invalide_apres_lecture_en_masse(self):
+        from .compteurs import CompteurNonLues
+        from .services import NotificationService
+
+        notifications = self._creer(3)
+        self.assertEqual(CompteurNonLues.obtenir(self.user.id), 3)
+        envois = self._envois()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.mark_notifications_read(self.user, [notifications[0].id, notifications[1].id])
+        self.assertEqual(CompteurNonLues.obtenir(self.user.id), 1)
+        self.assertEqual(envois(), [1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.mark_notifications_read(self.user)
+        self.assertEqual(CompteurNonLues.obtenir(self.user.id), 0)
+
+    def test_invalide_apres_archivage_en_masse(self):
+        from .compteurs import CompteurNonLues
+        from .services import NotificationService
+
+        notifications = self._creer(2)
+        self.assertEqual(CompteurNonLues.obtenir(self.user.id), 2)
+        envois = self._envois()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.archive_notifications(self.user, [notifications[0].id])
+        self.assertEqual(CompteurNonLues.obtenir(self.user.id), 1)
+        self.assertEqual(envois(), [1])
+
+    def test_statistiques_en_nombre_de_requetes_constant(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+        from .services import NotificationService
+
+        self._creer(1)
+        # État de lecture des notifications générales créé au premier appel
+        NotificationService.get_notification_stats(self.user)
+        with CaptureQueriesContext(connection) as peu:
+            NotificationService.get_notification_stats(self.user)
+
+        for type_notification in self.types:
+            for priorite in ('faible', 'normale', 'elevee'):
+                self._creer(2, type_notification.code, priorite)
+        with self.captureOnCommitCallbacks(execute=True):
+            NotificationService.mark_notifications_read(self.user, [self._creer(1)[0].id])
+        with CaptureQueriesContext(connection) as beaucoup:
+            stats = NotificationService.get_notification_stats(self.user)
+
+        self.assertEqual(len(beaucoup), len(peu))
+        groupees = [requete for requete in beaucoup.captured_queries if 'GROUP BY' in requete['sql']]
+        self.assertEqual(len(groupees), 1)
+        self.assertEqual(stats['total_notifications'], 20)
+        self.assertEqual(stats['notifications_non_lues'], 19)
+        self.assertEqual(stats['notifications_par_type']['tache_assignee'], 6)
+        self.assertEqual(stats['notifications_par_priorite']['elevee'], 6)
+
+
+@override_settings(CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}})
+class DiffusionGroupeeTest(TestCase):
+    """Regroupement des messages WebSocket par groupe : fenêtre, latence maximale, taille de lot"""
+
+    GROUPE = 'notifications_personal_1'
+
+    def setUp(self):
+        from unittest import mock
+        from asgiref.sync import async_to_sync
+        from channels.layers import get_channel_layer
+        from .diffusion import DiffusionGroupee
+
+        DiffusionGroupee.vider()
+        boucle = mock.patch.object(DiffusionGroupee, '_boucle', None)
+        boucle.start()
+        self.addCleanup(boucle.stop)
+        self.addCleanup(DiffusionGroupee.vider)
+
+        self.layer = get_channel_layer()
+        self.canal = async_to_sync(self.layer.new_channel)()
+        async_to_sync(self.layer.group_add)(self.GROUPE, self.canal)
+
+    def _reglages(self, **config):
+        reglages = override_settings(NOTIFICATIONS_COALESCING=config)
+        reglages.enable()
+        self.addCleanup(reglages.disable)
+
+    def _recus(self):
+        """Messages déjà arrivés sur le canal (sans attendre les suivants)"""
+        import asyncio
+        from asgiref.sync import async_to_sync
+
+        async def lire():
+            messages = []
+            while True:
+                try:
+                    messages.append(await asyncio.wait_for(self.layer.receive(self.canal), 0.01))
+                except asyncio.TimeoutError:
+                    return messages
+        return async_to_sync(lire)()
+
+    def _envoyer(self, *ids):
+        from .diffusion import DiffusionGroupee
+
+        for notification_id in ids:
+            DiffusionGroupee.envoyer(self.GROUPE, 'notification_personal', {'id': notification_id})
+
+    def test_messages_de_la_fenetre_envoyes_en_un_lot(self):
+        import time
+
+        self._reglages(FENETRE_MS=50, LATENCE_MAX_MS=1000, TAILLE_MAX=50)
+        self._envoyer(1, 2, 3)
+        self.assertEqual(self._recus(), [])
+
+        time.sleep(0.3)
+        recus = self._recus()
+        self.assertEqual(len(recus), 1)
+        self.assertEqual(recus[0]['type'], 'notification_batch')
+        self.assertEqual([message['data']['id'] for message in recus[0]['messages']], [1, 2, 3])
+
+    def test_message_isole_envoye_sous_sa_forme_d_origine(self):
+        import time
+
+        self._reglages(FENETRE_MS=20, LATENCE_MAX_MS=1000, TAILLE_MAX=50)
+        self._envoyer(1)
+        time.sleep(0.2)
+        self.assertEqual(self._recus(), [{'type': 'notification_personal', 'notification': {'id': 1}}])
+
+    def test_latence_maximale_malgre_un_flux_continu(self):
+        import time
+
+        self._reglages(FENETRE_MS=100, LATENCE_MAX_MS=150, TAILLE_MAX=50)
+        debut = time.monotonic()
+        # Un message toutes les 30 ms : la fenêtre ne se referme jamais
+        for notification_id in range(15):
+            self._envoyer(notification_id)
+            time.sleep(0.03)
+        self.assertLess(time.monotonic() - debut, 1)
+        time.sleep(0.3)
+
+        recus = self._recus()
+        self.assertGreaterEqual(len(recus), 2)
+        ids = [
+            element['data']['id'] if message['type'] == 'notification_batch' else message['notification']['id']
+            for message in recus
+            for element in (message.get('messages') or [message])
+        ]
+        self.assertEqual(ids, list(range(15)))
+
+    def test_lot_plein_envoye_immediatement(self):
+        self._reglages(FENETRE_MS=10000, LATENCE_MAX_MS=10000, TAILLE_MAX=3)
+        self._envoyer(1, 2, 3, 4)
+        recus = self._recus()
+        self.assertEqual(len(recus), 1)
+        self.assertEqual([message['data']['id'] for message in recus[0]['messages']], [1, 2, 3])
+
+    def test_envoi_en_echec_journalise(self):
+        from unittest import mock
+        from .diffusion import DiffusionGroupee
+
+        async def group_send(groupe, message):
+            if groupe == 'en_echec':
+                raise ConnectionError('couche indisponible')
+
+        with mock.patch.object(self.layer, 'group_send', side_effect=group_send), \
+                mock.patch('notifications.diffusion.logger') as logger:
+            DiffusionGroupee.publier([
+                ('en_echec', {'type': 'notification_general', 'notification': {'id': 1}}),
+                (self.GROUPE, {'type': 'notification_personal', 'notification': {'id': 2}}),
+            ])
+        logger.error.assert_called_once()
+        self.assertIn('en_echec', logger.error.call_args.args[0])
+
+    def test_vidage_a_l_arret_sans_async_to_sync(self):
+        from unittest import mock
+        from .diffusion import DiffusionGroupee
+
+        self._reglages(FENETRE_MS=10000, LATENCE_MAX_MS=10000, TAILLE_MAX=50)
+        self._envoyer(1)
+        with mock.patch('notifications.diffusion.async_to_sync', side_effect=RuntimeError('arrêt')):
+            DiffusionGroupee.vider(arret=True)
+        self.assertEqual(self._recus(), [{'type': 'notification_personal', 'notification': {'id': 1}}])
+
+
+@override_settings(NOTIFICATIONS_DISPATCH={'ASYNC': False})
+class NotificationListViewTest(TestCase):
+    """Statut des notifications générales propre à l'utilisateur dans la liste"""
+
+    def setUp(self):
+        from django.contrib.auth import get_user_model
+        from .models import NotificationType
+        from .services import NotificationService
+
+        NotificationType.objects.create(code='annonce_generale', nom='Annonce générale')
+        self.user = get_user_model().objects.create_user(
+            username='liste', email='liste@example.com', password='x', prenom='Liste', nom='Test'
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.generale = NotificationService.create_general_notification(
+                type_code='annonce_generale', titre='Titre', message='Message'
+            )
+            NotificationService.mark_general_notifications_read(self.user, [self.generale.id])
+
+    def test_serialiseur_construit_avant_get_queryset(self):
+        from rest_framework.test import APIRequestFactory, force_authenticate
+        from .views import NotificationListView
+
+        requete = APIRequestFactory().get('/')
+        force_authenticate(requete, user=self.user)
+        vue = NotificationListView()
+        vue.setup(requete)
+        vue.request = vue.initialize_request(requete)
+        vue.format_kwarg = None
+
+        self.assertEqual(vue.get_serializer(self.generale).data['statut'], 'lue')
+        with self.assertNumQueries(0):
+            vue.get_serializer_context()
+
+    def test_liste(self):
+        from django.urls import reverse
+        from rest_framework.test import APIClient
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with override_settings(ROOT_URLCONF='notifications.urls'):
+            reponse = client.get(reverse('notification-list'))
+        self.assertEqual(reponse.status_code, 200)
+        self.assertEqual([(n['id'], n['statut']) for n in reponse.data['results']], [(self.generale.id, 'lue')])
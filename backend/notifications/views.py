@@ -4,9 +4,8 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth import get_user_model
 from django.db.models import Q
-from django.utils import timezone
-from datetime import timedelta
 
+from .compteurs import CompteurNonLues
 from .models import Notification, NotificationType, ChatMessage, NotificationPreference
 from .serializers import (
     NotificationSerializer, NotificationListSerializer, NotificationCreateSerializer,
@@ -14,6 +13,7 @@ from .serializers import (
     NotificationPreferenceSerializer, NotificationPreferenceUpdateSerializer,
     NotificationStatsSerializer, NotificationMarkReadSerializer, NotificationArchiveSerializer
 )
+from .pagination import NotificationCursorPagination, ChatMessageCursorPagination
 from .services import NotificationService, ChatService
 
 User = get_user_model()
@@ -30,14 +30,36 @@ class NotificationTypeListView(generics.ListAPIView):
 
 class NotificationListView(generics.ListAPIView):
     """
-    Liste des notifications pour l'utilisateur connecté
+    Liste des notifications pour l'utilisateur connecté, paginée par curseur
+    (?cursor=...&page_size=...) sur (cree_le, id)
     """
     serializer_class = NotificationListSerializer
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = NotificationCursorPagination
+    
+    def get_etat_general(self):
+        """État de lecture des notifications générales (repère + masquées), chargé une fois par requête"""
+        if getattr(self, '_etat_general', None) is None:
+            self._etat_general = NotificationService.get_general_state(self.request.user)
+        return self._etat_general
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        # Chargé au besoin : le sérialiseur peut être construit avant get_queryset()
+        if self.request is not None and self.request.user.is_authenticated:
+            context['etat_general'] = self.get_etat_general()
+        return context
     
     def get_queryset(self):
         user = self.request.user
         notification_type = self.request.query_params.get('type', 'all')
+        statut = self.request.query_params.get('statut')
+        
+        # État de lecture des notifications générales (repère + masquées)
+        etat_general = self.get_etat_general()
+        generales = NotificationService.general_status_q(etat_general, statut) if statut else (
+            Q(destinataire__isnull=True) & ~Q(id__in=etat_general.masquees)
+        )
         
         queryset = Notification.objects.select_related(
             'type_notification', 'projet', 'tache', 'service'
@@ -68,24 +90,19 @@ class NotificationListView(generics.ListAPIView):
                     Q(destinataire=user) | Q(destinataire__isnull=True)
                 )
         
-        # Filtrer par statut
-        statut = self.request.query_params.get('statut')
+        # Filtrer par statut : colonne statut pour les personnelles, état de
+        # l'utilisateur pour les générales (masquées exclues par défaut)
+        personnelles = Q(destinataire__isnull=False)
         if statut:
-            queryset = queryset.filter(statut=statut)
+            personnelles &= Q(statut=statut)
+        queryset = queryset.filter(personnelles | generales)
         
         # Filtrer par priorité
         priorite = self.request.query_params.get('priorite')
         if priorite:
             queryset = queryset.filter(priorite=priorite)
         
-        # Limiter les notifications générales aux 30 derniers jours (plus généreux)
-        if notification_type in ['general', 'all']:
-            cutoff_date = timezone.now() - timedelta(days=30)
-            queryset = queryset.filter(
-                Q(destinataire=user) | Q(cree_le__gte=cutoff_date)
-            )
-        
-        return queryset.order_by('-cree_le')
+        return queryset.order_by('-cree_le', '-id')
 
 
 class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
@@ -108,6 +125,8 @@ class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
         # Marquer comme lue si c'est une notification personnelle
         if instance.destinataire == request.user and instance.statut == 'non_lue':
             instance.marquer_comme_lue()
+        elif instance.destinataire_id is None:
+            NotificationService.mark_general_notifications_read(request.user, [instance.id])
         
         serializer = self.get_serializer(instance)
         return Response(serializer.data)
@@ -120,6 +139,9 @@ class NotificationDetailView(generics.RetrieveUpdateDestroyAPIView):
                 status=status.HTTP_403_FORBIDDEN
             )
         
+        instance = self.get_object()
+        if instance.statut == 'non_lue':
+            CompteurNonLues.invalider([instance.destinataire_id])
         return super().destroy(request, *args, **kwargs)
 
 
@@ -236,9 +258,11 @@ class NotificationDeleteBulkView(APIView):
                 )
             
             # Supprimer les notifications spécifiées
-            deleted_count = Notification.objects.filter(
-                id__in=notification_ids
-            ).delete()[0]
+            notifications = Notification.objects.filter(id__in=notification_ids)
+            CompteurNonLues.invalider(
+                notifications.filter(statut='non_lue').values_list('destinataire_id', flat=True).distinct()
+            )
+            deleted_count = notifications.delete()[0]
             
             return Response({
                 'message': f'{deleted_count} notification(s) supprimée(s)',
@@ -251,9 +275,11 @@ class NotificationDeleteBulkView(APIView):
 # Vues pour le chat
 class ChatMessageListView(generics.ListCreateAPIView):
     """
-    Liste et création des messages de chat
+    Liste (paginée par curseur sur (cree_le, id), filtrable par ?salon=) et
+    création des messages de chat
     """
     permission_classes = [permissions.IsAuthenticated]
+    pagination_class = ChatMessageCursorPagination
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -261,10 +287,11 @@ class ChatMessageListView(generics.ListCreateAPIView):
         return ChatMessageSerializer
     
     def get_queryset(self):
-        return ChatService.get_recent_messages(limit=100)
+        return ChatService.get_messages_queryset(self.request.query_params.get('salon'))
     
     def perform_create(self, serializer):
-        serializer.save(expediteur=self.request.user)
+        message = serializer.save(expediteur=self.request.user)
+        ChatService.ajouter_a_l_historique(message)
 
 
 class ChatMessageDetailView(generics.RetrieveDestroyAPIView):
@@ -275,7 +302,7 @@ class ChatMessageDetailView(generics.RetrieveDestroyAPIView):
     serializer_class = ChatMessageSerializer
     
     def get_queryset(self):
-        return ChatService.get_recent_messages(limit=1000)
+        return ChatService.get_messages_queryset()
     
     def destroy(self, request, *args, **kwargs):
         """
@@ -288,21 +315,22 @@ class ChatMessageDetailView(generics.RetrieveDestroyAPIView):
             )
         
         message = self.get_object()
-        message_id = message.id
-        message.delete()
+        supprime = ChatService.supprimer_message(message.id)
         
-        # Notifier la suppression via WebSocket
-        from channels.layers import get_channel_layer
-        from asgiref.sync import async_to_sync
-        
-        channel_layer = get_channel_layer()
-        async_to_sync(channel_layer.group_send)(
-            'chat_general',
-            {
-                'type': 'message_deleted',
-                'message_id': message_id
-            }
-        )
+        # Notifier la suppression via WebSocket (les clients identifient les messages par uid)
+        if supprime:
+            from channels.layers import get_channel_layer
+            from asgiref.sync import async_to_sync
+            
+            message_uid, salon = supprime
+            channel_layer = get_channel_layer()
+            async_to_sync(channel_layer.group_send)(
+                f'chat_{salon}',
+                {
+                    'type': 'message_deleted',
+                    'message_id': message_uid
+                }
+            )
         
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -314,18 +342,7 @@ class ChatOnlineUsersView(APIView):
     permission_classes = [permissions.IsAuthenticated]
     
     def get(self, request):
-        online_users = ChatService.get_online_users()
-        
-        users_data = []
-        for user in online_users:
-            users_data.append({
-                'id': user.id,
-                'username': user.username,
-                'prenom': user.prenom,
-                'nom': user.nom,
-                'service': user.service.nom if user.service else None,
-                'last_login': user.last_login.isoformat() if user.last_login else None
-            })
+        users_data = [ChatService.serialize_online_user(user) for user in ChatService.get_online_users()]
         
         return Response({
             'online_users': users_data,
@@ -436,12 +453,28 @@ def cleanup_old_notifications(request):
     """
     Nettoyer les anciennes notifications (admin seulement)
     """
-    days = request.data.get('days', 30)
+    try:
+        days = int(request.data.get('days', 30))
+        purge_days = request.data.get('purge_days')
+        purge_days = int(purge_days) if purge_days not in (None, '') else None
+    except (TypeError, ValueError):
+        return Response({
+            'error': 'days et purge_days doivent être des nombres entiers de jours'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    if days < 0 or (purge_days is not None and purge_days < 0):
+        return Response({
+            'error': 'days et purge_days ne peuvent pas être négatifs'
+        }, status=status.HTTP_400_BAD_REQUEST)
+    
     archived_count = NotificationService.cleanup_old_notifications(days)
     
+    # Suppression définitive des notifications archivées (optionnelle)
+    deleted_count = NotificationService.purge_archived_notifications(purge_days) if purge_days else 0
+    
     return Response({
-        'message': f'{archived_count} notifications archivées',
-        'archived_count': archived_count
+        'message': f'{archived_count} notifications archivées, {deleted_count} supprimées',
+        'archived_count': archived_count,
+        'deleted_count': deleted_count
     })
 
 
@@ -451,14 +484,11 @@ def notification_unread_count(request):
     """
     Nombre de notifications non lues
     """
-    user = request.user
-    count = Notification.objects.filter(
-        destinataire=user,
-        statut='non_lue'
-    ).count()
+    count = CompteurNonLues.obtenir(request.user.id)
     
     return Response({
-        'unread_count': count
+        'unread_count': count,
+        'general_unread_count': NotificationService.get_general_unread_count(request.user)
     })
 
 
@@ -1,6 +1,10 @@
 from django.contrib import admin
 from django.utils.html import format_html
-from .models import Projet, MembreProjet, HistoriqueEtat, PermissionProjet, Tache, PhaseProjet, ProjetPhaseEtat
+from .models import (
+    Projet, MembreProjet, HistoriqueEtat, PermissionProjet, Tache, PhaseProjet, ProjetPhaseEtat,
+    EmailOutbox, EmailDigestEntry
+)
+from .email_outbox import EmailOutboxService
 
 # Register your models here.
 
@@ -139,3 +143,39 @@ class ProjetPhaseEtatAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('projet', 'phase')
 
 
+
+
+@admin.register(EmailOutbox)
+class EmailOutboxAdmin(admin.ModelAdmin):
+    """Configuration admin pour la file d'attente des emails."""
+    list_display = ['sujet', 'statut', 'tentatives', 'nombre_destinataires', 'prochaine_tentative', 'cree_le', 'envoye_le']
+    list_filter = ['statut', 'template', 'cree_le']
+    search_fields = ['sujet', 'derniere_erreur']
+    readonly_fields = ['cree_le', 'verrouille_le', 'envoye_le']
+    date_hierarchy = 'cree_le'
+    actions = ['remettre_en_file']
+    
+    def nombre_destinataires(self, obj):
+        """Afficher le nombre de destinataires."""
+        return len(obj.destinataires)
+    nombre_destinataires.short_description = 'Destinataires'
+    
+    def remettre_en_file(self, request, queryset):
+        """Remettre en file les emails abandonnés."""
+        nombre = EmailOutboxService.requeue(queryset)
+        self.message_user(request, f"{nombre} email(s) remis en file d'attente.")
+    remettre_en_file.short_description = "Remettre en file les emails abandonnés"
+
+
+@admin.register(EmailDigestEntry)
+class EmailDigestEntryAdmin(admin.ModelAdmin):
+    """Configuration admin pour les événements en attente de digest."""
+    list_display = ['sujet', 'utilisateur', 'frequence', 'evenement', 'cree_le', 'envoye_le']
+    list_filter = ['frequence', 'evenement', 'cree_le']
+    search_fields = ['sujet', 'resume', 'utilisateur__email', 'utilisateur__nom']
+    readonly_fields = ['cree_le', 'envoye_le']
+    date_hierarchy = 'cree_le'
+    
+    def get_queryset(self, request):
+        """Optimiser les requêtes."""
+        return super().get_queryset(request).select_related('utilisateur')
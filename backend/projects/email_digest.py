@@ -0,0 +1,273 @@
+"""
+Regroupement des emails de projets par destinataire (digests).
+
+Deux mécanismes réduisent le nombre d'emails envoyés :
+
+- les préférences : un utilisateur dont NotificationPreference.frequence_digest
+  vaut « quotidien » ou « hebdomadaire » ne reçoit plus d'email au fil de l'eau,
+  ses événements sont stockés (EmailDigestEntry) puis envoyés en un seul email
+  par la commande send_email_digests ;
+- le regroupement d'exécution : les commandes qui émettent beaucoup d'emails
+  (monitor_dates, send_delay_emails) ouvrent un contexte regroupement() dans
+  lequel les événements sont collectés puis envoyés à la fin, à raison d'un
+  seul email par destinataire.
+"""
+from django.conf import settings as django_settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils import timezone
+from collections import OrderedDict, defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+import logging
+
+from .email_outbox import EmailOutboxService
+from .models import EmailDigestEntry
+
+logger = logging.getLogger(__name__)
+
+
+# Collecteur actif pendant un regroupement() : {email: OrderedDict(cle -> événement)}
+_collecteur = ContextVar('email_digest_collecteur', default=None)
+
+FREQUENCES_DIFFEREES = ('quotidien', 'hebdomadaire')
+
+
+class EmailDigestService:
+    """Service de routage des événements email et de construction des digests"""
+
+    TEMPLATE = 'emails/digest.html'
+
+    # ------------------------------------------------------------------
+    # Événements
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def evenement(subject, template_name, context, text_content, html_content):
+        """Décrit un email de ProjectEmailService sous forme d'événement de digest"""
+        nom = template_name.rsplit('/', 1)[-1].rsplit('.', 1)[0]
+        task = context.get('task')
+        project = context.get('project')
+
+        if task is not None:
+            cle = f"{nom}:tache:{task.id}"
+            resume = f"Tâche « {task.titre} » — projet {task.projet.nom}"
+        elif project is not None:
+            cle = f"{nom}:projet:{project.id}"
+            resume = f"Projet « {project.nom} » ({project.code})"
+        elif context.get('task_nom'):
+            cle = f"{nom}:{context.get('project_nom')}:{context['task_nom']}"
+            resume = f"Tâche « {context['task_nom']} » — projet {context.get('project_nom')}"
+        else:
+            cle = f"{nom}:{context.get('project_code') or context.get('project_nom')}"
+            resume = f"Projet « {context.get('project_nom')} » ({context.get('project_code')})"
+
+        return {
+            'evenement': nom,
+            'cle': cle[:200],
+            'sujet': subject,
+            'resume': resume,
+            'url': context.get('project_url', ''),
+            'texte': text_content,
+            'html': html_content,
+            'template': template_name,
+        }
+
+    # ------------------------------------------------------------------
+    # Routage (appelé par ProjectEmailService._send_email)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def distribuer(cls, email_list, evenement):
+        """
+        Répartit les destinataires d'un événement selon leurs préférences.
+
+        - notifications_email désactivé : l'email n'est pas envoyé ;
+        - digest quotidien / hebdomadaire : l'événement est stocké ;
+        - immédiat : collecté si un regroupement() est actif, sinon retourné.
+
+        Retourne la liste des adresses à qui envoyer l'email immédiatement.
+        """
+        preferences = cls._preferences(email_list)
+        immediats, differes = [], defaultdict(list)
+        for email in email_list:
+            utilisateur_id, frequence, actif = preferences.get(email, (None, 'immediat', True))
+            if not actif:
+                continue
+            if utilisateur_id and frequence in FREQUENCES_DIFFEREES:
+                differes[frequence].append(utilisateur_id)
+            else:
+                immediats.append(email)
+
+        if differes:
+            cls._stocker(evenement, differes)
+
+        collecteur = _collecteur.get()
+        if collecteur is not None:
+            for email in immediats:
+                collecteur[email].setdefault(evenement['cle'], evenement)
+            return []
+        return immediats
+
+    @staticmethod
+    def _preferences(email_list):
+        """{email: (utilisateur_id, frequence_digest, notifications_email)} en une requête"""
+        try:
+            from notifications.models import NotificationPreference
+        except ImportError:
+            return {}
+        return {
+            email: (utilisateur_id, frequence, actif)
+            for email, utilisateur_id, frequence, actif in NotificationPreference.objects.filter(
+                utilisateur__email__in=email_list
+            ).values_list('utilisateur__email', 'utilisateur_id', 'frequence_digest', 'notifications_email')
+        }
+
+    @staticmethod
+    def _stocker(evenement, differes):
+        """Enregistre l'événement pour chaque utilisateur en digest, sans doublon en attente"""
+        utilisateur_ids = [uid for ids in differes.values() for uid in ids]
+        deja_en_attente = set(EmailDigestEntry.objects.filter(
+            utilisateur_id__in=utilisateur_ids, cle=evenement['cle'], envoye_le__isnull=True
+        ).values_list('utilisateur_id', flat=True))
+        EmailDigestEntry.objects.bulk_create([
+            EmailDigestEntry(
+                utilisateur_id=utilisateur_id,
+                frequence=frequence,
+                evenement=evenement['evenement'],
+                cle=evenement['cle'],
+                sujet=evenement['sujet'][:255],
+                resume=evenement['resume'],
+                url=evenement['url'][:500],
+            )
+            for frequence, ids in differes.items()
+            for utilisateur_id in ids
+            if utilisateur_id not in deja_en_attente
+        ])
+
+    # ------------------------------------------------------------------
+    # Regroupement d'exécution (commandes)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    @contextmanager
+    def regroupement(cls):
+        """
+        Collecte les emails immédiats émis dans le bloc et les envoie à la sortie :
+        un seul email par destinataire, les destinataires ayant exactement les
+        mêmes événements partageant le même message.
+        """
+        if _collecteur.get() is not None:
+            # Regroupement déjà actif : le contexte englobant enverra les emails
+            yield
+            return
+        jeton = _collecteur.set(defaultdict(OrderedDict))
+        try:
+            yield
+            collecteur = _collecteur.get()
+        finally:
+            _collecteur.reset(jeton)
+        cls._envoyer_collecte(collecteur)
+
+    @classmethod
+    def _envoyer_collecte(cls, collecteur):
+        # Regrouper les destinataires qui ont reçu exactement les mêmes événements
+        destinataires_par_lot = OrderedDict()
+        for email, evenements in collecteur.items():
+            cle = tuple(evenements)
+            destinataires_par_lot.setdefault(cle, ([], list(evenements.values())))[0].append(email)
+
+        messages = 0
+        with transaction.atomic():
+            for destinataires, evenements in destinataires_par_lot.values():
+                if len(evenements) == 1:
+                    # Un seul événement : l'email d'origine, inchangé
+                    evenement = evenements[0]
+                    EmailOutboxService.enqueue(
+                        destinataires, evenement['sujet'], evenement['texte'],
+                        corps_html=evenement['html'], template=evenement['template'],
+                    )
+                else:
+                    sujet, texte, html = cls.rendre(evenements)
+                    EmailOutboxService.enqueue(destinataires, sujet, texte, corps_html=html, template=cls.TEMPLATE)
+                messages += 1
+
+        nb_evenements = sum(len(evenements) for evenements in collecteur.values())
+        logger.info(
+            f"Regroupement des emails: {nb_evenements} envoi(s) individuel(s) "
+            f"remplacé(s) par {messages} email(s)"
+        )
+
+    # ------------------------------------------------------------------
+    # Digests différés (send_email_digests)
+    # ------------------------------------------------------------------
+
+    @classmethod
+    def envoyer_digests(cls, frequence):
+        """
+        Envoie un email récapitulatif à chaque utilisateur ayant des événements en
+        attente pour cette fréquence. Retourne (nombre d'emails, nombre d'événements).
+        """
+        emails = evenements_traites = 0
+        with transaction.atomic():
+            entrees = list(
+                EmailDigestEntry.objects.select_for_update()
+                .filter(frequence=frequence, envoye_le__isnull=True)
+                .select_related('utilisateur')
+                .order_by('utilisateur_id', 'cree_le')
+            )
+            par_utilisateur = OrderedDict()
+            for entree in entrees:
+                par_utilisateur.setdefault(entree.utilisateur, []).append(entree)
+
+            for utilisateur, entrees_utilisateur in par_utilisateur.items():
+                if not utilisateur.email:
+                    continue
+                sujet, texte, html = cls.rendre(
+                    [
+                        {'sujet': e.sujet, 'resume': e.resume, 'url': e.url, 'cree_le': e.cree_le}
+                        for e in entrees_utilisateur
+                    ],
+                    utilisateur=utilisateur,
+                    frequence=frequence,
+                )
+                EmailOutboxService.enqueue([utilisateur.email], sujet, texte, corps_html=html, template=cls.TEMPLATE)
+                emails += 1
+
+            evenements_traites = len(entrees)
+            if entrees:
+                EmailDigestEntry.objects.filter(id__in=[e.id for e in entrees]).update(envoye_le=timezone.now())
+        return emails, evenements_traites
+
+    @classmethod
+    def rendre(cls, evenements, utilisateur=None, frequence=None):
+        """Rend le sujet, le texte et le HTML d'un email récapitulatif"""
+        try:
+            from .email_service import ProjectEmailService
+            domain, site_name, frontend_url = ProjectEmailService._get_site_info()
+        except Exception:
+            site_name = 'Gestion Marketing'
+            frontend_url = getattr(django_settings, 'FRONTEND_URL', '')
+
+        periode = dict(EmailDigestEntry.FREQUENCE_CHOICES).get(frequence)
+        sujet = f"📬 {len(evenements)} mise(s) à jour de vos projets"
+        if periode:
+            sujet = f"📬 Récapitulatif {periode.lower()} : {len(evenements)} mise(s) à jour"
+
+        context = {
+            'utilisateur': utilisateur,
+            'evenements': evenements,
+            'periode': periode,
+            'site_name': site_name,
+            'frontend_url': frontend_url,
+        }
+        html = render_to_string(cls.TEMPLATE, context)
+
+        salutation = f"Bonjour {utilisateur.prenom} {utilisateur.nom}," if utilisateur else "Bonjour,"
+        lignes = [f"- {e['sujet']}\n  {e['resume']}" + (f"\n  {e['url']}" if e.get('url') else '') for e in evenements]
+        texte = (
+            f"{salutation}\n\nVoici les dernières mises à jour de vos projets :\n\n"
+            + "\n".join(lignes)
+            + "\n\nCordialement,\nL'équipe de gestion de projets\n"
+        )
+        return sujet, texte, html
@@ -0,0 +1,239 @@
+"""
+File d'attente persistante des emails sortants (outbox).
+
+Les services d'envoi insèrent les messages déjà rendus dans la table
+EmailOutbox, dans la transaction de l'appelant : aucun accès SMTP n'a lieu
+pendant la requête. La commande process_email_outbox vide ensuite la file par
+lots, avec une seule connexion SMTP par lot, un backoff exponentiel entre les
+tentatives et un statut « abandonné » (dead-letter) après trop d'échecs.
+"""
+from django.conf import settings as django_settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import connection as db_connection, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from datetime import timedelta
+import logging
+import random
+import smtplib
+import time
+
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+
+# Valeurs par défaut, surchargeables via settings.EMAIL_OUTBOX
+CONFIG_PAR_DEFAUT = {
+    'BATCH_SIZE': 50,          # Emails envoyés par connexion SMTP
+    'MAX_ATTEMPTS': 5,         # Au-delà, l'email passe en statut « abandonné »
+    'BACKOFF_BASE': 30,        # Délai (s) avant la 2e tentative, doublé ensuite
+    'BACKOFF_MAX': 3600,       # Délai maximal (s) entre deux tentatives
+    'LOCK_TIMEOUT': 600,       # Un lot « en cours » plus vieux est repris (worker arrêté)
+}
+
+
+def get_config():
+    """Configuration de la file d'attente fusionnée avec les valeurs par défaut"""
+    return {**CONFIG_PAR_DEFAUT, **getattr(django_settings, 'EMAIL_OUTBOX', {})}
+
+
+class EmailOutboxService:
+    """Service de mise en file et d'envoi par lots des emails"""
+
+    def __init__(self, config=None):
+        self.config = config or get_config()
+
+    # ------------------------------------------------------------------
+    # Mise en file (appelée depuis les requêtes / signaux)
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def enqueue(destinataires, sujet, corps_texte, corps_html='', template='', expediteur=None):
+        """
+        Ajoute un email à la file d'attente. L'insertion suit la transaction en
+        cours : un email n'est pas envoyé si la modification est annulée.
+        """
+        destinataires = sorted(set(email for email in destinataires if email))
+        if not destinataires:
+            return None
+        return EmailOutbox.objects.create(
+            sujet=sujet[:255],
+            destinataires=destinataires,
+            expediteur=expediteur or django_settings.DEFAULT_FROM_EMAIL,
+            corps_texte=corps_texte,
+            corps_html=corps_html,
+            template=template,
+        )
+
+    # ------------------------------------------------------------------
+    # Envoi (worker)
+    # ------------------------------------------------------------------
+
+    def vider(self, max_lots=None):
+        """
+        Envoie les emails dus lot par lot jusqu'à ce que la file soit vide
+        (ou max_lots atteint). Retourne les métriques cumulées.
+        """
+        stats = self._stats_vides()
+        debut = time.monotonic()
+        lots = 0
+        while max_lots is None or lots < max_lots:
+            resultat = self.traiter_lot()
+            if not resultat['traites']:
+                break
+            lots += 1
+            for cle in ('traites', 'envoyes', 'echecs', 'abandonnes'):
+                stats[cle] += resultat[cle]
+            if resultat['envoyes'] == 0:
+                # Lot entièrement en échec (serveur SMTP indisponible) : laisser le backoff agir
+                break
+        stats['lots'] = lots
+        self._finaliser_stats(stats, debut)
+        return stats
+
+    def traiter_lot(self):
+        """Réserve un lot d'emails dus et l'envoie sur une seule connexion SMTP"""
+        debut = time.monotonic()
+        stats = self._stats_vides()
+        emails = self._reserver(self.config['BATCH_SIZE'])
+        stats['traites'] = len(emails)
+        if not emails:
+            return stats
+
+        envoyes, en_echec = [], set()
+        connexion = get_connection()
+        try:
+            connexion.open()
+        except Exception as e:
+            # Aucun email du lot ne peut partir : tous sont replanifiés
+            logger.error(f"Connexion SMTP impossible ({django_settings.EMAIL_HOST}:{django_settings.EMAIL_PORT}): {e}")
+            for email in emails:
+                self._echec(email, e, stats)
+            self._finaliser_stats(stats, debut)
+            return stats
+
+        try:
+            for email in emails:
+                message = EmailMultiAlternatives(
+                    subject=email.sujet,
+                    body=email.corps_texte,
+                    from_email=email.expediteur or django_settings.DEFAULT_FROM_EMAIL,
+                    to=email.destinataires,
+                    connection=connexion,
+                )
+                if email.corps_html:
+                    message.attach_alternative(email.corps_html, "text/html")
+                try:
+                    message.send()
+                    envoyes.append(email.id)
+                except Exception as e:
+                    en_echec.add(email.id)
+                    self._echec(email, e, stats)
+                    if isinstance(e, smtplib.SMTPServerDisconnected):
+                        # Le serveur a coupé la connexion : en rouvrir une pour la suite du lot
+                        try:
+                            connexion.close()
+                        except Exception:
+                            pass
+                        connexion.open()
+        except Exception as e:
+            # Reconnexion impossible : les emails restants du lot sont replanifiés
+            traites = set(envoyes) | en_echec
+            for email in emails:
+                if email.id not in traites:
+                    self._echec(email, e, stats)
+        finally:
+            try:
+                connexion.close()
+            except Exception:
+                pass
+
+        if envoyes:
+            EmailOutbox.objects.filter(id__in=envoyes).update(
+                statut='envoye', envoye_le=timezone.now(), verrouille_le=None, derniere_erreur=''
+            )
+        stats['envoyes'] = len(envoyes)
+        self._finaliser_stats(stats, debut)
+        return stats
+
+    def _reserver(self, taille):
+        """
+        Passe un lot d'emails dus en statut « en cours ». Les lignes déjà
+        verrouillées par un autre worker sont ignorées (SKIP LOCKED) quand la
+        base le permet.
+        """
+        maintenant = timezone.now()
+        expiration = maintenant - timedelta(seconds=self.config['LOCK_TIMEOUT'])
+        dus = EmailOutbox.objects.filter(
+            Q(statut='en_attente', prochaine_tentative__lte=maintenant) |
+            Q(statut='en_cours', verrouille_le__lt=expiration)
+        ).order_by('prochaine_tentative', 'id')
+
+        skip_locked = db_connection.features.has_select_for_update_skip_locked
+        with transaction.atomic():
+            emails = list(dus.select_for_update(skip_locked=skip_locked)[:taille])
+            if emails:
+                EmailOutbox.objects.filter(id__in=[email.id for email in emails]).update(
+                    statut='en_cours', verrouille_le=maintenant
+                )
+        return emails
+
+    def _echec(self, email, erreur, stats):
+        """Replanifie un email avec backoff exponentiel, ou l'abandonne"""
+        tentatives = email.tentatives + 1
+        if tentatives >= self.config['MAX_ATTEMPTS']:
+            statut = 'abandonne'
+            prochaine_tentative = email.prochaine_tentative
+            stats['abandonnes'] += 1
+            logger.error(f"Email {email.id} abandonné après {tentatives} tentative(s): {erreur}")
+        else:
+            statut = 'en_attente'
+            prochaine_tentative = timezone.now() + timedelta(seconds=self.delai_avant_tentative(tentatives))
+            stats['echecs'] += 1
+            logger.warning(f"Échec d'envoi de l'email {email.id} (tentative {tentatives}): {erreur}")
+        EmailOutbox.objects.filter(id=email.id).update(
+            statut=statut,
+            tentatives=tentatives,
+            prochaine_tentative=prochaine_tentative,
+            derniere_erreur=str(erreur)[:2000],
+            verrouille_le=None,
+        )
+
+    def delai_avant_tentative(self, tentatives):
+        """Délai (s) avant la tentative suivante : base * 2^(n-1), plafonné, avec ±10 % d'aléa"""
+        delai = min(self.config['BACKOFF_BASE'] * 2 ** (tentatives - 1), self.config['BACKOFF_MAX'])
+        return delai * random.uniform(0.9, 1.1)
+
+    @staticmethod
+    def requeue(queryset):
+        """Remet en file des emails abandonnés (compteur de tentatives remis à zéro)"""
+        return queryset.filter(statut='abandonne').update(
+            statut='en_attente', tentatives=0, prochaine_tentative=timezone.now(), derniere_erreur=''
+        )
+
+    # ------------------------------------------------------------------
+    # Métriques
+    # ------------------------------------------------------------------
+
+    @staticmethod
+    def statistiques():
+        """Nombre d'emails par statut et ancienneté du plus vieil email en attente"""
+        stats = {statut: 0 for statut, _ in EmailOutbox.STATUT_CHOICES}
+        for ligne in EmailOutbox.objects.values('statut').annotate(nombre=Count('id')).order_by():
+            stats[ligne['statut']] = ligne['nombre']
+        plus_ancien = EmailOutbox.objects.filter(statut='en_attente').order_by('cree_le').values_list(
+            'cree_le', flat=True
+        ).first()
+        stats['attente_max_secondes'] = (timezone.now() - plus_ancien).total_seconds() if plus_ancien else 0
+        return stats
+
+    @staticmethod
+    def _stats_vides():
+        return {'traites': 0, 'envoyes': 0, 'echecs': 0, 'abandonnes': 0}
+
+    @staticmethod
+    def _finaliser_stats(stats, debut):
+        duree = time.monotonic() - debut
+        stats['duree_secondes'] = round(duree, 3)
+        stats['debit_par_seconde'] = round(stats['envoyes'] / duree, 2) if duree > 0 else 0.0
@@ -1,9 +1,14 @@
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
 from django.conf import settings as django_settings
 from django.contrib.sites.models import Site
 from django.utils import timezone
 from datetime import date
+import logging
+
+from .email_digest import EmailDigestService
+from .email_outbox import EmailOutboxService
+
+logger = logging.getLogger(__name__)
 
 
 class ProjectEmailService:
@@ -49,7 +54,15 @@ class ProjectEmailService:
     
     @staticmethod
     def _send_email(recipients, subject, template_name, context, text_content=None):
-        """Méthode générique pour envoyer un email."""
+        """
+        Méthode générique pour envoyer un email.
+        
+        Le message est rendu puis placé dans la file d'attente (EmailOutbox) :
+        l'envoi SMTP est fait par la commande process_email_outbox, jamais
+        pendant la requête ou le signal appelant. Les destinataires en mode
+        digest (NotificationPreference.frequence_digest) reçoivent l'événement
+        dans leur email récapitulatif (voir EmailDigestService).
+        """
         if not recipients:
             return False
         
@@ -63,91 +76,24 @@ class ProjectEmailService:
             if not email_list:
                 return False
             
-            # Créer l'email
-            email = EmailMultiAlternatives(
-                subject=subject,
-                body=text_content or html_content,
-                from_email=django_settings.DEFAULT_FROM_EMAIL,
-                to=email_list
+            evenement = EmailDigestService.evenement(
+                subject, template_name, context, text_content or html_content, html_content
             )
+            email_list = EmailDigestService.distribuer(email_list, evenement)
+            if not email_list:
+                return True
             
-            # Attacher le contenu HTML
-            email.attach_alternative(html_content, "text/html")
-            
-            # Envoyer l'email avec retry et gestion améliorée de la connexion
-            max_retries = 3
-            for attempt in range(max_retries):
-                connection = None
-                try:
-                    # Créer une nouvelle connexion à chaque tentative
-                    from django.core.mail import get_connection
-                    connection = get_connection()
-                    
-                    # Ouvrir la connexion explicitement avec gestion d'erreurs
-                    try:
-                        connection.open()
-                    except Exception as conn_error:
-                        if connection:
-                            try:
-                                connection.close()
-                            except:
-                                pass
-                        if attempt < max_retries - 1:
-                            import time
-                            time.sleep(2)  # Attendre 2 secondes avant de réessayer
-                            continue
-                        else:
-                            raise conn_error
-                    
-                    # Envoyer l'email
-                    email.connection = connection
-                    email.send()
-                    
-                    # Fermer la connexion proprement
-                    try:
-                        connection.close()
-                    except:
-                        pass
-                    
-                    return True
-                    
-                except Exception as send_error:
-                    # Fermer la connexion en cas d'erreur
-                    if connection:
-                        try:
-                            connection.close()
-                        except:
-                            pass
-                    
-                    if attempt < max_retries - 1:
-                        # Attendre un peu avant de réessayer
-                        import time
-                        time.sleep(2)
-                        continue
-                    else:
-                        raise send_error
-            
+            EmailOutboxService.enqueue(
+                email_list,
+                subject,
+                text_content or html_content,
+                corps_html=html_content,
+                template=template_name,
+            )
             return True
             
         except Exception as e:
-            import logging
-            logger = logging.getLogger(__name__)
-            error_msg = f"Erreur lors de l'envoi d'email: {str(e)}"
-            logger.error(error_msg, exc_info=True)
-            
-            # En mode DEBUG, afficher aussi dans la console avec plus de détails
-            if django_settings.DEBUG:
-                print(f"\n❌ ERREUR ENVOI EMAIL")
-                print(f"   Message: {error_msg}")
-                print(f"   Template: {template_name}")
-                print(f"   Destinataires: {email_list if 'email_list' in locals() else 'N/A'}")
-                print(f"   EMAIL_HOST: {django_settings.EMAIL_HOST}")
-                print(f"   EMAIL_PORT: {django_settings.EMAIL_PORT}")
-                print(f"   EMAIL_HOST_USER: {django_settings.EMAIL_HOST_USER}")
-                print(f"   Mot de passe configuré: {'Oui' if django_settings.EMAIL_HOST_PASSWORD else 'Non'}")
-                print(f"   Longueur du mot de passe: {len(django_settings.EMAIL_HOST_PASSWORD) if django_settings.EMAIL_HOST_PASSWORD else 0} caractères")
-                print()
-            
+            logger.error(f"Erreur lors de la mise en file d'un email ({template_name}): {str(e)}", exc_info=True)
             return False
     
     # ============================================================================
@@ -3,6 +3,8 @@ from django.utils import timezone
 from datetime import date, timedelta
 from projects.models import Projet, Tache, MembreProjet
 from projects.email_service import ProjectEmailService
+from projects.email_digest import EmailDigestService
+from notifications.dispatcher import NotificationDispatcher
 from notifications.services import NotificationService
 import logging
 
@@ -13,6 +15,13 @@ class Command(BaseCommand):
     help = 'Surveille les dates de début et de fin des projets et tâches, met à jour les statuts automatiquement et envoie des notifications'
 
     def handle(self, *args, **options):
+        # Un seul email par destinataire pour tous les événements de l'exécution
+        with EmailDigestService.regroupement():
+            self._surveiller(*args, **options)
+        # Attendre la diffusion des notifications différées par les signaux
+        NotificationDispatcher.vider()
+    
+    def _surveiller(self, *args, **options):
         today = date.today()
         tomorrow = today + timedelta(days=1)
         
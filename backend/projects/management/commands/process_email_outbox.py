@@ -0,0 +1,101 @@
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from concurrent.futures import ThreadPoolExecutor
+from projects.email_outbox import EmailOutboxService
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = "Envoie les emails en file d'attente (EmailOutbox) par lots, une connexion SMTP par lot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Tourner en continu (worker) au lieu de vider la file une seule fois.'
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='Pause en secondes entre deux passages en mode --loop (défaut: 5).'
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Nombre de threads qui vident la file en parallèle (défaut: 1).'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help="Nombre d'emails envoyés par connexion SMTP (défaut: settings.EMAIL_OUTBOX['BATCH_SIZE'])."
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Afficher uniquement l\'état de la file d\'attente.'
+        )
+
+    def handle(self, *args, **options):
+        service = EmailOutboxService()
+        if options['batch_size']:
+            service.config['BATCH_SIZE'] = options['batch_size']
+
+        if options['stats']:
+            self._afficher_file(service)
+            return
+
+        workers = max(1, options['workers'])
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while True:
+                debut = time.monotonic()
+                resultats = list(executor.map(self._vider, [service] * workers))
+                self._afficher_resultats(resultats, time.monotonic() - debut)
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
+
+    @staticmethod
+    def _vider(service):
+        """Vide la file depuis un thread (connexion base propre au thread)"""
+        close_old_connections()
+        try:
+            return service.vider()
+        except Exception as e:
+            logger.error(f"Erreur lors du traitement de la file d'emails: {e}", exc_info=True)
+            return None
+        finally:
+            close_old_connections()
+
+    def _afficher_resultats(self, resultats, duree):
+        resultats = [resultat for resultat in resultats if resultat]
+        traites = sum(resultat['traites'] for resultat in resultats)
+        if not traites:
+            return
+        envoyes = sum(resultat['envoyes'] for resultat in resultats)
+        echecs = sum(resultat['echecs'] for resultat in resultats)
+        abandonnes = sum(resultat['abandonnes'] for resultat in resultats)
+        debit = envoyes / duree if duree > 0 else 0.0
+
+        self.stdout.write(self.style.SUCCESS(f'📧 {envoyes} email(s) envoyé(s) en {duree:.2f}s ({debit:.1f}/s)'))
+        if echecs:
+            self.stdout.write(self.style.WARNING(f'   ⏳ {echecs} email(s) replanifié(s) après échec'))
+        if abandonnes:
+            self.stdout.write(self.style.ERROR(f'   ❌ {abandonnes} email(s) abandonné(s)'))
+        logger.info(
+            f"File d'emails: {traites} traité(s), {envoyes} envoyé(s), {echecs} échec(s), "
+            f"{abandonnes} abandonné(s), {debit:.1f} emails/s"
+        )
+
+    def _afficher_file(self, service):
+        stats = service.statistiques()
+        self.stdout.write(self.style.SUCCESS("\n📊 File d'attente des emails:"))
+        self.stdout.write(f"   - En attente: {stats['en_attente']}")
+        self.stdout.write(f"   - En cours d'envoi: {stats['en_cours']}")
+        self.stdout.write(f"   - Envoyés: {stats['envoye']}")
+        self.stdout.write(f"   - Abandonnés: {stats['abandonne']}")
+        self.stdout.write(f"   - Attente du plus ancien: {stats['attente_max_secondes']:.0f}s")
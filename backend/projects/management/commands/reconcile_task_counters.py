@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from projects.services import CompteursTachesService
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Recompte les compteurs de tâches des projets et des phases depuis la table des tâches et signale les écarts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Afficher les écarts sans corriger les compteurs.'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+
+        try:
+            ecarts = CompteursTachesService.reconcile(apply=not dry_run)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Erreur lors de la réconciliation des compteurs de tâches: {str(e)}'))
+            logger.error(f"Erreur lors de la réconciliation des compteurs de tâches: {e}", exc_info=True)
+            return
+
+        for ecart in ecarts:
+            self.stdout.write(
+                self.style.WARNING(
+                    f"  ⚠️  {ecart['modele']} {ecart['id']}: "
+                    f"stocké={ecart['stocke']} attendu={ecart['attendu']}"
+                )
+            )
+
+        self.stdout.write(self.style.SUCCESS('\n📊 Résumé:'))
+        self.stdout.write(f'   - Écarts détectés: {len(ecarts)}')
+        if dry_run:
+            self.stdout.write(self.style.WARNING('   - Mode simulation: aucun compteur modifié'))
+        else:
+            self.stdout.write('   - Compteurs recomptés depuis la table des tâches')
@@ -3,12 +3,18 @@ from django.utils import timezone
 from datetime import date, timedelta
 from projects.models import Projet, Tache
 from projects.email_service import ProjectEmailService
+from projects.email_digest import EmailDigestService
 
 
 class Command(BaseCommand):
     help = 'Envoie des emails de retard pour les projets et tâches en retard (à exécuter 3 fois par jour)'
 
     def handle(self, *args, **options):
+        # Un seul email par destinataire pour tous les retards de l'exécution
+        with EmailDigestService.regroupement():
+            self._envoyer_retards()
+    
+    def _envoyer_retards(self):
         today = date.today()
         sent_count = 0
         
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from projects.email_digest import EmailDigestService, FREQUENCES_DIFFEREES
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Envoie les emails récapitulatifs (digests) aux utilisateurs en mode quotidien ou hebdomadaire'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--frequence',
+            choices=FREQUENCES_DIFFEREES,
+            default='quotidien',
+            help='Fréquence des digests à envoyer (quotidien: chaque jour, hebdomadaire: chaque semaine).'
+        )
+
+    def handle(self, *args, **options):
+        frequence = options['frequence']
+
+        try:
+            emails, evenements = EmailDigestService.envoyer_digests(frequence)
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'❌ Erreur lors de la construction des digests: {str(e)}'))
+            logger.error(f"Erreur lors de la construction des digests {frequence}: {e}", exc_info=True)
+            return
+
+        self.stdout.write(self.style.SUCCESS(f'\n📬 Digests {frequence}:'))
+        self.stdout.write(f'   - Événements regroupés: {evenements}')
+        self.stdout.write(f'   - Emails mis en file d\'attente: {emails}')
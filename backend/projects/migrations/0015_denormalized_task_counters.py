@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-17 17:40
+
+from django.db import migrations, models
+from django.db.models import Count, Q
+
+
+def backfill_task_counters(apps, schema_editor):
+    """Initialise les compteurs de tâches dénormalisés depuis la table des tâches"""
+    Projet = apps.get_model('projects', 'Projet')
+    ProjetPhaseEtat = apps.get_model('projects', 'ProjetPhaseEtat')
+    Tache = apps.get_model('projects', 'Tache')
+    
+    compteurs_projets = Tache.objects.values('projet_id').annotate(
+        total=Count('id'),
+        terminees=Count('id', filter=Q(statut='termine')),
+    ).order_by()
+    for ligne in compteurs_projets:
+        Projet.objects.filter(pk=ligne['projet_id']).update(
+            taches_total=ligne['total'],
+            taches_terminees=ligne['terminees'],
+            progression=ligne['terminees'] / ligne['total'] * 100,
+        )
+    
+    compteurs_phases = Tache.objects.filter(phase_etat__isnull=False).values('phase_etat_id').annotate(
+        total=Count('id'),
+        terminees=Count('id', filter=Q(statut='termine')),
+        en_attente=Count('id', filter=Q(statut='en_attente')),
+    ).order_by()
+    for ligne in compteurs_phases:
+        ProjetPhaseEtat.objects.filter(pk=ligne['phase_etat_id']).update(
+            taches_total=ligne['total'],
+            taches_terminees=ligne['terminees'],
+            taches_en_attente=ligne['en_attente'],
+            progression=ligne['terminees'] / ligne['total'] * 100,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0014_add_en_cours_status_to_projet'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='projet',
+            name='taches_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de tâches'),
+        ),
+        migrations.AddField(
+            model_name='projet',
+            name='taches_terminees',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de tâches terminées'),
+        ),
+        migrations.AddField(
+            model_name='projet',
+            name='progression',
+            field=models.FloatField(default=0.0, verbose_name='Progression des tâches (%)'),
+        ),
+        migrations.AddField(
+            model_name='projetphaseetat',
+            name='taches_total',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de tâches'),
+        ),
+        migrations.AddField(
+            model_name='projetphaseetat',
+            name='taches_terminees',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de tâches terminées'),
+        ),
+        migrations.AddField(
+            model_name='projetphaseetat',
+            name='taches_en_attente',
+            field=models.PositiveIntegerField(default=0, verbose_name='Nombre de tâches en attente'),
+        ),
+        migrations.AddField(
+            model_name='projetphaseetat',
+            name='progression',
+            field=models.FloatField(default=0.0, verbose_name='Progression des tâches (%)'),
+        ),
+        migrations.RunPython(
+            code=backfill_task_counters,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0015_denormalized_task_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailOutbox',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sujet', models.CharField(max_length=255, verbose_name='Sujet')),
+                ('destinataires', models.JSONField(default=list, verbose_name='Destinataires')),
+                ('expediteur', models.CharField(blank=True, max_length=254, verbose_name='Expéditeur')),
+                ('corps_texte', models.TextField(verbose_name='Contenu texte')),
+                ('corps_html', models.TextField(blank=True, verbose_name='Contenu HTML')),
+                ('template', models.CharField(blank=True, max_length=200, verbose_name='Template')),
+                ('statut', models.CharField(choices=[('en_attente', 'En attente'), ('en_cours', "En cours d'envoi"), ('envoye', 'Envoyé'), ('abandonne', 'Abandonné')], default='en_attente', max_length=20, verbose_name='Statut')),
+                ('tentatives', models.PositiveIntegerField(default=0, verbose_name='Tentatives')),
+                ('prochaine_tentative', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Prochaine tentative')),
+                ('derniere_erreur', models.TextField(blank=True, verbose_name='Dernière erreur')),
+                ('cree_le', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('verrouille_le', models.DateTimeField(blank=True, null=True, verbose_name='Pris en charge le')),
+                ('envoye_le', models.DateTimeField(blank=True, null=True, verbose_name='Envoyé le')),
+            ],
+            options={
+                'verbose_name': "Email en file d'attente",
+                'verbose_name_plural': "File d'attente des emails",
+                'db_table': 'email_outbox',
+                'ordering': ['prochaine_tentative', 'id'],
+                'indexes': [models.Index(fields=['statut', 'prochaine_tentative'], name='email_outbo_statut_8cc0da_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-17 18:55
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('projects', '0016_email_outbox'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EmailDigestEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('frequence', models.CharField(choices=[('quotidien', 'Quotidien'), ('hebdomadaire', 'Hebdomadaire')], max_length=20, verbose_name='Fréquence')),
+                ('evenement', models.CharField(max_length=50, verbose_name='Événement')),
+                ('cle', models.CharField(max_length=200, verbose_name='Clé de déduplication')),
+                ('sujet', models.CharField(max_length=255, verbose_name='Sujet')),
+                ('resume', models.TextField(blank=True, verbose_name='Résumé')),
+                ('url', models.CharField(blank=True, max_length=500, verbose_name='Lien')),
+                ('cree_le', models.DateTimeField(auto_now_add=True, verbose_name='Créé le')),
+                ('envoye_le', models.DateTimeField(blank=True, null=True, verbose_name='Envoyé le')),
+                ('utilisateur', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='evenements_digest', to=settings.AUTH_USER_MODEL, verbose_name='Utilisateur')),
+            ],
+            options={
+                'verbose_name': 'Événement de digest',
+                'verbose_name_plural': 'Événements de digest',
+                'db_table': 'email_digest_entries',
+                'ordering': ['utilisateur', 'cree_le'],
+                'indexes': [models.Index(fields=['frequence', 'envoye_le'], name='email_diges_frequen_fd62da_idx'), models.Index(fields=['utilisateur', 'cle'], name='email_diges_utilisa_91e8c8_idx')],
+            },
+        ),
+    ]
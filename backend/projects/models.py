@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Case, F, FloatField, Value, When
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from accounts.models import Service, Role, Permission
@@ -6,6 +7,49 @@ from accounts.models import Service, Role, Permission
 User = get_user_model()
 
 
+def _contribution_tache(statut):
+    """Contribution d'une tâche aux compteurs dénormalisés : (total, terminées, en attente)"""
+    return 1, int(statut == 'termine'), int(statut == 'en_attente')
+
+
+def _ajuster_compteurs_taches(queryset, d_total, d_terminees, **autres_deltas):
+    """
+    Applique des deltas aux compteurs de tâches d'une ligne en un seul UPDATE.
+    
+    La progression est assignée en premier et calculée à partir des anciennes
+    valeurs + deltas : MySQL évalue les affectations de gauche à droite avec les
+    valeurs déjà modifiées, PostgreSQL / SQLite avec les valeurs d'origine ;
+    placée en tête, l'expression donne le même résultat sur tous les moteurs.
+    """
+    nouveau_total = F('taches_total') + d_total
+    nouvelles_terminees = F('taches_terminees') + d_terminees
+    valeurs = {
+        'progression': Case(
+            When(**{'taches_total__lte': -d_total}, then=Value(0.0)),
+            default=nouvelles_terminees * 100.0 / nouveau_total,
+            output_field=FloatField()
+        ),
+        'taches_total': nouveau_total,
+        'taches_terminees': nouvelles_terminees,
+    }
+    for champ, delta in autres_deltas.items():
+        valeurs[champ] = F(champ) + delta
+    queryset.update(**valeurs)
+
+
+def _champs_hors_compteurs(instance, compteurs):
+    """
+    Champs d'une sauvegarde complète sans les compteurs dénormalisés : leurs valeurs
+    en mémoire, lues au chargement, écraseraient les deltas appliqués depuis par
+    Tache.save (F-expressions)
+    """
+    differes = instance.get_deferred_fields()
+    return [
+        champ.attname for champ in instance._meta.concrete_fields
+        if not champ.primary_key and champ.name not in compteurs and champ.attname not in differes
+    ]
+
+
 class Projet(models.Model):
     """
     Modèle pour les projets marketing.
@@ -66,6 +110,14 @@ class Projet(models.Model):
     fin = models.DateTimeField(null=True, blank=True, verbose_name="Date de fin")
     estimation_jours = models.IntegerField(null=True, blank=True, verbose_name="Estimation en jours")
     
+    # Compteurs dénormalisés, maintenus à chaque écriture de tâche
+    taches_total = models.PositiveIntegerField(default=0, verbose_name="Nombre de tâches")
+    taches_terminees = models.PositiveIntegerField(default=0, verbose_name="Nombre de tâches terminées")
+    progression = models.FloatField(default=0.0, verbose_name="Progression des tâches (%)")
+    
+    # Écrits uniquement par ajuster_compteurs_taches / recompter_taches
+    CHAMPS_COMPTEURS = ('taches_total', 'taches_terminees', 'progression')
+    
     class Meta:
         db_table = "projets"
         verbose_name = "Projet"
@@ -92,6 +144,10 @@ class Projet(models.Model):
         # Vérifier si c'est une nouvelle création
         is_new = self.pk is None
         
+        # Sauvegarde complète d'un projet existant : les compteurs de tâches ne sont pas réécrits
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = _champs_hors_compteurs(self, self.CHAMPS_COMPTEURS)
+        
         super().save(*args, **kwargs)
         
         # Si c'est un nouveau projet, créer automatiquement les phases standard
@@ -162,8 +218,12 @@ class Projet(models.Model):
                 statut='termine',
                 mise_a_jour_le=timezone.now()
             )
+            # QuerySet.update ne passe pas par Tache.save : recompter les tâches
+            phase_etat.recompter_taches()
             phase_etat.recalculer_depuis_taches()
         
+        self.recompter_taches()
+        
         print(f"🎯 Projet '{self.nom}' marqué comme terminé - Toutes les phases et étapes terminées automatiquement")
     
     def marquer_non_termine(self):
@@ -186,16 +246,31 @@ class Projet(models.Model):
         ).exists()
         return not phases_non_terminees
     
+    @classmethod
+    def ajuster_compteurs_taches(cls, projet_id, d_total=0, d_terminees=0):
+        """Applique atomiquement des deltas aux compteurs de tâches d'un projet"""
+        if projet_id and (d_total or d_terminees):
+            _ajuster_compteurs_taches(cls.objects.filter(pk=projet_id), d_total, d_terminees)
+    
+    def recompter_taches(self):
+        """Recalcule les compteurs de tâches depuis la table des tâches (réparation / opérations en masse)"""
+        compteurs = Tache.objects.filter(projet=self).aggregate(
+            total=models.Count('id'),
+            terminees=models.Count('id', filter=models.Q(statut='termine')),
+        )
+        self.taches_total = compteurs['total']
+        self.taches_terminees = compteurs['terminees']
+        self.progression = (self.taches_terminees / self.taches_total * 100) if self.taches_total else 0.0
+        Projet.objects.filter(pk=self.pk).update(
+            taches_total=self.taches_total,
+            taches_terminees=self.taches_terminees,
+            progression=self.progression,
+        )
+    
     @property
     def progression_globale(self):
-        """Calcule la progression globale du projet basée sur les tâches des utilisateurs"""
-        # Utiliser les tâches préchargées si disponibles, sinon faire une requête
-        if hasattr(self, '_prefetched_objects_cache') and 'taches' in self._prefetched_objects_cache:
-            toutes_les_taches = list(self._prefetched_objects_cache['taches'])
-        else:
-            toutes_les_taches = list(Tache.objects.filter(projet=self))
-        
-        if len(toutes_les_taches) == 0:
+        """Progression globale du projet basée sur les tâches (compteurs dénormalisés)"""
+        if self.taches_total == 0:
             # Si aucune tâche, calculer basé sur les phases comme fallback
             phases_etat = self.phases_etat.all()
             if not phases_etat.exists():
@@ -208,13 +283,7 @@ class Projet(models.Model):
             progression = (phases_completes / total_phases * 100) if total_phases > 0 else 0
             return round(progression, 1)
         
-        # Compter les tâches terminées
-        taches_terminees = sum(1 for tache in toutes_les_taches if tache.statut == 'termine')
-        
-        # Calculer la progression basée sur les tâches
-        progression = (taches_terminees / len(toutes_les_taches) * 100) if len(toutes_les_taches) > 0 else 0
-        
-        return round(progression, 2)
+        return round(self.progression, 2)
     
     @property
     def phase_actuelle(self):
@@ -494,40 +563,59 @@ class Tache(models.Model):
     def __str__(self):
         return f"{self.projet.code} - {self.titre}"
     
-    def save(self, *args, **kwargs):
+    # Phase fonctionnelle correspondant à chaque phase standard
+    PHASE_PAR_NOM = {
+        'Expression du besoin': 'expression_besoin',
+        'Études de faisabilité': 'etudes_faisabilite',
+        'Conception': 'conception',
+        'Développement / Implémentation': 'developpement',
+        'Lancement commercial': 'lancement_commercial',
+        'Suppression d\'une offre': 'suppression_offre',
+    }
+    
+    def appliquer_champs_derives(self):
+        """
+        Déduit le projet et la phase fonctionnelle depuis la phase du projet, et
+        l'estimation en jours depuis les dates (aussi utilisé par les opérations en masse).
+        """
         # Si une phase est assignée, déduire le projet et la phase fonctionnelle
         if self.phase_etat:
             self.projet = self.phase_etat.projet
             if not self.phase:
                 phase_nom = self.phase_etat.phase.nom if self.phase_etat.phase else None
-                phase_mapping = {
-                    'Expression du besoin': 'expression_besoin',
-                    'Études de faisabilité': 'etudes_faisabilite',
-                    'Conception': 'conception',
-                    'Développement / Implémentation': 'developpement',
-                    'Lancement commercial': 'lancement_commercial',
-                    'Suppression d\'une offre': 'suppression_offre',
-                }
-                self.phase = phase_mapping.get(phase_nom, self.phase)
+                self.phase = self.PHASE_PAR_NOM.get(phase_nom, self.phase)
         
         # Calculer l'estimation en jours si début et fin sont définis
         if self.debut and self.fin:
             delta = self.fin - self.debut
             self.nbr_jour_estimation = delta.days
+    
+    def save(self, *args, **kwargs):
+        self.appliquer_champs_derives()
         
         # Récupérer l'ancien statut si la tâche existe déjà
         old_statut = None
         old_phase_etat_id = None
+        old_projet_id = None
+        existait = False
         if self.pk:
             try:
                 old_instance = Tache.objects.get(pk=self.pk)
                 old_statut = old_instance.statut
                 old_phase_etat_id = old_instance.phase_etat_id
+                old_projet_id = old_instance.projet_id
+                existait = True
             except Tache.DoesNotExist:
                 pass
         
         super().save(*args, **kwargs)
         
+        # Mettre à jour les compteurs dénormalisés de la phase et du projet
+        self._mettre_a_jour_compteurs(
+            (old_projet_id, old_phase_etat_id, old_statut) if existait else None,
+            (self.projet_id, self.phase_etat_id, self.statut)
+        )
+        
         # Mettre à jour la progression de la phase si une tâche est liée
         if self.phase_etat:
             self.phase_etat.recalculer_depuis_taches()
@@ -540,6 +628,32 @@ class Tache(models.Model):
             except ProjetPhaseEtat.DoesNotExist:
                 pass
     
+    @staticmethod
+    def _mettre_a_jour_compteurs(ancien_etat, nouvel_etat):
+        """
+        Répercute une création, suppression, changement de statut ou de phase
+        sur les compteurs de tâches dénormalisés (un UPDATE par ligne touchée).
+        Chaque état est un tuple (projet_id, phase_etat_id, statut) ou None.
+        """
+        deltas_projets = {}
+        deltas_phases = {}
+        for etat, signe in ((ancien_etat, -1), (nouvel_etat, 1)):
+            if etat is None:
+                continue
+            projet_id, phase_etat_id, statut = etat
+            contribution = [signe * valeur for valeur in _contribution_tache(statut)]
+            if projet_id:
+                cumul = deltas_projets.setdefault(projet_id, [0, 0, 0])
+                deltas_projets[projet_id] = [a + b for a, b in zip(cumul, contribution)]
+            if phase_etat_id:
+                cumul = deltas_phases.setdefault(phase_etat_id, [0, 0, 0])
+                deltas_phases[phase_etat_id] = [a + b for a, b in zip(cumul, contribution)]
+        
+        for projet_id, (d_total, d_terminees, _) in deltas_projets.items():
+            Projet.ajuster_compteurs_taches(projet_id, d_total, d_terminees)
+        for phase_etat_id, (d_total, d_terminees, d_en_attente) in deltas_phases.items():
+            ProjetPhaseEtat.ajuster_compteurs_taches(phase_etat_id, d_total, d_terminees, d_en_attente)
+    
     @property
     def est_en_retard(self):
         """Vérifie si la tâche est en retard"""
@@ -622,6 +736,15 @@ class ProjetPhaseEtat(models.Model):
     date_fin = models.DateTimeField(null=True, blank=True, verbose_name="Date de fin")
     commentaire = models.TextField(blank=True, null=True, verbose_name="Commentaire sur la phase")
     
+    # Compteurs dénormalisés, maintenus à chaque écriture de tâche
+    taches_total = models.PositiveIntegerField(default=0, verbose_name="Nombre de tâches")
+    taches_terminees = models.PositiveIntegerField(default=0, verbose_name="Nombre de tâches terminées")
+    taches_en_attente = models.PositiveIntegerField(default=0, verbose_name="Nombre de tâches en attente")
+    progression = models.FloatField(default=0.0, verbose_name="Progression des tâches (%)")
+    
+    # Écrits uniquement par ajuster_compteurs_taches / recompter_taches
+    CHAMPS_COMPTEURS = ('taches_total', 'taches_terminees', 'taches_en_attente', 'progression')
+    
     # Métadonnées
     cree_le = models.DateTimeField(auto_now_add=True, verbose_name="Date de création")
     mis_a_jour_le = models.DateTimeField(auto_now=True, verbose_name="Date de mise à jour")
@@ -653,6 +776,10 @@ class ProjetPhaseEtat(models.Model):
             except ProjetPhaseEtat.DoesNotExist:
                 pass
         
+        # Sauvegarde complète d'une phase existante : les compteurs de tâches ne sont pas réécrits
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            kwargs['update_fields'] = _champs_hors_compteurs(self, self.CHAMPS_COMPTEURS)
+        
         super().save(*args, **kwargs)
         
         # Vérifier si la phase a été marquée comme terminée et si le projet doit être mis à jour
@@ -712,23 +839,38 @@ class ProjetPhaseEtat(models.Model):
     
     @property
     def progression_pourcentage(self):
-        """Calcule la progression de la phase basée sur les tâches des étapes"""
+        """Progression de la phase basée sur ses tâches (compteurs dénormalisés)"""
         if self.terminee:
             return 100
         
-        # Récupérer toutes les tâches directement liées à cette phase
-        toutes_les_taches = self.taches.all()
-        
-        if toutes_les_taches.count() == 0:
-            return 0
-        
-        # Compter les tâches terminées
-        taches_terminees = toutes_les_taches.filter(statut='termine').count()
-        
-        # Calculer la progression basée sur les tâches
-        progression = (taches_terminees / toutes_les_taches.count() * 100) if toutes_les_taches.count() > 0 else 0
-        
-        return round(progression, 2)
+        return round(self.progression, 2)
+    
+    @classmethod
+    def ajuster_compteurs_taches(cls, phase_etat_id, d_total=0, d_terminees=0, d_en_attente=0):
+        """Applique atomiquement des deltas aux compteurs de tâches d'une phase"""
+        if phase_etat_id and (d_total or d_terminees or d_en_attente):
+            _ajuster_compteurs_taches(
+                cls.objects.filter(pk=phase_etat_id), d_total, d_terminees,
+                taches_en_attente=d_en_attente
+            )
+    
+    def recompter_taches(self):
+        """Recalcule les compteurs de tâches depuis la table des tâches (réparation / opérations en masse)"""
+        compteurs = self.taches.aggregate(
+            total=models.Count('id'),
+            terminees=models.Count('id', filter=models.Q(statut='termine')),
+            en_attente=models.Count('id', filter=models.Q(statut='en_attente')),
+        )
+        self.taches_total = compteurs['total']
+        self.taches_terminees = compteurs['terminees']
+        self.taches_en_attente = compteurs['en_attente']
+        self.progression = (self.taches_terminees / self.taches_total * 100) if self.taches_total else 0.0
+        ProjetPhaseEtat.objects.filter(pk=self.pk).update(
+            taches_total=self.taches_total,
+            taches_terminees=self.taches_terminees,
+            taches_en_attente=self.taches_en_attente,
+            progression=self.progression,
+        )
     
     def marquer_debut(self):
         """Marque le début de la phase"""
@@ -765,14 +907,15 @@ class ProjetPhaseEtat(models.Model):
         """Met à jour automatiquement le statut et les dates de la phase en fonction des tâches"""
         from django.utils import timezone
         
-        taches = self.taches.all()
-        total_taches = taches.count()
+        # Relire les compteurs dénormalisés (mis à jour par F-expressions)
+        self.refresh_from_db(fields=['taches_total', 'taches_terminees', 'taches_en_attente', 'progression'])
+        total_taches = self.taches_total
         if total_taches == 0:
             # Si aucune tâche n'est liée, on ne touche pas au statut automatiquement
             return
         
-        terminees = taches.filter(statut='termine').count()
-        en_attente = taches.filter(statut='en_attente').count()
+        terminees = self.taches_terminees
+        en_attente = self.taches_en_attente
         en_cours = total_taches - terminees - en_attente
         
         champs_a_mettre_a_jour = set()
@@ -816,3 +959,98 @@ class ProjetPhaseEtat(models.Model):
                     if not projet.fin:
                         projet.fin = timezone.now()
                     projet.save(update_fields=['statut', 'fin', 'mis_a_jour_le'])
+
+
+class EmailOutbox(models.Model):
+    """
+    File d'attente persistante des emails sortants.
+    
+    ProjectEmailService se contente d'y insérer les messages rendus (dans la
+    transaction de l'appelant) ; la commande process_email_outbox les envoie
+    par lots sur une seule connexion SMTP.
+    """
+    
+    STATUT_CHOICES = [
+        ('en_attente', 'En attente'),
+        ('en_cours', 'En cours d\'envoi'),
+        ('envoye', 'Envoyé'),
+        ('abandonne', 'Abandonné'),
+    ]
+    
+    sujet = models.CharField(max_length=255, verbose_name="Sujet")
+    destinataires = models.JSONField(default=list, verbose_name="Destinataires")
+    expediteur = models.CharField(max_length=254, blank=True, verbose_name="Expéditeur")
+    corps_texte = models.TextField(verbose_name="Contenu texte")
+    corps_html = models.TextField(blank=True, verbose_name="Contenu HTML")
+    template = models.CharField(max_length=200, blank=True, verbose_name="Template")
+    
+    statut = models.CharField(
+        max_length=20,
+        choices=STATUT_CHOICES,
+        default='en_attente',
+        verbose_name="Statut"
+    )
+    tentatives = models.PositiveIntegerField(default=0, verbose_name="Tentatives")
+    prochaine_tentative = models.DateTimeField(default=timezone.now, verbose_name="Prochaine tentative")
+    derniere_erreur = models.TextField(blank=True, verbose_name="Dernière erreur")
+    
+    cree_le = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    verrouille_le = models.DateTimeField(null=True, blank=True, verbose_name="Pris en charge le")
+    envoye_le = models.DateTimeField(null=True, blank=True, verbose_name="Envoyé le")
+    
+    class Meta:
+        db_table = "email_outbox"
+        verbose_name = "Email en file d'attente"
+        verbose_name_plural = "File d'attente des emails"
+        ordering = ['prochaine_tentative', 'id']
+        indexes = [
+            models.Index(fields=['statut', 'prochaine_tentative']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sujet} → {len(self.destinataires)} destinataire(s) ({self.get_statut_display()})"
+
+
+class EmailDigestEntry(models.Model):
+    """
+    Événement en attente d'un email récapitulatif (digest).
+    
+    Les utilisateurs dont NotificationPreference.frequence_digest vaut
+    « quotidien » ou « hebdomadaire » ne reçoivent pas les emails au fil de
+    l'eau : chaque événement est stocké ici puis regroupé en un seul email par
+    la commande send_email_digests.
+    """
+    
+    FREQUENCE_CHOICES = [
+        ('quotidien', 'Quotidien'),
+        ('hebdomadaire', 'Hebdomadaire'),
+    ]
+    
+    utilisateur = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='evenements_digest',
+        verbose_name="Utilisateur"
+    )
+    frequence = models.CharField(max_length=20, choices=FREQUENCE_CHOICES, verbose_name="Fréquence")
+    evenement = models.CharField(max_length=50, verbose_name="Événement")
+    # Clé de déduplication : un même événement n'apparaît qu'une fois par digest
+    cle = models.CharField(max_length=200, verbose_name="Clé de déduplication")
+    sujet = models.CharField(max_length=255, verbose_name="Sujet")
+    resume = models.TextField(blank=True, verbose_name="Résumé")
+    url = models.CharField(max_length=500, blank=True, verbose_name="Lien")
+    cree_le = models.DateTimeField(auto_now_add=True, verbose_name="Créé le")
+    envoye_le = models.DateTimeField(null=True, blank=True, verbose_name="Envoyé le")
+    
+    class Meta:
+        db_table = "email_digest_entries"
+        verbose_name = "Événement de digest"
+        verbose_name_plural = "Événements de digest"
+        ordering = ['utilisateur', 'cree_le']
+        indexes = [
+            models.Index(fields=['frequence', 'envoye_le']),
+            models.Index(fields=['utilisateur', 'cle']),
+        ]
+    
+    def __str__(self):
+        return f"{self.sujet} → {self.utilisateur} ({self.get_frequence_display()})"
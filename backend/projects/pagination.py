@@ -0,0 +1,20 @@
+from gestion.pagination import KeysetCursorPagination
+
+
+class ProjetCursorPagination(KeysetCursorPagination):
+    """
+    Pagination par curseur (keyset) sur (cree_le, id) pour la liste des projets.
+    
+    Activée uniquement si le client envoie `cursor` ou `page_size` : sans ces
+    paramètres la liste reste renvoyée en entier (compatibilité avec le frontend).
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-cree_le', '-id')
+    
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
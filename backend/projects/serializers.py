@@ -1,4 +1,6 @@
 from rest_framework import serializers
+from django.db.models import Count, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
 from .models import Projet, MembreProjet, HistoriqueEtat, PermissionProjet, PhaseProjet, ProjetPhaseEtat
 from accounts.serializers import UserListSerializer, ServiceSerializer
 from .email_service import ProjectEmailService
@@ -95,7 +97,43 @@ class ProjetListSerializer(serializers.ModelSerializer):
             'chef_projet', 'service', 'progression_globale', 'phase_actuelle'
         ]
     
+    @staticmethod
+    def annoter_queryset(queryset):
+        """
+        Annote en SQL les valeurs calculées de la liste (phases, membres) pour que
+        la sérialisation n'émette aucune requête par projet. La progression des
+        tâches est lue dans les compteurs dénormalisés du projet et des phases.
+        """
+        def compter(sous_queryset, champ):
+            return Coalesce(
+                Subquery(
+                    sous_queryset.order_by().values(champ).annotate(total=Count('pk')).values('total')[:1],
+                    output_field=IntegerField()
+                ),
+                0
+            )
+        
+        phases = ProjetPhaseEtat.objects.filter(projet=OuterRef('pk'))
+        phases_ouvertes = phases.filter(terminee=False, ignoree=False).order_by('phase__ordre')
+        derniere_phase = phases.order_by('-phase__ordre')
+        
+        return queryset.select_related(
+            'proprietaire__role', 'proprietaire__service'
+        ).annotate(
+            nb_membres=compter(MembreProjet.objects.filter(projet=OuterRef('pk')), 'projet'),
+            nb_phases=compter(phases, 'projet'),
+            nb_phases_completes=compter(phases.filter(Q(terminee=True) | Q(ignoree=True)), 'projet'),
+            phase_actuelle_id=Subquery(phases_ouvertes.values('id')[:1]),
+            phase_actuelle_nom=Subquery(phases_ouvertes.values('phase__nom')[:1]),
+            phase_actuelle_ordre=Subquery(phases_ouvertes.values('phase__ordre')[:1]),
+            phase_actuelle_progression=Subquery(phases_ouvertes.values('progression')[:1]),
+            derniere_phase_nom=Subquery(derniere_phase.values('phase__nom')[:1]),
+            derniere_phase_ordre=Subquery(derniere_phase.values('phase__ordre')[:1]),
+        )
+    
     def get_nombre_membres(self, obj):
+        if hasattr(obj, 'nb_membres'):
+            return obj.nb_membres
         return obj.membres.count()
     
     def get_chef_projet(self, obj):
@@ -116,11 +154,33 @@ class ProjetListSerializer(serializers.ModelSerializer):
     
     def get_progression_globale(self, obj):
         """Récupérer la progression globale du projet"""
-        return obj.progression_globale
+        if obj.taches_total or not hasattr(obj, 'nb_phases'):
+            return obj.progression_globale
+        
+        # Sans tâche : mêmes règles que Projet.progression_globale, à partir des annotations
+        if obj.nb_phases == 0:
+            return 0
+        return round(obj.nb_phases_completes / obj.nb_phases * 100, 1)
     
     def get_phase_actuelle(self, obj):
         """Récupérer la phase actuelle du projet"""
-        return obj.phase_actuelle
+        if not hasattr(obj, 'phase_actuelle_id'):
+            return obj.phase_actuelle
+        
+        # Mêmes règles que Projet.phase_actuelle, à partir des annotations
+        if obj.phase_actuelle_id:
+            return {
+                'nom': obj.phase_actuelle_nom,
+                'ordre': obj.phase_actuelle_ordre,
+                'progression': round(obj.phase_actuelle_progression, 2)
+            }
+        if obj.derniere_phase_nom is not None:
+            return {
+                'nom': obj.derniere_phase_nom,
+                'ordre': obj.derniere_phase_ordre,
+                'progression': 100
+            }
+        return None
 
 
 class ProjetDetailSerializer(serializers.ModelSerializer):
@@ -553,6 +613,72 @@ class TacheStatutUpdateSerializer(serializers.ModelSerializer):
         return value
 
 
+class TacheBulkItemSerializer(serializers.Serializer):
+    """Sérialiseur d'une tâche à créer dans une opération en masse."""
+    titre = serializers.CharField(max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    statut = serializers.ChoiceField(choices=Tache.STATUT_CHOICES, default='en_attente')
+    priorite = serializers.ChoiceField(choices=Tache.PRIORITE_CHOICES, default='haut')
+    phase = serializers.ChoiceField(choices=Tache.PHASE_CHOICES, required=False, allow_null=True)
+    debut = serializers.DateField(required=False, allow_null=True)
+    fin = serializers.DateField(required=False, allow_null=True)
+    phase_etat_id = serializers.IntegerField()
+    assigne_a = serializers.ListField(child=serializers.IntegerField(), required=False, default=list)
+    tache_dependante = serializers.IntegerField(required=False, allow_null=True)
+    
+    def validate(self, data):
+        if data.get('debut') and data.get('fin') and data['debut'] > data['fin']:
+            raise serializers.ValidationError("La date de début ne peut pas être postérieure à la date de fin.")
+        return data
+
+
+class TacheBulkSerializer(serializers.Serializer):
+    """Sérialiseur des opérations en masse sur les tâches."""
+    OPERATION_CHOICES = [
+        ('create', 'Création'),
+        ('update_statut', 'Mise à jour du statut'),
+        ('reassign', 'Réassignation'),
+        ('move_phase', 'Changement de phase'),
+    ]
+    
+    # Nombre maximal de tâches par opération
+    MAX_TACHES = 500
+    
+    operation = serializers.ChoiceField(choices=OPERATION_CHOICES)
+    taches = TacheBulkItemSerializer(many=True, required=False)
+    ids = serializers.ListField(child=serializers.IntegerField(), required=False)
+    statut = serializers.ChoiceField(choices=Tache.STATUT_CHOICES, required=False)
+    assigne_a = serializers.ListField(child=serializers.IntegerField(), required=False)
+    phase_etat_id = serializers.IntegerField(required=False)
+    
+    def validate(self, data):
+        """Vérifier les champs requis par chaque opération."""
+        operation = data['operation']
+        champs_requis = {
+            'create': ['taches'],
+            'update_statut': ['ids', 'statut'],
+            'reassign': ['ids', 'assigne_a'],
+            'move_phase': ['ids', 'phase_etat_id'],
+        }[operation]
+        manquants = [champ for champ in champs_requis if data.get(champ) in (None, [])]
+        if operation == 'reassign' and data.get('assigne_a') == []:
+            # Une liste vide est valide : elle retire tous les assignés
+            manquants.remove('assigne_a')
+        if manquants:
+            raise serializers.ValidationError({
+                champ: f"Ce champ est requis pour l'opération '{operation}'." for champ in manquants
+            })
+        
+        nombre = len(data.get('taches') or data.get('ids') or [])
+        if nombre > self.MAX_TACHES:
+            raise serializers.ValidationError(
+                f"Une opération en masse est limitée à {self.MAX_TACHES} tâches ({nombre} reçues)."
+            )
+        if data.get('ids'):
+            data['ids'] = list(dict.fromkeys(data['ids']))
+        return data
+
+
 # Sérialiseurs pour les phases de projet
 class PhaseProjetSerializer(serializers.ModelSerializer):
     """Sérialiseur pour les phases de projet."""
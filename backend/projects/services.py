@@ -0,0 +1,434 @@
+from django.core.exceptions import ValidationError
+from django.db import connection, models, transaction
+from django.utils import timezone
+from contextlib import contextmanager
+import contextvars
+import logging
+
+from .models import Projet, Tache, MembreProjet, ProjetPhaseEtat
+
+# Import des services optionnels (notifications, compteurs d'analytiques)
+try:
+    from notifications.services import NotificationService
+except ImportError:
+    NotificationService = None
+
+try:
+    from analytics.counters import AnalyticsCounterService, etat_de
+except ImportError:
+    AnalyticsCounterService = None
+
+logger = logging.getLogger(__name__)
+
+
+# Vrai pendant une opération en masse : les signaux par tâche (notifications,
+# emails, compteurs) sont ignorés, l'opération émet ses propres effets agrégés
+_operation_en_masse = contextvars.ContextVar('operation_en_masse', default=False)
+
+
+def operation_en_masse_en_cours():
+    """Indique si une opération en masse sur les tâches est en cours"""
+    return _operation_en_masse.get()
+
+
+@contextmanager
+def mode_operation_en_masse():
+    """Suspend les effets des signaux par tâche le temps d'une opération en masse"""
+    jeton = _operation_en_masse.set(True)
+    try:
+        yield
+    finally:
+        _operation_en_masse.reset(jeton)
+
+
+class TacheBulkService:
+    """
+    Service pour les opérations en masse sur les tâches (création, statut,
+    réassignation, changement de phase).
+
+    Chaque opération s'exécute dans une seule transaction avec bulk_create /
+    bulk_update, recalcule chaque phase et chaque projet touchés une seule fois
+    à la fin, et envoie une seule notification agrégée par destinataire.
+    """
+
+    TAILLE_LOT = 200
+
+    def __init__(self, utilisateur, projets_accessibles):
+        self.utilisateur = utilisateur
+        self.projets_accessibles = projets_accessibles
+
+    # ------------------------------------------------------------------
+    # Opérations
+    # ------------------------------------------------------------------
+
+    def creer(self, items):
+        """Crée des tâches à partir de données validées (TacheBulkItemSerializer)"""
+        phases = self._get_phases({item['phase_etat_id'] for item in items})
+
+        # Vérifier en une requête que les assignés sont membres des projets
+        assignations_demandees = {
+            (phases[item['phase_etat_id']].projet_id, user_id)
+            for item in items for user_id in item.get('assigne_a', [])
+        }
+        self._verifier_membres(assignations_demandees)
+
+        # Vérifier en une requête les tâches dépendantes
+        dependances = {item['tache_dependante'] for item in items if item.get('tache_dependante')}
+        projets_dependances = dict(
+            Tache.objects.filter(id__in=dependances).values_list('id', 'projet_id')
+        )
+        for item in items:
+            dependance = item.get('tache_dependante')
+            if not dependance:
+                continue
+            if dependance not in projets_dependances:
+                raise ValidationError(f"La tâche dépendante {dependance} n'existe pas.")
+            if projets_dependances[dependance] != phases[item['phase_etat_id']].projet_id:
+                raise ValidationError("La tâche dépendante doit appartenir au même projet.")
+
+        taches = []
+        for item in items:
+            tache = Tache(
+                phase_etat=phases[item['phase_etat_id']],
+                titre=item['titre'],
+                description=item.get('description'),
+                statut=item['statut'],
+                priorite=item['priorite'],
+                phase=item.get('phase'),
+                debut=item.get('debut'),
+                fin=item.get('fin'),
+                tache_dependante_id=item.get('tache_dependante'),
+            )
+            tache.appliquer_champs_derives()
+            taches.append(tache)
+
+        with transaction.atomic(), mode_operation_en_masse():
+            self._inserer(taches)
+
+            Assignation = Tache.assigne_a.through
+            Assignation.objects.bulk_create([
+                Assignation(tache_id=tache.id, user_id=user_id)
+                for tache, item in zip(taches, items)
+                for user_id in set(item.get('assigne_a', []))
+            ], batch_size=self.TAILLE_LOT)
+
+            self._enregistrer_compteurs([(None, tache) for tache in taches])
+            self._recalculer(
+                {tache.phase_etat_id for tache in taches},
+                {tache.projet_id for tache in taches}
+            )
+
+        self._notifier_assignations({
+            tache.id: set(item.get('assigne_a', [])) for tache, item in zip(taches, items)
+        }, taches)
+        return taches
+
+    def mettre_a_jour_statut(self, ids, statut):
+        """Change le statut de plusieurs tâches"""
+        with transaction.atomic(), mode_operation_en_masse():
+            taches = self._get_taches(ids)
+
+            bloquees = [tache.id for tache in taches if tache.statut == 'termine' and statut != 'termine']
+            if bloquees:
+                raise ValidationError(
+                    f"Une tâche terminée ne peut pas changer de statut (tâches: {', '.join(map(str, bloquees))})."
+                )
+
+            modifiees = [tache for tache in taches if tache.statut != statut]
+            anciens_etats = {tache.id: self._etat(tache) for tache in modifiees}
+            terminees = [tache for tache in modifiees if statut == 'termine']
+
+            maintenant = timezone.now()
+            for tache in modifiees:
+                tache.statut = statut
+                tache.mise_a_jour_le = maintenant
+            Tache.objects.bulk_update(modifiees, ['statut', 'mise_a_jour_le'], batch_size=self.TAILLE_LOT)
+
+            self._enregistrer_compteurs([(anciens_etats[tache.id], tache) for tache in modifiees])
+            self._recalculer(
+                {tache.phase_etat_id for tache in modifiees},
+                {tache.projet_id for tache in modifiees}
+            )
+
+        self._notifier_terminees(terminees)
+        return taches
+
+    def reassigner(self, ids, assigne_a):
+        """Remplace les assignés de plusieurs tâches"""
+        with transaction.atomic(), mode_operation_en_masse():
+            taches = self._get_taches(ids)
+            self._verifier_membres({
+                (tache.projet_id, user_id) for tache in taches for user_id in assigne_a
+            })
+
+            Assignation = Tache.assigne_a.through
+            anciens = {}
+            for tache_id, user_id in Assignation.objects.filter(tache_id__in=ids).values_list('tache_id', 'user_id'):
+                anciens.setdefault(tache_id, set()).add(user_id)
+
+            Assignation.objects.filter(tache_id__in=ids).delete()
+            Assignation.objects.bulk_create([
+                Assignation(tache_id=tache.id, user_id=user_id)
+                for tache in taches for user_id in set(assigne_a)
+            ], batch_size=self.TAILLE_LOT)
+            Tache.objects.filter(id__in=ids).update(mise_a_jour_le=timezone.now())
+
+        # Notifier uniquement les nouveaux assignés de chaque tâche
+        self._notifier_assignations({
+            tache.id: set(assigne_a) - anciens.get(tache.id, set()) for tache in taches
+        }, taches)
+        return taches
+
+    def deplacer_phase(self, ids, phase_etat_id):
+        """Déplace plusieurs tâches vers une autre phase du même projet"""
+        phase_cible = self._get_phases({phase_etat_id})[phase_etat_id]
+
+        with transaction.atomic(), mode_operation_en_masse():
+            taches = self._get_taches(ids)
+
+            hors_projet = [tache.id for tache in taches if tache.projet_id != phase_cible.projet_id]
+            if hors_projet:
+                raise ValidationError(
+                    f"La phase sélectionnée n'appartient pas au projet des tâches {', '.join(map(str, hors_projet))}."
+                )
+
+            deplacees = [tache for tache in taches if tache.phase_etat_id != phase_etat_id]
+            anciens_etats = {tache.id: self._etat(tache) for tache in deplacees}
+            phases_touchees = {tache.phase_etat_id for tache in deplacees} | {phase_etat_id}
+
+            maintenant = timezone.now()
+            nouvelle_phase = Tache.PHASE_PAR_NOM.get(phase_cible.phase.nom if phase_cible.phase else None)
+            for tache in deplacees:
+                tache.phase_etat = phase_cible
+                tache.phase = nouvelle_phase or tache.phase
+                tache.mise_a_jour_le = maintenant
+            Tache.objects.bulk_update(
+                deplacees, ['phase_etat', 'phase', 'mise_a_jour_le'], batch_size=self.TAILLE_LOT
+            )
+
+            self._enregistrer_compteurs([(anciens_etats[tache.id], tache) for tache in deplacees])
+            if deplacees:
+                self._recalculer(phases_touchees, {phase_cible.projet_id})
+
+        return taches
+
+    # ------------------------------------------------------------------
+    # Utilitaires
+    # ------------------------------------------------------------------
+
+    def _get_phases(self, phase_ids):
+        """Phases des projets accessibles, en une requête"""
+        phases = {
+            phase.id: phase
+            for phase in ProjetPhaseEtat.objects.select_related('projet', 'phase').filter(
+                id__in=phase_ids, projet__in=self.projets_accessibles
+            )
+        }
+        manquantes = set(phase_ids) - set(phases)
+        if manquantes:
+            raise ValidationError(
+                f"Phase(s) introuvable(s) ou inaccessible(s): {', '.join(map(str, sorted(manquantes)))}."
+            )
+        return phases
+
+    def _get_taches(self, ids):
+        """
+        Tâches des projets accessibles, verrouillées pour la durée de la transaction
+        (les lignes des projets joints ne sont pas verrouillées)
+        """
+        taches = list(
+            Tache.objects.select_for_update(of=('self',)).select_related('projet').filter(
+                id__in=ids, projet__in=self.projets_accessibles
+            ).order_by('id')
+        )
+        manquantes = set(ids) - {tache.id for tache in taches}
+        if manquantes:
+            raise ValidationError(
+                f"Tâche(s) introuvable(s) ou inaccessible(s): {', '.join(map(str, sorted(manquantes)))}."
+            )
+        return taches
+
+    @staticmethod
+    def _verifier_membres(assignations):
+        """Vérifie en une requête que chaque (projet, utilisateur) correspond à un membre du projet"""
+        if not assignations:
+            return
+        membres = set(
+            MembreProjet.objects.filter(
+                projet_id__in={projet_id for projet_id, _ in assignations},
+                utilisateur_id__in={user_id for _, user_id in assignations}
+            ).values_list('projet_id', 'utilisateur_id')
+        )
+        non_membres = sorted(user_id for projet_id, user_id in assignations - membres)
+        if non_membres:
+            raise ValidationError(
+                f"Utilisateur(s) non membre(s) de l'équipe du projet: {', '.join(map(str, non_membres))}."
+            )
+
+    def _inserer(self, taches):
+        """Insère les tâches en masse (clés primaires renseignées sur les objets)"""
+        if connection.features.can_return_rows_from_bulk_insert:
+            Tache.objects.bulk_create(taches, batch_size=self.TAILLE_LOT)
+            return
+        # Moteurs sans RETURNING (MySQL) : insertion ligne par ligne pour récupérer
+        # les identifiants, sans passer par Tache.save ni par les signaux par tâche
+        for tache in taches:
+            models.Model.save(tache, force_insert=True)
+
+    @staticmethod
+    def _etat(tache):
+        """État compté d'une tâche avant modification"""
+        return {'statut': tache.statut, 'priorite': tache.priorite, 'projet_id': tache.projet_id}
+
+    @staticmethod
+    def _enregistrer_compteurs(transitions):
+        """Répercute les transitions sur les compteurs d'analytiques (signaux non déclenchés)"""
+        if AnalyticsCounterService is None:
+            return
+        AnalyticsCounterService.enregistrer_transitions(Tache, [
+            (ancien_etat, etat_de(Tache, tache)) for ancien_etat, tache in transitions
+        ])
+
+    @staticmethod
+    def _recalculer(phase_ids, projet_ids):
+        """Recompte et recalcule chaque phase et chaque projet touchés, une seule fois"""
+        for phase_etat in ProjetPhaseEtat.objects.select_related('projet').filter(id__in=phase_ids):
+            phase_etat.recompter_taches()
+            phase_etat.recalculer_depuis_taches()
+        for projet in Projet.objects.filter(id__in=projet_ids):
+            projet.recompter_taches()
+
+    @staticmethod
+    def _notifier_assignations(assignes_par_tache, taches):
+        """Une notification par utilisateur nouvellement assigné, quel que soit le nombre de tâches"""
+        if NotificationService is None:
+            return
+        taches_par_id = {tache.id: tache for tache in taches}
+        taches_par_utilisateur = {}
+        for tache_id, user_ids in assignes_par_tache.items():
+            for user_id in user_ids:
+                taches_par_utilisateur.setdefault(user_id, []).append(taches_par_id[tache_id])
+
+        from accounts.models import User
+        utilisateurs = User.objects.in_bulk(list(taches_par_utilisateur))
+        for user_id, taches_utilisateur in taches_par_utilisateur.items():
+            utilisateur = utilisateurs.get(user_id)
+            if not utilisateur:
+                continue
+            premiere = taches_utilisateur[0]
+            if len(taches_utilisateur) == 1:
+                titre = f'Nouvelle tâche assignée: {premiere.titre}'
+                message = f'Une nouvelle tâche vous a été assignée: "{premiere.titre}" dans le projet "{premiere.projet.nom}"'
+            else:
+                titre = f'{len(taches_utilisateur)} nouvelles tâches assignées'
+                message = f'{len(taches_utilisateur)} tâches vous ont été assignées: ' + ', '.join(
+                    f'"{tache.titre}"' for tache in taches_utilisateur[:5]
+                ) + (' ...' if len(taches_utilisateur) > 5 else '')
+            NotificationService.create_personal_notification(
+                type_code='tache_assignee',
+                titre=titre,
+                message=message,
+                destinataire=utilisateur,
+                projet=premiere.projet,
+                tache=premiere if len(taches_utilisateur) == 1 else None,
+                priorite='normale',
+                donnees_supplementaires={'taches': [tache.id for tache in taches_utilisateur]}
+            )
+
+    @staticmethod
+    def _notifier_terminees(taches):
+        """Une notification par chef de projet pour l'ensemble des tâches terminées"""
+        if NotificationService is None or not taches:
+            return
+        taches_par_projet = {}
+        for tache in taches:
+            taches_par_projet.setdefault(tache.projet_id, []).append(tache)
+
+        projets = Projet.objects.select_related('proprietaire').in_bulk(list(taches_par_projet))
+        taches_par_chef = {}
+        for projet_id, taches_projet in taches_par_projet.items():
+            projet = projets.get(projet_id)
+            if projet:
+                taches_par_chef.setdefault(projet.proprietaire, []).append((projet, taches_projet))
+
+        for chef, projets_chef in taches_par_chef.items():
+            total = sum(len(taches_projet) for _, taches_projet in projets_chef)
+            projet, taches_projet = projets_chef[0]
+            if total == 1:
+                titre = f'Tâche terminée: {taches_projet[0].titre}'
+                message = f'La tâche "{taches_projet[0].titre}" du projet "{projet.nom}" a été terminée'
+            else:
+                titre = f'{total} tâches terminées'
+                message = 'Tâches terminées: ' + ', '.join(
+                    f'{len(taches_p)} dans "{projet_p.nom}"' for projet_p, taches_p in projets_chef
+                )
+            NotificationService.create_personal_notification(
+                type_code='tache_terminee',
+                titre=titre,
+                message=message,
+                destinataire=chef,
+                projet=projet if len(projets_chef) == 1 else None,
+                tache=taches_projet[0] if total == 1 else None,
+                priorite='faible',
+                donnees_supplementaires={
+                    'taches': [tache.id for _, taches_p in projets_chef for tache in taches_p]
+                }
+            )
+
+
+class CompteursTachesService:
+    """
+    Réconciliation des compteurs de tâches dénormalisés (Projet, ProjetPhaseEtat)
+    avec la table des tâches : répare les écarts laissés par les écritures qui ne
+    passent pas par Tache.save (QuerySet.update, SQL brut...).
+    """
+
+    @staticmethod
+    def _attendus(champ_tache, avec_en_attente):
+        """Compteurs recalculés depuis les tâches : {id: (total, terminées[, en attente])}"""
+        agregats = {
+            'total': models.Count('id'),
+            'terminees': models.Count('id', filter=models.Q(statut='termine')),
+        }
+        if avec_en_attente:
+            agregats['en_attente'] = models.Count('id', filter=models.Q(statut='en_attente'))
+        attendus = {}
+        lignes = Tache.objects.exclude(**{champ_tache: None}).values(champ_tache).annotate(**agregats).order_by()
+        for ligne in lignes:
+            attendus[ligne[champ_tache]] = tuple(ligne[cle] for cle in agregats)
+        return attendus
+
+    @classmethod
+    def reconcile(cls, apply=True):
+        """
+        Compare les compteurs stockés aux valeurs recalculées et retourne les écarts.
+        Si apply=True, les lignes en écart sont verrouillées puis recomptées.
+        """
+        ecarts = []
+        for modele, champ_tache, champs in (
+            (Projet, 'projet_id', ('taches_total', 'taches_terminees')),
+            (ProjetPhaseEtat, 'phase_etat_id', ('taches_total', 'taches_terminees', 'taches_en_attente')),
+        ):
+            attendus = cls._attendus(champ_tache, avec_en_attente=len(champs) == 3)
+            a_recompter = []
+            for objet_id, *stockes in modele.objects.values_list('id', *champs, 'progression').iterator():
+                progression = stockes.pop()
+                attendu = attendus.get(objet_id, (0,) * len(champs))
+                progression_attendue = (attendu[1] / attendu[0] * 100) if attendu[0] else 0.0
+                if tuple(stockes) != attendu or abs(progression - progression_attendue) > 1e-6:
+                    a_recompter.append(objet_id)
+                    ecarts.append({
+                        'modele': modele.__name__,
+                        'id': objet_id,
+                        'stocke': dict(zip(champs, stockes)),
+                        'attendu': dict(zip(champs, attendu)),
+                    })
+
+            if apply:
+                for debut in range(0, len(a_recompter), TacheBulkService.TAILLE_LOT):
+                    with transaction.atomic():
+                        for objet in modele.objects.select_for_update().filter(
+                            id__in=a_recompter[debut:debut + TacheBulkService.TAILLE_LOT]
+                        ):
+                            objet.recompter_taches()
+        return ecarts
@@ -1,7 +1,7 @@
-from django.db.models.signals import post_save, pre_save
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 from django.utils import timezone
-from .models import Projet, ProjetPhaseEtat
+from .models import Projet, ProjetPhaseEtat, Tache
 
 @receiver(post_save, sender=ProjetPhaseEtat)
 def update_project_status_on_phase_change(sender, instance, created, **kwargs):
@@ -28,3 +28,14 @@ def update_project_status_on_phase_change(sender, instance, created, **kwargs):
             projet.statut = 'en_attente'
             projet.save(update_fields=['statut', 'mis_a_jour_le'])
             print(f"🔄 Projet '{projet.nom}' automatiquement marqué comme non terminé")
+
+
+@receiver(post_delete, sender=Tache)
+def update_task_counters_on_delete(sender, instance, **kwargs):
+    """
+    Décrémente les compteurs de tâches dénormalisés de la phase et du projet
+    """
+    Tache._mettre_a_jour_compteurs(
+        (instance.projet_id, instance.phase_etat_id, instance.statut),
+        None
+    )
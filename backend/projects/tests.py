@@ -1,3 +1,444 @@
-from django.test import TestCase
+from datetime import timedelta
+from unittest import mock
+import smtplib
 
-# Create your tests here.
+from django.contrib.auth import get_user_model
+from django.core import mail
+from django.core.exceptions import ValidationError
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .email_digest import EmailDigestService
+from .email_outbox import EmailOutboxService, get_config as get_outbox_config
+from .models import EmailDigestEntry, EmailOutbox, MembreProjet, Projet, ProjetPhaseEtat, Tache
+from .serializers import ProjetCreateUpdateSerializer
+from .services import CompteursTachesService, TacheBulkService
+
+User = get_user_model()
+
+
+class CompteursTachesTest(TestCase):
+    """Les compteurs de tâches ne sont écrits que par deltas ou recomptage, jamais par une sauvegarde complète"""
+
+    def setUp(self):
+        self.proprietaire = User.objects.create_user(
+            username='chef', email='chef@example.com', password='x', prenom='Chef', nom='Projet'
+        )
+        self.projet = Projet.objects.create(
+            code='PRJ-001', nom='Projet test', description='Description', objectif='Objectif',
+            type='marketing', proprietaire=self.proprietaire
+        )
+        self.phase_etat = self.projet.phases_etat.first()
+
+    def test_mise_a_jour_du_projet_pendant_une_creation_de_tache(self):
+        projet = Projet.objects.get(pk=self.projet.pk)
+
+        # Tâche créée par une autre requête entre le chargement et l'enregistrement du projet
+        Tache.objects.create(projet=self.projet, phase_etat=self.phase_etat, titre='Concurrente', statut='termine')
+
+        serializer = ProjetCreateUpdateSerializer(
+            projet, data={'nom': 'Projet renommé'}, partial=True,
+            context={'request': mock.Mock(user=self.proprietaire)}
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        projet.refresh_from_db()
+        self.assertEqual(projet.nom, 'Projet renommé')
+        self.assertEqual(projet.taches_total, 1)
+        self.assertEqual(projet.taches_terminees, 1)
+        self.assertEqual(projet.progression, 100.0)
+
+    def test_mise_a_jour_de_la_phase_pendant_une_creation_de_tache(self):
+        phase_etat = type(self.phase_etat).objects.get(pk=self.phase_etat.pk)
+
+        Tache.objects.create(projet=self.projet, phase_etat=self.phase_etat, titre='Concurrente')
+
+        phase_etat.commentaire = 'Commentaire'
+        phase_etat.save()
+
+        phase_etat.refresh_from_db()
+        self.assertEqual(phase_etat.commentaire, 'Commentaire')
+        self.assertEqual(phase_etat.taches_total, 1)
+        self.assertEqual(phase_etat.taches_en_attente, 1)
+
+    def test_reconciliation_des_compteurs(self):
+        Tache.objects.create(projet=self.projet, phase_etat=self.phase_etat, titre='Tâche', statut='termine')
+        # Écriture hors Tache.save : compteurs faux
+        Projet.objects.filter(pk=self.projet.pk).update(taches_total=5, taches_terminees=0, progression=0.0)
+
+        ecarts = CompteursTachesService.reconcile(apply=False)
+        self.assertEqual(
+            [(ecart['modele'], ecart['id']) for ecart in ecarts], [('Projet', self.projet.pk)]
+        )
+        self.assertEqual(ecarts[0]['attendu'], {'taches_total': 1, 'taches_terminees': 1})
+
+        CompteursTachesService.reconcile()
+        self.projet.refresh_from_db()
+        self.assertEqual((self.projet.taches_total, self.projet.taches_terminees), (1, 1))
+        self.assertEqual(self.projet.progression, 100.0)
+        self.assertEqual(CompteursTachesService.reconcile(apply=False), [])
+
+
+@override_settings(ROOT_URLCONF='projects.urls', NOTIFICATIONS_DISPATCH={'ASYNC': False})
+class ProjetListTest(TestCase):
+    """Liste des projets : requêtes en nombre constant, pagination keyset sur (cree_le, id)"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='x', prenom='Admin', nom='Projets'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.index = 0
+
+    def _creer_projets(self, nombre, membres=0, taches=0):
+        projets = []
+        for _ in range(nombre):
+            self.index += 1
+            projet = Projet.objects.create(
+                code=f'PRJ-L{self.index}', nom=f'Projet {self.index}', description='Description',
+                objectif='Objectif', type='marketing', proprietaire=self.admin
+            )
+            utilisateurs = [
+                User.objects.create_user(
+                    username=f'm{self.index}-{rang}', email=f'm{self.index}-{rang}@example.com',
+                    password='x', prenom='Membre', nom=str(rang)
+                )
+                for rang in range(membres)
+            ]
+            MembreProjet.objects.bulk_create([
+                MembreProjet(projet=projet, utilisateur=utilisateur, role_projet='membre')
+                for utilisateur in utilisateurs
+            ])
+            phase = projet.phases_etat.first()
+            for rang in range(taches):
+                Tache.objects.create(projet=projet, phase_etat=phase, titre=f'Tâche {rang}', statut='en_cours')
+            projets.append(projet)
+        return projets
+
+    def _requetes(self, **parametres):
+        with CaptureQueriesContext(connection) as requetes:
+            reponse = self.client.get(reverse('projet-list'), parametres)
+        self.assertEqual(reponse.status_code, 200)
+        return len(requetes), reponse.data
+
+    def test_nombre_de_requetes_constant(self):
+        self._creer_projets(2)
+        petite_page, donnees = self._requetes(page_size=2)
+        self.assertEqual(len(donnees['results']), 2)
+        sans_pagination, _ = self._requetes()
+
+        self._creer_projets(6, membres=3, taches=4)
+        grande_page, donnees = self._requetes(page_size=8)
+        self.assertEqual(len(donnees['results']), 8)
+        self.assertEqual(donnees['results'][0]['nombre_membres'], 3)
+        self.assertEqual(grande_page, petite_page)
+        self.assertEqual(self._requetes()[0], sans_pagination)
+
+    def test_pages_sans_doublon_avec_dates_identiques(self):
+        projets = self._creer_projets(5)
+        Projet.objects.filter(id__in=[projet.id for projet in projets]).update(cree_le=timezone.now())
+
+        vus = []
+        _, donnees = self._requetes(page_size=2)
+        vus += [projet['id'] for projet in donnees['results']]
+        while donnees['next']:
+            with CaptureQueriesContext(connection) as requetes:
+                donnees = self.client.get(donnees['next']).data
+            # Position (cree_le, id) dans le curseur : les ex æquo ne sont pas départagés par OFFSET
+            self.assertFalse([requete for requete in requetes.captured_queries if 'OFFSET' in requete['sql']])
+            vus += [projet['id'] for projet in donnees['results']]
+        self.assertEqual(vus, sorted((projet.id for projet in projets), reverse=True))
+
+
+@override_settings(ROOT_URLCONF='projects.urls')
+class TacheBulkServiceTest(TestCase):
+    """Opérations en masse : recalcul unique par phase et projet, notifications agrégées, rollback"""
+
+    def setUp(self):
+        self.proprietaire = User.objects.create_user(
+            username='chef', email='chef@example.com', password='x', prenom='Chef', nom='Projet'
+        )
+        self.membre = User.objects.create_user(
+            username='membre', email='membre@example.com', password='x', prenom='Membre', nom='Equipe'
+        )
+        self.projet = Projet.objects.create(
+            code='PRJ-002', nom='Projet masse', description='Description', objectif='Objectif',
+            type='marketing', proprietaire=self.proprietaire
+        )
+        MembreProjet.objects.bulk_create([
+            MembreProjet(projet=self.projet, utilisateur=self.membre, role_projet='membre')
+        ])
+        self.phase_a, self.phase_b = list(self.projet.phases_etat.all()[:2])
+        self.service = TacheBulkService(self.proprietaire, Projet.objects.all())
+        notifications = mock.patch('projects.services.NotificationService')
+        self.notifications = notifications.start()
+        self.addCleanup(notifications.stop)
+
+    def _creer(self, phases, assigne_a=()):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.service.creer([
+                {
+                    'titre': f'Tâche {index}', 'statut': 'en_attente', 'priorite': 'haut',
+                    'phase_etat_id': phase.id, 'assigne_a': list(assigne_a),
+                }
+                for index, phase in enumerate(phases)
+            ])
+
+    def _compteurs(self, objet):
+        objet.refresh_from_db()
+        return objet.taches_total, objet.taches_terminees
+
+    def _recomptages(self):
+        """Espionne les recomptages des phases et des projets"""
+        phases = mock.patch.object(
+            ProjetPhaseEtat, 'recompter_taches', autospec=True, side_effect=ProjetPhaseEtat.recompter_taches
+        )
+        projets = mock.patch.object(
+            Projet, 'recompter_taches', autospec=True, side_effect=Projet.recompter_taches
+        )
+        self.addCleanup(phases.stop)
+        self.addCleanup(projets.stop)
+        return phases.start(), projets.start()
+
+    def test_creation_recalcul_unique_et_notification_agregee(self):
+        recomptages_phases, recomptages_projets = self._recomptages()
+
+        taches = self._creer([self.phase_a] * 3 + [self.phase_b] * 2, assigne_a=[self.membre.id])
+
+        self.assertEqual(len(taches), 5)
+        self.assertEqual(recomptages_phases.call_count, 2)
+        self.assertEqual(recomptages_projets.call_count, 1)
+        self.assertEqual(self._compteurs(self.phase_a), (3, 0))
+        self.assertEqual(self._compteurs(self.phase_b), (2, 0))
+        self.assertEqual(self._compteurs(self.projet), (5, 0))
+
+        # Une seule notification pour les cinq tâches assignées
+        appels = self.notifications.create_personal_notification.call_args_list
+        self.assertEqual(len(appels), 1)
+        self.assertEqual(appels[0].kwargs['destinataire'], self.membre)
+        self.assertEqual(len(appels[0].kwargs['donnees_supplementaires']['taches']), 5)
+
+    def test_changement_de_statut(self):
+        taches = self._creer([self.phase_a] * 2 + [self.phase_b] * 2)
+        self.notifications.reset_mock()
+        recomptages_phases, recomptages_projets = self._recomptages()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.mettre_a_jour_statut([tache.id for tache in taches], 'termine')
+
+        self.assertEqual(recomptages_phases.call_count, 2)
+        self.assertEqual(recomptages_projets.call_count, 1)
+        self.assertEqual(self._compteurs(self.projet), (4, 4))
+        self.assertEqual(self.projet.progression, 100.0)
+        self.assertEqual(self._compteurs(self.phase_a), (2, 2))
+
+        appels = self.notifications.create_personal_notification.call_args_list
+        self.assertEqual(len(appels), 1)
+        self.assertEqual(appels[0].kwargs['destinataire'], self.proprietaire)
+        self.assertEqual(appels[0].kwargs['type_code'], 'tache_terminee')
+
+    def test_changement_de_phase(self):
+        taches = self._creer([self.phase_a] * 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.service.deplacer_phase([tache.id for tache in taches[:2]], self.phase_b.id)
+
+        self.assertEqual(self._compteurs(self.phase_a), (1, 0))
+        self.assertEqual(self._compteurs(self.phase_b), (2, 0))
+        self.assertEqual(self._compteurs(self.projet), (3, 0))
+
+    def test_suppression_apres_operation_en_masse(self):
+        taches = self._creer([self.phase_a] * 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tache.objects.get(pk=taches[0].id).delete()
+
+        self.assertEqual(self._compteurs(self.phase_a), (2, 0))
+        self.assertEqual(self._compteurs(self.projet), (2, 0))
+        self.assertEqual(CompteursTachesService.reconcile(apply=False), [])
+
+    def test_rollback_sur_erreur(self):
+        taches = self._creer([self.phase_a] * 2)
+        ids = [tache.id for tache in taches]
+
+        with mock.patch.object(TacheBulkService, '_recalculer', side_effect=RuntimeError('panne')):
+            with self.assertRaises(RuntimeError):
+                self.service.mettre_a_jour_statut(ids, 'termine')
+
+        self.assertFalse(Tache.objects.filter(id__in=ids, statut='termine').exists())
+        self.assertEqual(self._compteurs(self.projet), (2, 0))
+
+        # Assigné hors équipe : rien n'est créé
+        with self.assertRaises(ValidationError):
+            self.service.creer([{
+                'titre': 'Refusée', 'statut': 'en_attente', 'priorite': 'haut',
+                'phase_etat_id': self.phase_a.id, 'assigne_a': [self.proprietaire.id],
+            }])
+        self.assertEqual(Tache.objects.filter(projet=self.projet).count(), 2)
+
+    def test_api_bulk(self):
+        client = APIClient()
+        client.force_authenticate(self.proprietaire)
+        url = reverse('tache-bulk')
+
+        reponse = client.post(url, {
+            'operation': 'create',
+            'taches': [{'titre': 'API', 'phase_etat_id': self.phase_a.id}],
+        }, format='json')
+        self.assertEqual(reponse.status_code, 201)
+        tache_id = reponse.data['taches'][0]['id']
+
+        client.post(url, {'operation': 'update_statut', 'ids': [tache_id], 'statut': 'termine'}, format='json')
+        reponse = client.post(url, {'operation': 'update_statut', 'ids': [tache_id], 'statut': 'en_cours'}, format='json')
+        self.assertEqual(reponse.status_code, 400)
+        self.assertEqual(Tache.objects.get(pk=tache_id).statut, 'termine')
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailOutboxServiceTest(TestCase):
+    """File d'attente des emails : envoi par lots, backoff entre tentatives, abandon"""
+
+    def setUp(self):
+        self.service = EmailOutboxService({
+            **get_outbox_config(), 'MAX_ATTEMPTS': 2, 'BACKOFF_BASE': 30, 'BACKOFF_MAX': 3600
+        })
+
+    def test_envoi_par_lot(self):
+        for index in range(3):
+            EmailOutboxService.enqueue([f'dest{index}@example.com', ''], f'Sujet {index}', 'Texte', corps_html='<p>Texte</p>')
+
+        stats = self.service.vider()
+
+        self.assertEqual((stats['traites'], stats['envoyes'], stats['echecs']), (3, 3, 0))
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(mail.outbox[0].to, ['dest0@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
+        self.assertFalse(EmailOutbox.objects.exclude(statut='envoye').exists())
+
+    def test_rien_en_file_si_transaction_annulee(self):
+        with self.assertRaises(RuntimeError), transaction.atomic():
+            EmailOutboxService.enqueue(['dest@example.com'], 'Sujet', 'Texte')
+            raise RuntimeError('annulation')
+        self.assertFalse(EmailOutbox.objects.exists())
+        self.assertIsNone(EmailOutboxService.enqueue([''], 'Sujet', 'Texte'))
+
+    def test_backoff_puis_abandon(self):
+        email = EmailOutboxService.enqueue(['dest@example.com'], 'Sujet', 'Texte')
+
+        with mock.patch('projects.email_outbox.EmailMultiAlternatives.send', side_effect=smtplib.SMTPException('refus')):
+            avant = timezone.now()
+            stats = self.service.vider()
+            email.refresh_from_db()
+            self.assertEqual((stats['echecs'], stats['abandonnes']), (1, 0))
+            self.assertEqual((email.statut, email.tentatives), ('en_attente', 1))
+            self.assertIn('refus', email.derniere_erreur)
+            self.assertGreaterEqual(email.prochaine_tentative, avant + timedelta(seconds=27))
+
+            # Pas encore dû : rien n'est retenté
+            self.assertEqual(self.service.vider()['traites'], 0)
+
+            EmailOutbox.objects.filter(pk=email.pk).update(prochaine_tentative=timezone.now())
+            stats = self.service.vider()
+            email.refresh_from_db()
+            self.assertEqual(stats['abandonnes'], 1)
+            self.assertEqual((email.statut, email.tentatives), ('abandonne', 2))
+
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(EmailOutboxService.requeue(EmailOutbox.objects.all()), 1)
+        self.service.vider()
+        email.refresh_from_db()
+        self.assertEqual(email.statut, 'envoye')
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_delai_avant_tentative(self):
+        for tentatives, attendu in ((1, 30), (2, 60), (4, 240), (20, 3600)):
+            delai = self.service.delai_avant_tentative(tentatives)
+            self.assertGreaterEqual(delai, attendu * 0.9)
+            self.assertLessEqual(delai, attendu * 1.1)
+
+    def test_lot_en_cours_expire_repris(self):
+        email = EmailOutboxService.enqueue(['dest@example.com'], 'Sujet', 'Texte')
+        # Worker arrêté pendant l'envoi : le lot reste « en cours »
+        EmailOutbox.objects.filter(pk=email.pk).update(
+            statut='en_cours', verrouille_le=timezone.now() - timedelta(hours=1)
+        )
+        self.assertEqual(self.service.vider()['envoyes'], 1)
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend')
+class EmailDigestServiceTest(TestCase):
+    """Digests : routage selon les préférences, regroupement par destinataire"""
+
+    def setUp(self):
+        from notifications.models import NotificationPreference
+
+        self.quotidien = self._utilisateur('quotidien')
+        self.immediat = self._utilisateur('immediat')
+        self.immediat_bis = self._utilisateur('immediat2')
+        self.sans_email = self._utilisateur('muet')
+        NotificationPreference.objects.create(utilisateur=self.quotidien, frequence_digest='quotidien')
+        NotificationPreference.objects.create(utilisateur=self.sans_email, notifications_email=False)
+        self.destinataires = [u.email for u in (self.quotidien, self.immediat, self.immediat_bis, self.sans_email)]
+
+    @staticmethod
+    def _utilisateur(nom):
+        return User.objects.create_user(
+            username=nom, email=f'{nom}@example.com', password='x', prenom=nom.capitalize(), nom='Test'
+        )
+
+    @staticmethod
+    def _evenement(code):
+        return EmailDigestService.evenement(
+            f'Projet {code} mis à jour', 'emails/project_updated.html',
+            {'project_nom': f'Projet {code}', 'project_code': code}, 'Texte', '<p>HTML</p>'
+        )
+
+    def test_distribution_selon_les_preferences(self):
+        immediats = EmailDigestService.distribuer(self.destinataires, self._evenement('A'))
+        EmailDigestService.distribuer(self.destinataires, self._evenement('A'))
+
+        self.assertEqual(immediats, [self.immediat.email, self.immediat_bis.email])
+        # Un seul événement en attente malgré deux envois identiques
+        entrees = EmailDigestEntry.objects.filter(utilisateur=self.quotidien)
+        self.assertEqual(entrees.count(), 1)
+        self.assertEqual(entrees.get().frequence, 'quotidien')
+        self.assertFalse(EmailDigestEntry.objects.exclude(utilisateur=self.quotidien).exists())
+
+    def test_regroupement_un_email_par_destinataire(self):
+        with EmailDigestService.regroupement():
+            for code in ('A', 'B', 'C'):
+                self.assertEqual(EmailDigestService.distribuer(self.destinataires, self._evenement(code)), [])
+
+        # Les deux destinataires immédiats ont les mêmes événements : un seul message
+        emails = list(EmailOutbox.objects.all())
+        self.assertEqual(len(emails), 1)
+        self.assertEqual(emails[0].destinataires, sorted([self.immediat.email, self.immediat_bis.email]))
+        self.assertEqual(emails[0].template, EmailDigestService.TEMPLATE)
+        self.assertIn('Projet A mis à jour', emails[0].corps_texte)
+        self.assertIn('Projet C mis à jour', emails[0].corps_texte)
+
+        EmailOutboxService().vider()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(EmailDigestEntry.objects.filter(utilisateur=self.quotidien).count(), 3)
+
+    def test_envoi_des_digests_differes(self):
+        for code in ('A', 'B'):
+            EmailDigestService.distribuer([self.quotidien.email], self._evenement(code))
+
+        self.assertEqual(EmailDigestService.envoyer_digests('hebdomadaire'), (0, 0))
+        self.assertEqual(EmailDigestService.envoyer_digests('quotidien'), (1, 2))
+        self.assertEqual(EmailDigestService.envoyer_digests('quotidien'), (0, 0))
+        self.assertFalse(EmailDigestEntry.objects.filter(envoye_le__isnull=True).exists())
+
+        EmailOutboxService().vider()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, [self.quotidien.email])
+        self.assertIn('Quotidien'.lower(), mail.outbox[0].subject)
+        self.assertIn('Projet B mis à jour', mail.outbox[0].body)
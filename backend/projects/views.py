@@ -24,8 +24,11 @@ from .serializers import (
     HistoriqueEtatSerializer, PermissionProjetSerializer, PermissionProjetCreateSerializer,
     PermissionProjetUpdateSerializer, UtilisateurPermissionsSerializer,
     TacheListSerializer, TacheDetailSerializer, TacheCreateUpdateSerializer, TacheStatutUpdateSerializer,
+    TacheBulkSerializer,
     PhaseProjetSerializer, ProjetPhaseEtatSerializer, ProjetPhaseEtatUpdateSerializer
 )
+from .pagination import ProjetCursorPagination
+from .services import TacheBulkService
 from .permissions import (
     ProjetPermissions, MembreProjetPermissions, HistoriqueEtatPermissions,
     PermissionProjetPermissions
@@ -46,25 +49,29 @@ class ProjetViewSet(viewsets.ModelViewSet):
     - GET /api/projects/stats/ - Statistiques des projets
     """
     permission_classes = [ProjetPermissions]
-    queryset = Projet.objects.all().select_related('proprietaire').prefetch_related('phases_etat__phase')
+    pagination_class = ProjetCursorPagination
+    queryset = Projet.objects.all().select_related('proprietaire')
     
     def get_queryset(self):
         """Filtrer les projets selon les permissions de l'utilisateur."""
-        from .models import Tache
-        
         user = self.request.user
         
         # Les superusers voient tous les projets
         if user.is_superuser:
-            queryset = super().get_queryset().prefetch_related('phases_etat__phase', 'taches')
+            queryset = super().get_queryset()
         else:
         # Les utilisateurs normaux voient leurs projets et ceux où ils ont des permissions
             queryset = Projet.objects.filter(
             Q(proprietaire=user) |
             Q(permissions_utilisateurs__utilisateur=user, permissions_utilisateurs__active=True)
-            ).distinct().select_related('proprietaire').prefetch_related('phases_etat__phase', 'taches')
+            ).distinct().select_related('proprietaire')
+        
+        if self.action == 'list':
+            # Progression, phase actuelle et membres calculés en SQL : nombre de requêtes
+            # constant quelle que soit la taille de la page
+            return ProjetListSerializer.annoter_queryset(queryset).order_by('-cree_le', '-id')
         
-        return queryset
+        return queryset.prefetch_related('phases_etat__phase', 'taches')
     
     def get_serializer_class(self):
         """Choisir le bon sérialiseur selon l'action."""
@@ -490,6 +497,7 @@ class TacheViewSet(viewsets.ModelViewSet):
     - PUT /api/taches/{id}/ - Modifier une tâche
     - DELETE /api/taches/{id}/ - Supprimer une tâche
     - PATCH /api/taches/{id}/update_statut/ - Mettre à jour le statut
+    - POST /api/taches/bulk/ - Opérations en masse (création, statut, réassignation, phase)
     - GET /api/taches/projet/{projet_id}/ - Tâches d'un projet
     - GET /api/taches/mes_taches/ - Tâches assignées à l'utilisateur
     """
@@ -524,6 +532,8 @@ class TacheViewSet(viewsets.ModelViewSet):
             return TacheCreateUpdateSerializer
         elif self.action == 'update_statut':
             return TacheStatutUpdateSerializer
+        elif self.action == 'bulk':
+            return TacheBulkSerializer
         return TacheListSerializer
     
     def create(self, request, *args, **kwargs):
@@ -636,6 +646,50 @@ class TacheViewSet(viewsets.ModelViewSet):
             'tache': TacheDetailSerializer(tache).data
         })
     
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        """
+        Opérations en masse sur les tâches (POST /api/taches/bulk/).
+        
+        operation = create (taches), update_statut (ids, statut),
+        reassign (ids, assigne_a) ou move_phase (ids, phase_etat_id).
+        """
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        
+        user = request.user
+        projets_accessibles = Projet.objects.all()
+        if not user.is_superuser:
+            projets_accessibles = Projet.objects.filter(
+                Q(proprietaire=user) |
+                Q(permissions_utilisateurs__utilisateur=user, permissions_utilisateurs__active=True)
+            ).distinct()
+        service = TacheBulkService(user, projets_accessibles)
+        
+        operation = data['operation']
+        try:
+            if operation == 'create':
+                taches = service.creer(data['taches'])
+            elif operation == 'update_statut':
+                taches = service.mettre_a_jour_statut(data['ids'], data['statut'])
+            elif operation == 'reassign':
+                taches = service.reassigner(data['ids'], data['assigne_a'])
+            else:
+                taches = service.deplacer_phase(data['ids'], data['phase_etat_id'])
+        except ValidationError as e:
+            return Response({
+                'error': ' '.join(e.messages),
+                'message': "L'opération en masse a été annulée"
+            }, status=status.HTTP_400_BAD_REQUEST)
+        
+        taches = self.get_queryset().filter(id__in=[tache.id for tache in taches]).order_by('id')
+        return Response({
+            'message': f'{len(taches)} tâche(s) traitée(s)',
+            'operation': operation,
+            'taches': TacheListSerializer(taches, many=True).data
+        }, status=status.HTTP_201_CREATED if operation == 'create' else status.HTTP_200_OK)
+    
     @action(detail=False, methods=['get'])
     def projet_taches(self, request):
         """Obtenir toutes les tâches d'un projet spécifique."""
@@ -172,6 +172,10 @@ const SummaryCharts = ({ type = 'all', projectId = null }) => {
 
   const handleWebSocketMessage = (data) => {
     switch (data.type) {
+      case 'notifications_batch':
+        // Notifications regroupées par le serveur : traitées une à une
+        data.data.forEach(message => handleWebSocketMessage(message));
+        break;
       case 'notification_general':
       case 'notification_personal':
         // Nouvelle notification reçue
@@ -10,6 +10,7 @@ const NotificationBell = () => {
   
   const wsRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
+  const dernierIdRef = useRef(null);
 
   // Connexion WebSocket pour les notifications
   useEffect(() => {
@@ -29,7 +30,9 @@ const NotificationBell = () => {
     }
 
     // Vérifier si le serveur est accessible
-    const wsUrl = `ws://localhost:8000/ws/notifications/?token=${token}`;
+    // Après une reconnexion, le serveur n'envoie que les notifications postérieures à la dernière reçue
+    const lastId = dernierIdRef.current ? `&last_id=${dernierIdRef.current}` : '';
+    const wsUrl = `ws://localhost:8000/ws/notifications/?token=${token}${lastId}`;
     
     try {
       wsRef.current = new WebSocket(wsUrl);
@@ -87,15 +90,21 @@ const NotificationBell = () => {
 
   const handleWebSocketMessage = (data) => {
     switch (data.type) {
+      case 'notifications_batch':
+        // Notifications regroupées par le serveur : traitées une à une
+        data.data.forEach(message => handleWebSocketMessage(message));
+        break;
       case 'notification_personal':
         // Nouvelle notification personnelle
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.data.id || 0);
         setUnreadCount(prev => prev + 1);
         // Optionnel: afficher une notification toast
         showNotificationToast(data.data);
         break;
       case 'notifications_non_lues':
         // Mise à jour du compteur
-        setUnreadCount(data.data.personnelles?.length || 0);
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.dernier_id || 0);
+        setUnreadCount(data.data.nombre_non_lues ?? data.data.personnelles?.length ?? 0);
         break;
       default:
         break;
@@ -26,6 +26,7 @@ const NotificationCenter = ({ isOpen, onClose }) => {
   
   const wsRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
+  const dernierIdRef = useRef(null);
 
   // Types de notifications
   const notificationTypes = {
@@ -102,7 +103,9 @@ const NotificationCenter = ({ isOpen, onClose }) => {
     const token = localStorage.getItem('access_token');
     if (!token) return;
 
-    const wsUrl = `ws://localhost:8000/ws/notifications/?token=${token}`;
+    // Après une reconnexion, le serveur n'envoie que les notifications postérieures à la dernière reçue
+    const lastId = dernierIdRef.current ? `&last_id=${dernierIdRef.current}` : '';
+    const wsUrl = `ws://localhost:8000/ws/notifications/?token=${token}${lastId}`;
     wsRef.current = new WebSocket(wsUrl);
 
     wsRef.current.onopen = () => {
@@ -142,16 +145,22 @@ const NotificationCenter = ({ isOpen, onClose }) => {
 
   const handleWebSocketMessage = (data) => {
     switch (data.type) {
+      case 'notifications_batch':
+        // Notifications regroupées par le serveur : traitées une à une
+        data.data.forEach(message => handleWebSocketMessage(message));
+        break;
       case 'notification_general':
       case 'notification_personal':
         // Nouvelle notification reçue
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.data.id || 0);
         setNotifications(prev => [data.data, ...prev]);
         if (data.type === 'notification_personal') {
           setUnreadCount(prev => prev + 1);
         }
         break;
       case 'notifications_non_lues':
-        // Mise à jour des notifications non lues
+        // Mise à jour des notifications non lues (ou seulement les nouvelles après une reconnexion)
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.dernier_id || 0);
         setNotifications(prev => {
           const updated = [...prev];
           data.data.personnelles.forEach(notif => {
@@ -162,7 +171,7 @@ const NotificationCenter = ({ isOpen, onClose }) => {
           });
           return updated;
         });
-        setUnreadCount(data.data.personnelles.length);
+        setUnreadCount(data.data.nombre_non_lues ?? data.data.personnelles.length);
         break;
       default:
         break;
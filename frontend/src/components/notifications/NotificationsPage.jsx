@@ -58,6 +58,7 @@ const NotificationsPage = () => {
   const wsRef = useRef(null);
   const messagesEndRef = useRef(null);
   const reconnectTimeoutRef = useRef(null);
+  const dernierIdRef = useRef(null);
   
   // Emojis populaires
   const emojis = ['😀', '😃', '😄', '😁', '😆', '😅', '😂', '🤣', '😊', '😇', '🙂', '🙃', '😉', '😌', '😍', '🥰', '😘', '😗', '😙', '😚', '😋', '😛', '😝', '😜', '🤪', '🤨', '🧐', '🤓', '😎', '🤩', '🥳', '😏', '😒', '😞', '😔', '😟', '😕', '🙁', '☹️', '😣', '😖', '😫', '😩', '🥺', '😢', '😭', '😤', '😠', '😡', '🤬', '🤯', '😳', '🥵', '🥶', '😱', '😨', '😰', '😥', '😓', '🤗', '🤔', '🤭', '🤫', '🤥', '😶', '😐', '😑', '😬', '🙄', '😯', '😦', '😧', '😮', '😲', '🥱', '😴', '🤤', '😪', '😵', '🤐', '🥴', '🤢', '🤮', '🤧', '😷', '🤒', '🤕', '🤑', '🤠', '😈', '👿', '👹', '👺', '🤡', '💩', '👻', '💀', '☠️', '👽', '👾', '🤖', '🎃', '😺', '😸', '😹', '😻', '😼', '😽', '🙀', '😿', '😾'];
@@ -401,7 +402,9 @@ const NotificationsPage = () => {
     const token = localStorage.getItem(getConfig('TOKENS.ACCESS_TOKEN_KEY'));
     if (!token) return;
 
-    const wsUrl = `ws://localhost:8000/ws/notifications/?token=${token}`;
+    // Après une reconnexion, le serveur n'envoie que les notifications postérieures à la dernière reçue
+    const lastId = dernierIdRef.current ? `&last_id=${dernierIdRef.current}` : '';
+    const wsUrl = `ws://localhost:8000/ws/notifications/?token=${token}${lastId}`;
     wsRef.current = new WebSocket(wsUrl);
 
     wsRef.current.onopen = () => {
@@ -442,12 +445,18 @@ const NotificationsPage = () => {
 
   const handleWebSocketMessage = (data) => {
     switch (data.type) {
+      case 'notifications_batch':
+        // Notifications regroupées par le serveur : traitées une à une
+        data.data.forEach(message => handleWebSocketMessage(message));
+        break;
       case 'notification_general':
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.data.id || 0);
         setNotifications(prev => [data.data, ...prev]);
         setStats(prev => ({ ...prev, totalNotifications: prev.totalNotifications + 1 }));
         showNotificationAlert(data.data);
         break;
       case 'notification_personal':
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.data.id || 0);
         setNotifications(prev => [data.data, ...prev]);
         setUnreadCount(prev => prev + 1);
         setStats(prev => ({ ...prev, totalNotifications: prev.totalNotifications + 1 }));
@@ -456,7 +465,8 @@ const NotificationsPage = () => {
       case 'chat_message':
         // Éviter les doublons en vérifiant si le message existe déjà
         setMessages(prev => {
-          const messageExists = prev.some(msg => msg.id === data.data.id);
+          // Messages identifiés par leur uid (ceux chargés par l'API ont aussi un id en base)
+          const messageExists = prev.some(msg => (msg.uid || msg.id) === (data.data.uid || data.data.id));
           if (messageExists) return prev;
           return [...prev, data.data];
         });
@@ -465,6 +475,19 @@ const NotificationsPage = () => {
         setOnlineUsers(data.data?.users || data.users || []);
         setStats(prev => ({ ...prev, onlineUsers: data.data?.users?.length || data.users?.length || 0 }));
         break;
+      case 'online_users':
+        setOnlineUsers(data.users || []);
+        setStats(prev => ({ ...prev, onlineUsers: data.count ?? data.users?.length ?? 0 }));
+        break;
+      case 'presence_update':
+        setOnlineUsers(prev => {
+          const { etat, users = [] } = data.data || {};
+          const ids = users.map(user => user.id);
+          const restants = prev.filter(user => !ids.includes(user.id));
+          return etat === 'arrive' ? [...restants, ...users] : restants;
+        });
+        setStats(prev => ({ ...prev, onlineUsers: data.data?.count ?? prev.onlineUsers }));
+        break;
       case 'user_typing':
         setTypingUsers(prev => {
           const filtered = prev.filter(user => user.id !== data.user.id);
@@ -475,7 +498,7 @@ const NotificationsPage = () => {
         setTypingUsers(prev => prev.filter(user => user.id !== data.user.id));
         break;
       case 'message_deleted':
-        setMessages(prev => prev.filter(msg => msg.id !== data.message_id));
+        setMessages(prev => prev.filter(msg => msg.id !== data.message_id && msg.uid !== data.message_id));
         setDeletedMessages(prev => new Set([...prev, data.message_id]));
         console.log('Message supprimé en temps réel:', data.message_id, 'par:', data.deleted_by);
         break;
@@ -488,6 +511,7 @@ const NotificationsPage = () => {
         console.error('Erreur WebSocket:', data.message);
         break;
       case 'notifications_non_lues':
+        dernierIdRef.current = Math.max(dernierIdRef.current || 0, data.dernier_id || 0);
         if (data.data?.generales) {
           setNotifications(prev => [...data.data.generales, ...prev]);
           setStats(prev => ({ ...prev, totalNotifications: prev.totalNotifications + data.data.generales.length }));
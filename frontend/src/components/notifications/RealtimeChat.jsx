@@ -106,6 +106,14 @@ const RealtimeChat = ({ isOpen, onClose, roomName = 'general' }) => {
       case 'online_users_update':
         setOnlineUsers(data.data.users);
         break;
+      case 'presence_update':
+        setOnlineUsers(prev => {
+          const { etat, users = [] } = data.data || {};
+          const ids = users.map(user => user.id);
+          const restants = prev.filter(user => !ids.includes(user.id));
+          return etat === 'arrive' ? [...restants, ...users] : restants;
+        });
+        break;
       default:
         break;
     }
@@ -214,8 +214,16 @@ const WhatsAppChat = ({ isOpen, onClose, roomName = 'general' }) => {
         console.log('Mise à jour utilisateurs en ligne reçue:', data);
         setOnlineUsers(data.data?.users || data.users || []);
         break;
+      case 'presence_update':
+        setOnlineUsers(prev => {
+          const { etat, users = [] } = data.data || {};
+          const ids = users.map(user => user.id);
+          const restants = prev.filter(user => !ids.includes(user.id));
+          return etat === 'arrive' ? [...restants, ...users] : restants;
+        });
+        break;
       case 'message_deleted':
-        setMessages(prev => prev.filter(msg => msg.id !== data.message_id));
+        setMessages(prev => prev.filter(msg => msg.id !== data.message_id && msg.uid !== data.message_id));
         break;
       default:
         break;